@@ -0,0 +1,425 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core_data_domains import (
+    PlaybackEvent, UserInteractionEvent, QoSTelemtry, UserRating, PaymentTransaction,
+    ExperimentExposure, ErrorEvent, DataValidator
+)
+from load_generator import LoadGenerator, LoadProfile
+
+# Benchmark suite
+# Times construction, validation, serialization and the streaming stages on
+# load_generator data and writes machine-readable JSON, so runs on different
+# commits can be compared with --compare.
+#
+#   python benchmarks.py --output results/HEAD.json
+#   python benchmarks.py --compare results/main.json --threshold 0.10
+
+RESULTS_VERSION = 2
+
+MODELS = [
+    PlaybackEvent, UserInteractionEvent, QoSTelemtry, UserRating, PaymentTransaction,
+    ExperimentExposure, ErrorEvent,
+]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    operations: int
+    best_seconds: float
+    median_seconds: float
+    ops_per_sec: float
+    repeats: int
+
+
+class BenchmarkContext:
+    """Pre-generated events shared by all benchmarks, built lazily per model"""
+
+    def __init__(self, n: int, seed: int):
+        self.n = n
+        self.profile = LoadProfile(seed=seed)
+        self._events: Dict[type, List[Any]] = {}
+
+    def events(self, cls: type) -> List[Any]:
+        events = self._events.get(cls)
+        if events is None:
+            events = self._events[cls] = list(LoadGenerator(self.profile).stream_for(cls, self.n))
+        return events
+
+
+# name -> (group, setup); setup(context) returns (operations, run)
+BENCHMARKS: Dict[str, Tuple[str, Callable[[BenchmarkContext], Tuple[int, Callable[[], Any]]]]] = {}
+
+
+def benchmark(group: str, name: str):
+    def register(setup):
+        BENCHMARKS[f"{group}.{name}"] = (group, setup)
+        return setup
+    return register
+
+
+# Construction
+
+def _construction(cls: type):
+    def setup(ctx: BenchmarkContext):
+        names = [f.name for f in fields(cls)]
+        payloads = [{name: getattr(e, name) for name in names} for e in ctx.events(cls)]
+
+        def run():
+            for payload in payloads:
+                cls(**payload)
+        return len(payloads), run
+    return setup
+
+
+def _generation(cls: type):
+    def setup(ctx: BenchmarkContext):
+        def run():
+            for _ in LoadGenerator(ctx.profile).stream_for(cls, ctx.n):
+                pass
+        return ctx.n, run
+    return setup
+
+
+for _cls in MODELS:
+    benchmark("construction", _cls.__name__)(_construction(_cls))
+    benchmark("generation", _cls.__name__)(_generation(_cls))
+
+
+# Validation
+
+@benchmark("validation", "DataValidator.validate_playback_event")
+def _validate_playback(ctx: BenchmarkContext):
+    events = ctx.events(PlaybackEvent)
+    validate = DataValidator.validate_playback_event
+
+    def run():
+        for event in events:
+            validate(event)
+    return len(events), run
+
+
+@benchmark("validation", "PlaybackEventBatch.validate_batch")
+def _validate_playback_batch(ctx: BenchmarkContext):
+    from playback_batch import PlaybackEventBatch
+    batch = PlaybackEventBatch.from_events(ctx.events(PlaybackEvent))
+    return len(batch), batch.validate_batch
+
+
+# Serialization
+
+@benchmark("serialization", "PlaybackEvent.to_dict+json.dumps")
+def _to_dict_json(ctx: BenchmarkContext):
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        for event in events:
+            json.dumps(event.to_dict())
+    return len(events), run
+
+
+def _fast_json(cls: type):
+    def setup(ctx: BenchmarkContext):
+        import fast_json
+        events = ctx.events(cls)
+        encoder = fast_json.get_encoder(cls)
+        return len(events), lambda: encoder.encode_many(events)
+    return setup
+
+
+def _avro(cls: type):
+    def setup(ctx: BenchmarkContext):
+        import avro_codec
+        events = ctx.events(cls)
+        codec = avro_codec.get_codec(cls)
+
+        def run():
+            buf = bytearray()
+            for event in events:
+                codec.encode_into(event, buf)
+        return len(events), run
+    return setup
+
+
+# Fields a typical downstream stage reads
+PROJECTIONS = {
+    PlaybackEvent: ["user_id", "content_id", "event_type", "event_timestamp"],
+    QoSTelemtry: ["session_id", "user_id", "timestamp", "current_bitrate_kbps"],
+}
+
+
+def _avro_decode(cls: type, projected: bool):
+    def setup(ctx: BenchmarkContext):
+        import avro_codec
+        codec = avro_codec.get_codec(cls)
+        messages = [codec.encode(event) for event in ctx.events(cls)]
+        if not projected:
+            return len(messages), lambda: [codec.decode(m) for m in messages]
+        projection = codec.projection(PROJECTIONS[cls])
+        names = projection.field_names
+
+        def run():
+            for view in map(projection.decode, messages):
+                for name in names:
+                    getattr(view, name)
+        return len(messages), run
+    return setup
+
+
+for _cls in MODELS:
+    benchmark("serialization", f"fast_json.{_cls.__name__}")(_fast_json(_cls))
+    benchmark("serialization", f"avro.{_cls.__name__}")(_avro(_cls))
+for _cls in PROJECTIONS:
+    benchmark("serialization", f"avro_decode.{_cls.__name__}")(_avro_decode(_cls, False))
+    benchmark("serialization", f"avro_projected.{_cls.__name__}")(_avro_decode(_cls, True))
+
+
+# Streaming stages
+
+@benchmark("streaming", "Sessionizer")
+def _sessionizer(ctx: BenchmarkContext):
+    from sessionizer import Sessionizer
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        sessionizer = Sessionizer()
+        sessionizer.process_many(events)
+        sessionizer.flush()
+    return len(events), run
+
+
+@benchmark("streaming", "QoSWindowAggregator")
+def _qos_windows(ctx: BenchmarkContext):
+    from qos_metrics import QoSWindowAggregator
+    samples = ctx.events(QoSTelemtry)
+
+    def run():
+        aggregator = QoSWindowAggregator(window_seconds=60, slide_seconds=10)
+        aggregator.add_many(samples)
+        aggregator.flush()
+    return len(samples), run
+
+
+@benchmark("streaming", "UniqueViewerCounter")
+def _unique_viewers(ctx: BenchmarkContext):
+    from unique_viewers import UniqueViewerCounter
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        UniqueViewerCounter().add_many(events)
+    return len(events), run
+
+
+@benchmark("streaming", "TimeBucketedBloomFilter")
+def _dedup(ctx: BenchmarkContext):
+    from deduplication import TimeBucketedBloomFilter, block_masks
+    ids = [e.event_id for e in ctx.events(PlaybackEvent)]
+    ids += ids[: len(ids) // 10]
+    capacity = max(len(ids), 1000)
+    # Build the shared mask table outside the timed region
+    block_masks(TimeBucketedBloomFilter(ids_per_bucket=capacity).num_hashes)
+
+    def run():
+        TimeBucketedBloomFilter(ids_per_bucket=capacity).seen_or_add_many(ids, 0.0)
+    return len(ids), run
+
+
+@benchmark("streaming", "FeatureStore")
+def _feature_store(ctx: BenchmarkContext):
+    from feature_store import FeatureStore
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        FeatureStore().process_many(events)
+    return len(events), run
+
+
+@benchmark("streaming", "SearchAnalytics")
+def _search_analytics(ctx: BenchmarkContext):
+    from search_analytics import SearchAnalytics
+    events = ctx.events(UserInteractionEvent)
+
+    def run():
+        analytics = SearchAnalytics()
+        analytics.process_many(events)
+        analytics.flush()
+    return len(events), run
+
+
+@benchmark("streaming", "EventProducer")
+def _producer(ctx: BenchmarkContext):
+    from event_producer import EventProducer
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        producer = EventProducer(max_queue_records=len(events) + 1)
+        for event in events:
+            producer.produce(event)
+        producer.close()
+    return len(events), run
+
+
+@benchmark("streaming", "PartitionedColumnarSink")
+def _columnar_sink(ctx: BenchmarkContext):
+    import shutil
+    import tempfile
+    from columnar_sink import PartitionedColumnarSink
+    events = ctx.events(PlaybackEvent)
+
+    def run():
+        root = tempfile.mkdtemp(prefix="bench-sink-")
+        try:
+            sink = PartitionedColumnarSink(root, PlaybackEvent)
+            sink.write_many(events)
+            sink.close()
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return len(events), run
+
+
+def run_benchmark(name: str, ctx: BenchmarkContext, repeats: int = 3) -> BenchmarkResult:
+    group, setup = BENCHMARKS[name]
+    operations, run = setup(ctx)
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return BenchmarkResult(
+        name=name, group=group, operations=operations, best_seconds=best,
+        median_seconds=statistics.median(timings),
+        ops_per_sec=operations / best if best > 0 else float("inf"), repeats=repeats,
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(n: int = 100_000, seed: int = 42, repeats: int = 3,
+              only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run every benchmark (or those whose name starts with one of only)"""
+    ctx = BenchmarkContext(n, seed)
+    results = []
+    for name in BENCHMARKS:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        try:
+            result = run_benchmark(name, ctx, repeats)
+        except Exception as e:
+            # One broken stage should not lose the rest of the run, but it
+            # stays in the report so compare() can flag it
+            print(f"{name:<55} FAILED: {e!r}", file=sys.stderr)
+            results.append({"name": name, "group": BENCHMARKS[name][0], "error": repr(e)})
+            continue
+        print(f"{name:<55} {result.ops_per_sec:>14,.0f} ops/sec", file=sys.stderr)
+        results.append(asdict(result))
+    return {
+        "version": RESULTS_VERSION,
+        "metadata": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "events_per_benchmark": n,
+            "seed": seed,
+            "repeats": repeats,
+            "only": only,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Per-benchmark throughput change against a baseline run. A benchmark
+    regresses when its ops/sec dropped by more than threshold, or when it
+    passed in the baseline but failed or is missing from the current run.
+    Baseline benchmarks outside the current run's only prefixes are skipped.
+    """
+    latest = {r["name"]: r for r in current["results"]}
+    only = current.get("metadata", {}).get("only")
+    rows = []
+    for before in baseline["results"]:
+        name = before["name"]
+        if "error" in before or (only and not any(name.startswith(prefix) for prefix in only)):
+            continue
+        result = latest.get(name)
+        row = {"name": name, "baseline_ops_per_sec": before["ops_per_sec"]}
+        if result is None or "error" in result:
+            row.update(ops_per_sec=None, change=None, regression=True,
+                       error=result["error"] if result else "missing from this run")
+        else:
+            change = result["ops_per_sec"] / before["ops_per_sec"] - 1.0
+            row.update(ops_per_sec=result["ops_per_sec"], change=change, regression=change < -threshold)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline benchmark suite")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", action="append", help="Benchmark name prefix, repeatable")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative throughput drop that counts as a regression")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        sys.exit(0)
+
+    report = run_suite(args.events, args.seed, args.repeats, args.only)
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["comparison"] = {
+            "baseline_commit": baseline["metadata"].get("git_commit"),
+            "threshold": args.threshold,
+            "rows": compare(report, baseline, args.threshold),
+        }
+        for row in report["comparison"]["rows"]:
+            if row["change"] is None:
+                print(f"{row['name']:<55} {'n/a':>8} REGRESSION: {row['error']}", file=sys.stderr)
+                continue
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<55} {row['change']:>+8.1%} {flag}", file=sys.stderr)
+        if any(row["regression"] for row in report["comparison"]["rows"]):
+            exit_code = 1
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    sys.exit(exit_code)
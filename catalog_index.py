@@ -0,0 +1,516 @@
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import ContentMetadata, ContentType, MaturityRating
+
+logger = logging.getLogger(__name__)
+
+# In-memory catalog query engine
+# Every title gets a dense slot number; each genre, country, language,
+# maturity rating, content type and the is_active flag map to a bitmap (a
+# Python int, bit n = slot n). A query is a chain of & / | over those ints,
+# which costs O(catalog / 64) word operations instead of a per-title scan.
+# License windows are answered from a cached bitmap per elementary interval
+# between license boundaries.
+
+SNAPSHOT_MAGIC = b"CIDX"
+SNAPSHOT_VERSION = 1
+
+# Movie and TV ratings on one audience scale, so "at most PG-13" also
+# admits TV-PG and TV-14
+MATURITY_LEVEL = {
+    MaturityRating.G: 0, MaturityRating.TV_Y: 0, MaturityRating.TV_G: 0,
+    MaturityRating.TV_Y7: 1,
+    MaturityRating.PG: 2, MaturityRating.TV_PG: 2,
+    MaturityRating.PG13: 3, MaturityRating.TV_14: 3,
+    MaturityRating.R: 4, MaturityRating.TV_MA: 4,
+    MaturityRating.NC17: 5,
+}
+
+OPEN_ENDED = float("inf")
+
+# Positions of the set bits in each byte value, for bitmap -> slot decoding
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+# Bitmap families and the ContentMetadata value(s) they are keyed on
+INDEXED_FIELDS = ("genre", "country", "language", "rating", "content_type")
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    return OPEN_ENDED if value is None else value.timestamp()
+
+
+def _keys(content: ContentMetadata) -> Dict[str, List[str]]:
+    return {
+        "genre": sorted({g.lower() for g in content.genres}),
+        "country": sorted({c.upper() for c in content.available_countries}),
+        "language": sorted({lang.lower() for lang in content.available_languages}),
+        "rating": [content.maturity_rating.value],
+        "content_type": [content.content_type.value],
+    }
+
+
+class CatalogIndex:
+    """
+    Bitmap inverted indexes over ContentMetadata with composable queries.
+
+    query() covers the common request-time filter; the per-field bitmap
+    accessors (genre(), country(), ...) return plain ints for arbitrary
+    & / | / and-not composition, and content_ids() turns a bitmap back into
+    ids. upsert() only re-indexes a title when its updated_at moved forward.
+    """
+
+    def __init__(self):
+        self._slot_of: Dict[str, int] = {}
+        self._content_ids: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._updated_at: List[float] = []
+        self._keys: List[Optional[Dict[str, List[str]]]] = []
+        self._license: List[Tuple[float, float]] = []
+        self._bitmaps: Dict[str, Dict[str, int]] = {name: {} for name in INDEXED_FIELDS}
+        self._active = 0
+        self._live = 0
+        # Interval cache: sorted license boundaries and bitmap per interval
+        self._boundaries: Optional[List[float]] = None
+        self._licensed_cache: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, content_id: str) -> bool:
+        return content_id in self._slot_of
+
+    # Maintenance
+
+    def upsert(self, content: ContentMetadata) -> bool:
+        """Index or re-index a title; False if this version is not newer"""
+        updated_at = content.updated_at.timestamp()
+        slot = self._slot_of.get(content.content_id)
+        if slot is not None:
+            if updated_at <= self._updated_at[slot]:
+                return False
+            self._unindex(slot)
+        else:
+            slot = self._allocate(content.content_id)
+        self._index(slot, _keys(content), content.is_active,
+                    (_timestamp(content.license_start_date), _timestamp(content.license_end_date)),
+                    updated_at)
+        return True
+
+    def upsert_many(self, catalog: Iterable[ContentMetadata]) -> int:
+        """
+        Bulk upsert. Bits are collected into one bytearray per indexed value
+        and OR-ed in at the end, instead of rebuilding a large int per title.
+        """
+        flags: Dict[Tuple[str, str], bytearray] = {}
+        count = 0
+
+        def set_bit(key: Tuple[str, str], byte: int, bit: int):
+            buffer = flags.get(key)
+            if buffer is None:
+                buffer = flags[key] = bytearray()
+            if len(buffer) <= byte:
+                buffer.extend(bytes(byte + 1 - len(buffer)))
+            buffer[byte] |= bit
+
+        for content in catalog:
+            updated_at = content.updated_at.timestamp()
+            slot = self._slot_of.get(content.content_id)
+            if slot is not None:
+                if updated_at <= self._updated_at[slot]:
+                    continue
+                self._unindex(slot)
+            else:
+                slot = self._allocate(content.content_id)
+            keys = _keys(content)
+            self._record(slot, keys, (_timestamp(content.license_start_date),
+                                      _timestamp(content.license_end_date)), updated_at)
+            byte, bit = slot >> 3, 1 << (slot & 7)
+            for name, values in keys.items():
+                for value in values:
+                    set_bit((name, value), byte, bit)
+            if content.is_active:
+                set_bit(("_active", ""), byte, bit)
+            set_bit(("_live", ""), byte, bit)
+            count += 1
+        for (name, value), buffer in flags.items():
+            bits = int.from_bytes(buffer, "little")
+            if name == "_active":
+                self._active |= bits
+            elif name == "_live":
+                self._live |= bits
+            else:
+                bitmaps = self._bitmaps[name]
+                bitmaps[value] = bitmaps.get(value, 0) | bits
+        return count
+
+    def remove(self, content_id: str) -> bool:
+        slot = self._slot_of.pop(content_id, None)
+        if slot is None:
+            return False
+        self._unindex(slot)
+        self._content_ids[slot] = None
+        self._keys[slot] = None
+        # Back to the fresh-slot window, so whichever title reuses the slot
+        # goes through _record's invalidation instead of patching intervals
+        # cut without this window's boundaries
+        self._license[slot] = (OPEN_ENDED, OPEN_ENDED)
+        self._free_slots.append(slot)
+        return True
+
+    def _allocate(self, content_id: str) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._content_ids[slot] = content_id
+        else:
+            slot = len(self._content_ids)
+            self._content_ids.append(content_id)
+            self._updated_at.append(0.0)
+            self._keys.append(None)
+            self._license.append((OPEN_ENDED, OPEN_ENDED))
+        self._slot_of[content_id] = slot
+        return slot
+
+    def _index(self, slot: int, keys: Dict[str, List[str]], is_active: bool,
+               license_window: Tuple[float, float], updated_at: float):
+        bit = 1 << slot
+        for name, values in keys.items():
+            bitmaps = self._bitmaps[name]
+            for value in values:
+                bitmaps[value] = bitmaps.get(value, 0) | bit
+        if is_active:
+            self._active |= bit
+        self._live |= bit
+        self._record(slot, keys, license_window, updated_at)
+
+    def _record(self, slot: int, keys: Dict[str, List[str]], license_window: Tuple[float, float],
+                updated_at: float):
+        self._keys[slot] = keys
+        self._updated_at[slot] = updated_at
+        if self._license[slot] != license_window:
+            self._license[slot] = license_window
+            self._invalidate_license_cache()
+        else:
+            # Same window, but the slot may be new to the cached intervals
+            self._patch_license_cache(slot, license_window)
+
+    def _slot_keys(self, slot: int) -> Dict[str, List[str]]:
+        keys = self._keys[slot]
+        if keys is None:
+            # Not kept in snapshots; recovered from the bitmaps on first change
+            keys = {name: [value for value, bitmap in bitmaps.items() if bitmap >> slot & 1]
+                    for name, bitmaps in self._bitmaps.items()}
+        return keys
+
+    def _unindex(self, slot: int):
+        mask = ~(1 << slot)
+        for name, values in self._slot_keys(slot).items():
+            bitmaps = self._bitmaps[name]
+            for value in values:
+                remaining = bitmaps[value] & mask
+                if remaining:
+                    bitmaps[value] = remaining
+                else:
+                    del bitmaps[value]
+        self._active &= mask
+        self._live &= mask
+        for interval, bitmap in self._licensed_cache.items():
+            self._licensed_cache[interval] = bitmap & mask
+
+    # License interval index
+
+    def _invalidate_license_cache(self):
+        self._boundaries = None
+        self._licensed_cache.clear()
+
+    def _patch_license_cache(self, slot: int, window: Tuple[float, float]):
+        if self._boundaries is None:
+            return
+        start, end = window
+        bit = 1 << slot
+        for interval in self._licensed_cache:
+            if start <= self._interval_start(interval) and self._interval_end(interval) <= end:
+                self._licensed_cache[interval] |= bit
+
+    def _interval_start(self, interval: int) -> float:
+        return self._boundaries[interval - 1] if interval > 0 else float("-inf")
+
+    def _interval_end(self, interval: int) -> float:
+        return self._boundaries[interval] if interval < len(self._boundaries) else OPEN_ENDED
+
+    def licensed_at(self, when: Optional[datetime] = None) -> int:
+        """Bitmap of titles whose license window contains when (default now)"""
+        t = (when or datetime.utcnow()).timestamp()
+        if self._boundaries is None:
+            boundaries = set()
+            for slot, (start, end) in enumerate(self._license):
+                if self._content_ids[slot] is not None:
+                    boundaries.add(start)
+                    boundaries.add(end)
+            boundaries.discard(OPEN_ENDED)
+            self._boundaries = sorted(boundaries)
+        # Validity only changes at a boundary, so every t in one interval shares a bitmap
+        interval = bisect_right(self._boundaries, t)
+        bitmap = self._licensed_cache.get(interval)
+        if bitmap is None:
+            flags = bytearray(len(self._license) + 7 >> 3)
+            content_ids = self._content_ids
+            for slot, (start, end) in enumerate(self._license):
+                if start <= t < end and content_ids[slot] is not None:
+                    flags[slot >> 3] |= 1 << (slot & 7)
+            bitmap = int.from_bytes(flags, "little")
+            if len(self._licensed_cache) >= 64:
+                self._licensed_cache.clear()
+            self._licensed_cache[interval] = bitmap
+        return bitmap
+
+    # Bitmap accessors
+
+    @property
+    def all_titles(self) -> int:
+        return self._live
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _any_of(self, name: str, values: Iterable[str]) -> int:
+        bitmaps = self._bitmaps[name]
+        result = 0
+        for value in values:
+            result |= bitmaps.get(value, 0)
+        return result
+
+    def genre(self, *genres: str) -> int:
+        return self._any_of("genre", (g.lower() for g in genres))
+
+    def country(self, *countries: str) -> int:
+        return self._any_of("country", (c.upper() for c in countries))
+
+    def language(self, *languages: str) -> int:
+        return self._any_of("language", (lang.lower() for lang in languages))
+
+    def rating(self, *ratings: MaturityRating) -> int:
+        return self._any_of("rating", (r.value for r in ratings))
+
+    def rating_at_most(self, rating: MaturityRating) -> int:
+        level = MATURITY_LEVEL[rating]
+        return self.rating(*(r for r, r_level in MATURITY_LEVEL.items() if r_level <= level))
+
+    def content_type(self, *content_types: ContentType) -> int:
+        return self._any_of("content_type", (t.value for t in content_types))
+
+    def values(self, name: str) -> Dict[str, int]:
+        """Indexed values of one field with their title counts (facets)"""
+        return {value: bin(bitmap).count("1") for value, bitmap in self._bitmaps[name].items()}
+
+    # Queries
+
+    def query_bitmap(self, country: Optional[str] = None, language: Optional[str] = None,
+                     max_rating: Optional[MaturityRating] = None, genres: Iterable[str] = (),
+                     all_genres: bool = False, content_types: Iterable[ContentType] = (),
+                     active_only: bool = True, licensed_at: Optional[datetime] = None,
+                     check_license: bool = True) -> int:
+        """
+        Titles matching every given filter. genres match any of the list
+        unless all_genres; the license check uses now unless licensed_at is
+        given or check_license is False.
+        """
+        result = self._active if active_only else self._live
+        # Most selective filters first so later ANDs work on sparse ints
+        if country is not None and result:
+            result &= self.country(country)
+        if language is not None and result:
+            result &= self.language(language)
+        genres = list(genres)
+        if genres and result:
+            if all_genres:
+                for g in genres:
+                    result &= self.genre(g)
+            else:
+                result &= self.genre(*genres)
+        content_types = list(content_types)
+        if content_types and result:
+            result &= self.content_type(*content_types)
+        if max_rating is not None and result:
+            result &= self.rating_at_most(max_rating)
+        if check_license and result:
+            result &= self.licensed_at(licensed_at)
+        return result
+
+    def query(self, limit: Optional[int] = None, **filters) -> List[str]:
+        return self.content_ids(self.query_bitmap(**filters), limit)
+
+    def count(self, **filters) -> int:
+        return bin(self.query_bitmap(**filters)).count("1")
+
+    def content_ids(self, bitmap: int, limit: Optional[int] = None) -> List[str]:
+        """Decode a bitmap to content_ids in slot order"""
+        ids: List[str] = []
+        if not bitmap:
+            return ids
+        content_ids = self._content_ids
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")
+        byte_bits = _BYTE_BITS
+        for index, byte in enumerate(data):
+            if byte:
+                base = index << 3
+                for bit in byte_bits[byte]:
+                    ids.append(content_ids[base + bit])
+                if limit is not None and len(ids) >= limit:
+                    return ids[:limit]
+        return ids
+
+    # Snapshots
+
+    def save(self, path: str):
+        """
+        Write the index atomically: a small JSON header (content_ids and
+        blob offsets) followed by raw bitmap bytes and float64 arrays for
+        updated_at and license windows, so load() rebuilds nothing.
+        Per-title keys are not stored; they are recovered from the bitmaps
+        when a loaded title is next changed.
+        """
+        blobs: List[bytes] = []
+        position = 0
+
+        def add_blob(data: bytes) -> List[int]:
+            nonlocal position
+            blobs.append(data)
+            entry = [position, len(data)]
+            position += len(data)
+            return entry
+
+        def add_bitmap(bitmap: int) -> List[int]:
+            return add_blob(bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little"))
+
+        header = json.dumps({
+            "content_ids": self._content_ids,
+            "bitmaps": {name: {value: add_bitmap(bitmap) for value, bitmap in bitmaps.items()}
+                        for name, bitmaps in self._bitmaps.items()},
+            "active": add_bitmap(self._active),
+            "live": add_bitmap(self._live),
+            "updated_at": add_blob(array("d", self._updated_at).tobytes()),
+            "license_start": add_blob(array("d", (w[0] for w in self._license)).tobytes()),
+            "license_end": add_blob(array("d", (w[1] for w in self._license)).tobytes()),
+        }, separators=(",", ":")).encode("utf-8")
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack("<HI", SNAPSHOT_VERSION, len(header)))
+            f.write(header)
+            for data in blobs:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CatalogIndex":
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a catalog index snapshot")
+        version, header_length = struct.unpack_from("<HI", data, 4)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot version {version}")
+        body_start = 10 + header_length
+        header = json.loads(data[10:body_start])
+        body = memoryview(data)[body_start:]
+
+        def blob(entry: List[int]) -> memoryview:
+            offset, length = entry
+            return body[offset:offset + length]
+
+        def bitmap(entry: List[int]) -> int:
+            return int.from_bytes(blob(entry), "little")
+
+        def floats(entry: List[int]) -> List[float]:
+            values = array("d")
+            values.frombytes(blob(entry))
+            return values.tolist()
+
+        index = cls()
+        index._content_ids = header["content_ids"]
+        index._keys = [None] * len(index._content_ids)
+        index._updated_at = floats(header["updated_at"])
+        index._license = list(zip(floats(header["license_start"]), floats(header["license_end"])))
+        index._bitmaps = {name: {value: bitmap(entry) for value, entry in bitmaps.items()}
+                          for name, bitmaps in header["bitmaps"].items()}
+        index._active = bitmap(header["active"])
+        index._live = bitmap(header["live"])
+        for slot, content_id in enumerate(index._content_ids):
+            if content_id is None:
+                index._free_slots.append(slot)
+            else:
+                index._slot_of[content_id] = slot
+        return index
+
+
+if __name__ == "__main__":
+    # Query latency vs a linear scan, and snapshot round trip
+    rng = random.Random(9)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    now = datetime(2024, 6, 1)
+    genres = ["drama", "comedy", "action", "thriller", "documentary", "animation", "horror", "romance"]
+    countries = ["US", "GB", "DE", "FR", "BR", "MX", "JP", "IN", "CA", "AU", "ES", "IT"]
+    languages = ["en", "es", "de", "fr", "pt", "ja", "hi", "it"]
+    ratings = list(MaturityRating)
+    catalog = [
+        ContentMetadata(
+            content_id=f"content_{i}", genres=rng.sample(genres, rng.randint(1, 3)),
+            maturity_rating=rng.choice(ratings), available_countries=rng.sample(countries, rng.randint(1, 8)),
+            available_languages=rng.sample(languages, rng.randint(1, 4)),
+            license_start_date=now - timedelta(days=rng.randrange(2000)),
+            license_end_date=None if rng.random() < 0.5 else now + timedelta(days=rng.randrange(-300, 700)),
+            is_active=rng.random() < 0.95, updated_at=now,
+        )
+        for i in range(n)
+    ]
+
+    start = time.perf_counter()
+    index = CatalogIndex()
+    index.upsert_many(catalog)
+    build_secs = time.perf_counter() - start
+
+    filters = dict(country="DE", language="de", max_rating=MaturityRating.PG13, genres=["drama"], licensed_at=now)
+    pg13 = MATURITY_LEVEL[MaturityRating.PG13]
+    t_now = now.timestamp()
+
+    def scan():
+        return [c.content_id for c in catalog
+                if c.is_active and "DE" in c.available_countries and "de" in c.available_languages
+                and MATURITY_LEVEL[c.maturity_rating] <= pg13 and "drama" in c.genres
+                and c.license_start_date.timestamp() <= t_now
+                and (c.license_end_date is None or t_now < c.license_end_date.timestamp())]
+
+    start = time.perf_counter()
+    expected = scan()
+    scan_secs = time.perf_counter() - start
+    index.query(**filters)  # warm the license interval cache
+    start = time.perf_counter()
+    for _ in range(100):
+        result = index.query(**filters)
+    query_secs = (time.perf_counter() - start) / 100
+    assert sorted(result) == sorted(expected)
+
+    path = os.path.join(tempfile.gettempdir(), "catalog_index.cidx")
+    index.save(path)
+    start = time.perf_counter()
+    loaded = CatalogIndex.load(path)
+    load_secs = time.perf_counter() - start
+    assert sorted(loaded.query(**filters)) == sorted(expected)
+    print(f"{n:,} titles indexed in {build_secs:.2f}s, {len(expected):,} matches")
+    print(f"linear scan {scan_secs * 1e3:.1f} ms, bitmap query {query_secs * 1e3:.2f} ms")
+    print(f"snapshot {os.path.getsize(path) / 1e6:.1f} MB, loaded in {load_secs * 1e3:.0f} ms")
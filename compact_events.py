@@ -0,0 +1,226 @@
+import json
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import fields, MISSING
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, Tuple, Type
+
+import fast_json
+from core_data_domains import PlaybackEvent, UserInteractionEvent, QoSTelemtry
+
+# Memory-compact event representations
+# Slotted variants of the high-volume event dataclasses for holding millions
+# of events in memory (windowing, sessionization). Attribute names match the
+# source dataclasses; uuid ids are kept as 16 raw bytes and low-cardinality
+# strings are interned.
+
+_intern = sys.intern
+
+
+def pack_uuid(value: Any) -> Any:
+    # Canonical uuid strings become 16 bytes, anything else is kept as-is
+    if value.__class__ is str and len(value) == 36:
+        try:
+            packed = bytes.fromhex(value.replace('-', ''))
+        except ValueError:
+            return value
+        if len(packed) == 16 and render_uuid(packed) == value:
+            return packed
+    return value
+
+
+def render_uuid(value: Any) -> Any:
+    if value.__class__ is bytes:
+        h = value.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return value
+
+
+class UUIDField:
+    # Descriptor storing a uuid string as bytes in a private slot
+    __slots__ = ('name', 'slot')
+
+    def __init__(self, name: str, slot):
+        self.name = name
+        self.slot = slot
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return render_uuid(self.slot.__get__(instance, owner))
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, pack_uuid(value))
+
+
+class CompactEvent:
+    """Base for the generated slotted event classes"""
+    __slots__ = ()
+
+    source: Type = None
+    field_names: Tuple[str, ...] = ()
+    # Keys of source.to_dict() in order, or every field if it has none
+    dict_fields: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_event(cls, event: Any) -> "CompactEvent":
+        return cls(**{name: getattr(event, name) for name in cls.field_names})
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any]):
+        return [cls.from_event(event) for event in events]
+
+    def to_event(self) -> Any:
+        return self.source(**{name: getattr(self, name) for name in self.field_names})
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {}
+        for name in self.dict_fields:
+            value = getattr(self, name)
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            result[name] = value
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.field_names)
+
+    def __repr__(self):
+        args = ", ".join(f"{n}={getattr(self, n)!r}" for n in self.field_names)
+        return f"{self.__class__.__name__}({args})"
+
+
+def make_compact_class(name: str, source: Type, uuid_fields: Iterable[str],
+                       interned_fields: Iterable[str]) -> Type[CompactEvent]:
+    """
+    Build a slotted class mirroring the source dataclass' fields and defaults.
+    The __init__ is generated so construction costs no more than the dataclass.
+    """
+    uuid_fields, interned_fields = set(uuid_fields), set(interned_fields)
+    source_fields = fields(source)
+    field_names = tuple(f.name for f in source_fields)
+    slots = tuple(f"_{n}" if n in uuid_fields else n for n in field_names)
+
+    namespace: Dict[str, Any] = {'_intern': _intern, '_pack_uuid': pack_uuid, '_MISSING': MISSING}
+    params, body = [], []
+    for f in source_fields:
+        n = f.name
+        if f.default is not MISSING:
+            namespace[f"_default_{n}"] = f.default
+            params.append(f"{n}=_default_{n}")
+        elif f.default_factory is not MISSING:
+            namespace[f"_factory_{n}"] = f.default_factory
+            params.append(f"{n}=_MISSING")
+        else:
+            params.append(n)
+
+        if n in uuid_fields:
+            if f.default_factory is not MISSING:
+                # Skip minting and re-parsing a string id on the default path
+                body.append(f"    self._{n} = _uuid4().bytes if {n} is _MISSING else _pack_uuid({n})")
+                namespace['_uuid4'] = uuid.uuid4
+            else:
+                body.append(f"    self._{n} = _pack_uuid({n})")
+            continue
+        if f.default_factory is not MISSING:
+            body.append(f"    if {n} is _MISSING:\n        {n} = _factory_{n}()")
+        if n in interned_fields:
+            body.append(f"    self.{n} = _intern({n}) if {n}.__class__ is str else {n}")
+        else:
+            body.append(f"    self.{n} = {n}")
+
+    source_code = f"def __init__(self, {', '.join(params)}):\n" + "\n".join(body) + "\n"
+    exec(source_code, namespace)
+
+    cls_namespace = {
+        '__slots__': slots,
+        '__init__': namespace['__init__'],
+        'source': source,
+        'field_names': field_names,
+        'dict_fields': tuple(fast_json.to_dict_fields(source)),
+    }
+    cls = type(name, (CompactEvent,), cls_namespace)
+    # Expose uuid fields under their public names on top of the private slots
+    for n in uuid_fields:
+        setattr(cls, n, UUIDField(n, cls.__dict__[f"_{n}"]))
+    return cls
+
+
+CompactPlaybackEvent = make_compact_class(
+    'CompactPlaybackEvent', PlaybackEvent,
+    uuid_fields=('event_id', 'session_id'),
+    interned_fields=(
+        'content_title', 'audio_language', 'subtitle_language', 'platform_version',
+        'app_version', 'network_type', 'error_code', 'country', 'region', 'city',
+        'timezone', 'event_date',
+    ),
+)
+
+CompactUserInteractionEvent = make_compact_class(
+    'CompactUserInteractionEvent', UserInteractionEvent,
+    uuid_fields=('event_id', 'session_id'),
+    interned_fields=(
+        'page_title', 'element_type', 'recommendation_algorithm',
+        'recommendation_model_version', 'user_agent', 'country', 'region', 'event_date',
+    ),
+)
+
+CompactQoSTelemetry = make_compact_class(
+    'CompactQoSTelemetry', QoSTelemtry,
+    uuid_fields=('telemetry_id', 'session_id'),
+    interned_fields=(
+        'last_quality_switch_reason', 'network_type', 'cdn_server',
+        'error_code', 'error_message',
+    ),
+)
+
+
+def measure_bytes_per_event(build, n: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / n
+
+
+if __name__ == "__main__":
+    # Memory benchmark: bytes per event for dataclass vs compact variants.
+    # Payloads go through json.loads so strings are distinct objects, as they
+    # would be coming off the wire.
+    template = json.dumps({
+        'user_id': 'user_12345', 'device_id': 'device_xyz', 'content_id': 'movie_001',
+        'content_title': 'The Great Film', 'audio_language': 'en', 'app_version': '8.42.1',
+        'platform_version': '17.2', 'network_type': 'wifi', 'country': 'US',
+        'region': 'CA', 'city': 'Los Angeles', 'timezone': 'America/Los_Angeles',
+    })
+
+    def payloads(n):
+        for _ in range(n):
+            payload = json.loads(template)
+            payload['event_id'] = str(uuid.uuid4())
+            payload['session_id'] = str(uuid.uuid4())
+            yield payload
+
+    n = 100_000
+    plain = measure_bytes_per_event(lambda n: [PlaybackEvent(**p) for p in payloads(n)], n)
+    compact = measure_bytes_per_event(lambda n: [CompactPlaybackEvent(**p) for p in payloads(n)], n)
+    print(f"PlaybackEvent: {plain:,.0f} bytes/event")
+    print(f"CompactPlaybackEvent: {compact:,.0f} bytes/event ({compact / plain:.0%})")
+
+    prepared = list(payloads(n))
+    start = time.perf_counter()
+    for p in prepared:
+        CompactPlaybackEvent(**p)
+    print(f"CompactPlaybackEvent construction: {n / (time.perf_counter() - start):,.0f} events/sec")
@@ -0,0 +1,542 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from local_broker import InMemoryBroker
+
+logger = logging.getLogger(__name__)
+
+# Multiprocess consumer pool
+# One coordinator thread in the parent fetches from the broker and hands
+# record batches to worker processes, so processing runs outside the parent's
+# GIL. Every partition is owned by exactly one worker (rendezvous hashing on
+# topic/partition, so scaling moves only the partitions that must move) and
+# its PartitionProcessor lives in that worker, keeping keyed state local.
+#
+# Flow control is credit based: a worker holds at most max_inflight_batches
+# unacknowledged batches, so task queues stay bounded and a slow worker only
+# stalls its own partitions. Offsets are committed in batches, and only up to
+# what workers have acknowledged as processed.
+#
+# Rebalances are cooperative: a moving partition stops being fetched, its
+# revoke message queues behind the batches already sent, and the old owner
+# answers with a snapshot of the processor's state once they are processed.
+# The offset is committed and the new owner starts from exactly that offset
+# with that state, so in-flight work is neither lost nor counted twice. A
+# crashed worker is replaced and its partitions are rebuilt from their last
+# handed-off state, replaying from the offset that state was taken at.
+
+TopicPartition = Tuple[str, int]
+
+# Worker -> coordinator message kinds
+_ACK, _REVOKED, _STOPPED, _FAILED = "ack", "revoked", "stopped", "failed"
+# Coordinator -> worker message kinds
+_RECORDS, _ASSIGN, _REVOKE, _STOP = "records", "assign", "revoke", "stop"
+
+
+class PartitionProcessor:
+    """
+    Processes the records of one topic partition inside a worker process.
+    Subclasses must be importable (they are created in the worker from the
+    factory passed to ConsumerPool) and their snapshots picklable.
+    """
+
+    def __init__(self, topic: str, partition: int, state: Any = None):
+        self.topic = topic
+        self.partition = partition
+
+    def process(self, records: List[Tuple[Optional[bytes], bytes]], base_offset: int):
+        raise NotImplementedError
+
+    def snapshot(self) -> Any:
+        """State handed to the partition's next owner on rebalance and returned by stop()"""
+        return None
+
+
+ProcessorFactory = Callable[[str, int, Any], PartitionProcessor]
+
+
+def owner_for(topic: str, partition: int, workers: Sequence[int]) -> int:
+    """Rendezvous (highest random weight) hash: adding or removing a worker only moves its share"""
+    best, best_weight = -1, b""
+    for worker in workers:
+        weight = hashlib.blake2b(f"{topic}:{partition}:{worker}".encode(), digest_size=8).digest()
+        if weight > best_weight:
+            best, best_weight = worker, weight
+    return best
+
+
+def _worker_main(worker_id: int, factory: ProcessorFactory, tasks, results):
+    processors: Dict[TopicPartition, PartitionProcessor] = {}
+    try:
+        while True:
+            message = tasks.get()
+            kind = message[0]
+            if kind == _RECORDS:
+                _, topic, partition, base_offset, records = message
+                processors[(topic, partition)].process(records, base_offset)
+                results.put((_ACK, worker_id, topic, partition, base_offset + len(records)))
+            elif kind == _ASSIGN:
+                _, topic, partition, state = message
+                processors[(topic, partition)] = factory(topic, partition, state)
+            elif kind == _REVOKE:
+                _, topic, partition = message
+                processor = processors.pop((topic, partition))
+                results.put((_REVOKED, worker_id, topic, partition, processor.snapshot()))
+            elif kind == _STOP:
+                results.put((_STOPPED, worker_id, {tp: p.snapshot() for tp, p in processors.items()}))
+                return
+    except Exception as e:
+        logger.exception("Consumer worker %d failed", worker_id)
+        results.put((_FAILED, worker_id, repr(e)))
+
+
+@dataclass
+class ConsumerPoolConfig:
+    num_workers: int = os.cpu_count() or 1
+    max_batch_records: int = 500
+    # Unacknowledged batches per worker before its partitions stop being fetched
+    max_inflight_batches: int = 4
+    commit_interval_seconds: float = 1.0
+    commit_every_records: int = 50_000
+    idle_wait_seconds: float = 0.005
+    # None uses the platform default; processors must be importable either way
+    start_method: Optional[str] = None
+
+
+@dataclass
+class ConsumerPoolMetrics:
+    records_dispatched: int = 0
+    records_processed: int = 0
+    batches_dispatched: int = 0
+    commits: int = 0
+    rebalances: int = 0
+    partitions_moved: int = 0
+    worker_restarts: int = 0
+    # Dispatch passes that skipped a partition because its worker had no credit
+    backpressure_waits: int = 0
+
+
+class _Partition:
+    __slots__ = ("topic", "partition", "owner", "position", "acked", "committed", "paused",
+                 "moving_to", "state", "state_offset")
+
+    def __init__(self, topic: str, partition: int, committed: int):
+        self.topic = topic
+        self.partition = partition
+        self.owner = -1
+        # Next offset to fetch / processed up to / committed up to
+        self.position = committed
+        self.acked = committed
+        self.committed = committed
+        self.paused = True
+        self.moving_to: Optional[int] = None
+        # Last handed-off processor state and the offset it covers, used to
+        # rebuild the partition after a crash
+        self.state: Any = None
+        self.state_offset = committed
+
+
+class _Worker:
+    __slots__ = ("worker_id", "process", "tasks", "credits", "stopping")
+
+    def __init__(self, worker_id: int, process, tasks, credits: int):
+        self.worker_id = worker_id
+        self.process = process
+        self.tasks = tasks
+        self.credits = credits
+        self.stopping = False
+
+
+class ConsumerPool:
+    """
+    Consumer-group runtime over the local broker with processing in worker
+    processes. start() assigns every partition of `topics` and begins
+    consuming from the group's committed offsets; scale() changes the worker
+    count with a cooperative rebalance; stop() drains, commits and returns
+    the final processor snapshots keyed by (topic, partition).
+    """
+
+    def __init__(self, broker: InMemoryBroker, group_id: str, topics: Sequence[str],
+                 processor_factory: ProcessorFactory, config: Optional[ConsumerPoolConfig] = None):
+        self.broker = broker
+        self.group_id = group_id
+        self.topics = list(topics)
+        self.processor_factory = processor_factory
+        self.config = config or ConsumerPoolConfig()
+        if self.config.num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {self.config.num_workers}")
+        self.metrics = ConsumerPoolMetrics()
+        self._ctx = multiprocessing.get_context(self.config.start_method)
+        self._results = self._ctx.Queue()
+        self._workers: Dict[int, _Worker] = {}
+        self._next_worker_id = 0
+        self._partitions: Dict[TopicPartition, _Partition] = {}
+        self._target_workers = self.config.num_workers
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._snapshots: Dict[TopicPartition, Any] = {}
+        self._last_commit = time.monotonic()
+        self._uncommitted = 0
+
+    # Lifecycle
+
+    def start(self):
+        for topic in self.topics:
+            for partition in range(self.broker.num_partitions(topic)):
+                committed = self.broker.committed(self.group_id, topic, partition)
+                self._partitions[(topic, partition)] = _Partition(topic, partition, committed)
+        for _ in range(self._target_workers):
+            self._spawn()
+        self._rebalance()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="consumer-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> Dict[TopicPartition, Any]:
+        """Finish in-flight batches, commit, stop the workers and return their final snapshots"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self._snapshots
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def scale(self, num_workers: int):
+        """Change the worker count; only partitions whose owner changes are paused and moved"""
+        # Every partition needs an owner, so the pool never scales to zero
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+        with self._lock:
+            self._target_workers = num_workers
+
+    # Progress
+
+    def lag(self) -> int:
+        """Records not yet acknowledged as processed, across all partitions"""
+        return sum(self.broker.end_offset(p.topic, p.partition) - p.acked for p in self._partitions.values())
+
+    def rebalancing(self) -> bool:
+        return any(p.moving_to is not None for p in self._partitions.values())
+
+    def wait_until_caught_up(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.lag() or self.rebalancing() or len(self._live_workers()) != self._target_workers:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # Workers
+
+    def _spawn(self) -> _Worker:
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        tasks = self._ctx.Queue()
+        process = self._ctx.Process(target=_worker_main, name=f"consumer-worker-{worker_id}",
+                                    args=(worker_id, self.processor_factory, tasks, self._results), daemon=True)
+        process.start()
+        worker = self._workers[worker_id] = _Worker(worker_id, process, tasks, self.config.max_inflight_batches)
+        return worker
+
+    def _live_workers(self) -> List[int]:
+        return sorted(w.worker_id for w in self._workers.values() if not w.stopping)
+
+    def _rebalance(self):
+        """Move partitions to their rendezvous owner among the live workers"""
+        workers = self._live_workers()
+        moved = 0
+        for p in self._partitions.values():
+            owner = owner_for(p.topic, p.partition, workers)
+            if p.owner == -1:
+                p.owner = owner
+                p.paused = False
+                self._workers[owner].tasks.put((_ASSIGN, p.topic, p.partition, p.state))
+            elif owner != p.owner and p.moving_to is None:
+                # Queued behind the batches already sent, so the revoke reply
+                # means everything dispatched for this partition is processed
+                p.paused = True
+                p.moving_to = owner
+                self._workers[p.owner].tasks.put((_REVOKE, p.topic, p.partition))
+                moved += 1
+            elif p.moving_to is not None and p.moving_to != owner:
+                p.moving_to = owner
+        if moved:
+            self.metrics.rebalances += 1
+            self.metrics.partitions_moved += moved
+            logger.info("Rebalancing %d partitions over workers %s", moved, workers)
+
+    def _apply_scale(self):
+        with self._lock:
+            target = self._target_workers
+        live = self._live_workers()
+        if len(live) == target:
+            return
+        if len(live) < target:
+            for _ in range(target - len(live)):
+                self._spawn()
+        else:
+            for worker_id in live[target:]:
+                self._workers[worker_id].stopping = True
+        self._rebalance()
+
+    def _retire_idle_workers(self):
+        # A stopping worker is stopped once it owns no partitions
+        for worker in list(self._workers.values()):
+            if worker.stopping and not any(worker.worker_id in (p.owner, p.moving_to)
+                                           for p in self._partitions.values()):
+                self._stop_worker(worker)
+
+    def _stop_worker(self, worker: _Worker):
+        worker.tasks.put((_STOP,))
+        while True:
+            # The worker may exit before its reply is read, so only give up
+            # once it is gone and nothing more is queued
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                if worker.process.is_alive():
+                    continue
+                logger.error("Consumer worker %d exited without a final snapshot", worker.worker_id)
+                break
+            if message[0] == _STOPPED and message[1] == worker.worker_id:
+                self._snapshots.update(message[2])
+                break
+            self._handle(message)
+        worker.process.join()
+        worker.tasks.close()
+        self._workers.pop(worker.worker_id, None)
+
+    def _check_workers(self):
+        for worker in list(self._workers.values()):
+            if worker.process.is_alive():
+                continue
+            self._recover(worker.worker_id, f"exit code {worker.process.exitcode}")
+
+    def _recover(self, worker_id: int, reason: str):
+        logger.error("Consumer worker %d died (%s); replaying its partitions from their last handoff",
+                     worker_id, reason)
+        self.metrics.worker_restarts += 1
+        dead = self._workers.pop(worker_id)
+        dead.process.join(0)
+        # Nothing will read the dead worker's queue; don't block exit flushing it
+        dead.tasks.cancel_join_thread()
+        dead.tasks.close()
+        # A fresh id, so acks the dead worker queued before dying are ignored
+        if not dead.stopping:
+            self._spawn()
+        for p in self._partitions.values():
+            if p.owner == worker_id:
+                p.owner, p.moving_to, p.paused = -1, None, True
+                p.position = p.acked = p.state_offset
+        self._rebalance()
+
+    # Coordinator loop
+
+    def _handle(self, message: tuple):
+        kind = message[0]
+        if kind == _ACK:
+            _, worker_id, topic, partition, next_offset = message
+            p = self._partitions[(topic, partition)]
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                return
+            worker.credits += 1
+            if p.owner != worker_id:
+                return
+            self.metrics.records_processed += next_offset - p.acked
+            self._uncommitted += next_offset - p.acked
+            p.acked = next_offset
+        elif kind == _REVOKED:
+            _, worker_id, topic, partition, state = message
+            p = self._partitions[(topic, partition)]
+            if p.owner != worker_id:
+                return
+            self._commit_partition(p)
+            p.state, p.state_offset = state, p.acked
+            owner = p.moving_to
+            if owner not in self._workers or self._workers[owner].stopping:
+                owner = owner_for(topic, partition, self._live_workers())
+            p.owner, p.moving_to = owner, None
+            p.position = p.acked
+            p.paused = False
+            self._workers[p.owner].tasks.put((_ASSIGN, topic, partition, state))
+        elif kind == _FAILED:
+            _, worker_id, reason = message
+            worker = self._workers.get(worker_id)
+            if worker is not None:
+                worker.process.join()
+                self._recover(worker_id, reason)
+
+    def _commit_partition(self, p: _Partition):
+        if p.acked > p.committed:
+            self.broker.commit(self.group_id, p.topic, p.partition, p.acked)
+            p.committed = p.acked
+
+    def _commit(self):
+        for p in self._partitions.values():
+            self._commit_partition(p)
+        self.metrics.commits += 1
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def _dispatch(self) -> int:
+        broker = self.broker
+        max_records = self.config.max_batch_records
+        workers = self._workers
+        metrics = self.metrics
+        sent = 0
+        for p in self._partitions.values():
+            if p.paused:
+                continue
+            worker = workers[p.owner]
+            if p.position >= broker.end_offset(p.topic, p.partition):
+                continue
+            if worker.credits <= 0:
+                metrics.backpressure_waits += 1
+                continue
+            batch = broker.fetch(p.topic, p.partition, p.position, max_records)
+            # (key, value) pairs pickle far smaller and faster than BrokerRecords
+            worker.tasks.put((_RECORDS, p.topic, p.partition, p.position, [r[3:5] for r in batch]))
+            worker.credits -= 1
+            p.position += len(batch)
+            sent += len(batch)
+            metrics.batches_dispatched += 1
+        metrics.records_dispatched += sent
+        return sent
+
+    def _drain_results(self, timeout: float) -> int:
+        handled = 0
+        try:
+            message = self._results.get(timeout=timeout) if timeout else self._results.get_nowait()
+            while True:
+                self._handle(message)
+                handled += 1
+                message = self._results.get_nowait()
+        except queue.Empty:
+            return handled
+
+    def _run(self):
+        config = self.config
+        last_check = time.monotonic()
+        while self._running:
+            self._apply_scale()
+            handled = self._drain_results(0)
+            sent = self._dispatch()
+            self._retire_idle_workers()
+            now = time.monotonic()
+            if self._uncommitted and (self._uncommitted >= config.commit_every_records
+                                      or now - self._last_commit >= config.commit_interval_seconds):
+                self._commit()
+            if now - last_check >= 0.5:
+                self._check_workers()
+                last_check = now
+            if not handled and not sent:
+                self._drain_results(config.idle_wait_seconds)
+        self._shutdown()
+
+    def _shutdown(self):
+        # Everything dispatched is acknowledged before the final commit
+        while any(w.credits < self.config.max_inflight_batches for w in self._workers.values()) \
+                or self.rebalancing():
+            self._drain_results(self.config.idle_wait_seconds)
+        self._commit()
+        for worker in list(self._workers.values()):
+            self._stop_worker(worker)
+
+
+class WatchTimeProcessor(PartitionProcessor):
+    """Per-user event counts and watch position from JSON PlaybackEvents (used by the benchmark)"""
+
+    def __init__(self, topic: str, partition: int, state: Any = None):
+        super().__init__(topic, partition, state)
+        self.users: Dict[str, List[int]] = state or {}
+
+    def process(self, records: List[Tuple[Optional[bytes], bytes]], base_offset: int):
+        users = self.users
+        loads = json.loads
+        for _, value in records:
+            event = loads(value)
+            totals = users.get(event["user_id"])
+            if totals is None:
+                totals = users[event["user_id"]] = [0, 0]
+            totals[0] += 1
+            totals[1] += event["position_seconds"] or 0
+
+    def snapshot(self) -> Any:
+        return self.users
+
+
+def _merge(snapshots: Dict[TopicPartition, Any]) -> Dict[str, List[int]]:
+    merged: Dict[str, List[int]] = {}
+    for users in snapshots.values():
+        for user_id, (count, position) in (users or {}).items():
+            totals = merged.setdefault(user_id, [0, 0])
+            totals[0] += count
+            totals[1] += position
+    return merged
+
+
+if __name__ == "__main__":
+    # Scaling from 1 to N worker processes, then a run that rebalances twice
+    # mid-stream and must match a single-process reference exactly
+    from event_producer import EventProducer
+    from load_generator import LoadGenerator, LoadProfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    broker = InMemoryBroker()
+    producer = EventProducer(broker, batch_size=1000)
+    for event in LoadGenerator(LoadProfile(num_users=50_000)).playback_events(n):
+        producer.produce(event)
+    producer.close()
+    topic = broker.topics()[0]
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    reference = None
+    for num_workers in counts:
+        pool = ConsumerPool(broker, f"scale-{num_workers}", [topic], WatchTimeProcessor,
+                            ConsumerPoolConfig(num_workers=num_workers))
+        start = time.perf_counter()
+        pool.start()
+        pool.wait_until_caught_up()
+        elapsed = time.perf_counter() - start
+        result = _merge(pool.stop())
+        reference = reference or result
+        assert result == reference
+        print(f"{num_workers:2d} workers: {n / elapsed:,.0f} records/sec ({pool.metrics.batches_dispatched:,} batches, "
+              f"{pool.metrics.backpressure_waits:,} backpressure waits)")
+    if cores == 1:
+        print("(single core: no parallel speedup is possible on this machine)")
+
+    # Rebalance while records are in flight: 2 -> 4 -> 3 workers
+    pool = ConsumerPool(broker, "rebalance", [topic], WatchTimeProcessor, ConsumerPoolConfig(num_workers=2))
+    pool.start()
+    while pool.metrics.records_processed < n // 3:
+        time.sleep(0.005)
+    pool.scale(4)
+    while pool.metrics.records_processed < 2 * n // 3:
+        time.sleep(0.005)
+    pool.scale(3)
+    pool.wait_until_caught_up()
+    result = _merge(pool.stop())
+    assert sum(count for count, _ in result.values()) == n
+    assert result == reference
+    committed = sum(broker.committed("rebalance", topic, p) for p in range(broker.num_partitions(topic)))
+    assert committed == n
+    print(f"rebalanced run matches the reference: {pool.metrics}")
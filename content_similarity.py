@@ -0,0 +1,439 @@
+import heapq
+import logging
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from bisect import bisect_left, insort
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from core_data_domains import ContentMetadata, ContentSimilarity, UserRating, ViewingSession
+from real_time_event_streaming import KafkaTopics
+
+logger = logging.getLogger(__name__)
+
+# Top-K content similarity
+# Item-item cosine similarity over a sparse user x content interaction matrix
+# (ratings and completed sessions), blended with genre and cast overlap from
+# ContentMetadata. Neighbours are found through the inverted user index, so
+# work per title is proportional to its co-viewers rather than the catalog.
+# Only titles touched by new interactions are recomputed on refresh(), and
+# the result is the same top-K a full rebuild() would produce.
+
+DEFAULT_MODEL_VERSION = "item-cosine-v1"
+
+
+@dataclass
+class SimilarityConfig:
+    top_k: int = 20
+    # Titles recomputed per block; bounds the partial score maps held at once
+    block_size: int = 256
+    # Pairs need this many co-viewers before the cohort score is trusted
+    min_common_users: int = 2
+    # Only the most recent interactions per user are kept, so heavy users
+    # and bots neither dominate scores nor blow up the product
+    max_user_items: int = 500
+    # Ratings at or below this carry no positive signal
+    rating_neutral: float = 2.5
+    completed_session_weight: float = 1.0
+    cohort_weight: float = 0.6
+    genre_weight: float = 0.2
+    cast_weight: float = 0.2
+    model_version: str = DEFAULT_MODEL_VERSION
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common) if common else 0.0
+
+
+class ContentSimilarityEngine:
+    """
+    Incremental top-K ContentSimilarity builder.
+
+    Interactions live in two sparse maps, user -> {content: weight} and
+    content -> {user: weight}, which are the rows and columns of the
+    interaction matrix. For a block of target titles the engine computes the
+    corresponding rows of X^T X by walking target -> users -> contents and
+    divides by the column norms to get cosine scores.
+
+    A new interaction only changes the row of the title it touches, plus
+    single pairs elsewhere: the user's other titles (their dot product with
+    it changed) and titles listing it as a neighbour (its norm changed).
+    refresh() recomputes touched titles in full and patches just those pairs
+    into the other titles' top-K lists. A patch that lowers or drops a
+    listed neighbour of a full list recomputes that title instead, since the
+    title that should move up is not known.
+
+    Both paths draw candidates from _candidates() and rank rows by (rounded
+    score, content_id), so refresh() and rebuild() agree exactly.
+    """
+
+    def __init__(self, config: Optional[SimilarityConfig] = None):
+        self.config = config or SimilarityConfig()
+        self._user_items: Dict[str, Dict[str, float]] = {}
+        self._item_users: Dict[str, Dict[str, float]] = {}
+        self._item_norm_sq: Dict[str, float] = {}
+        self._genres: Dict[str, Set[str]] = {}
+        self._cast: Dict[str, Set[str]] = {}
+        self._genre_index: Dict[str, Set[str]] = {}
+        # Titles per exact genre set, sorted by content_id
+        self._genre_groups: Dict[FrozenSet[str], List[str]] = {}
+        self._cast_index: Dict[str, Set[str]] = {}
+        self._neighbours: Dict[str, List[ContentSimilarity]] = {}
+        self._listed_by: Dict[str, Set[str]] = {}
+        self._dirty: Set[str] = set()
+        # title -> partners whose pair score with it changed
+        self._stale_pairs: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._item_users.keys() | self._genres.keys())
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty | self._stale_pairs.keys())
+
+    # Inputs
+
+    def add_rating(self, rating: UserRating):
+        weight = (rating.rating_value - self.config.rating_neutral) / (5.0 - self.config.rating_neutral)
+        self._set_interaction(rating.user_id, rating.content_id, max(0.0, min(1.0, weight)))
+
+    def add_session(self, session: ViewingSession):
+        if session.is_completed:
+            self._set_interaction(session.user_id, session.content_id,
+                                  self.config.completed_session_weight)
+
+    def add_interactions(self, events: Iterable):
+        for event in events:
+            if isinstance(event, UserRating):
+                self.add_rating(event)
+            elif isinstance(event, ViewingSession):
+                self.add_session(event)
+
+    def _set_interaction(self, user_id: str, content_id: str, weight: float):
+        if not user_id or not content_id:
+            return
+        items = self._user_items.get(user_id)
+        if items is None:
+            items = self._user_items[user_id] = {}
+        previous = items.pop(content_id, 0.0)
+        # The strongest signal wins: a completed watch is not undone by a lukewarm rating
+        weight = max(weight, previous)
+        if weight <= 0.0:
+            return
+        # Re-insert so dict order stays oldest -> newest
+        items[content_id] = weight
+        if weight != previous:
+            self._set_cell(user_id, content_id, weight)
+            self._mark_dirty(user_id, content_id)
+        if len(items) > self.config.max_user_items:
+            oldest = next(iter(items))
+            del items[oldest]
+            self._set_cell(user_id, oldest, 0.0)
+            self._mark_dirty(user_id, oldest)
+            # Its norm shrank, so its score with every remaining co-viewed
+            # title may have risen, listed or not
+            stale = self._stale_pairs
+            for other_user in self._item_users.get(oldest, ()):
+                for other in self._user_items[other_user]:
+                    if other != oldest:
+                        stale.setdefault(other, set()).add(oldest)
+
+    def _set_cell(self, user_id: str, content_id: str, weight: float):
+        users = self._item_users.get(content_id)
+        if users is None:
+            users = self._item_users[content_id] = {}
+        previous = users.pop(user_id, 0.0)
+        norm_sq = self._item_norm_sq.get(content_id, 0.0) - previous * previous
+        if weight > 0.0:
+            users[user_id] = weight
+            norm_sq += weight * weight
+        if users:
+            self._item_norm_sq[content_id] = max(norm_sq, 0.0)
+        else:
+            del self._item_users[content_id]
+            self._item_norm_sq.pop(content_id, None)
+
+    def _mark_dirty(self, user_id: str, content_id: str):
+        self._dirty.add(content_id)
+        stale = self._stale_pairs
+        for other in self._user_items.get(user_id, ()):
+            if other != content_id:
+                stale.setdefault(other, set()).add(content_id)
+        for other in self._listed_by.get(content_id, ()):
+            stale.setdefault(other, set()).add(content_id)
+
+    def upsert_content(self, content: ContentMetadata):
+        content_id = content.content_id
+        genres = {g.lower() for g in content.genres}
+        cast = set(content.cast)
+        old_genres = self._genres.get(content_id)
+        if old_genres == genres and self._cast.get(content_id) == cast:
+            return
+        if old_genres != genres:
+            if old_genres is not None:
+                group = self._genre_groups[frozenset(old_genres)]
+                del group[bisect_left(group, content_id)]
+                if not group:
+                    del self._genre_groups[frozenset(old_genres)]
+            insort(self._genre_groups.setdefault(frozenset(genres), []), content_id)
+        for index, old in ((self._genre_index, self._genres.get(content_id, ())),
+                           (self._cast_index, self._cast.get(content_id, ()))):
+            for token in old:
+                postings = index.get(token)
+                if postings is not None:
+                    postings.discard(content_id)
+                    if not postings:
+                        del index[token]
+        self._genres[content_id] = genres
+        self._cast[content_id] = cast
+        for token in genres:
+            self._genre_index.setdefault(token, set()).add(content_id)
+        for token in cast:
+            self._cast_index.setdefault(token, set()).add(content_id)
+        self._dirty.add(content_id)
+        # Pairs with titles listing it or sharing cast are re-scored, and
+        # with every title sharing a genre once top-K lists exist
+        partners = set(self._listed_by.get(content_id, ()))
+        for member in cast:
+            partners |= self._cast_index[member]
+        if old_genres != genres and self._neighbours:
+            for genre in genres | (old_genres or set()):
+                partners |= self._genre_index.get(genre, set())
+        partners.discard(content_id)
+        for other in partners:
+            self._stale_pairs.setdefault(other, set()).add(content_id)
+
+    def upsert_catalog(self, catalog: Iterable[ContentMetadata]):
+        for content in catalog:
+            self.upsert_content(content)
+
+    # Computation
+
+    def _cohort_scores(self, content_id: str) -> Dict[str, float]:
+        # One row of X^T X: sum over co-viewers of w(u, a) * w(u, b)
+        users = self._item_users.get(content_id)
+        if not users:
+            return {}
+        scores: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        user_items = self._user_items
+        get = scores.get
+        get_count = counts.get
+        for user_id, weight in users.items():
+            for other, other_weight in user_items[user_id].items():
+                scores[other] = get(other, 0.0) + weight * other_weight
+                counts[other] = get_count(other, 0) + 1
+        del scores[content_id]
+        norm_a = math.sqrt(self._item_norm_sq[content_id])
+        norms = self._item_norm_sq
+        min_common = self.config.min_common_users
+        return {
+            other: dot / (norm_a * math.sqrt(norms[other]))
+            for other, dot in scores.items() if counts[other] >= min_common
+        }
+
+    def _genre_candidates(self, content_id: str) -> List[str]:
+        # Titles that can only score on genre overlap tie within a genre set,
+        # and ranking breaks ties by the larger content_id. Taking groups by
+        # descending Jaccard and the largest ids first, top_k of them cover
+        # every genre-only title that can make the top-K.
+        genres = self._genres.get(content_id)
+        if not genres:
+            return []
+        tiers: Dict[float, List[List[str]]] = {}
+        for group, members in self._genre_groups.items():
+            if not genres.isdisjoint(group):
+                tiers.setdefault(jaccard(genres, group), []).append(members)
+        need = self.config.top_k
+        picked: List[str] = []
+        for score in sorted(tiers, reverse=True):
+            tier = [other for members in tiers[score] for other in members if other != content_id]
+            taken = heapq.nlargest(need - len(picked), tier)
+            picked.extend(taken)
+            if len(picked) >= need:
+                break
+        return picked
+
+    def _candidates(self, content_id: str, cohort: Dict[str, float]) -> Set[str]:
+        # The one candidate set used by full computes, and implied by patches
+        candidates = set(cohort)
+        for member in self._cast.get(content_id, ()):
+            candidates |= self._cast_index[member]
+        candidates.update(self._genre_candidates(content_id))
+        candidates.discard(content_id)
+        return candidates
+
+    def _top_k(self, content_id: str, computed_at: datetime) -> List[ContentSimilarity]:
+        config = self.config
+        cohort = self._cohort_scores(content_id)
+        genres = self._genres.get(content_id, set())
+        cast = self._cast.get(content_id, set())
+        scored: List[Tuple[float, str, float, float, float]] = []
+        for other in self._candidates(content_id, cohort):
+            cohort_score = cohort.get(other, 0.0)
+            genre_score = jaccard(genres, self._genres.get(other, set()))
+            cast_score = jaccard(cast, self._cast.get(other, set()))
+            score = (config.cohort_weight * cohort_score + config.genre_weight * genre_score
+                     + config.cast_weight * cast_score)
+            if score > 0.0:
+                # Ranked on the stored (rounded) score, like _patch
+                scored.append((round(score, 6), other, cohort_score, genre_score, cast_score))
+
+        return [self._row(content_id, other, score, cohort_score, genre_score, cast_score, computed_at)
+                for score, other, cohort_score, genre_score, cast_score
+                in heapq.nlargest(config.top_k, scored)]
+
+    def _row(self, content_id: str, other: str, score: float, cohort_score: float,
+             genre_score: float, cast_score: float, computed_at: datetime) -> ContentSimilarity:
+        if cohort_score and (genre_score or cast_score):
+            similarity_type = "hybrid"
+        elif cohort_score:
+            similarity_type = "collaborative_filtering"
+        else:
+            similarity_type = "content_based"
+        return ContentSimilarity(
+            content_id_a=content_id, content_id_b=other, similarity_score=round(score, 6),
+            similarity_type=similarity_type, genre_similarity=round(genre_score, 6),
+            cast_similarity=round(cast_score, 6), user_cohor_similarity=round(cohort_score, 6),
+            computed_at=computed_at, model_version=self.config.model_version,
+        )
+
+    def _pair(self, content_id: str, other: str, computed_at: datetime) -> Optional[ContentSimilarity]:
+        # Score one pair directly: dot product over the smaller of the two columns
+        config = self.config
+        cohort_score = 0.0
+        users_a = self._item_users.get(content_id)
+        users_b = self._item_users.get(other)
+        if users_a and users_b:
+            small, large = (users_a, users_b) if len(users_a) <= len(users_b) else (users_b, users_a)
+            common = [weight * large[user_id] for user_id, weight in small.items() if user_id in large]
+            if len(common) >= config.min_common_users:
+                cohort_score = sum(common) / math.sqrt(self._item_norm_sq[content_id] * self._item_norm_sq[other])
+        genre_score = jaccard(self._genres.get(content_id, set()), self._genres.get(other, set()))
+        cast_score = jaccard(self._cast.get(content_id, set()), self._cast.get(other, set()))
+        score = (config.cohort_weight * cohort_score + config.genre_weight * genre_score
+                 + config.cast_weight * cast_score)
+        if score <= 0.0:
+            return None
+        return self._row(content_id, other, score, cohort_score, genre_score, cast_score, computed_at)
+
+    def _patch(self, content_id: str, partners: Set[str], computed_at: datetime) -> List[ContentSimilarity]:
+        # Re-score changed pairs and merge them into the existing top-K
+        current = self._neighbours.get(content_id, ())
+        full = len(current) >= self.config.top_k
+        rows = {row.content_id_b: row for row in current}
+        for other in partners:
+            row = self._pair(content_id, other, computed_at)
+            listed = rows.get(other)
+            if full and listed is not None and (row is None or row.similarity_score < listed.similarity_score):
+                return self._top_k(content_id, computed_at)
+            if row is None:
+                rows.pop(other, None)
+            else:
+                rows[other] = row
+        return heapq.nlargest(self.config.top_k, rows.values(),
+                              key=lambda r: (r.similarity_score, r.content_id_b))
+
+    def _store(self, content_id: str, rows: List[ContentSimilarity]):
+        for row in self._neighbours.get(content_id, ()):
+            listed = self._listed_by.get(row.content_id_b)
+            if listed is not None:
+                listed.discard(content_id)
+                if not listed:
+                    del self._listed_by[row.content_id_b]
+        if rows:
+            self._neighbours[content_id] = rows
+            for row in rows:
+                self._listed_by.setdefault(row.content_id_b, set()).add(content_id)
+        else:
+            self._neighbours.pop(content_id, None)
+
+    def refresh(self, max_titles: Optional[int] = None) -> List[ContentSimilarity]:
+        """
+        Recompute top-K for dirty titles, block_size titles at a time, and
+        return the new rows. max_titles bounds the work done per call; the
+        rest stays dirty for the next one.
+        """
+        dirty = sorted(self._dirty)
+        if max_titles is not None:
+            dirty = dirty[:max_titles]
+        computed_at = datetime.utcnow()
+        emitted: List[ContentSimilarity] = []
+        block_size = self.config.block_size
+        for start in range(0, len(dirty), block_size):
+            block = dirty[start:start + block_size]
+            results = [(content_id, self._top_k(content_id, computed_at)) for content_id in block]
+            for content_id, rows in results:
+                self._store(content_id, rows)
+                self._stale_pairs.pop(content_id, None)
+                emitted.extend(rows)
+            self._dirty.difference_update(block)
+
+        patched = sorted(self._stale_pairs)
+        if max_titles is not None:
+            patched = patched[:max(0, max_titles - len(dirty))]
+        for content_id in patched:
+            rows = self._patch(content_id, self._stale_pairs.pop(content_id), computed_at)
+            self._store(content_id, rows)
+            emitted.extend(rows)
+        logger.debug("Recomputed %d titles, patched %d, %d pending", len(dirty), len(patched), self.pending)
+        return emitted
+
+    def rebuild(self) -> List[ContentSimilarity]:
+        """Recompute the whole catalog"""
+        self._dirty.update(self._item_users)
+        self._dirty.update(self._genres)
+        self._stale_pairs.clear()
+        return self.refresh()
+
+    def neighbours(self, content_id: str) -> List[ContentSimilarity]:
+        return list(self._neighbours.get(content_id, ()))
+
+    def publish(self, producer, rows: Iterable[ContentSimilarity]) -> int:
+        count = 0
+        for row in rows:
+            producer.produce(row, topic=KafkaTopics.CONTENT_METRICS)
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    # Full build vs incremental refresh on a synthetic Zipf-skewed catalog
+    rng = random.Random(5)
+    num_titles = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_users = num_titles * 10
+    genres = ["drama", "comedy", "action", "thriller", "documentary", "animation", "horror", "romance"]
+    catalog = [
+        ContentMetadata(content_id=f"content_{i}", genres=rng.sample(genres, 2),
+                        cast=[f"actor_{rng.randrange(num_titles)}" for _ in range(4)])
+        for i in range(num_titles)
+    ]
+    weights = [1.0 / (rank + 1) for rank in range(num_titles)]
+    sessions = [
+        ViewingSession(user_id=f"user_{rng.randrange(num_users)}", is_completed=True,
+                       content_id=f"content_{rng.choices(range(num_titles), weights)[0]}")
+        for _ in range(num_users * 5)
+    ]
+
+    engine = ContentSimilarityEngine()
+    engine.upsert_catalog(catalog)
+    engine.add_interactions(sessions)
+    start = time.perf_counter()
+    rows = engine.rebuild()
+    full_secs = time.perf_counter() - start
+    print(f"full build: {num_titles:,} titles, {len(sessions):,} sessions, "
+          f"{len(rows):,} rows in {full_secs:.2f}s")
+
+    for _ in range(100):
+        engine.add_rating(UserRating(user_id=f"user_{rng.randrange(num_users)}",
+                                     content_id=f"content_{rng.randrange(num_titles)}", rating_value=5.0))
+    pending = engine.pending
+    start = time.perf_counter()
+    engine.refresh()
+    print(f"incremental: 100 ratings -> {pending:,} titles updated in {time.perf_counter() - start:.2f}s")
@@ -1,4 +1,4 @@
-from dataclass import dataclass, field
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List, Dict, Any
@@ -7,6 +7,8 @@ import json
 import uuid
 
 class EventType(Enum):
+    PLAY_START = "play_start"
+    # Original spelling, kept as an alias of PLAY_START
     PLAY_Start = "play_start"
     PLAY_PAUSE = "play_pause"
     PLAY_RESUME = "play_resume"
@@ -53,7 +55,7 @@ class MaturityRating(Enum):
     TV_14 = "TV-14"
     TV_MA = "TV-MA"
     
-Class SubscriptionTier(Enum):
+class SubscriptionTier(Enum):
     FREE = "free"
     BASIC = "basic"
     STANDARD = "standard"
@@ -83,9 +85,11 @@ class ExperimentVariant(Enum):
     
 @dataclass
 class PlaybackEvent:
+    """
     Captures video platback events with telemetry data.
     Partition by: event_date, event_hour, user_id
-    even_id: str = field(default_factory=lambda: str(vvid4()))
+    """
+    event_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     event_type: EventType = EventType.PLAY_START
     event_timestamp: datetime = field(default_factory=datetime.utcnow)
     
@@ -93,7 +97,7 @@ class PlaybackEvent:
     session_id: str = ""
     device_id: str = ""
     
-    content_id = str = ""
+    content_id: str = ""
     content_title: str = ""
     content_type: ContentType = ContentType.MOVIE
     
@@ -103,7 +107,7 @@ class PlaybackEvent:
     audio_language: str = "en"
     subtitle_language: Optional[str] = None
     
-    device_type: DeviceType = DeviceType.WEB_DESTOP
+    device_type: DeviceType = DeviceType.WEB_DESKTOP
     platform_version: str = ""
     app_version: str = ""
     network_type: str = "wifi"
@@ -139,7 +143,8 @@ class PlaybackEvent:
             'content_id': self.content_id,
             'content_title': self.content_title,
             'content_type': self.content_type.value,
-            'position_seconds': self.duration_seconds,
+            'position_seconds': self.position_seconds,
+            'duration_seconds': self.duration_seconds,
             'video_quality': self.video_quality.value,
             'audio_language': self.audio_language,
             'subtitle_language': self.subtitle_language,
@@ -147,7 +152,7 @@ class PlaybackEvent:
             'platform_version': self.platform_version,
             'app_version': self.app_version,
             'network_type': self.network_type,
-            'bandwidth_mbps': self.bandwidth_mbps
+            'bandwidth_mbps': self.bandwidth_mbps,
             'buffering_count': self.buffering_count,
             'buffering_duration_ms': self.buffering_duration_ms,
             'bitrate_kbps': self.bitrate_kbps,
@@ -164,9 +169,9 @@ class PlaybackEvent:
             'event_hour': self.event_hour,
             'ingestion_timestamp': self.ingestion_timestamp.isoformat()
         }
-        
-def to_json(self) -> str:
-    return json.dumps(self.to_dict())
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
 
 @dataclass
 class UserInteractionEvent:
@@ -174,14 +179,14 @@ class UserInteractionEvent:
     Captures user interactions (search, browse, click, etc.)
     Partition by: event_date, event_hour
     """
-    event_id: str = field(default_factory=lambda: str(vvid.vvid4()))
+    event_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     event_type: EventType = EventType.BROWSE
     event_timestamp: datetime = field(default_factory=datetime.utcnow)
     
     # User Context
     user_id: str = ""
     session_id: str = ""
-    device_id str = ""
+    device_id: str = ""
     
     # Interaction details
     page_url: str = ""
@@ -200,6 +205,8 @@ class UserInteractionEvent:
     search_result_clicked_position: Optional[int] = None
     
     # Content context 
+    content_id: Optional[str] = None
+    content_type: Optional[ContentType] = None
     recommendation_algorithm: Optional[str] = None
     recommendation_model_version: Optional[str] = None
     recommendation_score: Optional[float] = None
@@ -213,28 +220,28 @@ class UserInteractionEvent:
     region: str = ""
     
     # Metadata
-    event_date: str = field(default_factory=lambda: datetime.utcnow().strftime(""%Y-%m-%d""))
+    event_date: str = field(default_factory=lambda: datetime.utcnow().strftime("%Y-%m-%d"))
     event_hour: int = field(default_factory=lambda: datetime.utcnow().hour)
     
     def to_dict(self) -> Dict[str, Any]:
         return {
             'event_id': self.event_id,
             'event_type': self.event_type.value,
-            'event_timestamp': self.event_timestmap.isoformat(),
+            'event_timestamp': self.event_timestamp.isoformat(),
             'user_id': self.user_id,
             'device_id': self.device_id,
             'page_title': self.page_title,
-            'referrer_url': self.element_type,
-            'element_type': self.elemtn_type,
+            'referrer_url': self.referrer_url,
+            'element_type': self.element_type,
             'element_id': self.element_id,
-            'element_position': self.element_psotion,
+            'element_position': self.element_position,
             'search_query': self.search_query,
             'search_results_count': self.search_results_count,
             'search_result_clicked_position': self.search_result_clicked_position,
             'content_id': self.content_id,
             'content_type': self.content_type.value if self.content_type else None,
             'recommendation_algorithm': self.recommendation_algorithm,
-            'recommendation_model_version': self.recommendation_model.version,
+            'recommendation_model_version': self.recommendation_model_version,
             'recommendation_score': self.recommendation_score,
             'device_type': self.device_type.value,
             'user_agent': self.user_agent,
@@ -246,7 +253,7 @@ class UserInteractionEvent:
         
 @dataclass
 class ViewingSession:
-    session_id: str = field(default_factory=lambda: str(vvid.vvid4()))
+    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str = ""
     content_id: str = ""
     
@@ -271,7 +278,7 @@ class ViewingSession:
     
     # context
     device_type: DeviceType = DeviceType.WEB_DESKTOP
-    video_quality: VideoQuality = VideoQuality.HD_1080p
+    video_quality: VideoQuality = VideoQuality.HD_1080P
     
     # Flags
     is_completed: bool = False
@@ -292,12 +299,12 @@ class ContentMetadata:
     # Classification
     genres: List[str] = field(default_factory=list)
     maturity_rating: MaturityRating = MaturityRating.PG
-    content_advisotry: List[str] = field(default_facotry=list)
+    content_advisotry: List[str] = field(default_factory=list)
     
     # Credits
     Directory: List[str] = field(default_factory=list)
     cast: List[str] = field(default_factory=list)
-    writer: List[str] = field(default_facotry=list)
+    writer: List[str] = field(default_factory=list)
     producer: List[str] = field(default_factory=list)
     
     # Description
@@ -313,12 +320,12 @@ class ContentMetadata:
     
     # Availability
     available_countries: List[str] = field(default_factory=list)
-    available_languages: List[str] = field(default_facotry=list)
-    subtitle_languages: List[str] = field(default_facotry=list)
-    audio_formats: List[str] = field(default_facotry=list)
+    available_languages: List[str] = field(default_factory=list)
+    subtitle_languages: List[str] = field(default_factory=list)
+    audio_formats: List[str] = field(default_factory=list)
     
     # Quality Options
-    max_quality: VidoeQuality = VideoQuality.UHD_4K
+    max_quality: VideoQuality = VideoQuality.UHD_4K
     supports_hdr: bool = False
     supports_dolby_vision: bool = False
     
@@ -370,7 +377,7 @@ class QoSTelemtry:
     
     # Video quality
     current_bitrate_kbps: int = 0
-    current_resolution: VideoQuality = VideoQuality.HD_1080p
+    current_resolution: VideoQuality = VideoQuality.HD_1080P
     measured_bandwidth_mbps: float = 0.0
     
     # Buffer metrics (sampled every 10 seconds)
@@ -401,7 +408,7 @@ class QoSTelemtry:
     error_message: Optional[str] = None
     
     # Device
-    device_type: DeviceType = DeviceType = DeviceType.WEB_DESKTOP
+    device_type: DeviceType = DeviceType.WEB_DESKTOP
     cpu_usage_percentage: Optional[float] = None
     memory_usage_mb: Optional[int] = None
     
@@ -451,7 +458,7 @@ class UserList:
 @dataclass
 class ContentSimilarity:
     content_id_a: str = ""
-    content_id_b; str = ""
+    content_id_b: str = ""
     
     # Similarity scores
     similarity_score: float = 0.0
@@ -666,16 +673,16 @@ class DataValidator:
             errors.append("playback_rate out of valid range (0.25-3.0)")
             
         return errors
-    
-@staticmethod
-def validate_user_subscription(sub: UserSubscription) -> List[str]:
-    # Validate subscription and return list of errors
-    errors = []
-    
-    if not sub.user_id:
-        errors.append("user_id is required")
+
+    @staticmethod
+    def validate_user_subscription(sub: UserSubscription) -> List[str]:
+        # Validate subscription and return list of errors
+        errors = []
         
-        if sub.price_aount < 0:
+        if not sub.user_id:
+            errors.append("user_id is required")
+            
+        if sub.price_amount < 0:
             errors.append("price_amount cannot be negative")
             
         if sub.current_period_end < sub.current_period_start:
@@ -684,11 +691,11 @@ def validate_user_subscription(sub: UserSubscription) -> List[str]:
         if sub.max_concurrent_streams < 1:
             errors.append("max_concurrent_streams must be at least 1")
             
-        return erros
+        return errors
     
-if __name__ == "__main__"
+if __name__ == "__main__":
     # Example: Create a playback event
-    event = PlaybackEvent (
+    event = PlaybackEvent(
         user_id="user_12345",
         session_id="session_abc",
         device_id="device_xyz",
@@ -696,8 +703,8 @@ if __name__ == "__main__"
         content_title="The Great Film",
         content_type=ContentType.MOVIE,
         position_seconds=300,
-        duratio_seconds=7200,
-        video_quaity=VideoQuality.UHD_4K,
+        duration_seconds=7200,
+        video_quality=VideoQuality.UHD_4K,
         device_type=DeviceType.TV_SMART_TV,
         country="US",
         region="CA"
@@ -714,10 +721,11 @@ if __name__ == "__main__"
     # Example: Create content metadata
     content = ContentMetadata(
         content_id="movie_001",
-        content_type=ContenType.MOVIE,
+        content_type=ContentType.MOVIE,
         title="The Great Film",
         release_year=2024,
         duration_minutes=120,
         genres=["Action", "Thriller"],
-        maturity_rating=MaturityRating.P
-    )
\ No newline at end of file
+        maturity_rating=MaturityRating.PG13
+    )
+    print(f"Content: {content.title} ({content.maturity_rating.value}, {', '.join(content.genres)})")
@@ -0,0 +1,459 @@
+import hashlib
+import heapq
+import logging
+import math
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import ErrorEvent
+
+logger = logging.getLogger(__name__)
+
+# Streaming error grouping
+# Messages and stack traces are normalized (ids, hex, addresses and numbers
+# replaced by placeholders) and hashed into a stable fingerprint, so an
+# incident's millions of near-identical errors collapse into a few groups.
+# Groups live in a fixed-capacity Space-Saving table keyed on their sliding
+# window count: when it is full, the group with the smallest recent count
+# is replaced and the newcomer inherits that count as its error bound.
+# Each group keeps a small reservoir of exemplar events instead of every
+# event. Per app_version / cdn_server rates are compared against an EWMA
+# baseline on every event, so a spike is flagged as soon as the current
+# bucket crosses its threshold rather than when the bucket closes.
+
+EPOCH = datetime(1970, 1, 1)
+
+# The leading lookahead lets the scanner skip characters that cannot start
+# any alternative, which roughly halves the cost of sub() on typical text
+_NORMALIZE = re.compile(
+    r"(?=[0-9a-fA-F'\"])(?:(?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)"
+    r"|(?P<hex>\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{12,}\b)"
+    r"|(?P<ip>\b\d{1,3}(?:\.\d{1,3}){3}\b)"
+    r"|(?P<str>'[^'\n]*'|\"[^\"\n]*\")"
+    r"|(?P<num>\d+))"
+)
+_PLACEHOLDERS = {"uuid": "<uuid>", "hex": "<hex>", "ip": "<ip>", "str": "<str>", "num": "<n>"}
+
+
+def _placeholder(match: re.Match) -> str:
+    return _PLACEHOLDERS[match.lastgroup]
+
+
+def _frame_placeholder(match: re.Match) -> str:
+    # Quoted text in a frame is a file path or source line, not data, so it
+    # stays as is (and digits inside it are not rewritten either)
+    group = match.lastgroup
+    return match.group() if group == "str" else _PLACEHOLDERS[group]
+
+
+def normalize_message(text: str) -> str:
+    """Replace variable parts (ids, addresses, quoted values, numbers) with placeholders"""
+    return _NORMALIZE.sub(_placeholder, text).strip()
+
+
+def normalize_stack(stack_trace: str, max_frames: int = 8) -> Tuple[str, ...]:
+    """
+    Top max_frames non-empty lines, normalized like messages (line numbers
+    become <n>) except that quoted text such as File "..." paths is kept
+    """
+    frames = []
+    for line in stack_trace.splitlines():
+        line = line.strip()
+        if line and line != "...":
+            frames.append(line)
+            if len(frames) >= max_frames:
+                break
+    # One sub() over the joined frames instead of one per line
+    return tuple(_NORMALIZE.sub(_frame_placeholder, "\n".join(frames)).split("\n"))
+
+
+def event_seconds(ts: datetime) -> float:
+    return (ts - EPOCH).total_seconds()
+
+
+@dataclass
+class ErrorGroupingConfig:
+    # Space-Saving capacity; the error bound of a group is at most the
+    # smallest window count in the table when it was admitted
+    max_groups: int = 10_000
+    bucket_seconds: int = 10
+    # Sliding window = window_buckets * bucket_seconds
+    window_buckets: int = 30
+    exemplars_per_group: int = 5
+    max_frames: int = 8
+    spike_dimensions: Tuple[str, ...] = ("app_version", "cdn_server")
+    # Values tracked per dimension; the least recently seen are dropped
+    max_dimension_values: int = 10_000
+    # EWMA weight of each closed bucket in the baseline
+    baseline_alpha: float = 0.1
+    spike_z: float = 4.0
+    # A bucket must also be this many times the baseline mean and hold at
+    # least min_spike_count errors
+    spike_ratio: float = 3.0
+    min_spike_count: int = 50
+    # Buckets seen before a value's baseline is trusted
+    warmup_buckets: int = 6
+    seed: int = 0
+
+
+@dataclass
+class ErrorGroupingMetrics:
+    events: int = 0
+    late_events_dropped: int = 0
+    groups_created: int = 0
+    groups_evicted: int = 0
+    spikes: int = 0
+    normalize_cache_hits: int = 0
+
+
+@dataclass
+class ErrorGroup:
+    fingerprint: str
+    error_type: str
+    error_code: str
+    message: str
+    frames: Tuple[str, ...]
+    window_count: int
+    total_count: int
+    # Space-Saving overestimate inherited on admission
+    count_error: int
+    first_seen: datetime
+    last_seen: datetime
+    exemplars: List[ErrorEvent] = field(default_factory=list)
+
+
+@dataclass
+class ErrorSpike:
+    dimension: str
+    value: str
+    bucket_start: datetime
+    detected_at: datetime
+    count: int
+    baseline_mean: float
+    threshold: float
+    # (fingerprint, count) driving the spike within the bucket
+    top_fingerprints: List[Tuple[str, int]] = field(default_factory=list)
+
+
+class _Group:
+    __slots__ = ("fingerprint", "error_type", "error_code", "message", "frames", "window",
+                 "total", "error", "first_seen", "last_seen", "exemplars")
+
+    def __init__(self, fingerprint: str, event: ErrorEvent, message: str, frames: Tuple[str, ...],
+                 inherited: int, t: float):
+        self.fingerprint = fingerprint
+        self.error_type = event.error_type
+        self.error_code = event.error_code
+        self.message = message
+        self.frames = frames
+        self.window = inherited
+        self.total = 0
+        self.error = inherited
+        self.first_seen = t
+        self.last_seen = t
+        self.exemplars: List[ErrorEvent] = []
+
+
+class _RateState:
+    __slots__ = ("mean", "var", "buckets", "count", "threshold", "flagged", "fingerprints")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.buckets = 0
+        self.count = 0
+        self.threshold = math.inf
+        self.flagged = False
+        self.fingerprints: Dict[str, int] = {}
+
+
+class ErrorGrouper:
+    """
+    Fingerprints ErrorEvents into at most max_groups groups with windowed
+    counts, sampled exemplars and per-dimension spike detection.
+
+    Window counts use a ring of per-bucket {fingerprint: count} dicts and
+    the group table is indexed by count (Space-Saving stream summary), so
+    increments, window slides and evictions are all O(1) per event.
+    """
+
+    def __init__(self, config: Optional[ErrorGroupingConfig] = None,
+                 on_spike: Optional[Callable[[ErrorSpike], None]] = None):
+        self.config = config or ErrorGroupingConfig()
+        self.on_spike = on_spike
+        self.metrics = ErrorGroupingMetrics()
+        self.spikes: List[ErrorSpike] = []
+        self._rng = random.Random(self.config.seed)
+        self._groups: Dict[str, _Group] = {}
+        # window count -> fingerprints with that count, and the smallest count
+        self._by_count: Dict[int, Dict[str, None]] = {}
+        self._min_count = 0
+        self._ring: List[Dict[str, int]] = [{} for _ in range(self.config.window_buckets)]
+        self._bucket: Optional[int] = None
+        self._rates: Dict[str, Dict[str, _RateState]] = {d: {} for d in self.config.spike_dimensions}
+        self._message_cache: Dict[str, str] = {}
+        self._stack_cache: Dict[str, Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    # Fingerprints
+
+    def _normalized(self, event: ErrorEvent) -> Tuple[str, Tuple[str, ...]]:
+        # Raw texts repeat heavily, so normalization is cached (and reset when large)
+        message = self._message_cache.get(event.error_message)
+        if message is None:
+            if len(self._message_cache) >= 100_000:
+                self._message_cache.clear()
+            message = self._message_cache[event.error_message] = normalize_message(event.error_message)
+        else:
+            self.metrics.normalize_cache_hits += 1
+        frames = ()
+        if event.stack_trace:
+            frames = self._stack_cache.get(event.stack_trace)
+            if frames is None:
+                if len(self._stack_cache) >= 100_000:
+                    self._stack_cache.clear()
+                frames = self._stack_cache[event.stack_trace] = normalize_stack(
+                    event.stack_trace, self.config.max_frames)
+        return message, frames
+
+    def fingerprint(self, event: ErrorEvent) -> str:
+        message, frames = self._normalized(event)
+        return self._fingerprint(event, message, frames)
+
+    @staticmethod
+    def _fingerprint(event: ErrorEvent, message: str, frames: Tuple[str, ...]) -> str:
+        key = "\x1f".join((event.error_type, event.error_code, message) + frames)
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+    # Stream summary
+
+    def _move(self, fingerprint: str, old: int, new: int):
+        by_count = self._by_count
+        bucket = by_count[old]
+        del bucket[fingerprint]
+        if not bucket:
+            del by_count[old]
+            if old == self._min_count and new > old:
+                self._min_count = new
+        target = by_count.get(new)
+        if target is None:
+            target = by_count[new] = {}
+        target[fingerprint] = None
+        if new < self._min_count:
+            self._min_count = new
+
+    def _admit(self, fingerprint: str, event: ErrorEvent, message: str, frames: Tuple[str, ...],
+               t: float) -> _Group:
+        inherited = 0
+        if len(self._groups) >= self.config.max_groups:
+            inherited = self._min_count
+            victim = next(iter(self._by_count[inherited]))
+            del self._by_count[inherited][victim]
+            if not self._by_count[inherited]:
+                del self._by_count[inherited]
+            del self._groups[victim]
+            for counts in self._ring:
+                counts.pop(victim, None)
+            self.metrics.groups_evicted += 1
+        group = self._groups[fingerprint] = _Group(fingerprint, event, message, frames, inherited, t)
+        # The inherited count slides out with the current bucket
+        if inherited:
+            self._ring[self._bucket % len(self._ring)][fingerprint] = inherited
+        self._by_count.setdefault(inherited, {})[fingerprint] = None
+        # inherited is either 0 or the evicted minimum, so it is the new minimum
+        self._min_count = inherited
+        self.metrics.groups_created += 1
+        return group
+
+    # Time
+
+    def _advance(self, bucket: int, t: float):
+        if self._bucket is None:
+            self._bucket = bucket
+            return
+        steps = min(bucket - self._bucket, len(self._ring))
+        for step in range(1, steps + 1):
+            self._close_bucket()
+            expiring = self._ring[(self._bucket + step) % len(self._ring)]
+            for fingerprint, count in expiring.items():
+                group = self._groups[fingerprint]
+                self._move(fingerprint, group.window, group.window - count)
+                group.window -= count
+            expiring.clear()
+        self._bucket = bucket
+
+    def _close_bucket(self):
+        # Fold each value's closed bucket into its baseline and set the next threshold
+        config = self.config
+        alpha = config.baseline_alpha
+        for rates in self._rates.values():
+            for state in rates.values():
+                count = state.count
+                if state.buckets == 0:
+                    state.mean = float(count)
+                else:
+                    delta = count - state.mean
+                    state.mean += alpha * delta
+                    state.var = (1 - alpha) * (state.var + alpha * delta * delta)
+                state.buckets += 1
+                state.count = 0
+                state.flagged = False
+                state.fingerprints = {}
+                if state.buckets >= config.warmup_buckets:
+                    state.threshold = max(
+                        config.min_spike_count,
+                        state.mean + config.spike_z * math.sqrt(state.var),
+                        state.mean * config.spike_ratio,
+                    )
+
+    # Ingest
+
+    def add(self, event: ErrorEvent):
+        config = self.config
+        t = event_seconds(event.error_timestamp)
+        bucket = int(t // config.bucket_seconds)
+        if self._bucket is None or bucket > self._bucket:
+            self._advance(bucket, t)
+        elif bucket <= self._bucket - len(self._ring):
+            self.metrics.late_events_dropped += 1
+            return
+        self.metrics.events += 1
+
+        message, frames = self._normalized(event)
+        fingerprint = self._fingerprint(event, message, frames)
+        group = self._groups.get(fingerprint)
+        if group is None:
+            group = self._admit(fingerprint, event, message, frames, t)
+        counts = self._ring[bucket % len(self._ring)]
+        counts[fingerprint] = counts.get(fingerprint, 0) + 1
+        self._move(fingerprint, group.window, group.window + 1)
+        group.window += 1
+        group.total += 1
+        if t > group.last_seen:
+            group.last_seen = t
+        elif t < group.first_seen:
+            group.first_seen = t
+        # Reservoir sampling keeps a uniform sample of the group's events
+        exemplars = group.exemplars
+        if len(exemplars) < config.exemplars_per_group:
+            exemplars.append(event)
+        else:
+            slot = self._rng.randrange(group.total)
+            if slot < config.exemplars_per_group:
+                exemplars[slot] = event
+
+        # Late events still count towards groups but not towards spike rates
+        if bucket == self._bucket:
+            for dimension, rates in self._rates.items():
+                value = getattr(event, dimension, None)
+                if value:
+                    self._count_rate(dimension, rates, value, fingerprint, bucket, t)
+
+    def _count_rate(self, dimension: str, rates: Dict[str, _RateState], value: str,
+                    fingerprint: str, bucket: int, t: float):
+        state = rates.pop(value, None)
+        if state is None:
+            state = _RateState()
+            if len(rates) >= self.config.max_dimension_values:
+                del rates[next(iter(rates))]
+        # Re-inserted so iteration order is least recently seen first
+        rates[value] = state
+        state.count += 1
+        state.fingerprints[fingerprint] = state.fingerprints.get(fingerprint, 0) + 1
+        if state.count >= state.threshold and not state.flagged:
+            state.flagged = True
+            spike = ErrorSpike(
+                dimension=dimension, value=value,
+                bucket_start=EPOCH + timedelta(seconds=bucket * self.config.bucket_seconds),
+                detected_at=EPOCH + timedelta(seconds=t), count=state.count,
+                baseline_mean=state.mean, threshold=state.threshold,
+                top_fingerprints=heapq.nlargest(3, state.fingerprints.items(), key=lambda item: item[1]),
+            )
+            self.metrics.spikes += 1
+            self.spikes.append(spike)
+            if self.on_spike is not None:
+                self.on_spike(spike)
+
+    def add_many(self, events: Iterable[ErrorEvent]):
+        for event in events:
+            self.add(event)
+
+    # Reads
+
+    def _snapshot(self, group: _Group) -> ErrorGroup:
+        return ErrorGroup(
+            fingerprint=group.fingerprint, error_type=group.error_type, error_code=group.error_code,
+            message=group.message, frames=group.frames, window_count=group.window,
+            total_count=group.total, count_error=group.error,
+            first_seen=EPOCH + timedelta(seconds=group.first_seen),
+            last_seen=EPOCH + timedelta(seconds=group.last_seen), exemplars=list(group.exemplars),
+        )
+
+    def group(self, fingerprint: str) -> Optional[ErrorGroup]:
+        group = self._groups.get(fingerprint)
+        return self._snapshot(group) if group is not None else None
+
+    def top_groups(self, n: int = 20) -> List[ErrorGroup]:
+        """Groups with the highest counts in the current window"""
+        return [self._snapshot(g) for g in heapq.nlargest(n, self._groups.values(), key=lambda g: g.window)]
+
+
+if __name__ == "__main__":
+    # Grouping throughput and spike detection delay for an injected CDN incident
+    from dataclasses import replace
+
+    from load_generator import LoadGenerator, LoadProfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    rng = random.Random(19)
+    frames = {
+        "playback": ["at DrmSession.acquire(DrmSession.java:{0})", "at Player.prepare(Player.java:{1})",
+                     "at 0x{2:012x} libmedia.so"],
+        "network": ["at HttpClient.execute(HttpClient.java:{0})", "at SegmentFetcher.fetch(SegmentFetcher.java:{1})"],
+        "api": ["File \"/srv/api/handlers.py\", line {0}, in handle", "File \"/srv/api/db.py\", line {1}, in query"],
+        "client": ["#0 0x{2:012x} in VideoDecoder::Reset() decoder.cc:{0}", "#1 0x{2:012x} in Pipeline::Run() pipeline.cc:{1}"],
+    }
+    versions = ["8.42.1", "8.42.0", "8.41.3", "8.40.0"]
+    events = []
+    for event in LoadGenerator(LoadProfile(peak_events_per_second=100.0)).error_events(n):
+        stack = "\n".join(line.format(rng.randint(10, 900), rng.randint(10, 900), rng.getrandbits(40))
+                          for line in frames[event.error_type])
+        events.append(replace(event, error_message=f"{event.error_message} (request {event.request_id}, "
+                                                   f"attempt {rng.randint(1, 5)})",
+                              stack_trace=stack, app_version=rng.choice(versions)))
+
+    # Incident: one CDN node starts returning 5xx at 20x its normal error rate
+    incident_start = events[int(n * 0.6)].error_timestamp
+    incident_end = incident_start + timedelta(minutes=5)
+    target = next(e.cdn_server for e in events[int(n * 0.6):] if e.cdn_server)
+    template = next(e for e in events if e.error_code == "CDN_5XX")
+    injected = []
+    for event in events:
+        injected.append(event)
+        if incident_start <= event.error_timestamp < incident_end and rng.random() < 0.5:
+            injected.append(replace(template, error_timestamp=event.error_timestamp, cdn_server=target,
+                                    error_message=f"CDN returned {rng.choice((502, 503, 504))} for "
+                                                  f"segment {rng.getrandbits(64):016x}"))
+
+    grouper = ErrorGrouper(ErrorGroupingConfig(max_groups=1_000))
+    start = time.perf_counter()
+    grouper.add_many(injected)
+    elapsed = time.perf_counter() - start
+    span = injected[-1].error_timestamp - injected[0].error_timestamp
+    print(f"{len(injected):,} errors over {span}: {len(injected) / elapsed:,.0f} events/sec, "
+          f"{len(grouper)} groups, {grouper.metrics}")
+    for group in grouper.top_groups(5):
+        print(f"{group.window_count:6d} {group.total_count:8d} {group.error_code:24s} {group.message} | "
+              f"{group.frames[0] if group.frames else ''}")
+    for spike in grouper.spikes:
+        delay = (spike.detected_at - incident_start).total_seconds()
+        print(f"spike {spike.dimension}={spike.value} at {spike.detected_at} ({delay:+.0f}s after incident): "
+              f"{spike.count} vs baseline {spike.baseline_mean:.1f} (threshold {spike.threshold:.0f}), "
+              f"top {spike.top_fingerprints[0]}")
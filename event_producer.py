@@ -0,0 +1,321 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core_data_domains import (
+    PlaybackEvent, UserInteractionEvent, QoSTelemtry, UserRating,
+    ExperimentExposure, ExperimentMetric, ErrorEvent, ViewingSession
+)
+from real_time_event_streaming import KafkaTopics, TopicConfig
+from local_broker import InMemoryBroker
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+# Batching event producer
+# Routes domain events to their KafkaTopics entry, partitions by a stable hash
+# of user_id and ships per-partition batches from a background sender thread.
+
+EVENT_TOPICS = {
+    PlaybackEvent: KafkaTopics.PLAYBACK_EVENTS,
+    UserInteractionEvent: KafkaTopics.USER_INTERACTIONS,
+    QoSTelemtry: KafkaTopics.QOS_TELEMETRY,
+    UserRating: KafkaTopics.USER_RATINGS,
+    ExperimentExposure: KafkaTopics.EXPERIMENT_EXPOSURES,
+    ErrorEvent: KafkaTopics.ERROR_EVENTS,
+    ViewingSession: KafkaTopics.VIEWING_SESSIONS,
+    ExperimentMetric: KafkaTopics.EXPERIMENT_METRICS,
+}
+
+RecordMetadata = namedtuple("RecordMetadata", ["topic", "partition", "offset", "key", "latency_ms"])
+
+DeliveryCallback = Callable[[Optional[Exception], Optional[RecordMetadata]], None]
+
+
+def key_hash(key: str) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def partition_for_key(key: str, num_partitions: int) -> int:
+    return key_hash(key) % num_partitions
+
+
+def event_key(event: Any) -> str:
+    """Partition key: user_id, falling back to session_id and then the event's own id"""
+    key = getattr(event, "user_id", None) or getattr(event, "session_id", None)
+    if key:
+        return key
+    return str(getattr(event, fields(event)[0].name))
+
+
+@dataclass
+class ProducerMetrics:
+    records_queued: int = 0
+    records_delivered: int = 0
+    records_failed: int = 0
+    batches_sent: int = 0
+    bytes_sent: int = 0
+    backpressure_waits: int = 0
+    queue_full_errors: int = 0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=100_000))
+
+    def latency_percentile(self, percentile: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'records_queued': self.records_queued,
+            'records_delivered': self.records_delivered,
+            'records_failed': self.records_failed,
+            'batches_sent': self.batches_sent,
+            'bytes_sent': self.bytes_sent,
+            'backpressure_waits': self.backpressure_waits,
+            'queue_full_errors': self.queue_full_errors,
+            'latency_p50_ms': self.latency_percentile(50),
+            'latency_p99_ms': self.latency_percentile(99),
+        }
+
+
+class _Batch:
+    __slots__ = ("topic", "partition", "records", "enqueued_at", "callbacks", "created_at", "size_bytes")
+
+    def __init__(self, topic: str, partition: int):
+        self.topic = topic
+        self.partition = partition
+        self.records: List[Tuple[bytes, bytes]] = []
+        self.enqueued_at: List[float] = []
+        self.callbacks: List[Optional[DeliveryCallback]] = []
+        self.created_at = time.monotonic()
+        self.size_bytes = 0
+
+
+class EventProducer:
+    """
+    Asynchronous, batching producer for domain events.
+
+    produce() serializes the event, picks the partition from the key hash and
+    appends to that partition's open batch. A batch is sent when it reaches
+    batch_size records or batch_bytes, or linger_ms after it was opened.
+    When max_queue_records are in flight, produce() blocks for up to
+    max_block_ms and then raises BufferError, like confluent_kafka.Producer.
+    Delivery callbacks run on the sender thread.
+    """
+
+    def __init__(self, broker=None,
+                 serializer: Optional[Callable[[Any, str], bytes]] = None,
+                 batch_size: int = 1000,
+                 batch_bytes: int = 1048576,
+                 linger_ms: float = 5.0,
+                 max_queue_records: int = 100_000,
+                 max_block_ms: float = 1000.0,
+                 on_delivery: Optional[DeliveryCallback] = None):
+        self.broker = broker if broker is not None else InMemoryBroker()
+        self.serializer = serializer or (lambda event, topic: fast_json.encode(event))
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.linger_seconds = linger_ms / 1000.0
+        self.max_queue_records = max_queue_records
+        self.max_block_seconds = max_block_ms / 1000.0
+        self.on_delivery = on_delivery
+        self.metrics = ProducerMetrics()
+
+        self._partition_counts: Dict[str, int] = {}
+        self._key_hashes: Dict[str, int] = {}
+        self._open: Dict[Tuple[str, int], _Batch] = {}
+        self._ready: deque = deque()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._sender = threading.Thread(target=self._run_sender, name="event-producer-sender", daemon=True)
+        self._sender.start()
+
+    def _num_partitions(self, topic: KafkaTopics) -> int:
+        count = self._partition_counts.get(topic.value)
+        if count is None:
+            if not self.broker.has_topic(topic.value):
+                self.broker.create_topic(topic.value, TopicConfig.for_topic(topic)['num_partitions'])
+            count = self._partition_counts[topic.value] = self.broker.num_partitions(topic.value)
+        return count
+
+    def _partition(self, key: str, num_partitions: int) -> int:
+        h = self._key_hashes.get(key)
+        if h is None:
+            if len(self._key_hashes) >= 1_000_000:
+                self._key_hashes.clear()
+            h = self._key_hashes[key] = key_hash(key)
+        return h % num_partitions
+
+    def produce(self, event: Any, topic: Optional[KafkaTopics] = None,
+                on_delivery: Optional[DeliveryCallback] = None):
+        if self._closed:
+            raise RuntimeError("Producer is closed")
+        if topic is None:
+            try:
+                topic = EVENT_TOPICS[type(event)]
+            except KeyError:
+                raise ValueError(f"No topic mapping for {type(event).__name__}") from None
+        key = event_key(event)
+        value = self.serializer(event, topic.value)
+        partition = self._partition(key, self._num_partitions(topic))
+        now = time.monotonic()
+
+        with self._cond:
+            if self._in_flight >= self.max_queue_records:
+                self.metrics.backpressure_waits += 1
+                deadline = now + self.max_block_seconds
+                while self._in_flight >= self.max_queue_records:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics.queue_full_errors += 1
+                        raise BufferError("Local producer queue is full")
+                    self._cond.wait(remaining)
+
+            batch_key = (topic.value, partition)
+            batch = self._open.get(batch_key)
+            if batch is None:
+                batch = self._open[batch_key] = _Batch(topic.value, partition)
+            batch.records.append((key.encode("utf-8"), value))
+            batch.enqueued_at.append(now)
+            batch.callbacks.append(on_delivery)
+            batch.size_bytes += len(value)
+            self._in_flight += 1
+            self.metrics.records_queued += 1
+            if len(batch.records) >= self.batch_size or batch.size_bytes >= self.batch_bytes:
+                del self._open[batch_key]
+                self._ready.append(batch)
+                self._cond.notify_all()
+
+    def _collect_batches(self) -> List[_Batch]:
+        # Called with the condition held: wait for full or lingered batches
+        while True:
+            now = time.monotonic()
+            if self._flush_requested or self._closed:
+                self._ready.extend(self._open.values())
+                self._open.clear()
+            else:
+                expired = [k for k, b in self._open.items() if now - b.created_at >= self.linger_seconds]
+                for k in expired:
+                    self._ready.append(self._open.pop(k))
+            if self._ready:
+                batches = list(self._ready)
+                self._ready.clear()
+                return batches
+            if self._closed:
+                return []
+            if self._open:
+                oldest = min(b.created_at for b in self._open.values())
+                timeout = max(0.0, oldest + self.linger_seconds - now)
+            else:
+                timeout = None
+            self._cond.wait(timeout)
+
+    def _run_sender(self):
+        while True:
+            with self._cond:
+                batches = self._collect_batches()
+                if not batches and self._closed:
+                    return
+            for batch in batches:
+                self._send(batch)
+            with self._cond:
+                self._in_flight -= sum(len(b.records) for b in batches)
+                if not self._open and not self._ready:
+                    self._flush_requested = False
+                self._cond.notify_all()
+
+    def _send(self, batch: _Batch):
+        error = None
+        base_offset = -1
+        try:
+            base_offset = self.broker.produce_batch(batch.topic, batch.partition, batch.records)
+        except Exception as e:
+            logger.error("Failed to deliver batch to %s[%d]: %s", batch.topic, batch.partition, e)
+            error = e
+
+        done = time.monotonic()
+        metrics = self.metrics
+        if error is None:
+            metrics.batches_sent += 1
+            metrics.records_delivered += len(batch.records)
+            metrics.bytes_sent += batch.size_bytes
+        else:
+            metrics.records_failed += len(batch.records)
+
+        for i, ((key, _), enqueued_at, callback) in enumerate(
+                zip(batch.records, batch.enqueued_at, batch.callbacks)):
+            latency_ms = (done - enqueued_at) * 1000.0
+            metrics.latencies_ms.append(latency_ms)
+            callback = callback or self.on_delivery
+            if callback is None:
+                continue
+            metadata = None if error else RecordMetadata(
+                batch.topic, batch.partition, base_offset + i, key, latency_ms)
+            try:
+                callback(error, metadata)
+            except Exception:
+                logger.exception("Delivery callback raised")
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """Send all pending batches; returns the number of records still in flight"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._in_flight
+
+    def __len__(self) -> int:
+        return self._in_flight
+
+    def close(self, timeout: Optional[float] = None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._sender.join(timeout)
+
+
+if __name__ == "__main__":
+    # Benchmark: throughput and delivery latency against the in-memory broker
+    n = 200_000
+    events = [
+        PlaybackEvent(user_id=f"user_{i % 10000}", content_id=f"movie_{i % 300}",
+                      position_seconds=i, duration_seconds=7200)
+        for i in range(n)
+    ]
+    broker = InMemoryBroker()
+    producer = EventProducer(broker, batch_size=1000, linger_ms=5)
+
+    start = time.perf_counter()
+    for event in events:
+        producer.produce(event)
+    producer.flush()
+    elapsed = time.perf_counter() - start
+    producer.close()
+
+    # Per-user ordering: positions for each user must be increasing within its partition
+    topic = KafkaTopics.PLAYBACK_EVENTS.value
+    last_seen: Dict[bytes, int] = {}
+    for partition in range(broker.num_partitions(topic)):
+        for record in broker.fetch(topic, partition, 0, n):
+            position = int(record.value.split(b'"position_seconds": ', 1)[1].split(b',', 1)[0])
+            assert position > last_seen.get(record.key, -1)
+            last_seen[record.key] = position
+
+    m = producer.metrics.to_dict()
+    print(f"throughput: {n / elapsed:,.0f} events/sec over {m['batches_sent']} batches")
+    print(f"delivery latency p50={m['latency_p50_ms']:.2f}ms p99={m['latency_p99_ms']:.2f}ms")
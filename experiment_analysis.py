@@ -0,0 +1,553 @@
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import random
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core_data_domains import (
+    ExperimentExposure, ExperimentMetric, ExperimentVariant, ViewingSession, ErrorEvent,
+    PaymentTransaction
+)
+from real_time_event_streaming import KafkaTopics
+
+logger = logging.getLogger(__name__)
+
+# Streaming experiment analysis
+# Joins ExperimentExposure to later outcome events by user_id and keeps
+# per-variant running aggregates, so ExperimentMetric rows (mean, standard
+# error, confidence interval, p-value and lift against control) can be
+# emitted at any time without re-reading raw events.
+
+_NORMAL = NormalDist()
+
+_TIMESTAMP_FIELDS = ("event_timestamp", "session_end", "session_start", "timestamp",
+                     "transaction_date", "error_timestamp", "rating_timestamp", "exposure_timestamp")
+
+_WINDOW_PATTERN = re.compile(r"^(\d+)([mhdw])$")
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_window(window: str) -> timedelta:
+    """'7d' -> timedelta(days=7); units m, h, d, w"""
+    match = _WINDOW_PATTERN.match(window)
+    if not match:
+        raise ValueError(f"Invalid aggregation window {window!r}")
+    return timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def _unit_hash(*parts: str) -> Tuple[float, float]:
+    # Two independent uniforms in [0, 1) from one stable digest
+    digest = hashlib.blake2b(":".join(parts).encode("utf-8"), digest_size=16).digest()
+    return (int.from_bytes(digest[:8], "big") / 2 ** 64, int.from_bytes(digest[8:], "big") / 2 ** 64)
+
+
+def assign_variant(experiment_id: str, user_id: str,
+                   variants: Sequence[ExperimentVariant] = (ExperimentVariant.CONTROL,
+                                                           ExperimentVariant.TREATMENT_A),
+                   traffic_allocation: float = 1.0, salt: str = "") -> Optional[ExperimentVariant]:
+    """
+    Deterministic variant for a user, or None when the user falls outside
+    traffic_allocation. Allocation and variant use independent hash draws, so
+    raising traffic_allocation only adds users; nobody switches variant.
+    """
+    if not variants:
+        raise ValueError("At least one variant is required")
+    allocation_draw, variant_draw = _unit_hash(salt, experiment_id, user_id)
+    if allocation_draw >= traffic_allocation:
+        return None
+    return variants[int(variant_draw * len(variants))]
+
+
+def event_time(event: Any) -> Optional[datetime]:
+    for name in _TIMESTAMP_FIELDS:
+        value = getattr(event, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+class RunningStats:
+    """
+    Welford mean/variance that also supports removing a value, so a user's
+    contribution can be replaced as their outcome total grows. merge() uses
+    Chan's parallel formula to combine partitions.
+    """
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x: float):
+        if self.n <= 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.n -= 1
+        self.mean -= delta / self.n
+        self.m2 = max(0.0, self.m2 - delta * (x - self.mean))
+
+    def replace(self, old: float, new: float):
+        # Same n, so the update is closed-form
+        if self.n == 0 or old == new:
+            return
+        mean_old = self.mean
+        self.mean += (new - old) / self.n
+        self.m2 = max(0.0, self.m2 + (new - old) * (new - self.mean + old - mean_old))
+
+    def merge(self, other: "RunningStats"):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+
+class RatioStats:
+    """
+    Per-user (numerator, denominator) sums for ratio metrics such as errors
+    per session; the variance of sum(x) / sum(y) uses the delta method.
+    """
+
+    __slots__ = ("n", "sx", "sy", "sxx", "syy", "sxy")
+
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+
+    def add(self, x: float, y: float, sign: int = 1):
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.syy += sign * y * y
+        self.sxy += sign * x * y
+
+    def merge(self, other: "RatioStats"):
+        self.n += other.n
+        self.sx += other.sx
+        self.sy += other.sy
+        self.sxx += other.sxx
+        self.syy += other.syy
+        self.sxy += other.sxy
+
+    @property
+    def mean(self) -> float:
+        return self.sx / self.sy if self.sy else 0.0
+
+    @property
+    def variance_of_mean(self) -> float:
+        n = self.n
+        if n < 2 or not self.sy:
+            return 0.0
+        mean_x, mean_y = self.sx / n, self.sy / n
+        var_x = (self.sxx - n * mean_x * mean_x) / (n - 1)
+        var_y = (self.syy - n * mean_y * mean_y) / (n - 1)
+        cov = (self.sxy - n * mean_x * mean_y) / (n - 1)
+        r = mean_x / mean_y
+        return max(0.0, (var_x - 2 * r * cov + r * r * var_y) / (n * mean_y * mean_y))
+
+
+@dataclass
+class MetricDefinition:
+    """
+    Outcome metric per exposed user. value(event) returns the amount an
+    event adds to the user's total (None if the event is irrelevant).
+    metric_type "mean" and "proportion" average per-user totals
+    (proportion caps them at 1); "ratio" divides summed value by summed
+    denominator across users.
+    """
+    name: str
+    event_types: Tuple[type, ...]
+    value: Callable[[Any], Optional[float]]
+    metric_type: str = "mean"
+    denominator: Optional[Callable[[Any], Optional[float]]] = None
+
+
+DEFAULT_METRICS = [
+    MetricDefinition("watch_time_seconds", (ViewingSession,),
+                     lambda s: float(s.total_watch_tie_seconds)),
+    MetricDefinition("sessions_per_user", (ViewingSession,), lambda s: 1.0),
+    MetricDefinition("completion_rate", (ViewingSession,),
+                     lambda s: 1.0 if s.is_completed else None, metric_type="proportion"),
+    MetricDefinition("errors_per_session", (ViewingSession, ErrorEvent),
+                     lambda e: 1.0 if isinstance(e, ErrorEvent) else None, metric_type="ratio",
+                     denominator=lambda e: 1.0 if isinstance(e, ViewingSession) else None),
+    MetricDefinition("revenue_per_user", (PaymentTransaction,),
+                     lambda p: float(p.amount) if p.status == "success" else None),
+]
+
+
+@dataclass
+class ExperimentConfig:
+    experiment_id: str
+    aggregation_window: str = "7d"
+    control: ExperimentVariant = ExperimentVariant.CONTROL
+    confidence: float = 0.95
+    metrics: List[MetricDefinition] = field(default_factory=lambda: list(DEFAULT_METRICS))
+
+
+class _UserState:
+    __slots__ = ("variant", "exposed_at", "values")
+
+    def __init__(self, variant: ExperimentVariant, exposed_at: datetime, num_values: int):
+        self.variant = variant
+        self.exposed_at = exposed_at
+        self.values = [0.0] * num_values
+
+
+class _ExperimentState:
+    __slots__ = ("config", "window", "users", "stats", "value_slots", "num_values", "by_event_type",
+                 "exposures", "conflicting_exposures", "outcomes_attributed")
+
+    def __init__(self, config: ExperimentConfig):
+        self.config = config
+        self.window = parse_window(config.aggregation_window)
+        # user_id -> state, oldest exposure first; evicted once the window passes
+        self.users: "OrderedDict[str, _UserState]" = OrderedDict()
+        # (variant, metric index) -> RunningStats / RatioStats
+        self.stats: Dict[Tuple[ExperimentVariant, int], Any] = {}
+        # metric index -> first position in _UserState.values (ratio uses two)
+        self.value_slots: List[int] = []
+        slot = 0
+        for metric in config.metrics:
+            self.value_slots.append(slot)
+            slot += 2 if metric.metric_type == "ratio" else 1
+        self.num_values = slot
+        self.by_event_type: Dict[type, List[int]] = {}
+        for index, metric in enumerate(config.metrics):
+            for event_type in metric.event_types:
+                self.by_event_type.setdefault(event_type, []).append(index)
+        self.exposures = 0
+        self.conflicting_exposures = 0
+        self.outcomes_attributed = 0
+
+    def stats_for(self, variant: ExperimentVariant, index: int):
+        stats = self.stats.get((variant, index))
+        if stats is None:
+            ratio = self.config.metrics[index].metric_type == "ratio"
+            stats = self.stats[variant, index] = RatioStats() if ratio else RunningStats()
+        return stats
+
+
+class ExperimentAnalyzer:
+    """
+    Streaming exposure -> outcome join with online per-variant statistics.
+
+    The first exposure of a user fixes their variant; every exposed user
+    counts with a zero total until outcomes arrive. Outcome events for a
+    user within aggregation_window of their exposure update that user's
+    totals, and the per-variant aggregates are adjusted in place.
+
+    Memory is bounded by max_users_per_experiment and max_tracked_users:
+    users whose attribution window has passed (or the least recently
+    exposed, when over a cap) are dropped from the join, but their
+    contribution stays in the aggregates. As in the sessionizer, the
+    watermark trails the highest event time seen by allowed_lateness, so
+    out-of-order outcomes inside a window are still joined.
+    """
+
+    def __init__(self, metrics: Optional[List[MetricDefinition]] = None,
+                 default_window: str = "7d", max_users_per_experiment: int = 200_000,
+                 max_tracked_users: int = 2_000_000, allowed_lateness_seconds: int = 60, producer=None,
+                 on_metric: Optional[Callable[[ExperimentMetric], None]] = None):
+        self.metrics = metrics if metrics is not None else list(DEFAULT_METRICS)
+        self.default_window = default_window
+        self.max_users_per_experiment = max_users_per_experiment
+        self.max_tracked_users = max_tracked_users
+        self.producer = producer
+        self.on_metric = on_metric
+        self._experiments: Dict[str, _ExperimentState] = {}
+        # user_id -> experiment ids the user is still joinable in
+        self._user_experiments: Dict[str, List[str]] = {}
+        self._tracked = 0
+        self._lateness = timedelta(seconds=allowed_lateness_seconds)
+        self._max_event_time: Optional[datetime] = None
+        self._watermark: Optional[datetime] = None
+        # (window end, sequence, experiment_id, user_id) min-heap over joinable users
+        self._expiry: List[Tuple[datetime, int, str, str]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._experiments)
+
+    @property
+    def tracked_users(self) -> int:
+        return self._tracked
+
+    def register(self, config: ExperimentConfig):
+        if config.experiment_id in self._experiments:
+            raise ValueError(f"Experiment {config.experiment_id} is already registered")
+        self._experiments[config.experiment_id] = _ExperimentState(config)
+
+    def _experiment(self, experiment_id: str) -> _ExperimentState:
+        state = self._experiments.get(experiment_id)
+        if state is None:
+            state = self._experiments[experiment_id] = _ExperimentState(
+                ExperimentConfig(experiment_id, self.default_window, metrics=self.metrics))
+        return state
+
+    # Input
+
+    def process(self, event: Any):
+        if isinstance(event, ExperimentExposure):
+            self.expose(event)
+        else:
+            self.outcome(event)
+
+    def process_many(self, events: Iterable[Any]):
+        for event in events:
+            self.process(event)
+
+    def expose(self, exposure: ExperimentExposure):
+        if not exposure.user_id or not exposure.experiment_id:
+            return
+        ts = exposure.exposure_timestamp
+        self._advance(ts)
+        state = self._experiment(exposure.experiment_id)
+        user = state.users.get(exposure.user_id)
+        if user is not None:
+            if user.variant is not exposure.variant:
+                state.conflicting_exposures += 1
+            return
+        user = state.users[exposure.user_id] = _UserState(exposure.variant, ts, state.num_values)
+        state.exposures += 1
+        for index, metric in enumerate(state.config.metrics):
+            stats = state.stats_for(exposure.variant, index)
+            if metric.metric_type == "ratio":
+                stats.add(0.0, 0.0)
+            else:
+                stats.add(0.0)
+        self._user_experiments.setdefault(exposure.user_id, []).append(exposure.experiment_id)
+        self._tracked += 1
+        heapq.heappush(self._expiry, (ts + state.window, next(self._sequence),
+                                      exposure.experiment_id, exposure.user_id))
+        if len(state.users) > self.max_users_per_experiment:
+            self._evict(state, next(iter(state.users)))
+        if self._tracked > self.max_tracked_users:
+            self._evict_oldest()
+        if len(self._expiry) > 2 * self._tracked + 1024:
+            self._compact_expiry()
+
+    def outcome(self, event: Any):
+        user_id = getattr(event, "user_id", None)
+        if not user_id or user_id not in self._user_experiments:
+            return
+        ts = event_time(event)
+        if ts is not None:
+            self._advance(ts)
+        for experiment_id in self._user_experiments.get(user_id, ()):
+            state = self._experiments[experiment_id]
+            indices = state.by_event_type.get(type(event))
+            if not indices:
+                continue
+            user = state.users[user_id]
+            if ts is not None and not user.exposed_at <= ts < user.exposed_at + state.window:
+                continue
+            attributed = False
+            for index in indices:
+                metric = state.config.metrics[index]
+                value = metric.value(event)
+                if metric.metric_type == "ratio":
+                    denominator = metric.denominator(event) if metric.denominator else None
+                    if value is None and denominator is None:
+                        continue
+                    slot = state.value_slots[index]
+                    x, y = user.values[slot], user.values[slot + 1]
+                    stats = state.stats_for(user.variant, index)
+                    stats.add(x, y, sign=-1)
+                    x += value or 0.0
+                    y += denominator or 0.0
+                    stats.add(x, y)
+                    user.values[slot], user.values[slot + 1] = x, y
+                elif value is not None:
+                    slot = state.value_slots[index]
+                    old = user.values[slot]
+                    new = old + value
+                    if metric.metric_type == "proportion":
+                        new = min(new, 1.0)
+                    if new != old:
+                        state.stats_for(user.variant, index).replace(old, new)
+                        user.values[slot] = new
+                else:
+                    continue
+                attributed = True
+            if attributed:
+                state.outcomes_attributed += 1
+
+    # Bounded state
+
+    def _advance(self, ts: datetime):
+        if self._max_event_time is not None and ts <= self._max_event_time:
+            return
+        self._max_event_time = ts
+        watermark = self._watermark = ts - self._lateness
+        # Users whose window closed before the watermark can no longer change any aggregate
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= watermark:
+            self._evict_entry(heapq.heappop(expiry))
+
+    def _evict_entry(self, entry: Tuple[datetime, int, str, str]) -> bool:
+        # Entries go stale when a user was already evicted by a size cap
+        expires_at, _, experiment_id, user_id = entry
+        state = self._experiments.get(experiment_id)
+        user = state.users.get(user_id) if state is not None else None
+        if user is None or user.exposed_at + state.window != expires_at:
+            return False
+        self._evict(state, user_id)
+        return True
+
+    def _evict(self, state: _ExperimentState, user_id: str):
+        del state.users[user_id]
+        self._tracked -= 1
+        experiment_ids = self._user_experiments.get(user_id)
+        if experiment_ids is not None:
+            experiment_ids.remove(state.config.experiment_id)
+            if not experiment_ids:
+                del self._user_experiments[user_id]
+
+    def _evict_oldest(self):
+        # The user whose window closes first has the least left to contribute
+        while self._expiry:
+            if self._evict_entry(heapq.heappop(self._expiry)):
+                return
+
+    def _compact_expiry(self):
+        self._expiry = [
+            (user.exposed_at + state.window, next(self._sequence), experiment_id, user_id)
+            for experiment_id, state in self._experiments.items()
+            for user_id, user in state.users.items()
+        ]
+        heapq.heapify(self._expiry)
+
+    # Output
+
+    def metrics_for(self, experiment_id: str,
+                    computation_date: Optional[datetime] = None) -> List[ExperimentMetric]:
+        state = self._experiments.get(experiment_id)
+        if state is None:
+            return []
+        config = state.config
+        computation_date = computation_date or datetime.utcnow()
+        alpha = 1.0 - config.confidence
+        z = _NORMAL.inv_cdf(1.0 - alpha / 2)
+        variants = sorted({variant for variant, _ in state.stats}, key=lambda v: v.value)
+        rows = []
+        for index, metric in enumerate(config.metrics):
+            control = state.stats.get((config.control, index))
+            for variant in variants:
+                stats = state.stats.get((variant, index))
+                if stats is None:
+                    continue
+                mean, se = _mean_and_se(stats)
+                row = ExperimentMetric(
+                    experiment_id=experiment_id, variant=variant, metric_name=metric.name,
+                    metric_value=mean, metric_type=metric.metric_type, sample_size=stats.n,
+                    standard_error=se, confidence_interval_lower=mean - z * se,
+                    confidence_interval_upper=mean + z * se, computation_date=computation_date,
+                    aggregation_window=config.aggregation_window,
+                )
+                if variant is not config.control and control is not None and control.n > 1:
+                    control_mean, control_se = _mean_and_se(control)
+                    # Welch z-test on the difference of means
+                    diff_se = math.sqrt(se * se + control_se * control_se)
+                    if diff_se > 0:
+                        row.p_value = 2.0 * (1.0 - _NORMAL.cdf(abs(mean - control_mean) / diff_se))
+                        row.is_statistically_significant = row.p_value < alpha
+                    if control_mean:
+                        row.lift_percentage = (mean - control_mean) / abs(control_mean) * 100.0
+                rows.append(row)
+        return rows
+
+    def emit(self, experiment_ids: Optional[Iterable[str]] = None,
+             computation_date: Optional[datetime] = None) -> List[ExperimentMetric]:
+        """Compute rows for the given (default: all) experiments and publish them"""
+        rows = []
+        for experiment_id in experiment_ids if experiment_ids is not None else list(self._experiments):
+            rows.extend(self.metrics_for(experiment_id, computation_date))
+        for row in rows:
+            if self.producer is not None:
+                self.producer.produce(row, topic=KafkaTopics.EXPERIMENT_METRICS)
+            if self.on_metric is not None:
+                self.on_metric(row)
+        return rows
+
+    def finish(self, experiment_id: str) -> List[ExperimentMetric]:
+        """Emit final rows for an experiment and drop all of its state"""
+        rows = self.emit([experiment_id])
+        state = self._experiments.pop(experiment_id, None)
+        if state is not None:
+            for user_id in list(state.users):
+                experiment_ids = self._user_experiments.get(user_id)
+                if experiment_ids is not None:
+                    experiment_ids.remove(experiment_id)
+                    if not experiment_ids:
+                        del self._user_experiments[user_id]
+            self._tracked -= len(state.users)
+        return rows
+
+
+def _mean_and_se(stats) -> Tuple[float, float]:
+    if isinstance(stats, RatioStats):
+        return stats.mean, math.sqrt(stats.variance_of_mean)
+    se = math.sqrt(stats.variance / stats.n) if stats.n > 1 else 0.0
+    return stats.mean, se
+
+
+if __name__ == "__main__":
+    # 2,000 concurrent experiments, a known +5% watch-time effect in treatment
+    rng = random.Random(21)
+    num_experiments = 2000
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    start = datetime(2024, 1, 1)
+    events: List[Any] = []
+    for i in range(num_users):
+        user_id = f"user_{i}"
+        exposed_at = start + timedelta(seconds=i)
+        for experiment in [0] + rng.sample(range(1, num_experiments), 2):
+            variant = assign_variant(f"exp_{experiment}", user_id, traffic_allocation=1.0)
+            events.append(ExperimentExposure(experiment_id=f"exp_{experiment}", user_id=user_id,
+                                             variant=variant, exposure_timestamp=exposed_at))
+        lift = 1.05 if assign_variant("exp_0", user_id) is ExperimentVariant.TREATMENT_A else 1.0
+        for s in range(rng.randint(0, 4)):
+            events.append(ViewingSession(
+                user_id=user_id, session_start=exposed_at + timedelta(hours=s + 1),
+                session_end=exposed_at + timedelta(hours=s + 2),
+                total_watch_tie_seconds=int(rng.expovariate(1 / 1800.0) * lift),
+                is_completed=rng.random() < 0.4,
+            ))
+
+    analyzer = ExperimentAnalyzer(max_users_per_experiment=5_000)
+    t0 = time.perf_counter()
+    analyzer.process_many(events)
+    elapsed = time.perf_counter() - t0
+    rows = analyzer.emit()
+    print(f"{len(events):,} events, {num_experiments} experiments: {len(events) / elapsed:,.0f} events/sec, "
+          f"{len(rows):,} metric rows, {analyzer.tracked_users:,} users held in join state")
+    for row in rows:
+        if row.experiment_id == "exp_0" and row.metric_name == "watch_time_seconds":
+            print(f"exp_0 {row.variant.value}: {row.metric_value:.1f}s n={row.sample_size} "
+                  f"lift={row.lift_percentage} p={row.p_value}")
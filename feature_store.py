@@ -0,0 +1,510 @@
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import (
+    ContentMetadata, PlaybackEvent, UserInteractionEvent, UserRating, EventType
+)
+from real_time_event_streaming import KafkaTopics
+from sessionizer import PLAYING_EVENTS, STOPPED_EVENTS, ENDING_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Real-time per-user feature store
+# Rolling aggregates live in fixed-size ring buffers of time buckets: a slot
+# is reused (and zeroed) when a newer bucket maps onto it, so old data ages
+# out without a sweep and per-user memory is constant. Windows are rounded
+# to bucket edges: 1h is twelve 5-minute buckets, 24h is 24 hourly buckets
+# and 7d is 7 daily buckets (the current day included). All times are event
+# time; reads default to the latest event time seen.
+
+SNAPSHOT_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+
+def event_seconds(ts: datetime) -> float:
+    return (ts - EPOCH).total_seconds()
+
+
+class _RingSlab:
+    """
+    COLUMNS running sums for each of the last SLOTS buckets of WIDTH seconds,
+    one fixed-size row per user in two flat arrays (bucket ids and values)
+    """
+    __slots__ = ("width", "slots", "columns", "ids", "values", "_empty_ids", "_empty_values")
+
+    def __init__(self, width: int, slots: int, columns: int):
+        self.width = width
+        self.slots = slots
+        self.columns = columns
+        self._empty_ids = array("q", [-1]) * slots
+        self._empty_values = array("d", bytes(8 * slots * columns))
+        self.ids = array("q")
+        self.values = array("d")
+
+    def add_row(self):
+        self.ids.extend(self._empty_ids)
+        self.values.extend(self._empty_values)
+
+    def clear_row(self, row: int):
+        # Values are zeroed lazily when a slot is claimed by a new bucket
+        start = row * self.slots
+        self.ids[start:start + self.slots] = self._empty_ids
+
+    def offset(self, row: int, bucket: int) -> int:
+        """Index of bucket's first column in values, or -1 if it has aged out"""
+        index = row * self.slots + bucket % self.slots
+        current = self.ids[index]
+        base = index * self.columns
+        if current != bucket:
+            if current > bucket:
+                return -1
+            self.ids[index] = bucket
+            values = self.values
+            for i in range(base, base + self.columns):
+                values[i] = 0.0
+        return base
+
+    def totals(self, row: int, bucket: int) -> List[float]:
+        """Column sums over the SLOTS buckets ending at bucket"""
+        columns = self.columns
+        sums = [0.0] * columns
+        low = bucket - self.slots
+        start = row * self.slots
+        values = self.values
+        for index in range(start, start + self.slots):
+            current = self.ids[index]
+            if low < current <= bucket:
+                base = index * columns
+                for c in range(columns):
+                    sums[c] += values[base + c]
+        return sums
+
+
+# (width seconds, slots, columns) of the 1h, 24h and 7d rings
+FIVE_MINUTE_RING = (300, 12, 2)
+HOUR_RING = (3600, 24, 4)
+DAY_RING = (86400, 7, 3)
+RINGS = (FIVE_MINUTE_RING, HOUR_RING, DAY_RING)
+
+# Ring columns
+WATCH_SECONDS = 0
+SEARCHES_5M = 1
+BUFFERING_MS = 1
+PLAYBACK_EVENTS = 2
+SEARCHES_1H = 3
+RATINGS = 1
+RATING_SUM = 2
+
+
+@dataclass
+class FeatureStoreConfig:
+    # LRU cap: the least recently active users are evicted beyond this
+    max_users: int = 500_000
+    # Users with no event for this long are dropped
+    ttl_seconds: int = 7 * 86400
+    recent_genres: int = 10
+    # Same cap the sessionizer puts on time between playback events
+    max_watch_gap_seconds: int = 1800
+    # Ratings at or above this count towards recent genres
+    positive_rating: float = 4.0
+    # Open sessions tracked per user for watch time (several devices)
+    max_open_sessions: int = 4
+
+
+@dataclass
+class FeatureStoreMetrics:
+    # Events applied to the windows; skipped and late ones are counted
+    # separately, so the three add up to the events seen
+    events_processed: int = 0
+    events_skipped: int = 0
+    late_events_dropped: int = 0
+    users_expired: int = 0
+    users_evicted: int = 0
+
+
+@dataclass
+class UserFeatures:
+    user_id: str = ""
+    computed_at: datetime = field(default_factory=datetime.utcnow)
+    watch_minutes_1h: float = 0.0
+    watch_minutes_24h: float = 0.0
+    watch_minutes_7d: float = 0.0
+    avg_buffering_ms_24h: float = 0.0
+    playback_events_24h: int = 0
+    search_count_1h: int = 0
+    search_count_24h: int = 0
+    rating_count_7d: int = 0
+    avg_rating_7d: Optional[float] = None
+    # Most recent first
+    recent_genres: List[str] = field(default_factory=list)
+    last_event_at: Optional[datetime] = None
+
+
+class _UserState:
+    __slots__ = ("last_seen", "row", "genres", "sessions")
+
+    def __init__(self, last_seen: float, row: int, genres: Optional[Dict[str, None]] = None):
+        self.last_seen = last_seen
+        # Row in every ring slab
+        self.row = row
+        # genre -> None, oldest first
+        self.genres: Dict[str, None] = genres if genres is not None else {}
+        # session_id -> [last event seconds, playing]; not part of snapshots
+        self.sessions: Dict[str, list] = {}
+
+
+class FeatureStore:
+    """
+    Per-user features from PlaybackEvent, UserInteractionEvent and UserRating.
+
+    Writes are O(1) per event. get() and get_many() read at most 43 ring
+    slots per user, so point lookups stay in the tens of microseconds.
+    Users are kept in write order, which makes both TTL expiry (pop from the
+    front) and the LRU cap cheap; reads do not refresh a user's position.
+    Rows of evicted users are recycled, so the slabs never shrink but stop
+    growing at max_users.
+    """
+
+    def __init__(self, config: Optional[FeatureStoreConfig] = None):
+        self.config = config or FeatureStoreConfig()
+        self.metrics = FeatureStoreMetrics()
+        self._users: "OrderedDict[str, _UserState]" = OrderedDict()
+        self._fine, self._hourly, self._daily = self._slabs = tuple(_RingSlab(*ring) for ring in RINGS)
+        self._rows = 0
+        self._free_rows: List[int] = []
+        self._genres: Dict[str, Tuple[str, ...]] = {}
+        self._dirty: Dict[str, None] = {}
+        self._watermark = 0.0
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    @property
+    def pending(self) -> int:
+        """Users updated since the last publish()"""
+        return len(self._dirty)
+
+    # Catalog
+
+    def upsert_content(self, content: ContentMetadata):
+        self._genres[content.content_id] = tuple(content.genres)
+
+    def upsert_catalog(self, catalog: Iterable[ContentMetadata]):
+        for content in catalog:
+            self.upsert_content(content)
+
+    # Writes
+
+    def _new_row(self) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+            for slab in self._slabs:
+                slab.clear_row(row)
+            return row
+        for slab in self._slabs:
+            slab.add_row()
+        self._rows += 1
+        return self._rows - 1
+
+    def _drop(self, user_id: str, user: _UserState):
+        self._free_rows.append(user.row)
+        self._dirty.pop(user_id, None)
+
+    def _user(self, user_id: str, t: float) -> _UserState:
+        users = self._users
+        user = users.get(user_id)
+        if user is None:
+            if len(users) >= self.config.max_users:
+                self._drop(*users.popitem(last=False))
+                self.metrics.users_evicted += 1
+            user = users[user_id] = _UserState(t, self._new_row())
+        else:
+            users.move_to_end(user_id)
+            if t > user.last_seen:
+                user.last_seen = t
+        self._dirty[user_id] = None
+        if t > self._watermark:
+            self._watermark = t
+            if t >= self._next_sweep:
+                self._next_sweep = t + FIVE_MINUTE_RING[0]
+                self.expire()
+        return user
+
+    def _push_genres(self, user: _UserState, content_id: str):
+        genres = self._genres.get(content_id)
+        if not genres:
+            return
+        recent = user.genres
+        for genre in genres:
+            recent.pop(genre, None)
+            recent[genre] = None
+        while len(recent) > self.config.recent_genres:
+            del recent[next(iter(recent))]
+
+    def add_playback(self, event: PlaybackEvent):
+        t = event_seconds(event.event_timestamp)
+        user = self._user(event.user_id, t)
+        sessions = user.sessions
+        cursor = sessions.get(event.session_id)
+        event_type = event.event_type
+        watched = 0.0
+        if cursor is None:
+            self._push_genres(user, event.content_id)
+            sessions[event.session_id] = [t, event_type in PLAYING_EVENTS]
+            if len(sessions) > self.config.max_open_sessions:
+                del sessions[next(iter(sessions))]
+        elif t >= cursor[0]:
+            # Watch time accrues between events while playing, as in the sessionizer
+            if cursor[1]:
+                watched = min(t - cursor[0], self.config.max_watch_gap_seconds)
+            cursor[0] = t
+            if event_type in PLAYING_EVENTS:
+                cursor[1] = True
+            elif event_type in STOPPED_EVENTS:
+                cursor[1] = False
+        if event_type in ENDING_EVENTS:
+            sessions.pop(event.session_id, None)
+
+        row = user.row
+        seconds = int(t)
+        hourly = self._hourly
+        i = hourly.offset(row, seconds // hourly.width)
+        if i < 0:
+            self.metrics.late_events_dropped += 1
+            return
+        values = hourly.values
+        values[i + WATCH_SECONDS] += watched
+        values[i + BUFFERING_MS] += event.buffering_duration_ms
+        values[i + PLAYBACK_EVENTS] += 1
+        if watched:
+            for slab in (self._fine, self._daily):
+                i = slab.offset(row, seconds // slab.width)
+                if i >= 0:
+                    slab.values[i + WATCH_SECONDS] += watched
+        self.metrics.events_processed += 1
+
+    def add_interaction(self, event: UserInteractionEvent):
+        # Only searches feed features; other interactions do not create state
+        if event.event_type is not EventType.SEARCH or not event.user_id:
+            self.metrics.events_skipped += 1
+            return
+        t = event_seconds(event.event_timestamp)
+        row = self._user(event.user_id, t).row
+        hourly, fine = self._hourly, self._fine
+        i = hourly.offset(row, int(t) // hourly.width)
+        if i < 0:
+            self.metrics.late_events_dropped += 1
+            return
+        hourly.values[i + SEARCHES_1H] += 1
+        i = fine.offset(row, int(t) // fine.width)
+        if i >= 0:
+            fine.values[i + SEARCHES_5M] += 1
+        self.metrics.events_processed += 1
+
+    def add_rating(self, rating: UserRating):
+        t = event_seconds(rating.rating_timestamp)
+        user = self._user(rating.user_id, t)
+        if rating.rating_value >= self.config.positive_rating:
+            self._push_genres(user, rating.content_id)
+        daily = self._daily
+        i = daily.offset(user.row, int(t) // daily.width)
+        if i < 0:
+            self.metrics.late_events_dropped += 1
+            return
+        daily.values[i + RATINGS] += 1
+        daily.values[i + RATING_SUM] += rating.rating_value
+        self.metrics.events_processed += 1
+
+    def process(self, event):
+        if isinstance(event, PlaybackEvent):
+            self.add_playback(event)
+        elif isinstance(event, UserInteractionEvent):
+            self.add_interaction(event)
+        elif isinstance(event, UserRating):
+            self.add_rating(event)
+        else:
+            self.metrics.events_skipped += 1
+
+    def process_many(self, events: Iterable):
+        for event in events:
+            self.process(event)
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Drop users idle for longer than the TTL; returns how many"""
+        horizon = (event_seconds(now) if now is not None else self._watermark) - self.config.ttl_seconds
+        users = self._users
+        expired = 0
+        # Write order is (nearly) event-time order, so stop at the first live user
+        while users:
+            user_id, user = next(iter(users.items()))
+            if user.last_seen >= horizon:
+                break
+            del users[user_id]
+            self._drop(user_id, user)
+            expired += 1
+        self.metrics.users_expired += expired
+        return expired
+
+    # Reads
+
+    def _features(self, user_id: str, user: Optional[_UserState], t: float,
+                  computed_at: datetime) -> UserFeatures:
+        if user is None or user.last_seen < t - self.config.ttl_seconds:
+            return UserFeatures(user_id=user_id, computed_at=computed_at)
+        row = user.row
+        seconds = int(t)
+        fine, hourly, daily = self._slabs
+        watch_1h, searches_1h = fine.totals(row, seconds // fine.width)
+        watch_24h, buffering_ms, playback_events, searches_24h = hourly.totals(row, seconds // hourly.width)
+        watch_7d, ratings, rating_sum = daily.totals(row, seconds // daily.width)
+        return UserFeatures(
+            user_id=user_id, computed_at=computed_at,
+            watch_minutes_1h=watch_1h / 60.0, watch_minutes_24h=watch_24h / 60.0,
+            watch_minutes_7d=watch_7d / 60.0,
+            avg_buffering_ms_24h=buffering_ms / playback_events if playback_events else 0.0,
+            playback_events_24h=int(playback_events),
+            search_count_1h=int(searches_1h), search_count_24h=int(searches_24h),
+            rating_count_7d=int(ratings), avg_rating_7d=rating_sum / ratings if ratings else None,
+            recent_genres=list(reversed(user.genres)),
+            last_event_at=EPOCH + timedelta(seconds=user.last_seen),
+        )
+
+    def _read_time(self, now: Optional[datetime]) -> Tuple[float, datetime]:
+        if now is not None:
+            return event_seconds(now), now
+        return self._watermark, EPOCH + timedelta(seconds=self._watermark)
+
+    def get(self, user_id: str, now: Optional[datetime] = None) -> UserFeatures:
+        """Features as of now (default: the latest event time seen)"""
+        t, computed_at = self._read_time(now)
+        return self._features(user_id, self._users.get(user_id), t, computed_at)
+
+    def get_many(self, user_ids: Iterable[str], now: Optional[datetime] = None) -> List[UserFeatures]:
+        """Batched lookup for a ranking request, in the order of user_ids"""
+        t, computed_at = self._read_time(now)
+        users = self._users
+        features = self._features
+        return [features(user_id, users.get(user_id), t, computed_at) for user_id in user_ids]
+
+    def publish(self, producer, now: Optional[datetime] = None) -> int:
+        """Produce features of every user updated since the last publish"""
+        rows = self.get_many(self._dirty, now)
+        self._dirty = {}
+        for row in rows:
+            producer.produce(row, topic=KafkaTopics.REAL_TIME_FEATURES)
+        return len(rows)
+
+    # Snapshots
+
+    def save(self, path: str):
+        """
+        Snapshot to local disk atomically (write temp file, then rename): a
+        JSON header with users, their slab rows and genres, then the raw
+        slab arrays. Open-session cursors are not saved; at most one gap of
+        watch time per session is lost across a restart.
+        """
+        header = json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "config": asdict(self.config),
+            "watermark": self._watermark,
+            "rows": self._rows,
+            "users": [[user_id, user.last_seen, user.row, list(user.genres)]
+                      for user_id, user in self._users.items()],
+        }).encode("utf-8")
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for slab in self._slabs:
+                slab.ids.tofile(f)
+                slab.values.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureStore":
+        with open(path, "rb") as f:
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length))
+            if header["version"] != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported feature snapshot version {header['version']}")
+            store = cls(FeatureStoreConfig(**header["config"]))
+            rows = store._rows = header["rows"]
+            for slab in store._slabs:
+                slab.ids.fromfile(f, rows * slab.slots)
+                slab.values.fromfile(f, rows * slab.slots * slab.columns)
+        store._watermark = header["watermark"]
+        store._next_sweep = store._watermark + FIVE_MINUTE_RING[0]
+        users = store._users
+        for user_id, last_seen, row, genres in header["users"]:
+            users[user_id] = _UserState(last_seen, row, dict.fromkeys(genres))
+        used = {user.row for user in users.values()}
+        store._free_rows = [row for row in range(rows) if row not in used]
+        return store
+
+
+if __name__ == "__main__":
+    # Ingest throughput, lookup latency and snapshot restart time
+    from load_generator import LoadGenerator, LoadProfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    profile = LoadProfile(num_users=50_000, peak_events_per_second=50.0, concurrent_sessions=2000)
+    rng = random.Random(7)
+    genres = ["drama", "comedy", "action", "thriller", "documentary", "animation", "horror", "romance"]
+    store = FeatureStore()
+    store.upsert_catalog(
+        ContentMetadata(content_id=f"content_{i}", genres=rng.sample(genres, 2))
+        for i in range(profile.num_contents)
+    )
+    mix = {PlaybackEvent: 0.8, UserInteractionEvent: 0.15, UserRating: 0.05}
+    events = list(LoadGenerator(profile).mixed_stream(n, mix))
+
+    start = time.perf_counter()
+    store.process_many(events)
+    ingest_secs = time.perf_counter() - start
+    span = events[-1].event_timestamp - events[0].event_timestamp
+    print(f"{n:,} events over {span}: {n / ingest_secs:,.0f} events/sec, {len(store):,} users, {store.metrics}")
+
+    user_ids = list(store._users)
+    sample = [rng.choice(user_ids) for _ in range(20_000)]
+    latencies = []
+    for user_id in sample:
+        start = time.perf_counter()
+        store.get(user_id)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"get: p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us")
+    start = time.perf_counter()
+    for i in range(0, len(sample), 500):
+        store.get_many(sample[i:i + 500])
+    print(f"get_many(500): {(time.perf_counter() - start) / (len(sample) / 500) * 1e3:.2f} ms per batch")
+    print(store.get(max(user_ids, key=lambda u: store.get(u).watch_minutes_24h)))
+
+    path = os.path.join(tempfile.mkdtemp(prefix="features-"), "features.snapshot")
+    start = time.perf_counter()
+    store.save(path)
+    save_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    restored = FeatureStore.load(path)
+    load_secs = time.perf_counter() - start
+    assert restored.get_many(sample[:1000]) == store.get_many(sample[:1000])
+    print(f"snapshot {os.path.getsize(path) / 1e6:.1f} MB: save {save_secs * 1e3:.0f} ms, "
+          f"load {load_secs * 1e3:.0f} ms")
@@ -0,0 +1,763 @@
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import Counter as _Tally
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Hot-path instrumentation
+# A stage is any function or method on the pipeline's hot path (validation,
+# to_dict / fast_json / Avro serialization, produce, broker fetch/commit).
+# Instrumenting a stage swaps it for a timing wrapper in place; disabling
+# puts the original object back, so a disabled stage costs nothing at all.
+#
+# Latencies go into HDR-style histograms: log-linear buckets with a fixed
+# relative error, one counts array per thread so recording takes no lock.
+# Shards are merged only when metrics are scraped, and the shard of a thread
+# that exits is folded into a retired total and freed. Queue depths and consumer
+# lag are callback gauges, read at scrape time rather than updated per
+# record. Everything renders in the Prometheus text format, to a textfile
+# (node_exporter collector) or a small HTTP endpoint.
+#
+# A SamplingProfiler attached to a stage samples the stacks of threads
+# currently inside it and reports them in collapsed (flamegraph) form.
+
+
+@dataclass
+class InstrumentationConfig:
+    namespace: str = "pipeline"
+    # HDR precision: values below 2**significant_bits are exact, above that
+    # a bucket spans at most 1 / 2**(significant_bits - 1) of its value
+    significant_bits: int = 6
+    # Larger values (in ns: about 18 minutes) land in an overflow bucket
+    max_value_bits: int = 40
+    # Prometheus "le" bounds the HDR buckets are folded into on export
+    latency_buckets_seconds: Tuple[float, ...] = (
+        1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+        0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+    )
+
+
+def _bucket_index(value: int, bits: int) -> int:
+    length = value.bit_length()
+    if length <= bits:
+        return value
+    shift = length - bits
+    return (shift << (bits - 1)) + (value >> shift)
+
+
+def _bucket_bounds(index: int, bits: int) -> Tuple[int, int]:
+    # [low, high) of the values that map to index
+    if index < 1 << bits:
+        return index, index + 1
+    shift = (index >> (bits - 1)) - 1
+    mantissa = index - (shift << (bits - 1))
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class _ThreadToken:
+    # Lives only in a thread's locals, so it is collected when the thread exits
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """One array per recording thread; readers sum the arrays"""
+
+    __slots__ = ("_size", "_local", "_shards", "_retired", "_lock")
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[array] = []
+        # Totals of threads that have exited, so their shards can be freed
+        self._retired = array("q", bytes(8 * size))
+        # Reentrant: a retiring finalizer may run in a thread that holds it
+        self._lock = threading.RLock()
+
+    def _shard(self) -> array:
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = array("q", bytes(8 * self._size))
+            with self._lock:
+                self._shards.append(cells)
+            token = self._local.token = _ThreadToken()
+            retire = weakref.finalize(token, _Sharded._retire, self._lock, self._shards, self._retired, cells)
+            retire.atexit = False
+            self._local.cells = cells
+            return cells
+
+    @staticmethod
+    def _retire(lock, shards: List[array], retired: array, cells: array):
+        # Called once the owning thread is gone, so cells no longer change.
+        # Arrays compare by value, hence the identity search.
+        with lock:
+            for i, shard in enumerate(shards):
+                if shard is cells:
+                    del shards[i]
+                    break
+            for i, value in enumerate(cells):
+                retired[i] += value
+
+    def _merged(self) -> List[int]:
+        with self._lock:
+            shards = list(self._shards)
+            totals = self._retired.tolist()
+        if not shards:
+            return totals
+        return [sum(column) for column in zip(totals, *shards)]
+
+
+class Counter(_Sharded):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: int = 1):
+        self._shard()[0] += amount
+
+    @property
+    def value(self) -> int:
+        return self._merged()[0]
+
+
+class Gauge:
+    """Settable value, or fn() read at scrape time"""
+
+    __slots__ = ("_value", "fn")
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self._value = 0.0
+        self.fn = fn
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        if self.fn is None:
+            return self._value
+        try:
+            return float(self.fn())
+        except Exception:
+            logger.exception("Gauge callback raised")
+            return float("nan")
+
+
+class Histogram(_Sharded):
+    """
+    Log-linear (HDR-style) histogram of non-negative integers.
+
+    cells[0:overflow] count values per bucket, cells[overflow] counts values
+    of max_value_bits or more and the last cell is the running sum.
+    """
+
+    __slots__ = ("bits", "overflow", "scale", "_export_cache")
+
+    def __init__(self, significant_bits: int = 6, max_value_bits: int = 40, scale: float = 1.0):
+        if not 2 <= significant_bits < max_value_bits:
+            raise ValueError("need 2 <= significant_bits < max_value_bits")
+        self.bits = significant_bits
+        self.overflow = _bucket_index((1 << max_value_bits) - 1, significant_bits) + 1
+        # Exported value = recorded value * scale (ns -> seconds for latencies)
+        self.scale = scale
+        self._export_cache: Dict[Tuple[float, ...], array] = {}
+        super().__init__(self.overflow + 2)
+
+    def record(self, value: int):
+        cells = self._shard()
+        index = _bucket_index(value, self.bits)
+        cells[index if index < self.overflow else self.overflow] += 1
+        cells[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], int, int]:
+        # (bucket counts, count, sum)
+        merged = self._merged()
+        counts = merged[:-1]
+        return counts, sum(counts), merged[-1]
+
+    @property
+    def count(self) -> int:
+        return self.snapshot()[1]
+
+    def percentile(self, percentile: float) -> float:
+        # Midpoint of the bucket holding the rank, scaled
+        counts, total, _ = self.snapshot()
+        if not total:
+            return 0.0
+        rank = max(1, int(total * percentile / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                if index == self.overflow:
+                    return float("inf")
+                low, high = _bucket_bounds(index, self.bits)
+                return (low + high - 1) / 2 * self.scale
+        return float("inf")
+
+    def export_buckets(self, bounds: Tuple[float, ...], counts: Optional[List[int]] = None) -> List[int]:
+        # Cumulative counts per bound plus +Inf. A bucket is folded into the
+        # first bound at or above its lower edge, so counts are off by at
+        # most the HDR relative error
+        slots = self._export_cache.get(bounds)
+        if slots is None:
+            scaled = [bound / self.scale for bound in bounds]
+            slots = self._export_cache[bounds] = array("i", [
+                bisect_left(scaled, _bucket_bounds(i, self.bits)[0]) for i in range(self.overflow)
+            ] + [len(bounds)])
+        if counts is None:
+            counts = self.snapshot()[0]
+        folded = [0] * (len(bounds) + 1)
+        for index, count in enumerate(counts):
+            if count:
+                folded[slots[index]] += count
+        for i in range(1, len(folded)):
+            folded[i] += folded[i - 1]
+        return folded
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+@dataclass
+class _Family:
+    name: str
+    kind: str
+    help: str
+    children: Dict[Tuple[Tuple[str, str], ...], Any] = field(default_factory=dict)
+
+
+class Registry:
+    def __init__(self, config: Optional[InstrumentationConfig] = None):
+        self.config = config or InstrumentationConfig()
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, str], factory: Callable[[], Any]):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = _Family(name, kind, help)
+            elif family.kind != kind:
+                raise ValueError(f"{name} is already registered as a {family.kind}")
+            metric = family.children.get(key)
+            if metric is None:
+                metric = family.children[key] = factory()
+            return metric
+
+    def counter(self, name: str, help: str = "", **labels: str) -> Counter:
+        return self._get("counter", name, help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", fn: Optional[Callable[[], float]] = None,
+              **labels: str) -> Gauge:
+        gauge = self._get("gauge", name, help, labels, Gauge)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, help: str = "", scale: float = 1.0, **labels: str) -> Histogram:
+        config = self.config
+        return self._get("histogram", name, help, labels,
+                         lambda: Histogram(config.significant_bits, config.max_value_bits, scale))
+
+    def unregister(self, name: str, **labels: str):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is not None:
+                family.children.pop(key, None)
+                if not family.children:
+                    del self._families[name]
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            families = [(f.name, f.kind, f.help, list(f.children.items())) for f in self._families.values()]
+        bounds = self.config.latency_buckets_seconds
+        les = [f'le="{_number(bound)}"' for bound in bounds] + ['le="+Inf"']
+        lines = []
+        for name, kind, help, children in sorted(families):
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(children, key=lambda child: child[0]):
+                if kind == "histogram":
+                    counts, count, total = metric.snapshot()
+                    for le, cumulative in zip(les, metric.export_buckets(bounds, counts)):
+                        lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total * metric.scale)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        # Atomic replace, as the node_exporter textfile collector expects
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics from a daemon thread; stop with server.shutdown()"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics endpoint: " + format, *args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", host, server.server_address[1])
+        return server
+
+
+REGISTRY = Registry()
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of threads that are inside attached stages.
+
+    A background thread wakes every interval_ms and reads the frames of the
+    threads currently marked active by a stage wrapper, so stages without a
+    profiler attached pay nothing and attached ones pay a dict store per
+    call. Stacks are cut at the stage wrapper and tallied in collapsed form:
+    "stage;module:function;... count".
+    """
+
+    def __init__(self, interval_ms: float = 5.0, max_depth: int = 48, max_stacks: int = 10_000):
+        self.interval_seconds = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self.stacks: _Tally = _Tally()
+        # Thread ident -> stage name, written by the stage wrappers
+        self._active: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, owner: Any, attr: str, stage: Optional[str] = None, group: Optional[str] = None,
+               registry: Optional[Registry] = None) -> "Stage":
+        current = _patched.get((id(owner), attr))
+        if current is not None:
+            stage = stage or current.stage.name
+            group = group or current.stage.group
+            registry = registry or current.stage.registry
+        return instrument(owner, attr, stage, group or "custom", registry, profiler=self)
+
+    def detach(self, owner: Any, attr: str):
+        # Keep the stage timed, without the profiler
+        current = _patched.get((id(owner), attr))
+        if current is not None and current.profiler is self:
+            instrument(owner, attr, current.stage.name, current.stage.group, current.stage.registry)
+
+    def start(self) -> "SamplingProfiler":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, stage in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                self._sample(stage, frame)
+
+    def _sample(self, stage: str, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            if code is _PROFILED_CODE:
+                break
+            if code is not _WRAPPER_CODE:
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        names.append(stage)
+        key = ";".join(reversed(names))
+        if key not in self.stacks and len(self.stacks) >= self.max_stacks:
+            key = f"{stage};[other]"
+        self.stacks[key] += 1
+        self.samples += 1
+
+    def collapsed(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def write_collapsed(self, path: str):
+        # Input for flamegraph.pl / speedscope
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+
+    def top(self, n: int = 10) -> List[Tuple[str, int]]:
+        # Functions by self samples (leaf of the stack)
+        leaves: _Tally = _Tally()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+class Stage:
+    __slots__ = ("name", "group", "registry", "latency", "errors")
+
+    def __init__(self, name: str, group: str, registry: Registry):
+        namespace = registry.config.namespace
+        self.name = name
+        self.group = group
+        self.registry = registry
+        self.latency = registry.histogram(f"{namespace}_stage_latency_seconds", "Wall time per stage call",
+                                          scale=1e-9, group=group, stage=name)
+        self.errors = registry.counter(f"{namespace}_stage_errors_total", "Stage calls that raised",
+                                       group=group, stage=name)
+
+
+class _Patch:
+    __slots__ = ("owner", "attr", "original", "stage", "profiler")
+
+    def __init__(self, owner: Any, attr: str, original: Any, stage: Stage,
+                 profiler: Optional[SamplingProfiler]):
+        self.owner = owner
+        self.attr = attr
+        self.original = original
+        self.stage = stage
+        self.profiler = profiler
+
+
+# (id(owner), attr) -> patch; the owner is kept alive by the patch itself
+_patched: Dict[Tuple[int, str], _Patch] = {}
+_patch_lock = threading.RLock()
+
+
+def _timed(func: Callable, stage: Stage) -> Callable:
+    # The per-call path is inlined here rather than calling Histogram.record:
+    # two clock reads, a thread-local lookup and two array increments
+    histogram = stage.latency
+    local = histogram._local
+    shard = histogram._shard
+    bits = histogram.bits
+    half = bits - 1
+    overflow = histogram.overflow
+    errors = stage.errors
+    clock = time.perf_counter_ns
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            elapsed = clock() - start
+            try:
+                cells = local.cells
+            except AttributeError:
+                cells = shard()
+            length = elapsed.bit_length()
+            if length <= bits:
+                cells[elapsed] += 1
+            else:
+                index = ((length - bits) << half) + (elapsed >> (length - bits))
+                cells[index if index < overflow else overflow] += 1
+            cells[-1] += elapsed
+
+    return _named(wrapper, func)
+
+
+def _profiled(timed: Callable, stage: Stage, profiler: SamplingProfiler) -> Callable:
+    # Marks the thread as inside the stage for the sampler; nested stages
+    # hand the mark back on the way out
+    active = profiler._active
+    name = stage.name
+    get_ident = threading.get_ident
+
+    def profiled(*args, **kwargs):
+        ident = get_ident()
+        outer = active.get(ident)
+        active[ident] = name
+        try:
+            return timed(*args, **kwargs)
+        finally:
+            if outer is None:
+                active.pop(ident, None)
+            else:
+                active[ident] = outer
+
+    return _named(profiled, timed.__wrapped__)
+
+
+def _named(wrapper: Callable, func: Callable) -> Callable:
+    wrapper.__wrapped__ = func
+    wrapper.__name__ = getattr(func, "__name__", wrapper.__name__)
+    wrapper.__qualname__ = getattr(func, "__qualname__", wrapper.__name__)
+    wrapper.__doc__ = getattr(func, "__doc__", None)
+    return wrapper
+
+
+def _code(factory: Callable, name: str):
+    return next(const for const in factory.__code__.co_consts if inspect.iscode(const) and const.co_name == name)
+
+
+# Profiler stack walks skip the timing frame and stop at the stage entry
+_WRAPPER_CODE = _code(_timed, "wrapper")
+_PROFILED_CODE = _code(_profiled, "profiled")
+
+
+def instrument(owner: Any, attr: str, stage: Optional[str] = None, group: str = "custom",
+               registry: Optional[Registry] = None,
+               profiler: Optional[SamplingProfiler] = None) -> Stage:
+    """
+    Replace owner.attr (a function, method, staticmethod or classmethod on
+    a class or module) with a timed wrapper recording into registry.
+    Instrumenting again replaces the previous wrapper.
+    """
+    registry = registry or REGISTRY
+    with _patch_lock:
+        key = (id(owner), attr)
+        previous = _patched.get(key)
+        original = previous.original if previous is not None else inspect.getattr_static(owner, attr)
+        if stage is None:
+            stage = f"{getattr(owner, '__name__', type(owner).__name__)}.{attr}"
+        timed = Stage(stage, group, registry)
+        func = original.__func__ if isinstance(original, (staticmethod, classmethod)) else original
+        if not callable(func):
+            raise TypeError(f"{stage} is not callable")
+        replacement = _timed(func, timed)
+        if profiler is not None:
+            replacement = _profiled(replacement, timed, profiler)
+        if isinstance(original, (staticmethod, classmethod)):
+            replacement = type(original)(replacement)
+        setattr(owner, attr, replacement)
+        _patched[key] = _Patch(owner, attr, original, timed, profiler)
+        return timed
+
+
+def uninstrument(owner: Any, attr: str) -> bool:
+    with _patch_lock:
+        patch = _patched.pop((id(owner), attr), None)
+        if patch is None:
+            return False
+        setattr(owner, attr, patch.original)
+        return True
+
+
+def instrumented() -> List[Stage]:
+    with _patch_lock:
+        return [patch.stage for patch in _patched.values()]
+
+
+def default_stages() -> Iterable[Tuple[str, Any, str]]:
+    """(group, owner, attribute) for the pipeline's hot paths"""
+    import core_data_domains
+    import fast_json
+    from avro_codec import AvroEventSerde
+    from event_producer import EventProducer
+    from local_broker import InMemoryBroker
+
+    yield "validation", core_data_domains.DataValidator, "validate_playback_event"
+    for value in vars(core_data_domains).values():
+        if isinstance(value, type) and value.__module__ == core_data_domains.__name__:
+            for attr in ("to_dict", "to_json"):
+                if attr in vars(value):
+                    yield "serialization", value, attr
+    yield "serialization", fast_json, "encode"
+    yield "serialization", fast_json, "encode_many"
+    yield "serialization", AvroEventSerde, "serialize"
+    yield "serialization", AvroEventSerde, "deserialize"
+    yield "streaming", EventProducer, "produce"
+    yield "streaming", EventProducer, "_send"
+    yield "streaming", InMemoryBroker, "produce_batch"
+    yield "streaming", InMemoryBroker, "fetch"
+    yield "streaming", InMemoryBroker, "commit"
+
+
+def enable(registry: Optional[Registry] = None,
+           groups: Sequence[str] = ("validation", "serialization", "streaming")) -> List[Stage]:
+    stages = [instrument(owner, attr, group=group, registry=registry)
+              for group, owner, attr in default_stages() if group in groups]
+    logger.info("Instrumented %d pipeline stages", len(stages))
+    return stages
+
+
+def disable():
+    # Restores every original, including stages instrumented by hand
+    with _patch_lock:
+        for patch in list(_patched.values()):
+            uninstrument(patch.owner, patch.attr)
+
+
+def watch_producer(producer: Any, name: str = "default", registry: Optional[Registry] = None):
+    """Queue depth gauges for an EventProducer, read at scrape time"""
+    registry = registry or REGISTRY
+    namespace = registry.config.namespace
+    ref = weakref.ref(producer)
+
+    def in_flight() -> int:
+        p = ref()
+        return len(p) if p is not None else 0
+
+    def open_batches() -> int:
+        p = ref()
+        return len(p._open) + len(p._ready) if p is not None else 0
+
+    registry.gauge(f"{namespace}_queue_depth_records", "Records waiting in a queue", fn=in_flight,
+                   queue=f"producer:{name}")
+    registry.gauge(f"{namespace}_producer_pending_batches", "Open and ready producer batches",
+                   fn=open_batches, producer=name)
+
+
+def watch_consumer_lag(broker: Any, group_id: str, topics: Iterable[str], registry: Optional[Registry] = None):
+    """Records between each topic's end and group_id's committed offsets"""
+    registry = registry or REGISTRY
+    namespace = registry.config.namespace
+    for topic in topics:
+        def lag(topic: str = topic) -> int:
+            if not broker.has_topic(topic):
+                return 0
+            return sum(broker.end_offset(topic, p) - broker.committed(group_id, topic, p)
+                       for p in range(broker.num_partitions(topic)))
+        registry.gauge(f"{namespace}_consumer_lag_records", "Records not yet committed by the group",
+                       fn=lag, group_id=group_id, topic=topic)
+
+
+if __name__ == "__main__":
+    # Overhead per call (disabled, enabled, enabled + profiler) and a
+    # scrape after a producer run
+    import tempfile
+
+    from core_data_domains import DataValidator
+    from event_producer import EventProducer
+    from load_generator import LoadGenerator, LoadProfile
+    from real_time_event_streaming import KafkaTopics
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    events = list(LoadGenerator(LoadProfile()).playback_events(n))
+
+    def per_call(fn: Callable[[], Any], rounds: int = 3) -> float:
+        best = float("inf")
+        for _ in range(rounds):
+            start = time.perf_counter_ns()
+            fn()
+            best = min(best, time.perf_counter_ns() - start)
+        return best / n
+
+    def validate_all():
+        validate = DataValidator.validate_playback_event
+        for event in events:
+            validate(event)
+
+    original = inspect.getattr_static(DataValidator, "validate_playback_event")
+    baseline = per_call(validate_all)
+    instrument(DataValidator, "validate_playback_event", group="validation")
+    enabled = per_call(validate_all)
+    with SamplingProfiler(interval_ms=1.0) as profiler:
+        profiler.attach(DataValidator, "validate_playback_event")
+        profiled = per_call(validate_all)
+    disable()
+    assert inspect.getattr_static(DataValidator, "validate_playback_event") is original
+    disabled = per_call(validate_all)
+    print(f"validate_playback_event: {baseline:.0f}ns/call bare, +{enabled - baseline:.0f}ns instrumented, "
+          f"+{profiled - baseline:.0f}ns with profiler attached, +{disabled - baseline:.0f}ns after disable()")
+    print(f"profiler: {profiler.samples} samples, top {profiler.top(3)}")
+
+    registry = Registry()
+    stages = enable(registry)
+    producer = EventProducer(max_queue_records=n + 1)
+    watch_producer(producer, registry=registry)
+    topic = KafkaTopics.PLAYBACK_EVENTS.value
+    watch_consumer_lag(producer.broker, "analytics", [topic], registry=registry)
+    start = time.perf_counter()
+    for event in events:
+        DataValidator.validate_playback_event(event)
+        producer.produce(event)
+    producer.close()
+    elapsed = time.perf_counter() - start
+    # A consumer group that has read half of each partition
+    broker = producer.broker
+    for partition in range(broker.num_partitions(topic)):
+        half = broker.end_offset(topic, partition) // 2
+        offset = 0
+        while offset < half:
+            offset += len(broker.fetch(topic, partition, offset, min(500, half - offset)))
+            broker.commit("analytics", topic, partition, offset)
+    disable()
+    print(f"validate + produce, instrumented: {n / elapsed:,.0f} events/sec")
+    for stage in stages:
+        histogram = stage.latency
+        if histogram.count:
+            print(f"  {stage.group}/{stage.name}: {histogram.count:,} calls, "
+                  f"p50 {histogram.percentile(50) * 1e6:.2f}us, p99 {histogram.percentile(99) * 1e6:.2f}us")
+
+    start = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    path = os.path.join(tempfile.mkdtemp(), "pipeline.prom")
+    registry.write_textfile(path)
+    print(f"scrape: {len(text.splitlines())} lines in {render_ms:.1f}ms, written to {path}")
+    print("\n".join(line for line in text.splitlines() if "queue_depth" in line or "consumer_lag" in line))
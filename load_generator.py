@@ -0,0 +1,569 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from bisect import bisect
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from math import exp
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from core_data_domains import (
+    PlaybackEvent, UserInteractionEvent, QoSTelemtry, UserRating, PaymentTransaction,
+    ExperimentExposure, ErrorEvent, EventType, DeviceType, ContentType, VideoQuality,
+    ExperimentVariant
+)
+
+# Synthetic load generator
+# Seeded, reproducible event streams for every domain model: Zipfian content
+# popularity, session-shaped playback, device/country mixes and a diurnal
+# traffic curve. The same seed and profile always produce the same events,
+# so benchmark numbers are comparable across commits.
+
+DEVICE_MIX = {
+    DeviceType.TV_SMART_TV: 0.38,
+    DeviceType.MOBILE_IOS: 0.17,
+    DeviceType.MOBILE_ANDROID: 0.16,
+    DeviceType.WEB_DESKTOP: 0.14,
+    DeviceType.TABLET: 0.07,
+    DeviceType.GAME_CONSOLE: 0.05,
+    DeviceType.WEB_MOBILE: 0.03,
+}
+
+COUNTRY_MIX = {
+    "US": 0.32, "BR": 0.09, "GB": 0.07, "DE": 0.06, "MX": 0.06, "FR": 0.05, "CA": 0.05,
+    "IN": 0.05, "JP": 0.04, "ES": 0.04, "AU": 0.03, "IT": 0.03, "KR": 0.03, "NL": 0.02,
+    "AR": 0.02, "SE": 0.02, "PL": 0.02,
+}
+
+# Relative traffic per UTC hour: overnight trough, evening prime-time peak
+DIURNAL_CURVE = [
+    0.55, 0.40, 0.28, 0.20, 0.16, 0.15, 0.18, 0.25, 0.33, 0.40, 0.45, 0.50,
+    0.56, 0.60, 0.62, 0.66, 0.72, 0.82, 0.95, 1.00, 1.00, 0.97, 0.88, 0.72,
+]
+
+QUALITY_BY_DEVICE = {
+    DeviceType.TV_SMART_TV: (VideoQuality.UHD_4K, 14000),
+    DeviceType.GAME_CONSOLE: (VideoQuality.UHD_4K, 12000),
+    DeviceType.WEB_DESKTOP: (VideoQuality.HD_1080P, 5000),
+    DeviceType.TABLET: (VideoQuality.HD_1080P, 4500),
+    DeviceType.MOBILE_IOS: (VideoQuality.HD_720P, 2500),
+    DeviceType.MOBILE_ANDROID: (VideoQuality.HD_720P, 2500),
+    DeviceType.WEB_MOBILE: (VideoQuality.SD_480P, 1200),
+}
+
+NETWORK_MIX = {"wifi": 0.62, "ethernet": 0.18, "4g": 0.12, "5g": 0.07, "3g": 0.01}
+
+# Default share of each model in mixed_stream()
+EVENT_MIX = {
+    PlaybackEvent: 0.55,
+    QoSTelemtry: 0.22,
+    UserInteractionEvent: 0.17,
+    ErrorEvent: 0.02,
+    ExperimentExposure: 0.02,
+    UserRating: 0.01,
+    PaymentTransaction: 0.01,
+}
+
+ERROR_CATALOG = [
+    ("playback", "PLAYBACK_DRM_LICENSE", "License request failed", "error", "/v1/license"),
+    ("playback", "PLAYBACK_MANIFEST_404", "Manifest not found", "error", "/v1/manifest"),
+    ("network", "NETWORK_TIMEOUT", "Request timed out after 10000ms", "warning", "/v1/heartbeat"),
+    ("network", "CDN_5XX", "CDN returned 503", "error", None),
+    ("api", "API_RATE_LIMITED", "Too many requests", "warning", "/v1/recommendations"),
+    ("api", "API_INTERNAL", "Unexpected server error", "critical", "/v1/profile"),
+    ("client", "CLIENT_DECODER_FAILURE", "Hardware decoder reset", "error", None),
+]
+
+SEARCH_TERMS = [
+    "action", "comedy", "documentary", "thriller", "anime", "kids", "romance", "horror",
+    "sci fi", "true crime", "stand up", "cooking", "nature", "sports", "k drama", "western",
+]
+
+
+def _cumulative(weights: Iterable[float]) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _lookup_table(mix: Dict[Any, float], size: int = 1024) -> List[Any]:
+    # Slots proportional to weight, so a hash picks a value in O(1)
+    total = sum(mix.values())
+    table: List[Any] = []
+    for value, weight in mix.items():
+        table.extend([value] * int(round(weight / total * size)))
+    last = table[-1]
+    return (table + [last] * size)[:size]
+
+
+class ZipfSampler:
+    """
+    Draws ranks 0..n-1 with P(rank) proportional to 1 / (rank + 1) ** exponent
+    via bisection over precomputed cumulative weights.
+    """
+
+    def __init__(self, n: int, exponent: float, rng: random.Random):
+        self.n = n
+        self.exponent = exponent
+        self._cumulative = _cumulative(1.0 / (rank + 1) ** exponent for rank in range(n))
+        self._total = self._cumulative[-1]
+        self._random = rng.random
+
+    def __call__(self) -> int:
+        return bisect(self._cumulative, self._random() * self._total)
+
+
+def _uuid_string(getrandbits: Callable[[int], int]) -> str:
+    # Seeded uuid4-shaped id; uuid.uuid4() would break reproducibility
+    h = "%032x" % getrandbits(128)
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{h[16:20]}-{h[20:]}"
+
+
+@dataclass
+class LoadProfile:
+    seed: int = 42
+    num_users: int = 1_000_000
+    num_contents: int = 20_000
+    # s ~ 1.0-1.2 matches the head-heavy popularity of a streaming catalog
+    zipf_exponent: float = 1.1
+    start: datetime = datetime(2024, 1, 1)
+    # Simulated event rate at the diurnal peak; the clock slows down off-peak
+    # (about 25M events per simulated day at the default 500/sec)
+    peak_events_per_second: float = 500.0
+    concurrent_sessions: int = 20_000
+    mean_session_events: int = 40
+    tv_episode_share: float = 0.45
+    device_mix: Dict[DeviceType, float] = field(default_factory=lambda: dict(DEVICE_MIX))
+    country_mix: Dict[str, float] = field(default_factory=lambda: dict(COUNTRY_MIX))
+    diurnal_curve: List[float] = field(default_factory=lambda: list(DIURNAL_CURVE))
+
+
+class _Clock:
+    """
+    Simulated event time. Each tick advances by the inverse of the current
+    hour's rate, so event density follows the diurnal curve. Date and hour
+    strings are cached per hour since every event needs them.
+    """
+
+    __slots__ = ("now", "_steps", "_hour_end", "_step", "event_date", "event_hour")
+
+    def __init__(self, profile: LoadProfile):
+        self.now = profile.start
+        self._steps = [
+            timedelta(seconds=1.0 / (profile.peak_events_per_second * max(weight, 1e-3)))
+            for weight in profile.diurnal_curve
+        ]
+        self._roll_hour()
+
+    def _roll_hour(self):
+        now = self.now
+        self.event_hour = now.hour
+        self.event_date = now.strftime("%Y-%m-%d")
+        self._step = self._steps[now.hour]
+        self._hour_end = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+    def tick(self) -> datetime:
+        self.now += self._step
+        if self.now >= self._hour_end:
+            self._roll_hour()
+        return self.now
+
+
+class LoadGenerator:
+    """
+    Reproducible synthetic events for every domain model.
+
+    Each model has an unbounded iterator (playback_events(), qos_telemetry(),
+    ...); pass n to cap it. mixed_stream() interleaves them by EVENT_MIX on a
+    shared clock, and batches() groups any stream into lists. Users, devices
+    and countries are fixed per user, content is Zipf-distributed and
+    playback follows start -> heartbeats/seeks/pauses -> stop/complete
+    sessions, so downstream stages see realistic key skew and session state.
+    """
+
+    def __init__(self, profile: Optional[LoadProfile] = None, shard: int = 0):
+        self.profile = profile or LoadProfile()
+        # Independent, reproducible streams per shard for parallel generation
+        self.rng = random.Random(f"{self.profile.seed}:{shard}")
+        self.shard = shard
+        self.clock = _Clock(self.profile)
+        self._zipf = ZipfSampler(self.profile.num_contents, self.profile.zipf_exponent,
+                                 random.Random(f"{self.profile.seed}:{shard}:zipf"))
+        self._device_table = _lookup_table(self.profile.device_mix)
+        self._country_table = _lookup_table(self.profile.country_mix)
+        self._networks = list(NETWORK_MIX)
+        self._network_weights = _cumulative(NETWORK_MIX.values())
+        self._sessions: List[list] = []
+        self._session_counter = 0
+
+    # Entity helpers
+
+    def _user(self) -> int:
+        return self.rng.randrange(self.profile.num_users)
+
+    def _user_attributes(self, user: int):
+        # Stable per user without storing anything: derived from the user number
+        h = (user * 2654435761 + self.profile.seed) & 0xFFFFFFFF
+        return self._device_table[h >> 22], self._country_table[(h >> 6) & 1023]
+
+    def _content(self) -> int:
+        return self._zipf()
+
+    def _content_type(self, content: int) -> ContentType:
+        # Deterministic per title; short catalog tail is mostly episodes
+        return ContentType.TV_EPISODE if (content * 40503) % 1000 < self.profile.tv_episode_share * 1000 \
+            else ContentType.MOVIE
+
+    @staticmethod
+    def _content_duration(content: int, content_type: ContentType) -> int:
+        if content_type is ContentType.TV_EPISODE:
+            return 1320 + (content * 7919) % 2400
+        return 5400 + (content * 7919) % 3600
+
+    def _new_session(self) -> list:
+        rng = self.rng
+        self._session_counter += 1
+        user = self._user()
+        device, country = self._user_attributes(user)
+        content = self._content()
+        content_type = self._content_type(content)
+        duration = self._content_duration(content, content_type)
+        quality, bitrate = QUALITY_BY_DEVICE[device]
+        # Geometric session length; most viewers drop early, a few finish
+        length = 1 + int(rng.expovariate(1.0 / self.profile.mean_session_events))
+        network = rng.choices(self._networks, cum_weights=self._network_weights)[0]
+        cdn_server = f"cdn-{country.lower()}-{1 + user % 4}"
+        return [
+            f"session_{self.shard}_{self._session_counter}", f"user_{user}", f"device_{user}",
+            f"content_{content}", content_type, duration, 0, length, device, country,
+            quality, bitrate, network, cdn_server,
+        ]
+
+    def _session_slot(self) -> int:
+        sessions = self._sessions
+        if len(sessions) < self.profile.concurrent_sessions:
+            sessions.append(self._new_session())
+            return len(sessions) - 1
+        return self.rng.randrange(len(sessions))
+
+    # Per-model streams
+
+    def playback_events(self, n: Optional[int] = None) -> Iterator[PlaybackEvent]:
+        rng = self.rng
+        random_ = rng.random
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            slot = self._session_slot()
+            session = self._sessions[slot]
+            (session_id, user_id, device_id, content_id, content_type, duration,
+             position, remaining, device, country, quality, bitrate, network, _) = session
+            buffering_count = buffering_ms = 0
+            if position == 0:
+                event_type = EventType.PLAY_START
+            elif position >= duration:
+                event_type = EventType.PLAY_COMPLETE
+                position = duration
+                self._sessions[slot] = self._new_session()
+            elif remaining <= 1:
+                event_type = EventType.PLAY_STOP
+                self._sessions[slot] = self._new_session()
+            else:
+                roll = random_()
+                if roll < 0.04:
+                    event_type = EventType.SEEK
+                    position = max(0, min(duration, position + int((random_() - 0.4) * 600)))
+                elif roll < 0.07:
+                    event_type = EventType.PLAY_PAUSE
+                else:
+                    event_type = EventType.PLAY_RESUME
+                if roll > 0.97:
+                    buffering_count = 1
+                    buffering_ms = int(rng.expovariate(1 / 800.0))
+            session[6] = position + 30
+            session[7] = remaining - 1
+            yield PlaybackEvent(
+                event_id=_uuid_string(getrandbits), event_type=event_type, event_timestamp=ts,
+                user_id=user_id, session_id=session_id, device_id=device_id,
+                content_id=content_id, content_title=content_id.replace("_", " ").title(),
+                content_type=content_type, position_seconds=position, duration_seconds=duration,
+                video_quality=quality, device_type=device, network_type=network,
+                buffering_count=buffering_count, buffering_duration_ms=buffering_ms,
+                bitrate_kbps=bitrate, country=country, event_date=clock.event_date,
+                event_hour=clock.event_hour, ingestion_timestamp=ts,
+            )
+
+    def qos_telemetry(self, n: Optional[int] = None) -> Iterator[QoSTelemtry]:
+        rng = self.rng
+        random_ = rng.random
+        gauss = rng.gauss
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            session = self._sessions[self._session_slot()]
+            device, quality, bitrate, network = session[8], session[10], session[11], session[12]
+            is_buffering = random_() < 0.03
+            # Long-tailed (log-normal) latency and bandwidth, like real player telemetry
+            latency = int(exp(gauss(3.6, 0.6)))
+            frames = 1800
+            yield QoSTelemtry(
+                telemetry_id=_uuid_string(getrandbits), timestamp=ts, session_id=session[0],
+                user_id=session[1], content_id=session[3],
+                current_bitrate_kbps=int(bitrate * (0.6 + 0.4 * random_())),
+                current_resolution=quality,
+                measured_bandwidth_mbps=round(exp(gauss(3.0, 0.5)), 2),
+                buffer_level_seconds=round(0.0 if is_buffering else 5 + 25 * random_(), 2),
+                is_buffering=is_buffering,
+                buffering_duration_ms=int(rng.expovariate(1 / 900.0)) if is_buffering else 0,
+                frames_rendered=frames, frames_dropped=int(frames * 0.002 * rng.expovariate(1.0)),
+                network_type=network, latency_ms=latency,
+                packet_loss_percentage=round(rng.expovariate(10.0), 3),
+                cdn_server=session[13],
+                cdn_cache_hit=random_() < 0.93, device_type=device,
+            )
+
+    def interaction_events(self, n: Optional[int] = None) -> Iterator[UserInteractionEvent]:
+        rng = self.rng
+        random_ = rng.random
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            user = self._user()
+            device, country = self._user_attributes(user)
+            roll = random_()
+            kwargs: Dict[str, Any] = {}
+            if roll < 0.45:
+                event_type, page, element = EventType.BROWSE, "/browse", "row"
+                kwargs["element_position"] = int(rng.expovariate(0.2))
+            elif roll < 0.65:
+                event_type, page, element = EventType.SEARCH, "/search", "search_box"
+                term = SEARCH_TERMS[self._zipf() % len(SEARCH_TERMS)]
+                # Users type prefixes; a few queries find nothing
+                query = term[:max(1, int(len(term) * (0.4 + 0.6 * random_())))]
+                results = 0 if random_() < 0.06 else int(rng.expovariate(1 / 40.0)) + 1
+                kwargs.update(search_query=query, search_results_count=results)
+                if results and random_() < 0.55:
+                    kwargs["search_result_clicked_position"] = min(results, 1 + int(rng.expovariate(0.5)))
+            elif roll < 0.88:
+                event_type, page, element = EventType.CLICK, "/title", "tile"
+                kwargs.update(element_id=f"content_{self._content()}",
+                              recommendation_algorithm="two_tower",
+                              recommendation_model_version="v3.2",
+                              recommendation_score=round(random_(), 4))
+            elif roll < 0.95:
+                event_type, page, element = EventType.SCROLL, "/browse", "page"
+            elif roll < 0.98:
+                event_type, page, element = EventType.ADD_TO_LIST, "/title", "my_list_button"
+                kwargs["element_id"] = f"content_{self._content()}"
+            else:
+                event_type, page, element = EventType.REMOVE_FROM_LIST, "/my-list", "my_list_button"
+                kwargs["element_id"] = f"content_{self._content()}"
+            yield UserInteractionEvent(
+                event_id=_uuid_string(getrandbits), event_type=event_type, event_timestamp=ts,
+                user_id=f"user_{user}", session_id=f"browse_{self.shard}_{user}",
+                device_id=f"device_{user}", page_url=page, page_title=page.strip("/").title(),
+                element_type=element, device_type=device, country=country,
+                event_date=clock.event_date, event_hour=clock.event_hour, **kwargs,
+            )
+
+    def user_ratings(self, n: Optional[int] = None) -> Iterator[UserRating]:
+        rng = self.rng
+        random_ = rng.random
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            user = self._user()
+            device, _ = self._user_attributes(user)
+            # J-shaped: mostly 4-5 stars with a bump at 1
+            roll = random_()
+            stars = 5 if roll < 0.42 else 4 if roll < 0.72 else 3 if roll < 0.84 else 1 if roll < 0.94 else 2
+            has_review = random_() < 0.08
+            yield UserRating(
+                rating_id=_uuid_string(getrandbits), user_id=f"user_{user}",
+                content_id=f"content_{self._content()}", rating_value=float(stars),
+                rating_timestamp=ts,
+                review_title="Loved it" if has_review and stars >= 4 else ("Not for me" if has_review else None),
+                review_text="Synthetic review text." if has_review else None,
+                helpful_count=int(rng.expovariate(0.5)) if has_review else 0,
+                is_verified_watch=random_() < 0.85, device_type=device,
+            )
+
+    def payment_transactions(self, n: Optional[int] = None) -> Iterator[PaymentTransaction]:
+        rng = self.rng
+        random_ = rng.random
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        prices = (Decimal("6.99"), Decimal("15.49"), Decimal("22.99"))
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            user = self._user()
+            failed = random_() < 0.04
+            yield PaymentTransaction(
+                transaction_id=_uuid_string(getrandbits), subscription_id=f"sub_{user}",
+                user_id=f"user_{user}", amount=prices[user % 3],
+                transaction_type="refund" if random_() < 0.005 else "charge",
+                status="failed" if failed else "success",
+                payment_method="paypal" if user % 7 == 0 else "credit_card",
+                processor_transaction_id=f"ch_{getrandbits(64):016x}", transaction_date=ts,
+                settlement_date=None if failed else ts + timedelta(days=2),
+                failure_code="card_declined" if failed else None,
+                failure_message="Your card was declined." if failed else None,
+                retry_count=int(rng.expovariate(1.0)) if failed else 0,
+            )
+
+    def experiment_exposures(self, n: Optional[int] = None,
+                             num_experiments: int = 8) -> Iterator[ExperimentExposure]:
+        rng = self.rng
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        variants = list(ExperimentVariant)
+        start = self.profile.start - timedelta(days=7)
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            user = self._user()
+            device, _ = self._user_attributes(user)
+            experiment = getrandbits(16) % num_experiments
+            # Sticky assignment: a user always lands in the same variant
+            arms = 2 + experiment % 3
+            variant = variants[(user * 2654435761 + experiment) % arms]
+            yield ExperimentExposure(
+                exposure_id=_uuid_string(getrandbits), experiment_id=f"exp_{experiment}",
+                experiment_name=f"experiment_{experiment}", user_id=f"user_{user}",
+                variant=variant, exposure_timestamp=ts, device_type=device,
+                user_segment="new" if user % 10 == 0 else "tenured",
+                experiment_state_date=start, traffic_allocation=1.0 / arms,
+            )
+
+    def error_events(self, n: Optional[int] = None) -> Iterator[ErrorEvent]:
+        rng = self.rng
+        getrandbits = rng.getrandbits
+        clock = self.clock
+        catalog_weights = _cumulative(1.0 / (rank + 1) for rank in range(len(ERROR_CATALOG)))
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            ts = clock.tick()
+            session = self._sessions[self._session_slot()]
+            error_type, code, message, severity, endpoint = rng.choices(
+                ERROR_CATALOG, cum_weights=catalog_weights)[0]
+            yield ErrorEvent(
+                error_id=_uuid_string(getrandbits), error_timestamp=ts, error_type=error_type,
+                error_code=code, error_message=message, severity=severity,
+                user_id=session[1], session_id=session[0], content_id=session[3],
+                request_id=_uuid_string(getrandbits), api_endpoint=endpoint,
+                device_type=session[8], app_version="8.42.1", network_type=session[12],
+                cdn_server=session[13] if error_type == "network" else None,
+            )
+
+    def stream_for(self, cls: type, n: Optional[int] = None) -> Iterator[Any]:
+        return {
+            PlaybackEvent: self.playback_events,
+            QoSTelemtry: self.qos_telemetry,
+            UserInteractionEvent: self.interaction_events,
+            UserRating: self.user_ratings,
+            PaymentTransaction: self.payment_transactions,
+            ExperimentExposure: self.experiment_exposures,
+            ErrorEvent: self.error_events,
+        }[cls](n)
+
+    def mixed_stream(self, n: Optional[int] = None,
+                     mix: Optional[Dict[type, float]] = None) -> Iterator[Any]:
+        """Events of every model interleaved on one clock, weighted by mix"""
+        mix = mix or EVENT_MIX
+        streams = [self.stream_for(cls) for cls in mix]
+        weights = _cumulative(mix.values())
+        total = weights[-1]
+        random_ = self.rng.random
+        count = itertools.count() if n is None else range(n)
+        for _ in count:
+            yield next(streams[bisect(weights, random_() * total)])
+
+
+def batches(events: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    iterator = iter(events)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _write_shard(args) -> int:
+    # Worker for write_ndjson: one shard, one file
+    profile, shard, n, kind, directory = args
+    import fast_json
+    generator = LoadGenerator(profile, shard)
+    stream = generator.mixed_stream(n) if kind == "mixed" else \
+        generator.stream_for(MODELS_BY_NAME[kind], n)
+    path = os.path.join(directory, f"{kind}-{shard:05d}.ndjson")
+    with open(path, "wb") as f:
+        for batch in batches(stream, 10_000):
+            f.write(fast_json.encode_many(batch))
+    return n
+
+
+MODELS_BY_NAME = {
+    "playback": PlaybackEvent,
+    "qos": QoSTelemtry,
+    "interaction": UserInteractionEvent,
+    "rating": UserRating,
+    "payment": PaymentTransaction,
+    "exposure": ExperimentExposure,
+    "error": ErrorEvent,
+}
+
+
+def write_ndjson(directory: str, n: int, kind: str = "mixed", workers: int = 0,
+                 profile: Optional[LoadProfile] = None) -> List[str]:
+    """
+    Generate n events as NDJSON files, one shard per worker process. Shards
+    are seeded from (seed, shard), so output depends on workers but is
+    otherwise reproducible.
+    """
+    profile = profile or LoadProfile()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    per_shard = [n // workers + (1 if i < n % workers else 0) for i in range(workers)]
+    jobs = [(profile, shard, count, kind, directory) for shard, count in enumerate(per_shard) if count]
+    if len(jobs) == 1:
+        _write_shard(jobs[0])
+    else:
+        with multiprocessing.Pool(len(jobs)) as pool:
+            pool.map(_write_shard, jobs)
+    return [os.path.join(directory, f"{kind}-{job[1]:05d}.ndjson") for job in jobs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic domain events")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--kind", choices=["mixed", *MODELS_BY_NAME], default="mixed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per CPU")
+    parser.add_argument("--output", help="Directory for NDJSON shards; omit to only time generation")
+    args = parser.parse_args()
+
+    profile = LoadProfile(seed=args.seed)
+    start = time.perf_counter()
+    if args.output:
+        paths = write_ndjson(args.output, args.events, args.kind, args.workers, profile)
+        elapsed = time.perf_counter() - start
+        print(f"{args.events:,} events in {len(paths)} files, {args.events / elapsed:,.0f} events/sec")
+    else:
+        generator = LoadGenerator(profile)
+        stream = generator.mixed_stream(args.events) if args.kind == "mixed" else \
+            generator.stream_for(MODELS_BY_NAME[args.kind], args.events)
+        for _ in stream:
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{args.events:,} {args.kind} events, {args.events / elapsed:,.0f} events/sec per process")
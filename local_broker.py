@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# In-process Kafka stand-in
+# Partitioned, offset-addressed topic logs with consumer-group offset storage.
+# Used to run and benchmark producers/consumers without a real cluster.
+
+BrokerRecord = namedtuple(
+    "BrokerRecord", ["topic", "partition", "offset", "key", "value", "timestamp"]
+)
+
+
+class UnknownTopicError(KeyError):
+    pass
+
+
+class InMemoryBroker:
+    """
+    Minimal broker with the subset of Kafka semantics the pipeline relies on:
+    per-partition ordering, monotonically increasing offsets, and committed
+    offsets per consumer group. Each partition has its own lock so producers
+    writing to different partitions do not contend.
+    """
+
+    def __init__(self, produce_latency_ms: float = 0.0):
+        self.produce_latency_ms = produce_latency_ms
+        self._logs: Dict[str, List[List[BrokerRecord]]] = {}
+        self._locks: Dict[str, List[threading.Lock]] = {}
+        self._committed: Dict[Tuple[str, str, int], int] = {}
+        self._admin_lock = threading.Lock()
+        self._data_available = threading.Condition()
+
+    def create_topic(self, topic: str, num_partitions: int):
+        with self._admin_lock:
+            if topic in self._logs:
+                return
+            self._logs[topic] = [[] for _ in range(num_partitions)]
+            self._locks[topic] = [threading.Lock() for _ in range(num_partitions)]
+
+    def has_topic(self, topic: str) -> bool:
+        return topic in self._logs
+
+    def topics(self) -> List[str]:
+        return list(self._logs)
+
+    def num_partitions(self, topic: str) -> int:
+        try:
+            return len(self._logs[topic])
+        except KeyError:
+            raise UnknownTopicError(topic) from None
+
+    def produce_batch(self, topic: str, partition: int,
+                      records: Sequence[Tuple[Optional[bytes], bytes]]) -> int:
+        """Append (key, value) pairs to a partition and return the base offset"""
+        if self.produce_latency_ms:
+            time.sleep(self.produce_latency_ms / 1000.0)
+        try:
+            log = self._logs[topic][partition]
+            lock = self._locks[topic][partition]
+        except KeyError:
+            raise UnknownTopicError(topic) from None
+        now = time.time()
+        with lock:
+            base_offset = len(log)
+            log.extend(
+                BrokerRecord(topic, partition, base_offset + i, key, value, now)
+                for i, (key, value) in enumerate(records)
+            )
+        with self._data_available:
+            self._data_available.notify_all()
+        return base_offset
+
+    def fetch(self, topic: str, partition: int, offset: int,
+              max_records: int = 500) -> List[BrokerRecord]:
+        log = self._logs[topic][partition]
+        return log[offset:offset + max_records]
+
+    def wait_for_data(self, timeout: float):
+        with self._data_available:
+            self._data_available.wait(timeout)
+
+    def end_offset(self, topic: str, partition: int) -> int:
+        return len(self._logs[topic][partition])
+
+    def commit(self, group_id: str, topic: str, partition: int, offset: int):
+        # offset is the next offset to consume, as in Kafka
+        with self._admin_lock:
+            key = (group_id, topic, partition)
+            if offset > self._committed.get(key, 0):
+                self._committed[key] = offset
+
+    def committed(self, group_id: str, topic: str, partition: int) -> int:
+        return self._committed.get((group_id, topic, partition), 0)
@@ -0,0 +1,387 @@
+import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import QoSTelemtry, DeviceType
+from real_time_event_streaming import KafkaTopics
+
+logger = logging.getLogger(__name__)
+
+# Windowed QoS percentile aggregation
+# p50/p95/p99 of QoS telemetry per CDN server, region and device type over
+# tumbling or sliding windows, using mergeable DDSketch quantile sketches
+# instead of raw samples.
+
+QOS_METRICS = ("buffer_level_seconds", "current_bitrate_kbps", "latency_ms", "packet_loss_percentage")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class DDSketch:
+    """
+    Relative-error quantile sketch (Masson et al., DDSketch).
+
+    Values fall into logarithmic buckets of ratio gamma = (1 + a) / (1 - a),
+    so any quantile is returned within relative_accuracy of the true value.
+    Memory is capped at max_bins per sign; when exceeded the lowest buckets
+    are collapsed, which only affects accuracy at the very low end.
+    Two sketches with the same relative_accuracy merge exactly.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "gamma", "_multiplier", "min_value",
+                 "positive", "negative", "zero_count", "count", "sum", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1.0 / math.log(self.gamma)
+        self.min_value = 1e-9
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: int = 1):
+        if value > self.min_value:
+            store = self.positive
+            index = math.ceil(math.log(value) * self._multiplier)
+        elif value < -self.min_value:
+            store = self.negative
+            index = math.ceil(math.log(-value) * self._multiplier)
+        else:
+            store = None
+            self.zero_count += weight
+        if store is not None:
+            store[index] = store.get(index, 0) + weight
+            if len(store) > self.max_bins:
+                self._collapse(store)
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self, store: Dict[int, int]):
+        # Fold the lowest buckets into the lowest one that survives
+        indexes = sorted(store)
+        excess = len(indexes) - self.max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            store[target] += store.pop(index)
+
+    def merge(self, other: "DDSketch"):
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+            if len(mine) > self.max_bins:
+                self._collapse(mine)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def copy(self) -> "DDSketch":
+        sketch = DDSketch(self.relative_accuracy, self.max_bins)
+        sketch.merge(self)
+        return sketch
+
+    def _value(self, index: int) -> float:
+        return 2.0 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return max(self.min, -self._value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return min(self.max, self._value(index))
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Compact form for shipping partial aggregates between workers
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_bins': self.max_bins,
+            'positive': list(self.positive.items()),
+            'negative': list(self.negative.items()),
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DDSketch":
+        sketch = cls(data['relative_accuracy'], data['max_bins'])
+        sketch.positive = {int(k): v for k, v in data['positive']}
+        sketch.negative = {int(k): v for k, v in data['negative']}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if data['count']:
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
+
+
+@dataclass
+class QoSPercentileMetric:
+    # One published row: percentiles of one metric for one dimension value in one window
+    metric_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    window_start: datetime = field(default_factory=datetime.utcnow)
+    window_end: datetime = field(default_factory=datetime.utcnow)
+    dimension: str = ""
+    dimension_value: str = ""
+    metric_name: str = ""
+    sample_count: int = 0
+    mean: float = 0.0
+    min_value: float = 0.0
+    max_value: float = 0.0
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+
+
+SketchKey = Tuple[str, str, str]  # (dimension, dimension_value, metric_name)
+
+
+class QoSWindowAggregator:
+    """
+    Event-time windowed QoS percentiles.
+
+    Telemetry is bucketed into panes of slide_seconds; a window is the merge
+    of the window_seconds / slide_seconds most recent panes, so tumbling
+    (slide == window) and sliding windows share one code path and each
+    sample is only sketched once. Windows are emitted when the watermark
+    (max timestamp - allowed_lateness) passes their end, and panes no
+    longer covered by any open window are evicted.
+
+    region_for maps a telemetry sample to a region; QoSTelemtry itself does
+    not carry one, so the region dimension is skipped without it.
+    """
+
+    def __init__(self, window_seconds: int = 60, slide_seconds: Optional[int] = None,
+                 allowed_lateness_seconds: int = 10, relative_accuracy: float = 0.01,
+                 max_bins: int = 1024, region_for: Optional[Callable[[QoSTelemtry], Optional[str]]] = None,
+                 producer=None, on_metric: Optional[Callable[[QoSPercentileMetric], None]] = None):
+        slide_seconds = slide_seconds or window_seconds
+        if window_seconds % slide_seconds:
+            raise ValueError("window_seconds must be a multiple of slide_seconds")
+        self.window_seconds = window_seconds
+        self.slide_seconds = slide_seconds
+        self.panes_per_window = window_seconds // slide_seconds
+        self.allowed_lateness = allowed_lateness_seconds
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.region_for = region_for
+        self.producer = producer
+        self.on_metric = on_metric
+        self.late_samples_dropped = 0
+
+        self._panes: Dict[int, Dict[SketchKey, DDSketch]] = {}
+        self._max_ts: Optional[float] = None
+        # Index of the next pane whose window end has not been emitted yet
+        self._next_window_end: Optional[int] = None
+
+    def _new_sketch(self) -> DDSketch:
+        return DDSketch(self.relative_accuracy, self.max_bins)
+
+    def _dimensions(self, sample: QoSTelemtry) -> List[Tuple[str, str]]:
+        dims = [("cdn_server", sample.cdn_server or "unknown"),
+                ("device_type", sample.device_type.value if isinstance(sample.device_type, DeviceType)
+                 else str(sample.device_type))]
+        if self.region_for is not None:
+            region = self.region_for(sample)
+            if region:
+                dims.append(("region", region))
+        return dims
+
+    def add(self, sample: QoSTelemtry):
+        ts = sample.timestamp.timestamp() if sample.timestamp.tzinfo else \
+            (sample.timestamp - datetime(1970, 1, 1)).total_seconds()
+        pane = int(ts // self.slide_seconds)
+        if self._next_window_end is not None and pane < self._next_window_end - self.panes_per_window:
+            # Every window containing this pane has already been emitted
+            self.late_samples_dropped += 1
+            return
+
+        sketches = self._panes.get(pane)
+        if sketches is None:
+            if not self._panes:
+                self._next_window_end = self._start_cursor(pane)
+            sketches = self._panes[pane] = {}
+        for dimension, value in self._dimensions(sample):
+            for metric in QOS_METRICS:
+                measurement = getattr(sample, metric)
+                if measurement is None:
+                    continue
+                key = (dimension, value, metric)
+                sketch = sketches.get(key)
+                if sketch is None:
+                    sketch = sketches[key] = self._new_sketch()
+                sketch.add(measurement)
+
+        if self._max_ts is None or ts > self._max_ts:
+            self._max_ts = ts
+            self._advance(ts - self.allowed_lateness)
+
+    def add_many(self, samples: Iterable[QoSTelemtry]):
+        for sample in samples:
+            self.add(sample)
+
+    def _advance(self, watermark: float) -> List[QoSPercentileMetric]:
+        emitted = []
+        # Window ending at pane boundary e covers panes [e - panes_per_window, e)
+        while self._next_window_end is not None and \
+                self._next_window_end * self.slide_seconds <= watermark:
+            emitted.extend(self._emit_window(self._next_window_end))
+            self._next_window_end += 1
+            # Panes older than any still-open window can go
+            for pane in [p for p in self._panes if p < self._next_window_end - self.panes_per_window]:
+                del self._panes[pane]
+            if not self._panes:
+                # Keep the cursor so samples for emitted windows still count as late
+                break
+        return emitted
+
+    def _start_cursor(self, pane: int) -> int:
+        # No pane is buffered, so windows ending before this pane's first one are empty
+        if self._next_window_end is None:
+            return pane + 1
+        return max(self._next_window_end, pane + 1)
+
+    def window_sketches(self, end_pane: int) -> Dict[SketchKey, DDSketch]:
+        merged: Dict[SketchKey, DDSketch] = {}
+        for pane in range(end_pane - self.panes_per_window, end_pane):
+            for key, sketch in self._panes.get(pane, {}).items():
+                if key in merged:
+                    merged[key].merge(sketch)
+                else:
+                    merged[key] = sketch.copy()
+        return merged
+
+    def _emit_window(self, end_pane: int) -> List[QoSPercentileMetric]:
+        epoch = datetime(1970, 1, 1)
+        window_end = epoch + timedelta(seconds=end_pane * self.slide_seconds)
+        window_start = window_end - timedelta(seconds=self.window_seconds)
+        metrics = []
+        for (dimension, value, metric_name), sketch in self.window_sketches(end_pane).items():
+            p50, p95, p99 = (sketch.quantile(q) for q in QUANTILES)
+            metric = QoSPercentileMetric(
+                window_start=window_start, window_end=window_end,
+                dimension=dimension, dimension_value=value, metric_name=metric_name,
+                sample_count=sketch.count, mean=sketch.sum / sketch.count,
+                min_value=sketch.min, max_value=sketch.max, p50=p50, p95=p95, p99=p99,
+            )
+            metrics.append(metric)
+            if self.producer is not None:
+                self.producer.produce(metric, topic=KafkaTopics.CONTENT_METRICS)
+            if self.on_metric is not None:
+                self.on_metric(metric)
+        return metrics
+
+    def flush(self) -> List[QoSPercentileMetric]:
+        """Emit every window that still has data (end of stream)"""
+        if not self._panes:
+            return []
+        last_pane = max(self._panes)
+        return self._advance((last_pane + self.panes_per_window) * self.slide_seconds)
+
+    def partial_state(self) -> List[Tuple[int, List[Tuple[List[str], Dict[str, Any]]]]]:
+        # Pane sketches as nested (key, value) pairs so the state survives a JSON
+        # round trip; tuple sketch keys would not be valid JSON object keys
+        return [(pane, [(list(key), sketch.to_dict()) for key, sketch in sketches.items()])
+                for pane, sketches in sorted(self._panes.items())]
+
+    def merge_partial(self, state: Iterable[Tuple[int, Iterable[Tuple[List[str], Dict[str, Any]]]]]):
+        accepted = []
+        was_empty = not self._panes
+        for pane, sketches in state:
+            pane = int(pane)
+            if self._next_window_end is not None and pane < self._next_window_end - self.panes_per_window:
+                # Every window containing this pane has already been emitted
+                self.late_samples_dropped += self._pane_samples(sketches)
+                continue
+            mine = self._panes.setdefault(pane, {})
+            for (dimension, value, metric), data in sketches:
+                key = (dimension, value, metric)
+                sketch = DDSketch.from_dict(data)
+                if key in mine:
+                    mine[key].merge(sketch)
+                else:
+                    mine[key] = sketch
+            accepted.append(pane)
+        # Only move the cursor forward; moving it back would re-emit windows
+        if was_empty and accepted:
+            self._next_window_end = self._start_cursor(min(accepted))
+
+    @staticmethod
+    def _pane_samples(sketches: Iterable[Tuple[List[str], Dict[str, Any]]]) -> int:
+        # Every sample lands in exactly one cdn_server sketch per metric it carries
+        per_metric: Dict[str, int] = {}
+        for (dimension, _, metric), data in sketches:
+            if dimension == "cdn_server":
+                per_metric[metric] = per_metric.get(metric, 0) + data['count']
+        return max(per_metric.values(), default=0)
+
+    def merge(self, other: "QoSWindowAggregator"):
+        self.merge_partial(other.partial_state())
+
+if __name__ == "__main__":
+    # Accuracy and throughput check against exact percentiles
+    rng = random.Random(11)
+    start_time = datetime(2024, 1, 1)
+    n = 200_000
+    samples = [
+        QoSTelemtry(
+            timestamp=start_time + timedelta(milliseconds=i * 3),
+            cdn_server=f"cdn-{rng.randrange(8)}",
+            current_bitrate_kbps=int(rng.lognormvariate(8, 0.5)),
+            buffer_level_seconds=rng.expovariate(0.1),
+            latency_ms=int(rng.lognormvariate(4, 0.8)),
+            packet_loss_percentage=rng.random() * 2,
+        )
+        for i in range(n)
+    ]
+    emitted: List[QoSPercentileMetric] = []
+    aggregator = QoSWindowAggregator(window_seconds=300, slide_seconds=60, on_metric=emitted.append)
+    t0 = time.perf_counter()
+    aggregator.add_many(samples)
+    aggregator.flush()
+    elapsed = time.perf_counter() - t0
+
+    latencies = sorted(s.latency_ms for s in samples[:100_000] if s.cdn_server == "cdn-0")
+    exact_p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{n / elapsed:,.0f} samples/sec, {len(emitted)} metric rows")
+    sketch = DDSketch()
+    for v in latencies:
+        sketch.add(v)
+    print(f"latency p99 exact={exact_p99} sketch={sketch.quantile(0.99):.1f}")
@@ -9,22 +9,32 @@ import hashlib
 # real-time event srteaming infrastructure
 # Kafka-based streaming with avro serialization, schema registry, and producers/consumers
 
-# Kafka imports
-from confluent_kafka import Producer, Consumer, KafkaError, KafkaException
-from confluent_kafka.admin import AdminClient, NewTopic
-from confluent_kafka.serialization import (
-    SerializationContext, MessageField, StringSerializer, StringDeserializer
-)
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroSerializer, AvroDeserializer
+# Kafka imports: optional, the in-memory broker (local_broker) and the
+# compiled codecs (avro_codec) run without a cluster client installed
+try:
+    from confluent_kafka import Producer, Consumer, KafkaError, KafkaException
+    from confluent_kafka.admin import AdminClient, NewTopic
+    from confluent_kafka.serialization import (
+        SerializationContext, MessageField, StringSerializer, StringDeserializer
+    )
+    from confluent_kafka.schema_registry import SchemaRegistryClient
+    from confluent_kafka.schema_registry.avro import AvroSerializer, AvroDeserializer
+    HAS_CONFLUENT_KAFKA = True
+except ImportError:
+    Producer = Consumer = KafkaError = KafkaException = None
+    AdminClient = NewTopic = None
+    SerializationContext = MessageField = StringSerializer = StringDeserializer = None
+    SchemaRegistryClient = AvroSerializer = AvroDeserializer = None
+    HAS_CONFLUENT_KAFKA = False
 
 # Import data models
 from core_data_domains import (
     PlaybackEvent, UserInteractionEvent, QoSTelemtry,
     UserRating, ExperimentExposure, ErrorEvent, EventType
 )
+from avro_codec import avro_schema_for
 
-logging.basicConfig(level=loggin.INFO)
+logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Kafka Topic Configuration
@@ -44,6 +54,7 @@ class KafkaTopics(Enum):
     VIEWING_SESSIONS = "processed.viewing.sessions"
     USER_PROFILES_UPDATES = "processed.user.profiles"
     CONTENT_METRICS = "processed.content.metrics"
+    EXPERIMENT_METRICS = "processed.experiments.metrics"
     REAL_TIME_FEATURES = "ml.features.realtime"
     
 class TopicConfig:
@@ -88,13 +99,25 @@ class TopicConfig:
         }
     }
     
+    @staticmethod
+    def for_topic(topic: KafkaTopics) -> Dict[str, Any]:
+        # Config template each topic is created with
+        if topic in (KafkaTopics.PLAYBACK_EVENTS, KafkaTopics.USER_INTERACTIONS,
+                     KafkaTopics.QOS_TELEMETRY, KafkaTopics.SESSION_EVENTS):
+            return TopicConfig.CRITICAL_CONFIG
+        if topic in (KafkaTopics.EXPERIMENT_EXPOSURES, KafkaTopics.USER_PROFILES_UPDATES,
+                     KafkaTopics.CONTENT_METRICS, KafkaTopics.EXPERIMENT_METRICS):
+            return TopicConfig.ANALYTICS_CONFIG
+        return TopicConfig.STANDARD_CONFIG
+    
 # AVRO SCHEMAS
 
 class AvroSchemas:
-    """Avro schema definitions for all event types"""
+    """Avro schema definitions for all event types, generated from the dataclasses"""
     
-    PLAYBACK_EVENT_SCHEMA = """
-    {
-        "type": "record",
-        "name": "PlaybackEvent",
-    }
\ No newline at end of file
+    PLAYBACK_EVENT_SCHEMA = json.dumps(avro_schema_for(PlaybackEvent))
+    USER_INTERACTION_EVENT_SCHEMA = json.dumps(avro_schema_for(UserInteractionEvent))
+    QOS_TELEMETRY_SCHEMA = json.dumps(avro_schema_for(QoSTelemtry))
+    USER_RATING_SCHEMA = json.dumps(avro_schema_for(UserRating))
+    EXPERIMENT_EXPOSURE_SCHEMA = json.dumps(avro_schema_for(ExperimentExposure))
+    ERROR_EVENT_SCHEMA = json.dumps(avro_schema_for(ErrorEvent))
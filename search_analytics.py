@@ -0,0 +1,517 @@
+import heapq
+import logging
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import EventType, UserInteractionEvent
+
+logger = logging.getLogger(__name__)
+
+# Streaming search analytics
+# Every SEARCH interaction lands in a tumbling window (by event time) and is
+# counted per country and globally in Space-Saving summaries: a fixed number
+# of counters per summary, each with an overestimate bound, so the top
+# queries come out without a counter per distinct query. Zero-result
+# searches get their own summary (catalog gaps), and clicked result
+# positions a small fixed histogram. Only the last few windows are kept, so
+# memory is bounded by windows x countries x summary capacity however long
+# the query tail is.
+#
+# Autocomplete reads from a PrefixIndex rebuilt from the recent global
+# summaries whenever a window closes. The index is immutable and swapped in
+# whole, so lookups never lock.
+
+ALL_COUNTRIES = "*"
+OTHER_COUNTRY = "other"
+
+
+@dataclass
+class SearchAnalyticsConfig:
+    window_seconds: float = 900.0
+    # Closed windows kept for reporting and the index, besides the open one
+    windows_retained: int = 24
+    # Space-Saving counters per summary: a query with more than
+    # window searches / capacity hits is guaranteed to be tracked
+    country_capacity: int = 200
+    global_capacity: int = 2000
+    zero_result_capacity: int = 200
+    # Countries past this many in one window are counted under "other"
+    max_countries: int = 64
+    max_query_length: int = 64
+    # Positions past this one share the last histogram bucket
+    max_click_position: int = 20
+    # Autocomplete: queries indexed, recent windows they are scored over,
+    # and completions precomputed for prefixes up to short_prefix_length
+    index_size: int = 5000
+    index_windows: int = 4
+    index_completions: int = 10
+    short_prefix_length: int = 4
+    # One-off queries and queries that mostly return nothing are not suggested
+    min_index_searches: int = 2
+    max_index_zero_share: float = 0.5
+
+
+@dataclass
+class SearchAnalyticsMetrics:
+    events: int = 0
+    searches: int = 0
+    empty_queries: int = 0
+    late_events_dropped: int = 0
+    windows_closed: int = 0
+    index_rebuilds: int = 0
+    index_rebuild_seconds: float = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+
+@dataclass
+class QueryCount:
+    query: str
+    # Space-Saving estimate: never below the true count, at most error above it
+    count: int
+    error: int
+
+
+@dataclass
+class SearchWindowReport:
+    window_start: float
+    window_seconds: float
+    country: str
+    searches: int
+    zero_results: int
+    zero_result_rate: float
+    # Share of searches with results that led to a click
+    click_through_rate: float
+    # Mean of 1 / clicked position over searches with results (0 for no click)
+    mean_reciprocal_rank: float
+    # click_positions[i] = clicks on position i + 1; the last bucket is open-ended
+    click_positions: List[int]
+    top_queries: List[QueryCount] = field(default_factory=list)
+    top_zero_result_queries: List[QueryCount] = field(default_factory=list)
+
+
+def normalize_query(query: Optional[str], max_length: int = 64) -> str:
+    # Case and whitespace variants of a query count as one
+    if not query:
+        return ""
+    return " ".join(query.lower().split())[:max_length]
+
+
+def normalize_prefix(prefix: Optional[str], max_length: int = 64) -> str:
+    # As normalize_query, but a trailing space is kept: "sci " has finished
+    # the word and should not complete to "science"
+    normalized = normalize_query(prefix, max_length)
+    if normalized and prefix[-1].isspace() and len(normalized) < max_length:
+        normalized += " "
+    return normalized
+
+
+class SpaceSaving:
+    """Top-k counts over a stream in fixed memory (Metwally et al.).
+
+    Counters live in buckets by count, so an increment and an eviction of
+    the smallest counter are both O(1).
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "_buckets", "_min_count")
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # count -> insertion-ordered set of items with that count
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        self._min_count = 0
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.counts
+
+    def add(self, item: str):
+        counts = self.counts
+        buckets = self._buckets
+        count = counts.get(item)
+        if count is not None:
+            bucket = buckets[count]
+            del bucket[item]
+            if not bucket:
+                del buckets[count]
+                if count == self._min_count:
+                    self._min_count = count + 1
+            count += 1
+            counts[item] = count
+            target = buckets.get(count)
+            if target is None:
+                buckets[count] = {item: None}
+            else:
+                target[item] = None
+            return
+        if len(counts) < self.capacity:
+            counts[item] = 1
+            self.errors[item] = 0
+            target = buckets.get(1)
+            if target is None:
+                buckets[1] = {item: None}
+            else:
+                target[item] = None
+            self._min_count = 1
+            return
+        # Full: the new item takes over the oldest smallest counter and
+        # inherits its count as the error bound
+        floor = self._min_count
+        bucket = buckets[floor]
+        victim = next(iter(bucket))
+        del bucket[victim]
+        del counts[victim]
+        del self.errors[victim]
+        count = floor + 1
+        counts[item] = count
+        self.errors[item] = floor
+        target = buckets.get(count)
+        if target is None:
+            buckets[count] = {item: None}
+        else:
+            target[item] = None
+        if not bucket:
+            del buckets[floor]
+            self._min_count = count
+
+    def estimate(self, item: str) -> int:
+        # Untracked items occurred at most min_count times
+        count = self.counts.get(item)
+        if count is not None:
+            return count
+        return self._min_count if len(self.counts) >= self.capacity else 0
+
+    def top(self, n: int) -> List[QueryCount]:
+        errors = self.errors
+        return [QueryCount(item, count, errors[item])
+                for item, count in heapq.nlargest(n, self.counts.items(), key=itemgetter(1))]
+
+
+class PrefixIndex:
+    """Immutable autocomplete index over scored queries.
+
+    Queries are kept sorted with their scores alongside; a prefix maps to a
+    contiguous range found by two bisections. Short prefixes match most of
+    the index, so their completions are precomputed instead.
+    """
+
+    __slots__ = ("queries", "scores", "completions", "short_prefix_length", "built_at", "_short")
+
+    def __init__(self, scored: Iterable[Tuple[str, int]], completions: int = 10,
+                 short_prefix_length: int = 4, built_at: float = 0.0):
+        entries = sorted(scored)
+        self.queries: List[str] = [query for query, _ in entries]
+        self.scores = array("q", [score for _, score in entries])
+        self.completions = completions
+        self.short_prefix_length = short_prefix_length
+        self.built_at = built_at
+        short: Dict[str, List[Tuple[int, str]]] = {}
+        for query, score in entries:
+            for length in range(1, min(len(query), short_prefix_length) + 1):
+                short.setdefault(query[:length], []).append((score, query))
+        self._short: Dict[str, Tuple[str, ...]] = {
+            prefix: tuple(query for _, query in heapq.nlargest(completions, ranked, key=itemgetter(0)))
+            for prefix, ranked in short.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def lookup(self, prefix: str, n: Optional[int] = None) -> List[str]:
+        # prefix is expected normalized (see normalize_prefix)
+        n = self.completions if n is None else n
+        if len(prefix) <= self.short_prefix_length and n <= self.completions:
+            return list(self._short.get(prefix, ())[:n])
+        queries = self.queries
+        lo = bisect_left(queries, prefix)
+        hi = bisect_left(queries, prefix + "\U0010ffff", lo)
+        if lo == hi:
+            return []
+        scores = self.scores
+        if hi - lo <= n:
+            matches = sorted(range(lo, hi), key=scores.__getitem__, reverse=True)
+        else:
+            matches = heapq.nlargest(n, range(lo, hi), key=scores.__getitem__)
+        return [queries[i] for i in matches]
+
+
+class _CountryStats:
+    __slots__ = ("searches", "zero_results", "with_results", "clicks", "reciprocal_rank", "click_positions",
+                 "queries")
+
+    def __init__(self, capacity: int, positions: int):
+        self.searches = 0
+        self.zero_results = 0
+        self.with_results = 0
+        self.clicks = 0
+        self.reciprocal_rank = 0.0
+        self.click_positions = array("q", bytes(8 * positions))
+        self.queries = SpaceSaving(capacity)
+
+
+class _Window:
+    __slots__ = ("start", "countries", "all", "zero_queries")
+
+    def __init__(self, start: float, config: SearchAnalyticsConfig):
+        self.start = start
+        self.countries: Dict[str, _CountryStats] = {}
+        self.all = _CountryStats(config.global_capacity, config.max_click_position)
+        self.zero_queries = SpaceSaving(config.zero_result_capacity)
+
+
+class SearchAnalytics:
+    def __init__(self, config: Optional[SearchAnalyticsConfig] = None,
+                 on_report: Optional[Callable[[List[SearchWindowReport]], None]] = None):
+        self.config = config or SearchAnalyticsConfig()
+        self.metrics = SearchAnalyticsMetrics()
+        self.on_report = on_report
+        # Window number -> window; the newest is the open one
+        self._windows: Dict[int, _Window] = {}
+        self._closed: Deque[int] = deque()
+        self._current: Optional[int] = None
+        self.index = PrefixIndex((), self.config.index_completions, self.config.short_prefix_length)
+
+    def process(self, event: UserInteractionEvent):
+        self.metrics.events += 1
+        if event.event_type != EventType.SEARCH:
+            return
+        config = self.config
+        query = normalize_query(event.search_query, config.max_query_length)
+        if not query:
+            self.metrics.empty_queries += 1
+            return
+        window = self._window(event.event_timestamp.timestamp())
+        if window is None:
+            self.metrics.late_events_dropped += 1
+            return
+        self.metrics.searches += 1
+        country = event.country or OTHER_COUNTRY
+        stats = window.countries.get(country)
+        if stats is None:
+            if len(window.countries) >= config.max_countries:
+                country = OTHER_COUNTRY
+                stats = window.countries.get(country)
+            if stats is None:
+                stats = window.countries[country] = _CountryStats(config.country_capacity,
+                                                                  config.max_click_position)
+        position = event.search_result_clicked_position
+        zero = not event.search_results_count
+        if zero:
+            window.zero_queries.add(query)
+        last = config.max_click_position - 1
+        for target in (stats, window.all):
+            target.searches += 1
+            target.queries.add(query)
+            if zero:
+                target.zero_results += 1
+                continue
+            target.with_results += 1
+            if position:
+                target.clicks += 1
+                target.reciprocal_rank += 1.0 / position
+                target.click_positions[min(position - 1, last)] += 1
+
+    def process_many(self, events: Iterable[UserInteractionEvent]) -> int:
+        process = self.process
+        n = 0
+        for event in events:
+            process(event)
+            n += 1
+        return n
+
+    def _window(self, ts: float) -> Optional[_Window]:
+        number = int(ts // self.config.window_seconds)
+        window = self._windows.get(number)
+        if window is not None:
+            return window
+        current = self._current
+        if current is not None and number < current:
+            # Older than every retained window
+            return None
+        window = self._windows[number] = _Window(number * self.config.window_seconds, self.config)
+        self._current = number
+        if current is not None:
+            self._close(current)
+        return window
+
+    def _close(self, number: int):
+        config = self.config
+        self.metrics.windows_closed += 1
+        self._closed.append(number)
+        while len(self._closed) > config.windows_retained:
+            del self._windows[self._closed.popleft()]
+        self.rebuild_index()
+        if self.on_report is not None:
+            self.on_report(self.report(number))
+
+    def flush(self):
+        # Close the open window, e.g. at shutdown
+        if self._current is not None:
+            current, self._current = self._current, None
+            self._close(current)
+
+    def _numbers(self, windows: Optional[int] = None) -> List[int]:
+        numbers = sorted(self._windows)
+        return numbers if windows is None else numbers[-windows:]
+
+    def _stats(self, window: _Window, country: Optional[str]) -> Optional[_CountryStats]:
+        if country is None or country == ALL_COUNTRIES:
+            return window.all
+        return window.countries.get(country)
+
+    def top_queries(self, country: Optional[str] = None, n: int = 10,
+                    windows: int = 1) -> List[QueryCount]:
+        # Counts summed over the newest windows; errors add up the same way
+        counts: Dict[str, int] = {}
+        errors: Dict[str, int] = {}
+        for number in self._numbers(windows):
+            stats = self._stats(self._windows[number], country)
+            if stats is None:
+                continue
+            summary = stats.queries
+            for query, count in summary.counts.items():
+                counts[query] = counts.get(query, 0) + count
+                errors[query] = errors.get(query, 0) + summary.errors[query]
+        return [QueryCount(query, count, errors[query])
+                for query, count in heapq.nlargest(n, counts.items(), key=itemgetter(1))]
+
+    def zero_result_rate(self, country: Optional[str] = None, windows: int = 1) -> float:
+        searches = zero = 0
+        for number in self._numbers(windows):
+            stats = self._stats(self._windows[number], country)
+            if stats is not None:
+                searches += stats.searches
+                zero += stats.zero_results
+        return zero / searches if searches else 0.0
+
+    def report(self, number: Optional[int] = None, top_n: int = 20) -> List[SearchWindowReport]:
+        # One report per country plus the "*" total, for the given window
+        # number (default: the newest)
+        if number is None:
+            if not self._windows:
+                return []
+            number = max(self._windows)
+        window = self._windows.get(number)
+        if window is None:
+            return []
+        zero_top = window.zero_queries.top(top_n)
+        reports = []
+        for country, stats in [(ALL_COUNTRIES, window.all), *sorted(window.countries.items())]:
+            with_results = stats.with_results
+            reports.append(SearchWindowReport(
+                window_start=window.start, window_seconds=self.config.window_seconds, country=country,
+                searches=stats.searches, zero_results=stats.zero_results,
+                zero_result_rate=stats.zero_results / stats.searches if stats.searches else 0.0,
+                click_through_rate=stats.clicks / with_results if with_results else 0.0,
+                mean_reciprocal_rank=stats.reciprocal_rank / with_results if with_results else 0.0,
+                click_positions=stats.click_positions.tolist(),
+                top_queries=stats.queries.top(top_n),
+                top_zero_result_queries=zero_top if country == ALL_COUNTRIES else [],
+            ))
+        return reports
+
+    def rebuild_index(self) -> PrefixIndex:
+        # Score = searches over the recent windows, less those that found
+        # nothing; rare and mostly zero-result queries are left out
+        config = self.config
+        start = time.perf_counter()
+        scores: Dict[str, int] = {}
+        zero: Dict[str, int] = {}
+        for number in self._numbers(config.index_windows):
+            window = self._windows[number]
+            summary = window.all.queries
+            errors = summary.errors
+            for query, count in summary.counts.items():
+                # Guaranteed count: queries that only got in by evicting a
+                # counter do not carry its history into the index
+                scores[query] = scores.get(query, 0) + count - errors[query]
+            for query, count in window.zero_queries.counts.items():
+                zero[query] = zero.get(query, 0) + count
+        minimum, limit = config.min_index_searches, config.max_index_zero_share
+        scored = []
+        for query, count in scores.items():
+            misses = zero.get(query, 0)
+            if count >= minimum and misses <= limit * count:
+                scored.append((query, count - misses))
+        if len(scored) > config.index_size:
+            scored = heapq.nlargest(config.index_size, scored, key=itemgetter(1))
+        self.index = PrefixIndex(scored, config.index_completions, config.short_prefix_length,
+                                 built_at=time.time())
+        elapsed = time.perf_counter() - start
+        self.metrics.index_rebuilds += 1
+        self.metrics.index_rebuild_seconds += elapsed
+        logger.debug("Rebuilt prefix index: %d queries in %.1fms", len(scored), elapsed * 1000)
+        return self.index
+
+    def autocomplete(self, prefix: str, n: Optional[int] = None) -> List[str]:
+        return self.index.lookup(normalize_prefix(prefix, self.config.max_query_length), n)
+
+
+if __name__ == "__main__":
+    # Generated interactions plus a long tail of one-off queries, to show
+    # memory staying flat while the distinct query count grows
+    import random
+    import tracemalloc
+    from dataclasses import replace
+
+    from load_generator import LoadGenerator, LoadProfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    rng = random.Random(7)
+    events = []
+    for event in LoadGenerator(LoadProfile(peak_events_per_second=200.0)).interaction_events(n):
+        if event.event_type == EventType.SEARCH and rng.random() < 0.3:
+            tail = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 12)))
+            event = replace(event, search_query=f"{event.search_query} {tail}")
+        events.append(event)
+    distinct = len({normalize_query(e.search_query) for e in events if e.event_type == EventType.SEARCH})
+
+    analytics = SearchAnalytics(SearchAnalyticsConfig(window_seconds=300.0))
+    tracemalloc.start()
+    start = time.perf_counter()
+    half = len(events) // 2
+    analytics.process_many(events[:half])
+    mid_memory = tracemalloc.get_traced_memory()[0]
+    analytics.process_many(events[half:])
+    elapsed = time.perf_counter() - start
+    end_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    analytics.flush()
+    metrics = analytics.metrics
+    print(f"{len(events):,} events ({metrics.searches:,} searches, {distinct:,} distinct queries): "
+          f"{len(events) / elapsed:,.0f} events/sec")
+    print(f"state: {mid_memory / 2**20:.1f} MiB at half the stream, {end_memory / 2**20:.1f} MiB at the end, "
+          f"{len(analytics._windows)} windows kept")
+    print(f"{metrics.index_rebuilds} index rebuilds, "
+          f"{metrics.index_rebuild_seconds / max(1, metrics.index_rebuilds) * 1000:.1f}ms each, "
+          f"{len(analytics.index):,} queries indexed")
+
+    for report in analytics.report()[:3]:
+        print(f"{report.country}: {report.searches:,} searches, zero-result {report.zero_result_rate:.1%}, "
+              f"CTR {report.click_through_rate:.1%}, MRR {report.mean_reciprocal_rank:.3f}, "
+              f"top {[(q.query, q.count) for q in report.top_queries[:4]]}")
+    print(f"top zero-result queries: {[(q.query, q.count) for q in analytics.report()[0].top_zero_result_queries[:4]]}")
+
+    prefixes = ["a", "co", "thr", "sci ", "true c", "k dr", "stand", "zzz"]
+    for prefix in prefixes[:4]:
+        print(f"  {prefix!r} -> {analytics.autocomplete(prefix, 5)}")
+    rounds = 20_000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for prefix in prefixes:
+            analytics.autocomplete(prefix)
+    elapsed = time.perf_counter() - start
+    print(f"autocomplete: {elapsed / (rounds * len(prefixes)) * 1e6:.2f}us per lookup")
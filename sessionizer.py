@@ -0,0 +1,339 @@
+import logging
+import random
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from core_data_domains import (
+    PlaybackEvent, ViewingSession, EventType, ContentType
+)
+from real_time_event_streaming import KafkaTopics
+
+logger = logging.getLogger(__name__)
+
+# Incremental sessionization
+# Turns the PlaybackEvent stream into ViewingSession records using event-time
+# watermarks. Per-session state is evicted as soon as a session is finalized,
+# so memory tracks concurrent viewers rather than history.
+
+PLAYING_EVENTS = {EventType.PLAY_START, EventType.PLAY_RESUME, EventType.SEEK}
+STOPPED_EVENTS = {EventType.PLAY_PAUSE, EventType.PLAY_STOP, EventType.PLAY_COMPLETE}
+ENDING_EVENTS = {EventType.PLAY_STOP, EventType.PLAY_COMPLETE}
+
+ABANDONED_BELOW_PERCENT = 5.0
+COMPLETED_ABOVE_PERCENT = 95.0
+
+
+@dataclass
+class SessionizerConfig:
+    inactivity_gap_seconds: int = 1800
+    allowed_lateness_seconds: int = 60
+    # A TV episode starting this soon after the user's previous episode ended is a binge
+    binge_gap_seconds: int = 1800
+
+
+@dataclass
+class SessionizerMetrics:
+    events_processed: int = 0
+    late_events_dropped: int = 0
+    sessions_emitted: int = 0
+    sessions_timed_out: int = 0
+    peak_open_sessions: int = 0
+
+
+class _SessionState:
+    __slots__ = (
+        "session_id", "user_id", "content_id", "content_type", "start", "last_event_time",
+        "end", "deadline", "playing", "last_position", "max_position", "duration",
+        "watch_seconds", "pause_count", "seek_count", "rewind_count", "fast_forward_count",
+        "bitrate_sum", "bitrate_samples", "buffering_ms", "buffering_events",
+        "quality_changes", "errors", "device_type", "video_quality", "completed",
+    )
+
+    def __init__(self, event: PlaybackEvent):
+        self.session_id = event.session_id
+        self.user_id = event.user_id
+        self.content_id = event.content_id
+        self.content_type = event.content_type
+        self.start = event.event_timestamp
+        self.last_event_time = event.event_timestamp
+        self.end: Optional[datetime] = None
+        self.deadline = event.event_timestamp
+        self.playing = False
+        self.last_position = event.position_seconds
+        self.max_position = event.position_seconds
+        self.duration = event.duration_seconds
+        self.watch_seconds = 0.0
+        self.pause_count = 0
+        self.seek_count = 0
+        self.rewind_count = 0
+        self.fast_forward_count = 0
+        self.bitrate_sum = 0
+        self.bitrate_samples = 0
+        self.buffering_ms = 0
+        self.buffering_events = 0
+        self.quality_changes = 0
+        self.errors = 0
+        self.device_type = event.device_type
+        self.video_quality = event.video_quality
+        self.completed = False
+
+
+class Sessionizer:
+    """
+    Streaming PlaybackEvent -> ViewingSession builder.
+
+    Sessions are keyed by (session_id, content_id). The watermark trails the
+    highest event time seen by allowed_lateness. A session is finalized once
+    the watermark passes its PLAY_STOP/PLAY_COMPLETE time, or passes its last
+    event time plus the inactivity gap. Events older than the watermark for
+    a session that is no longer open are dropped as late.
+
+    Active sessions are kept in an OrderedDict in order of last update and
+    ended ones in a second OrderedDict in order of when they ended, and
+    expiry only looks at the fronts instead of scanning all state. With
+    in-order events the deadlines are monotone within each dict. A late
+    event moves its session to the back without moving its deadline, so
+    that session can be finalized up to allowed_lateness after its deadline
+    passes.
+    """
+
+    def __init__(self, config: Optional[SessionizerConfig] = None, producer=None,
+                 on_session: Optional[Callable[[ViewingSession], None]] = None):
+        self.config = config or SessionizerConfig()
+        self.producer = producer
+        self.on_session = on_session
+        self.metrics = SessionizerMetrics()
+        self.watermark: Optional[datetime] = None
+        self._max_event_time: Optional[datetime] = None
+        self._active: "OrderedDict[Tuple[str, str], _SessionState]" = OrderedDict()
+        self._ending: "OrderedDict[Tuple[str, str], _SessionState]" = OrderedDict()
+        self._last_episode_end: "OrderedDict[str, datetime]" = OrderedDict()
+        self._gap = timedelta(seconds=self.config.inactivity_gap_seconds)
+        self._lateness = timedelta(seconds=self.config.allowed_lateness_seconds)
+        self._binge_gap = timedelta(seconds=self.config.binge_gap_seconds)
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._ending)
+
+    def process(self, event: PlaybackEvent):
+        self.metrics.events_processed += 1
+        ts = event.event_timestamp
+        if self._max_event_time is None or ts > self._max_event_time:
+            self._max_event_time = ts
+            self.watermark = ts - self._lateness
+
+        key = (event.session_id or event.user_id, event.content_id)
+        state = self._active.get(key)
+        if state is not None:
+            self._active.move_to_end(key)
+        else:
+            state = self._ending.get(key)
+            if state is None:
+                if self.watermark is not None and ts < self.watermark:
+                    self.metrics.late_events_dropped += 1
+                    return
+                state = self._active[key] = _SessionState(event)
+                open_sessions = len(self._active) + len(self._ending)
+                if open_sessions > self.metrics.peak_open_sessions:
+                    self.metrics.peak_open_sessions = open_sessions
+
+        was_ended = state.end is not None
+        self._apply(state, event)
+        if state.end is not None and not was_ended:
+            self._active.pop(key, None)
+            self._ending[key] = state
+        elif was_ended and state.end is None:
+            # Playback resumed after a stop within the lateness window
+            del self._ending[key]
+            self._active[key] = state
+        self._expire()
+
+    def process_many(self, events: Iterable[PlaybackEvent]):
+        for event in events:
+            self.process(event)
+
+    def _apply(self, state: _SessionState, event: PlaybackEvent):
+        ts = event.event_timestamp
+        event_type = event.event_type
+        position = event.position_seconds
+
+        if ts >= state.last_event_time:
+            if state.playing:
+                # Watch time accrues between events while playing, capped at the gap
+                delta = (ts - state.last_event_time).total_seconds()
+                state.watch_seconds += min(delta, self.config.inactivity_gap_seconds)
+            state.last_event_time = ts
+            if event_type in PLAYING_EVENTS:
+                state.playing = True
+            elif event_type in STOPPED_EVENTS:
+                state.playing = False
+        elif ts < state.start:
+            state.start = ts
+
+        if event_type is EventType.PLAY_PAUSE:
+            state.pause_count += 1
+        elif event_type is EventType.SEEK:
+            state.seek_count += 1
+            if position < state.last_position:
+                state.rewind_count += 1
+            elif position > state.last_position:
+                state.fast_forward_count += 1
+
+        state.last_position = position
+        if position > state.max_position:
+            state.max_position = position
+        if event.duration_seconds > state.duration:
+            state.duration = event.duration_seconds
+        if event.bitrate_kbps:
+            state.bitrate_sum += event.bitrate_kbps
+            state.bitrate_samples += 1
+        state.buffering_ms += event.buffering_duration_ms
+        state.buffering_events += event.buffering_count
+        if event.video_quality is not state.video_quality:
+            state.quality_changes += 1
+            state.video_quality = event.video_quality
+        if event.error_code:
+            state.errors += 1
+        state.device_type = event.device_type
+
+        if event_type in ENDING_EVENTS:
+            if event_type is EventType.PLAY_COMPLETE:
+                state.completed = True
+            if state.end is None or ts > state.end:
+                state.end = ts
+            state.deadline = state.end
+        elif state.end is not None and ts > state.end and event_type in PLAYING_EVENTS:
+            state.end = None
+        if state.end is None:
+            state.deadline = state.last_event_time + self._gap
+
+    def _expire(self):
+        watermark = self.watermark
+        for sessions in (self._ending, self._active):
+            while sessions:
+                key, state = next(iter(sessions.items()))
+                if state.deadline > watermark:
+                    break
+                del sessions[key]
+                self._finalize(state, timed_out=state.end is None)
+
+        # Binge lookups only need episodes that ended within the binge gap
+        horizon = watermark - self._binge_gap
+        last_episode_end = self._last_episode_end
+        while last_episode_end:
+            user_id, ended = next(iter(last_episode_end.items()))
+            if ended > horizon:
+                break
+            del last_episode_end[user_id]
+
+    def _finalize(self, state: _SessionState, timed_out: bool) -> ViewingSession:
+        end = state.end or state.last_event_time
+        completion = 0.0
+        if state.duration > 0:
+            completion = min(100.0, state.max_position * 100.0 / state.duration)
+        completed = state.completed or completion >= COMPLETED_ABOVE_PERCENT
+
+        is_binge = False
+        if state.content_type is ContentType.TV_EPISODE:
+            previous_end = self._last_episode_end.pop(state.user_id, None)
+            is_binge = previous_end is not None and state.start - previous_end <= self._binge_gap
+            self._last_episode_end[state.user_id] = end
+
+        session = ViewingSession(
+            session_id=state.session_id,
+            user_id=state.user_id,
+            content_id=state.content_id,
+            session_start=state.start,
+            session_end=end,
+            total_watch_tie_seconds=int(state.watch_seconds),
+            completion_percentage=completion,
+            pause_count=state.pause_count,
+            seel_count=state.seek_count,
+            rewind_count=state.rewind_count,
+            fast_forward_count=state.fast_forward_count,
+            average_bitrate_kbps=state.bitrate_sum // state.bitrate_samples if state.bitrate_samples else 0,
+            total_buffering_duration_ms=state.buffering_ms,
+            buffering_events=state.buffering_events,
+            quality_changes=state.quality_changes,
+            errors_encountered=state.errors,
+            device_type=state.device_type,
+            video_quality=state.video_quality,
+            is_completed=completed,
+            is_abandoned=not completed and completion < ABANDONED_BELOW_PERCENT,
+            is_binge_watch=is_binge,
+        )
+        self.metrics.sessions_emitted += 1
+        if timed_out:
+            self.metrics.sessions_timed_out += 1
+        if self.producer is not None:
+            self.producer.produce(session, topic=KafkaTopics.VIEWING_SESSIONS)
+        if self.on_session is not None:
+            self.on_session(session)
+        return session
+
+    def flush(self) -> int:
+        """Finalize every open session (end of stream / shutdown)"""
+        count = len(self)
+        for sessions in (self._ending, self._active):
+            while sessions:
+                _, state = sessions.popitem(last=False)
+                self._finalize(state, timed_out=state.end is None)
+        return count
+
+
+def synthetic_playback_stream(num_events: int, concurrent_viewers: int = 50_000,
+                              seed: int = 7) -> Iterable[PlaybackEvent]:
+    # Interleaved viewer sessions: start, periodic heartbeats/seeks/pauses, stop
+    rng = random.Random(seed)
+    clock = datetime(2024, 1, 1)
+    step = timedelta(milliseconds=5)
+    viewers: List[list] = []
+    session_counter = 0
+
+    def new_viewer():
+        nonlocal session_counter
+        session_counter += 1
+        return [f"session_{session_counter}", f"user_{rng.randrange(1_000_000)}",
+                f"movie_{rng.randrange(5000)}", 0, rng.randint(20, 200)]
+
+    for _ in range(concurrent_viewers):
+        viewers.append(new_viewer())
+
+    for i in range(num_events):
+        clock += step
+        slot = rng.randrange(concurrent_viewers)
+        viewer = viewers[slot]
+        session_id, user_id, content_id, position, remaining = viewer
+        if position == 0:
+            event_type = EventType.PLAY_START
+        elif remaining <= 1:
+            event_type = EventType.PLAY_STOP
+            viewers[slot] = new_viewer()
+        else:
+            roll = rng.random()
+            event_type = EventType.SEEK if roll < 0.05 else \
+                EventType.PLAY_PAUSE if roll < 0.08 else EventType.PLAY_RESUME
+        viewer[3] = position + 30
+        viewer[4] = remaining - 1
+        yield PlaybackEvent(
+            event_type=event_type, event_timestamp=clock, user_id=user_id,
+            session_id=session_id, content_id=content_id, position_seconds=position,
+            duration_seconds=7200, bitrate_kbps=5000,
+        )
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    events = list(synthetic_playback_stream(n))
+    sessionizer = Sessionizer()
+    start = time.perf_counter()
+    sessionizer.process_many(events)
+    elapsed = time.perf_counter() - start
+    sessionizer.flush()
+    m = sessionizer.metrics
+    print(f"{n / elapsed:,.0f} events/sec, {m.sessions_emitted:,} sessions, "
+          f"peak open sessions {m.peak_open_sessions:,}, late dropped {m.late_events_dropped}")
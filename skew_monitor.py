@@ -0,0 +1,399 @@
+import logging
+import math
+import sys
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from event_producer import event_key, key_hash
+from real_time_event_streaming import KafkaTopics, TopicConfig
+
+logger = logging.getLogger(__name__)
+
+# Partition skew monitoring and partition planning
+# Every produced record is counted per partition (exact, a couple of array
+# increments) and per key in a count-min sketch per topic. Keys whose sketch
+# estimate beats the smallest tracked heavy hitter enter a fixed-size top-k
+# table, so hot keys are found without a counter per key. Reports are cut
+# per tumbling window: load imbalance across partitions and the keys that
+# cause it.
+#
+# The planner turns peak window rates into a partition count per topic. The
+# count is sized for per-partition capacity, headroom and the imbalance left
+# once hot keys are salted. Keys too hot for any single partition get a
+# salt bucket count.
+
+@dataclass
+class SkewMonitorConfig:
+    window_seconds: float = 60.0
+    # Count-min error is about e / width of the window's records, with
+    # probability 1 - e^-depth
+    sketch_width: int = 4096
+    sketch_depth: int = 4
+    heavy_hitters: int = 64
+    # Keys at or above either share are reported as hot
+    hot_key_share: float = 0.01
+    hot_key_partition_share: float = 0.10
+    # ...and seen at least this often in the window, so sparse partitions do not report noise
+    min_hot_key_records: int = 50
+    history_windows: int = 60
+
+
+@dataclass
+class HotKey:
+    key: str
+    partition: int
+    # Count-min estimate: never below the true count
+    estimated_records: int
+    share: float
+    partition_share: float
+
+
+@dataclass
+class SkewReport:
+    topic: str
+    window_start: float
+    window_seconds: float
+    records: int
+    bytes: int
+    records_per_second: float
+    bytes_per_second: float
+    num_partitions: int
+    partition_records: List[int]
+    max_partition: int
+    # Hottest partition over the mean; 1.0 is perfectly even
+    imbalance: float
+    # Coefficient of variation of partition record counts
+    cv: float
+    hot_keys: List[HotKey] = field(default_factory=list)
+
+
+class _TopicLoad:
+    __slots__ = ("num_partitions", "records", "bytes", "sketch", "top", "top_partitions", "floor", "total",
+                 "total_bytes")
+
+    def __init__(self, num_partitions: int, config: SkewMonitorConfig):
+        self.num_partitions = num_partitions
+        self.records = array("q", bytes(8 * num_partitions))
+        self.bytes = array("q", bytes(8 * num_partitions))
+        self.sketch = array("q", bytes(8 * config.sketch_width * config.sketch_depth))
+        # Heavy hitters: key -> latest estimate, and the smallest estimate kept
+        self.top: Dict[str, int] = {}
+        self.top_partitions: Dict[str, int] = {}
+        self.floor = 0
+        self.total = 0
+        self.total_bytes = 0
+
+    def reset(self):
+        zero = bytes(8 * self.num_partitions)
+        self.records = array("q", zero)
+        self.bytes = array("q", zero)
+        self.sketch = array("q", bytes(8 * len(self.sketch)))
+        self.top = {}
+        self.top_partitions = {}
+        self.floor = 0
+        self.total = 0
+        self.total_bytes = 0
+
+
+class SkewMonitor:
+    """
+    Per-topic partition load and heavy-hitter keys over tumbling windows.
+    observe() takes the partition key as produced (str, or the broker's utf-8
+    bytes) and maps it to a partition with the producer's hash unless the
+    partition is given.
+    """
+
+    def __init__(self, config: Optional[SkewMonitorConfig] = None,
+                 num_partitions: Optional[Callable[[str], int]] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_report: Optional[Callable[[SkewReport], None]] = None):
+        self.config = config or SkewMonitorConfig()
+        self._num_partitions = num_partitions or (
+            lambda topic: TopicConfig.for_topic(KafkaTopics(topic))['num_partitions'])
+        self.clock = clock
+        self.on_report = on_report
+        self.history: deque = deque(maxlen=self.config.history_windows)
+        self._topics: Dict[str, _TopicLoad] = {}
+        self._window_start: Optional[float] = None
+        # key -> sketch cell indices; hashing dominates otherwise, and keys repeat
+        self._cells: Dict[str, Tuple[int, ...]] = {}
+        self._hashes: Dict[str, int] = {}
+
+    def _topic(self, topic: str) -> _TopicLoad:
+        load = self._topics.get(topic)
+        if load is None:
+            load = self._topics[topic] = _TopicLoad(self._num_partitions(topic), self.config)
+        return load
+
+    def _hash(self, key: str) -> int:
+        h = self._hashes.get(key)
+        if h is None:
+            if len(self._hashes) >= 1_000_000:
+                self._hashes.clear()
+                self._cells.clear()
+            h = self._hashes[key] = key_hash(key)
+        return h
+
+    def _sketch_cells(self, key: str) -> Tuple[int, ...]:
+        cells = self._cells.get(key)
+        if cells is None:
+            # Kirsch-Mitzenmacher: depth indices from the two halves of one hash
+            h = self._hash(key)
+            h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+            width = self.config.sketch_width
+            cells = self._cells[key] = tuple(
+                row * width + (h1 + row * h2) % width for row in range(self.config.sketch_depth))
+        return cells
+
+    def observe(self, topic: str, key: Any, size_bytes: int = 0, partition: Optional[int] = None,
+                now: Optional[float] = None):
+        if now is None:
+            now = self.clock()
+        if self._window_start is None:
+            self._window_start = now
+        elif now - self._window_start >= self.config.window_seconds:
+            self.roll(now)
+        if key.__class__ is bytes:
+            key = key.decode("utf-8")
+        load = self._topic(topic)
+        if partition is None:
+            partition = self._hash(key) % load.num_partitions
+        load.records[partition] += 1
+        load.total += 1
+        if size_bytes:
+            load.bytes[partition] += size_bytes
+            load.total_bytes += size_bytes
+
+        sketch = load.sketch
+        estimate = None
+        for cell in self._sketch_cells(key):
+            count = sketch[cell] + 1
+            sketch[cell] = count
+            if estimate is None or count < estimate:
+                estimate = count
+        top = load.top
+        if key in top:
+            top[key] = estimate
+        elif len(top) < self.config.heavy_hitters:
+            top[key] = estimate
+            load.top_partitions[key] = partition
+            if len(top) == self.config.heavy_hitters:
+                load.floor = min(top.values())
+        elif estimate > load.floor:
+            evicted = min(top, key=top.__getitem__)
+            del top[evicted]
+            del load.top_partitions[evicted]
+            top[key] = estimate
+            load.top_partitions[key] = partition
+            load.floor = min(top.values())
+
+    def observe_event(self, event: Any, topic: KafkaTopics, size_bytes: int = 0,
+                      now: Optional[float] = None):
+        self.observe(topic.value, event_key(event), size_bytes, now=now)
+
+    def observe_records(self, records: Iterable[Any], now: Optional[float] = None):
+        """BrokerRecords, with their actual partitions and value sizes"""
+        for record in records:
+            self.observe(record.topic, record.key, len(record.value), record.partition, now)
+
+    # Reports
+
+    def _report(self, topic: str, load: _TopicLoad, window_start: float, window_seconds: float) -> SkewReport:
+        config = self.config
+        records = list(load.records)
+        mean = load.total / load.num_partitions
+        max_partition = max(range(load.num_partitions), key=records.__getitem__)
+        variance = sum((r - mean) ** 2 for r in records) / load.num_partitions
+        hot_keys = []
+        for key, estimate in sorted(load.top.items(), key=lambda item: -item[1]):
+            partition = load.top_partitions[key]
+            share = estimate / load.total
+            partition_share = min(1.0, estimate / records[partition]) if records[partition] else 0.0
+            if estimate < config.min_hot_key_records:
+                break
+            if share >= config.hot_key_share or partition_share >= config.hot_key_partition_share:
+                hot_keys.append(HotKey(key, partition, estimate, share, partition_share))
+        seconds = max(window_seconds, 1e-9)
+        return SkewReport(
+            topic=topic, window_start=window_start, window_seconds=window_seconds,
+            records=load.total, bytes=load.total_bytes, records_per_second=load.total / seconds,
+            bytes_per_second=load.total_bytes / seconds, num_partitions=load.num_partitions,
+            partition_records=records, max_partition=max_partition,
+            imbalance=records[max_partition] / mean if mean else 0.0,
+            cv=math.sqrt(variance) / mean if mean else 0.0, hot_keys=hot_keys,
+        )
+
+    def report(self, now: Optional[float] = None) -> List[SkewReport]:
+        """Reports for the window in progress, without closing it"""
+        if self._window_start is None:
+            return []
+        now = self.clock() if now is None else now
+        return [self._report(topic, load, self._window_start, now - self._window_start)
+                for topic, load in self._topics.items() if load.total]
+
+    def roll(self, now: Optional[float] = None) -> List[SkewReport]:
+        """Close the current window: report it, keep it in history and start a new one"""
+        now = self.clock() if now is None else now
+        reports = self.report(now)
+        for report in reports:
+            self.history.append(report)
+            if self.on_report is not None:
+                self.on_report(report)
+        for load in self._topics.values():
+            load.reset()
+        self._window_start = now
+        return reports
+
+
+# Partition planning
+
+@dataclass
+class PartitionPlannerConfig:
+    # Sustained per-partition throughput the consumers (not just the broker) handle
+    max_records_per_partition_per_second: float = 2_000.0
+    max_bytes_per_partition_per_second: float = 5_000_000.0
+    # Multiplier on the peak observed rate for growth and bursts
+    headroom: float = 2.0
+    # A key needing more than this fraction of one partition's capacity is salted
+    salt_threshold: float = 0.5
+    min_partitions: int = 3
+    max_partitions: int = 1_000
+
+
+@dataclass
+class PartitionPlan:
+    topic: str
+    current_partitions: int
+    recommended_partitions: int
+    peak_records_per_second: float
+    peak_bytes_per_second: float
+    # Hottest partition over the mean after salting the hot keys
+    residual_imbalance: float
+    # key -> number of salt buckets
+    salted_keys: Dict[str, int] = field(default_factory=dict)
+    notes: List[str] = field(default_factory=list)
+
+    def topic_config(self) -> Dict[str, Any]:
+        """The topic's TopicConfig template with the recommended partition count"""
+        try:
+            template = TopicConfig.for_topic(KafkaTopics(self.topic))
+        except ValueError:
+            template = TopicConfig.STANDARD_CONFIG
+        return {**template, 'num_partitions': self.recommended_partitions, 'config': dict(template['config'])}
+
+
+def salt_key(key: str, buckets: int, discriminator: str) -> str:
+    """
+    Spread a hot key over `buckets` sub-keys. Choosing the bucket from a
+    secondary attribute (e.g. session_id) keeps that attribute's records in
+    order; consumers must merge the sub-keys back when aggregating per key.
+    """
+    if buckets <= 1:
+        return key
+    return f"{key}#{key_hash(discriminator) % buckets}"
+
+
+def plan_partitions(reports: Iterable[SkewReport], current: Optional[Dict[str, int]] = None,
+                    config: Optional[PartitionPlannerConfig] = None) -> List[PartitionPlan]:
+    """Recommend partition counts and key salting per topic from observed window reports"""
+    config = config or PartitionPlannerConfig()
+    by_topic: Dict[str, List[SkewReport]] = {}
+    for report in reports:
+        by_topic.setdefault(report.topic, []).append(report)
+    plans = []
+    for topic, topic_reports in by_topic.items():
+        peak = max(topic_reports, key=lambda r: r.records_per_second)
+        peak_bytes = max(r.bytes_per_second for r in topic_reports)
+        capacity = config.max_records_per_partition_per_second
+        notes = []
+
+        # Salt keys whose own peak rate would crowd a partition
+        salted: Dict[str, int] = {}
+        key_rates: Dict[str, float] = {}
+        for report in topic_reports:
+            for hot in report.hot_keys:
+                rate = hot.estimated_records / max(report.window_seconds, 1e-9)
+                key_rates[hot.key] = max(key_rates.get(hot.key, 0.0), rate)
+        for key, rate in key_rates.items():
+            needed = rate * config.headroom / (capacity * config.salt_threshold)
+            if needed > 1:
+                salted[key] = math.ceil(needed)
+
+        # Imbalance of the peak window once salted keys are spread evenly
+        residual = list(peak.partition_records)
+        for hot in peak.hot_keys:
+            if hot.key in salted:
+                residual[hot.partition] -= hot.estimated_records
+        residual_mean = sum(residual) / len(residual) if residual else 0.0
+        residual_imbalance = max(residual) / residual_mean if residual_mean > 0 else 1.0
+        if salted and residual_imbalance < peak.imbalance:
+            notes.append(f"salting {len(salted)} key(s) cuts imbalance from "
+                         f"{peak.imbalance:.2f}x to {residual_imbalance:.2f}x")
+
+        # Hash imbalance shrinks as partitions grow, so this estimate is conservative
+        by_records = peak.records_per_second * config.headroom * residual_imbalance / capacity
+        by_bytes = peak_bytes * config.headroom / config.max_bytes_per_partition_per_second
+        recommended = min(config.max_partitions, max(config.min_partitions, math.ceil(max(by_records, by_bytes))))
+        for key in salted:
+            salted[key] = min(salted[key], recommended)
+
+        current_partitions = (current or {}).get(topic, peak.num_partitions)
+        if recommended < current_partitions:
+            notes.append(f"over-provisioned: {recommended} would do, but Kafka cannot shrink a topic; "
+                         f"keep {current_partitions} unless it is recreated")
+        elif recommended > current_partitions:
+            notes.append("adding partitions remaps keys; drain keyed state before expanding")
+        plans.append(PartitionPlan(
+            topic=topic, current_partitions=current_partitions, recommended_partitions=recommended,
+            peak_records_per_second=peak.records_per_second, peak_bytes_per_second=peak_bytes,
+            residual_imbalance=residual_imbalance, salted_keys=salted, notes=notes,
+        ))
+    return plans
+
+
+if __name__ == "__main__":
+    # A bot account on the user-keyed playback topic and a viral live event on
+    # the content-keyed metrics topic, detected and planned around
+    from load_generator import LoadGenerator, LoadProfile
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    profile = LoadProfile(peak_events_per_second=400.0)
+    events = list(LoadGenerator(profile).playback_events(n))
+    playback, content = KafkaTopics.PLAYBACK_EVENTS.value, KafkaTopics.CONTENT_METRICS.value
+    stream = []
+    for i, event in enumerate(events):
+        now = event.event_timestamp.timestamp()
+        user_id = "user_bot_1" if i % 20 == 0 else event.user_id
+        stream.append((playback, user_id, now))
+        content_id = "live_final_2024" if i % 7 == 0 else event.content_id
+        stream.append((content, content_id, now))
+
+    monitor = SkewMonitor(SkewMonitorConfig(window_seconds=60.0))
+    start = time.perf_counter()
+    for topic, key, now in stream:
+        monitor.observe(topic, key, 400, now=now)
+    elapsed = time.perf_counter() - start
+    monitor.roll(stream[-1][2])
+    print(f"{len(stream):,} observations: {len(stream) / elapsed:,.0f}/sec, {len(monitor.history)} window reports")
+
+    for topic in (playback, content):
+        report = max((r for r in monitor.history if r.topic == topic), key=lambda r: r.records_per_second)
+        print(f"{topic}: {report.records_per_second:,.0f} rec/s over {report.num_partitions} partitions, "
+              f"imbalance {report.imbalance:.2f}x (cv {report.cv:.2f}), hottest partition {report.max_partition}")
+        for hot in report.hot_keys[:3]:
+            print(f"  {hot.key}: ~{hot.estimated_records:,} records, {hot.share:.1%} of topic, "
+                  f"{hot.partition_share:.0%} of partition {hot.partition}")
+
+    # Scale the observed rates to a production peak (x50) before planning
+    scaled = [SkewReport(**{**vars(r), "records_per_second": r.records_per_second * 50,
+                            "bytes_per_second": r.bytes_per_second * 50, "window_seconds": r.window_seconds / 50})
+              for r in monitor.history]
+    for plan in plan_partitions(scaled):
+        print(f"{plan.topic}: {plan.current_partitions} -> {plan.recommended_partitions} partitions "
+              f"(peak {plan.peak_records_per_second:,.0f} rec/s, residual imbalance {plan.residual_imbalance:.2f}x), "
+              f"salt {plan.salted_keys}")
+        for note in plan.notes:
+            print(f"  {note}")
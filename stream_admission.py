@@ -0,0 +1,356 @@
+import logging
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core_data_domains import (
+    PlaybackEvent, UserSubscription, SubscriptionStatus, SubscriptionTier, VideoQuality, EventType
+)
+
+logger = logging.getLogger(__name__)
+
+# Concurrent-stream admission
+# Enforces UserSubscription.max_concurrent_streams, max_quality and status at
+# PLAY_START. Users are spread over independently locked shards, so play
+# starts from many threads only contend when they land on the same shard.
+# Active streams expire when heartbeats stop; each shard keeps a hashed timing
+# wheel of expiry deadlines, so expiry is amortized O(1) per stream instead of
+# a scan over every active stream.
+
+QUALITY_LADDER = list(VideoQuality)
+QUALITY_RANK = {quality: rank for rank, quality in enumerate(QUALITY_LADDER)}
+
+STREAMING_STATUSES = frozenset({SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL})
+
+STOP_EVENTS = {EventType.PLAY_STOP, EventType.PLAY_COMPLETE}
+
+
+class AdmissionReason(Enum):
+    ALLOWED = "allowed"
+    # Play start for a session that already holds a stream slot
+    ALREADY_ACTIVE = "already_active"
+    NO_SUBSCRIPTION = "no_subscription"
+    INACTIVE_SUBSCRIPTION = "inactive_subscription"
+    STREAM_LIMIT = "stream_limit"
+
+
+AdmissionDecision = namedtuple(
+    "AdmissionDecision", ["allowed", "reason", "quality", "active_streams", "max_streams"]
+)
+
+
+@dataclass
+class AdmissionConfig:
+    # Power of two; users map to shards by hash
+    num_shards: int = 64
+    # A stream with no heartbeat for this long no longer counts
+    heartbeat_timeout_seconds: float = 90.0
+    # Expiry resolution: a dead stream is released within one tick of its deadline
+    tick_seconds: float = 1.0
+
+
+@dataclass
+class AdmissionMetrics:
+    admitted: int = 0
+    already_active: int = 0
+    denied_no_subscription: int = 0
+    denied_inactive: int = 0
+    denied_limit: int = 0
+    quality_clamped: int = 0
+    heartbeats: int = 0
+    heartbeats_unknown: int = 0
+    released: int = 0
+    expired: int = 0
+
+
+class _Stream:
+    __slots__ = ("user_id", "session_id", "device_id", "quality", "deadline", "active")
+
+    def __init__(self, user_id: str, session_id: str, device_id: str, quality: VideoQuality, deadline: float):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.device_id = device_id
+        self.quality = quality
+        self.deadline = deadline
+        self.active = True
+
+
+class _UserState:
+    __slots__ = ("max_streams", "max_rank", "can_stream", "streams")
+
+    def __init__(self):
+        # No entitlement until a subscription is loaded
+        self.max_streams = 0
+        self.max_rank = -1
+        self.can_stream: Optional[bool] = None
+        self.streams: Dict[str, _Stream] = {}
+
+
+class _Shard:
+    __slots__ = ("lock", "users", "wheel", "tick", "metrics")
+
+    def __init__(self, wheel_slots: int):
+        self.lock = threading.Lock()
+        self.users: Dict[str, _UserState] = {}
+        self.wheel: List[List[_Stream]] = [[] for _ in range(wheel_slots)]
+        # Last wheel tick processed; None until first use
+        self.tick: Optional[int] = None
+        self.metrics = AdmissionMetrics()
+
+
+class StreamAdmissionService:
+    """
+    Thread-safe allow/deny for play starts, with quality clamped to the tier.
+
+    Each call takes exactly one shard lock and does dict lookups plus the
+    shard's share of due timing-wheel slots. Heartbeats only move a stream's
+    deadline; the wheel entry is re-filed lazily when its slot comes due, so
+    a heartbeat never touches the wheel. Subscription changes apply to new
+    play starts; streams already running are not cut off.
+    """
+
+    def __init__(self, config: Optional[AdmissionConfig] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.config = config or AdmissionConfig()
+        num_shards = self.config.num_shards
+        if num_shards < 1 or num_shards & (num_shards - 1):
+            raise ValueError(f"num_shards must be a power of two, got {num_shards}")
+        self.clock = clock
+        self._mask = num_shards - 1
+        self._tick_seconds = self.config.tick_seconds
+        self._timeout = self.config.heartbeat_timeout_seconds
+        # One lap of the wheel covers the longest possible wait for a deadline
+        self._wheel_slots = int(self._timeout / self._tick_seconds) + 2
+        self._shards = [_Shard(self._wheel_slots) for _ in range(num_shards)]
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self._shards[hash(user_id) & self._mask]
+
+    @property
+    def metrics(self) -> AdmissionMetrics:
+        """Counters summed over shards (not a consistent cut while running)"""
+        total = AdmissionMetrics()
+        for shard in self._shards:
+            for f in fields(AdmissionMetrics):
+                setattr(total, f.name, getattr(total, f.name) + getattr(shard.metrics, f.name))
+        return total
+
+    # Subscriptions
+
+    def upsert_subscription(self, subscription: UserSubscription):
+        shard = self._shard(subscription.user_id)
+        with shard.lock:
+            user = shard.users.get(subscription.user_id)
+            if user is None:
+                user = shard.users[subscription.user_id] = _UserState()
+            user.max_streams = subscription.max_concurrent_streams
+            user.max_rank = QUALITY_RANK[subscription.max_quality]
+            user.can_stream = subscription.status in STREAMING_STATUSES
+
+    def upsert_subscriptions(self, subscriptions: Iterable[UserSubscription]):
+        for subscription in subscriptions:
+            self.upsert_subscription(subscription)
+
+    def remove_subscription(self, user_id: str):
+        shard = self._shard(user_id)
+        with shard.lock:
+            user = shard.users.get(user_id)
+            if user is None:
+                return
+            if user.streams:
+                user.can_stream = None
+            else:
+                del shard.users[user_id]
+
+    # Streams
+
+    def admit(self, user_id: str, session_id: str,
+              requested_quality: VideoQuality = VideoQuality.UHD_8K, device_id: str = "") -> AdmissionDecision:
+        now = self.clock()
+        shard = self._shard(user_id)
+        with shard.lock:
+            self._advance(shard, now)
+            metrics = shard.metrics
+            user = shard.users.get(user_id)
+            if user is None or user.can_stream is None:
+                metrics.denied_no_subscription += 1
+                return AdmissionDecision(False, AdmissionReason.NO_SUBSCRIPTION, None,
+                                         len(user.streams) if user else 0, 0)
+            streams = user.streams
+            if not user.can_stream:
+                metrics.denied_inactive += 1
+                return AdmissionDecision(False, AdmissionReason.INACTIVE_SUBSCRIPTION, None,
+                                         len(streams), user.max_streams)
+            stream = streams.get(session_id)
+            if stream is None and len(streams) >= user.max_streams:
+                metrics.denied_limit += 1
+                return AdmissionDecision(False, AdmissionReason.STREAM_LIMIT, None,
+                                         len(streams), user.max_streams)
+            if QUALITY_RANK[requested_quality] > user.max_rank:
+                quality = QUALITY_LADDER[user.max_rank]
+                metrics.quality_clamped += 1
+            else:
+                quality = requested_quality
+            if stream is not None:
+                stream.deadline = now + self._timeout
+                stream.quality = quality
+                metrics.already_active += 1
+                return AdmissionDecision(True, AdmissionReason.ALREADY_ACTIVE, quality,
+                                         len(streams), user.max_streams)
+            stream = streams[session_id] = _Stream(user_id, session_id, device_id, quality, now + self._timeout)
+            self._schedule(shard, stream)
+            metrics.admitted += 1
+            return AdmissionDecision(True, AdmissionReason.ALLOWED, quality, len(streams), user.max_streams)
+
+    def heartbeat(self, user_id: str, session_id: str) -> bool:
+        """Extend a stream's lease; False if it is unknown or already expired"""
+        now = self.clock()
+        shard = self._shard(user_id)
+        with shard.lock:
+            self._advance(shard, now)
+            user = shard.users.get(user_id)
+            stream = user.streams.get(session_id) if user is not None else None
+            if stream is None:
+                shard.metrics.heartbeats_unknown += 1
+                return False
+            stream.deadline = now + self._timeout
+            shard.metrics.heartbeats += 1
+            return True
+
+    def release(self, user_id: str, session_id: str) -> bool:
+        now = self.clock()
+        shard = self._shard(user_id)
+        with shard.lock:
+            self._advance(shard, now)
+            user = shard.users.get(user_id)
+            if user is None or session_id not in user.streams:
+                return False
+            self._drop(shard, user, user.streams[session_id])
+            shard.metrics.released += 1
+            return True
+
+    def active_streams(self, user_id: str) -> int:
+        shard = self._shard(user_id)
+        with shard.lock:
+            self._advance(shard, self.clock())
+            user = shard.users.get(user_id)
+            return len(user.streams) if user is not None else 0
+
+    def handle_event(self, event: PlaybackEvent) -> Optional[AdmissionDecision]:
+        """Drive admission from the playback stream; decisions only for PLAY_START"""
+        if event.event_type is EventType.PLAY_START:
+            return self.admit(event.user_id, event.session_id, event.video_quality, event.device_id)
+        if event.event_type in STOP_EVENTS:
+            self.release(event.user_id, event.session_id)
+        else:
+            self.heartbeat(event.user_id, event.session_id)
+        return None
+
+    # Timing wheel
+
+    def _schedule(self, shard: _Shard, stream: _Stream):
+        # Filed one tick after the deadline so it is never processed early
+        tick = int(stream.deadline / self._tick_seconds) + 1
+        shard.wheel[tick % self._wheel_slots].append(stream)
+
+    def _advance(self, shard: _Shard, now: float):
+        target = int(now / self._tick_seconds)
+        previous = shard.tick
+        shard.tick = target
+        if previous is None or target <= previous:
+            return
+        wheel = shard.wheel
+        slots = self._wheel_slots
+        for tick in range(previous + 1, previous + 1 + min(target - previous, slots)):
+            index = tick % slots
+            due = wheel[index]
+            if not due:
+                continue
+            wheel[index] = []
+            for stream in due:
+                if not stream.active:
+                    continue
+                if stream.deadline <= now:
+                    self._drop(shard, shard.users[stream.user_id], stream)
+                    shard.metrics.expired += 1
+                else:
+                    # Heartbeats moved the deadline; re-file for the new one
+                    self._schedule(shard, stream)
+
+    def _drop(self, shard: _Shard, user: _UserState, stream: _Stream):
+        stream.active = False
+        del user.streams[stream.session_id]
+        if not user.streams and user.can_stream is None:
+            del shard.users[stream.user_id]
+
+
+def peak_play_start_rate(subscribers: int, daily_active_share: float = 0.5,
+                         starts_per_active_user: float = 3.0) -> float:
+    """Play starts/sec in the busiest evening hour of the load generator's diurnal curve"""
+    from load_generator import DIURNAL_CURVE
+    peak_hour_share = max(DIURNAL_CURVE) / sum(DIURNAL_CURVE)
+    return subscribers * daily_active_share * starts_per_active_user * peak_hour_share / 3600.0
+
+
+if __name__ == "__main__":
+    # Play starts from many threads at the evening peak: 1 shard vs sharded
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    num_threads = 8
+    ops_per_thread = 50_000
+    rng = random.Random(13)
+    tiers = [
+        (SubscriptionTier.BASIC, 1, VideoQuality.HD_720P, 0.35),
+        (SubscriptionTier.STANDARD, 2, VideoQuality.HD_1080P, 0.40),
+        (SubscriptionTier.PREMIUM, 4, VideoQuality.UHD_4K, 0.25),
+    ]
+    weights = [t[3] for t in tiers]
+    subscriptions = []
+    for i in range(num_users):
+        tier, streams, quality, _ = rng.choices(tiers, weights)[0]
+        status = SubscriptionStatus.ACTIVE if rng.random() < 0.97 else SubscriptionStatus.PAST_DUE
+        subscriptions.append(UserSubscription(user_id=f"user_{i}", tier=tier, status=status,
+                                              max_concurrent_streams=streams, max_quality=quality))
+    for subscribers in (10_000_000, 100_000_000):
+        print(f"Evening peak for {subscribers:,} subscribers: ~{peak_play_start_rate(subscribers):,.0f} play starts/sec")
+
+    def worker(service: StreamAdmissionService, seed: int, latencies: List[float]):
+        local = random.Random(seed)
+        active = []
+        perf = time.perf_counter
+        for i in range(ops_per_thread):
+            roll = local.random()
+            start = perf()
+            if roll < 0.6 or not active:
+                user_id = f"user_{local.randrange(num_users)}"
+                session_id = f"s{seed}_{i}"
+                if service.admit(user_id, session_id, local.choice(QUALITY_LADDER)).allowed:
+                    active.append((user_id, session_id))
+            elif roll < 0.85:
+                service.heartbeat(*active[local.randrange(len(active))])
+            else:
+                service.release(*active.pop(local.randrange(len(active))))
+            latencies.append(perf() - start)
+
+    for num_shards in (1, 64):
+        service = StreamAdmissionService(AdmissionConfig(num_shards=num_shards))
+        service.upsert_subscriptions(subscriptions)
+        samples = [[] for _ in range(num_threads)]
+        threads = [threading.Thread(target=worker, args=(service, t, samples[t])) for t in range(num_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        latencies = sorted(x for s in samples for x in s)
+        metrics = service.metrics
+        print(f"{num_shards:>3} shard(s), {num_threads} threads: {len(latencies) / elapsed:,.0f} ops/sec, "
+              f"p50 {latencies[len(latencies) // 2] * 1e6:.1f} us, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us "
+              f"(admitted {metrics.admitted:,}, limit {metrics.denied_limit:,}, "
+              f"inactive {metrics.denied_inactive:,}, clamped {metrics.quality_clamped:,})")
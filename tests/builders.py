@@ -0,0 +1,48 @@
+import random
+import typing
+from dataclasses import fields
+from datetime import datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+
+from core_data_domains import (
+    ErrorEvent, ExperimentExposure, ExperimentMetric, PaymentTransaction, PlaybackEvent, QoSTelemtry,
+    UserInteractionEvent, UserRating, ViewingSession
+)
+
+# Every class that is streamed or billed, for tests that run over all of them
+STREAMED_CLASSES = [
+    ErrorEvent, ExperimentExposure, ExperimentMetric, PaymentTransaction, PlaybackEvent, QoSTelemtry,
+    UserInteractionEvent, UserRating, ViewingSession,
+]
+
+BASE = datetime(2024, 1, 1)
+
+
+def _random_value(tp, rng: random.Random):
+    if typing.get_origin(tp) is typing.Union:
+        if rng.random() < 0.3:
+            return None
+        tp = next(arg for arg in typing.get_args(tp) if arg is not type(None))
+    if isinstance(tp, type) and issubclass(tp, Enum):
+        return rng.choice(list(tp))
+    if tp is bool:
+        return rng.random() < 0.5
+    if tp is int:
+        return rng.randint(-10 ** 6, 10 ** 9)
+    if tp is float:
+        return rng.uniform(-1e6, 1e6)
+    if tp is Decimal:
+        return Decimal(rng.randint(-10 ** 6, 10 ** 6)).scaleb(-2)
+    if tp is datetime:
+        return BASE + timedelta(microseconds=rng.randint(0, 10 ** 13))
+    if tp is str:
+        return "".join(rng.choice("abcxyz_09 é\"\\") for _ in range(rng.randint(0, 12)))
+    raise TypeError(f"no random value for {tp!r}")
+
+
+def random_events(cls, n: int, seed: int = 7) -> list:
+    # Instances with every field filled with a random value of its declared type
+    rng = random.Random(seed)
+    hints = typing.get_type_hints(cls)
+    return [cls(**{f.name: _random_value(hints[f.name], rng) for f in fields(cls)}) for _ in range(n)]
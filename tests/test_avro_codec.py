@@ -0,0 +1,109 @@
+from dataclasses import fields
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+
+from avro_codec import (
+    AvroEventSerde, LocalSchemaRegistryClient, WIRE_HEADER, avro_schema_for, decode_datum, encode_datum,
+    fingerprint64, get_codec, parsing_canonical_form, read_long, write_long
+)
+from builders import STREAMED_CLASSES, random_events
+from core_data_domains import PaymentTransaction, PlaybackEvent
+
+
+def events_for(cls, n=200):
+    return random_events(cls, n, seed=11)
+
+
+def as_avro_dict(event):
+    return {f.name: getattr(event, f.name).name if isinstance(getattr(event, f.name), Enum)
+            else getattr(event, f.name) for f in fields(event)}
+
+
+@pytest.mark.parametrize("n", [0, 1, -1, 63, -64, 64, 2 ** 31, -2 ** 63, 2 ** 63 - 1])
+def test_zigzag_varint_round_trip(n):
+    buf = bytearray()
+    write_long(buf, n)
+    assert read_long(buf, 0) == (n, len(buf))
+
+
+@pytest.mark.parametrize("cls", STREAMED_CLASSES, ids=lambda cls: cls.__name__)
+def test_compiled_codec_round_trips(cls):
+    codec = get_codec(cls)
+    for event in events_for(cls):
+        assert codec.decode(codec.encode(event)) == event
+
+
+@pytest.mark.parametrize("cls", STREAMED_CLASSES, ids=lambda cls: cls.__name__)
+def test_compiled_codec_matches_generic_encoder(cls):
+    codec = get_codec(cls)
+    for event in events_for(cls, 50):
+        buf = bytearray()
+        encode_datum(codec.schema, as_avro_dict(event), buf)
+        assert codec.encode(event) == bytes(buf)
+        record, end = decode_datum(codec.schema, bytes(buf))
+        assert end == len(buf)
+        assert record == as_avro_dict(event)
+
+
+def test_edge_values_round_trip():
+    codec = get_codec(PaymentTransaction)
+    for amount in (Decimal("0.00"), Decimal("-12.34"), Decimal("99999999.99"), Decimal("0.01")):
+        payment = PaymentTransaction(amount=amount)
+        assert codec.decode(codec.encode(payment)).amount == amount
+    event = PlaybackEvent(content_title="café ☃ \x00", bandwidth_mbps=None, subtitle_language="",
+                          event_timestamp=datetime(1969, 12, 31, 23, 59, 59, 999999))
+    assert get_codec(PlaybackEvent).decode(get_codec(PlaybackEvent).encode(event)) == event
+
+
+def test_aware_datetimes_are_stored_as_utc():
+    codec = get_codec(PlaybackEvent)
+    aware = datetime(2024, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))
+    decoded = codec.decode(codec.encode(PlaybackEvent(event_timestamp=aware)))
+    assert decoded.event_timestamp == datetime(2024, 1, 1, 10)
+
+
+def test_schema_shape_and_fingerprint():
+    schema = avro_schema_for(PlaybackEvent)
+    by_name = {f["name"]: f for f in schema["fields"]}
+    assert by_name["event_type"]["type"]["type"] == "enum"
+    assert by_name["event_type"]["default"] == "PLAY_START"
+    assert by_name["bandwidth_mbps"]["type"] == ["null", "double"]
+    assert by_name["event_timestamp"]["type"]["logicalType"] == "timestamp-micros"
+    # Documentation attributes do not change the fingerprint; the field list does
+    documented = dict(schema, doc="playback events")
+    assert parsing_canonical_form(documented) == parsing_canonical_form(schema)
+    assert fingerprint64(documented) == fingerprint64(schema)
+    assert fingerprint64(dict(schema, fields=schema["fields"][:-1])) != fingerprint64(schema)
+
+
+def test_serde_frames_and_caches_schema_ids(tmp_path):
+    registry = LocalSchemaRegistryClient(str(tmp_path / "schemas.json"))
+    serde = AvroEventSerde(registry, [PlaybackEvent])
+    events = events_for(PlaybackEvent, 20)
+    payloads = [serde.serialize(e, "playback-events") for e in events]
+    assert registry.request_count == 1
+    magic, schema_id = WIRE_HEADER.unpack_from(payloads[0])
+    assert (magic, schema_id) == (0, registry.get_latest_version("playback-events-value")[0])
+
+    reader = AvroEventSerde(LocalSchemaRegistryClient(str(tmp_path / "schemas.json")), [PlaybackEvent])
+    assert [reader.deserialize(p) for p in payloads] == events
+    assert reader.cache.registry.request_count == 1
+
+
+def test_unknown_writer_schema_decodes_to_dict(tmp_path):
+    registry = LocalSchemaRegistryClient(str(tmp_path / "schemas.json"))
+    event = events_for(PlaybackEvent, 1)[0]
+    payload = AvroEventSerde(registry).serialize(event, "playback-events")
+    record = AvroEventSerde(registry).deserialize(payload)
+    assert record == as_avro_dict(event)
+
+
+def test_bad_magic_byte_is_rejected(tmp_path):
+    serde = AvroEventSerde(LocalSchemaRegistryClient(str(tmp_path / "schemas.json")))
+    payload = bytearray(serde.serialize(PlaybackEvent(), "t"))
+    payload[0] = 1
+    with pytest.raises(ValueError):
+        serde.deserialize(bytes(payload))
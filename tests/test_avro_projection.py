@@ -0,0 +1,74 @@
+import pytest
+
+from avro_codec import AvroEventSerde, LocalSchemaRegistryClient, _UNSET, get_codec
+from core_data_domains import PlaybackEvent, QoSTelemtry
+from load_generator import LoadGenerator, LoadProfile
+
+FIELDS = ["content_id", "user_id", "event_type", "event_timestamp"]
+
+
+def events(cls=PlaybackEvent, n=300):
+    return list(LoadGenerator(LoadProfile(seed=5)).stream_for(cls, n))
+
+
+@pytest.mark.parametrize("field_names", [FIELDS, ["event_id"], ["ingestion_timestamp"],
+                                         ["subtitle_language", "bandwidth_mbps", "event_hour"]])
+def test_views_match_full_decode(field_names):
+    codec = get_codec(PlaybackEvent)
+    projection = codec.projection(field_names)
+    for event in events():
+        view = projection.decode(codec.encode(event))
+        for name in field_names:
+            assert getattr(view, name) == getattr(event, name)
+        assert view.promote() == event
+
+
+def test_fields_decode_on_first_access_only():
+    codec = get_codec(PlaybackEvent)
+    view = codec.projection(FIELDS).decode(codec.encode(events(n=1)[0]))
+    assert all(getattr(view, slot) is _UNSET for slot in view.__slots__ if slot.startswith("_v"))
+    first = view.event_timestamp
+    assert view.event_timestamp is first
+    assert sum(getattr(view, slot) is not _UNSET for slot in view.__slots__ if slot.startswith("_v")) == 1
+
+
+def test_view_exposes_only_projected_fields_in_schema_order():
+    codec = get_codec(PlaybackEvent)
+    event = events(n=1)[0]
+    view = codec.projection(FIELDS).decode(codec.encode(event))
+    assert list(view.as_dict()) == ["event_type", "event_timestamp", "user_id", "content_id"]
+    with pytest.raises(AttributeError, match="promote"):
+        view.country
+    assert "content_id=" in repr(view)
+
+
+def test_projections_are_cached_and_validated():
+    codec = get_codec(PlaybackEvent)
+    assert codec.projection(FIELDS) is codec.projection(list(reversed(FIELDS)))
+    with pytest.raises(ValueError):
+        codec.projection(["user_id", "no_such_field"])
+
+
+def test_view_reads_from_an_offset_without_copying():
+    codec = get_codec(QoSTelemtry)
+    telemetry = events(QoSTelemtry, 1)[0]
+    buf = codec.encode_into(telemetry, bytearray(b"\x01\x02\x03"))
+    view = codec.projection(["user_id", "content_id"]).decode(bytes(buf), 3)
+    assert isinstance(view._data, memoryview)
+    assert (view.user_id, view.content_id) == (telemetry.user_id, telemetry.content_id)
+    assert view.promote() == telemetry
+
+
+def test_projected_deserializer_falls_back_for_other_schemas(tmp_path):
+    serde = AvroEventSerde(LocalSchemaRegistryClient(str(tmp_path / "schemas.json")))
+    playback, qos = events(n=1)[0], events(QoSTelemtry, 1)[0]
+    deserialize = serde.projected_deserializer(PlaybackEvent, ["user_id", "content_id"])
+    view = deserialize(serde.serialize(playback, "playback"))
+    assert (view.user_id, view.content_id) == (playback.user_id, playback.content_id)
+    assert view.promote() == playback
+    assert deserialize(serde.serialize(qos, "qos")) == qos
+
+    payload = bytearray(serde.serialize(playback, "playback"))
+    payload[0] = 1
+    with pytest.raises(ValueError):
+        deserialize(bytes(payload))
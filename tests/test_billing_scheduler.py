@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from billing_scheduler import (
+    BillingConfig, BillingScheduler, ChargeResult, add_months, from_minor_units, to_minor_units
+)
+from core_data_domains import SubscriptionStatus, SubscriptionTier, UserSubscription
+
+T0 = datetime(2024, 1, 31, 12)
+
+
+class ScriptedGateway:
+    """Declines the subscriptions in `declines`; records every request it sees"""
+
+    def __init__(self, declines=()):
+        self.declines = set(declines)
+        self.requests = []
+
+    def __call__(self, batch):
+        self.requests.extend(batch)
+        return [ChargeResult(False, None, "card_declined", "Declined") if r.subscription_id in self.declines
+                else ChargeResult(True, f"ch_{r.idempotency_key}", None, None) for r in batch]
+
+
+def subscription(subscription_id="sub", due=T0, **overrides):
+    overrides.setdefault("next_billing_date", due)
+    return UserSubscription(subscription_id=subscription_id, user_id=f"user_{subscription_id}", **overrides)
+
+
+@pytest.mark.parametrize("amount, currency, units", [
+    (Decimal("9.99"), "USD", 999), (Decimal("0.125"), "USD", 12), (Decimal("0.135"), "USD", 14),
+    (Decimal("1200"), "JPY", 1200), (Decimal("1.234"), "BHD", 1234),
+])
+def test_minor_unit_conversion(amount, currency, units):
+    assert to_minor_units(amount, currency) == units
+    assert to_minor_units(from_minor_units(units, currency), currency) == units
+
+
+def test_add_months_clamps_and_keeps_anchor():
+    assert add_months(datetime(2024, 1, 31), 1) == datetime(2024, 2, 29)
+    assert add_months(datetime(2024, 2, 29), 1, anchor_day=31) == datetime(2024, 3, 31)
+    assert add_months(datetime(2024, 11, 30), 3) == datetime(2025, 2, 28)
+
+
+def test_renewal_charges_when_due_and_advances_period():
+    gateway = ScriptedGateway()
+    scheduler = BillingScheduler(gateway)
+    sub = subscription(price_amount=Decimal("15.49"))
+    scheduler.upsert_subscription(sub)
+    assert scheduler.next_due() == T0
+    assert scheduler.run_due(T0 - timedelta(seconds=1)) == []
+    (transaction,) = scheduler.run_due(T0)
+    assert (transaction.status, transaction.amount, transaction.retry_count) == ("success", Decimal("15.49"), 0)
+    assert transaction.settlement_date == T0 + timedelta(days=2)
+    assert (sub.status, sub.current_period_start, sub.next_billing_date) == \
+        (SubscriptionStatus.ACTIVE, T0, datetime(2024, 2, 29, 12))
+    scheduler.run_due(datetime(2024, 2, 29, 12))
+    # Anchored to the 31st, not the 29th
+    assert sub.next_billing_date == datetime(2024, 3, 31, 12)
+    assert scheduler.metrics.renewals == 2 and scheduler.metrics.charged_minor_units == {"USD": 3098}
+
+
+def test_trial_conversion_bills_at_trial_end():
+    gateway = ScriptedGateway()
+    scheduler = BillingScheduler(gateway)
+    sub = subscription(status=SubscriptionStatus.TRIAL, due=None, trial_end_date=T0, billing_interval="annual")
+    scheduler.upsert_subscription(sub)
+    scheduler.run_due(T0)
+    assert scheduler.metrics.trial_conversions == 1
+    assert (sub.status, sub.next_billing_date) == (SubscriptionStatus.ACTIVE, datetime(2025, 1, 31, 12))
+
+
+def test_declines_retry_with_backoff_then_expire():
+    gateway = ScriptedGateway(declines={"sub"})
+    config = BillingConfig(retry_backoff_hours=(24.0, 72.0), retry_jitter=0.25)
+    scheduler = BillingScheduler(gateway, config)
+    sub = subscription()
+    scheduler.upsert_subscription(sub)
+    transactions = scheduler.run_due(T0)
+    retry_counts = [t.retry_count for t in transactions]
+    for backoff in (24, 72):
+        assert sub.status is SubscriptionStatus.PAST_DUE
+        delay = scheduler.next_due() - transactions[-1].transaction_date
+        assert timedelta(hours=backoff) <= delay <= timedelta(hours=backoff * 1.25)
+        transactions = scheduler.run_due(scheduler.next_due())
+        retry_counts += [t.retry_count for t in transactions]
+    assert retry_counts == [0, 1, 2]
+    assert sub.status is SubscriptionStatus.EXPIRED and len(scheduler) == 0 and scheduler.next_due() is None
+    keys = [r.idempotency_key for r in gateway.requests]
+    assert len(set(keys)) == 3 and all(k.startswith("sub:20240131:") for k in keys)
+    assert (scheduler.metrics.failed, scheduler.metrics.retries, scheduler.metrics.expired) == (3, 2, 1)
+
+
+def test_non_billable_and_removed_subscriptions_are_not_charged():
+    gateway = ScriptedGateway()
+    scheduler = BillingScheduler(gateway)
+    scheduler.upsert_subscriptions([
+        subscription("free", tier=SubscriptionTier.FREE),
+        subscription("zero", price_amount=Decimal("0")),
+        subscription("cancelled", status=SubscriptionStatus.CANCELLED),
+        subscription("removed"),
+        subscription("moved"),
+    ])
+    scheduler.remove_subscription("removed")
+    scheduler.upsert_subscription(subscription("moved", due=T0 + timedelta(days=3)))
+    assert scheduler.run_due(T0) == []
+    assert [t.subscription_id for t in scheduler.run_due(T0 + timedelta(days=3))] == ["moved"]
+    assert scheduler.metrics.stale_entries_skipped == 2
+
+
+def test_parallel_batches_match_serial_run_and_respect_cap():
+    def run(workers):
+        gateway = ScriptedGateway(declines={f"s{i}" for i in range(0, 500, 7)})
+        scheduler = BillingScheduler(gateway, BillingConfig(batch_size=32, workers=workers,
+                                                            max_charges_per_run=400))
+        scheduler.upsert_subscriptions(subscription(f"s{i}", due=T0 - timedelta(minutes=i)) for i in range(500))
+        with scheduler:
+            first = scheduler.run_due(T0)
+            second = scheduler.run_due(T0)
+        return [(t.subscription_id, t.status, t.processor_transaction_id) for t in first + second], len(first)
+    serial, first_run = run(1)
+    assert first_run == 400 and len(serial) == 500
+    assert run(4)[0] == serial
@@ -0,0 +1,142 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from catalog_index import MATURITY_LEVEL, CatalogIndex
+from core_data_domains import ContentMetadata, ContentType, MaturityRating
+
+NOW = datetime(2024, 6, 1)
+GENRES = ["drama", "comedy", "action", "horror", "documentary"]
+COUNTRIES = ["US", "DE", "FR", "BR", "JP"]
+LANGUAGES = ["en", "de", "fr", "pt", "ja"]
+
+
+def random_catalog(n=2000, seed=4):
+    rng = random.Random(seed)
+    catalog = []
+    for i in range(n):
+        start = NOW + timedelta(days=rng.randint(-400, 60))
+        catalog.append(ContentMetadata(
+            content_id=f"title_{i}", content_type=rng.choice(list(ContentType)),
+            genres=rng.sample(GENRES, rng.randint(1, 3)), maturity_rating=rng.choice(list(MaturityRating)),
+            available_countries=rng.sample(COUNTRIES, rng.randint(1, 4)),
+            available_languages=rng.sample(LANGUAGES, rng.randint(1, 3)),
+            license_start_date=start,
+            license_end_date=None if rng.random() < 0.3 else start + timedelta(days=rng.randint(1, 500)),
+            is_active=rng.random() < 0.9, updated_at=NOW - timedelta(days=1),
+        ))
+    return catalog
+
+
+def scan(catalog, country=None, language=None, max_rating=None, genres=(), all_genres=False,
+         content_types=(), active_only=True, licensed_at=NOW):
+    t = licensed_at.timestamp()
+    match = []
+    for c in catalog:
+        end = c.license_end_date.timestamp() if c.license_end_date else float("inf")
+        if ((not active_only or c.is_active)
+                and (country is None or country in c.available_countries)
+                and (language is None or language in c.available_languages)
+                and (max_rating is None or MATURITY_LEVEL[c.maturity_rating] <= MATURITY_LEVEL[max_rating])
+                and (not genres or (all if all_genres else any)(g in c.genres for g in genres))
+                and (not content_types or c.content_type in content_types)
+                and c.license_start_date.timestamp() <= t < end):
+            match.append(c.content_id)
+    return sorted(match)
+
+
+QUERIES = [
+    dict(),
+    dict(country="DE", language="de", max_rating=MaturityRating.PG13, genres=["drama"]),
+    dict(country="US", genres=["comedy", "action"]),
+    dict(genres=["comedy", "action"], all_genres=True, content_types=[ContentType.MOVIE]),
+    dict(max_rating=MaturityRating.TV_Y7, active_only=False),
+    dict(language="ja", licensed_at=NOW + timedelta(days=200)),
+    dict(country="FR", licensed_at=NOW - timedelta(days=500)),
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return random_catalog()
+
+
+@pytest.mark.parametrize("filters", QUERIES)
+def test_queries_match_linear_scan(catalog, filters):
+    index = CatalogIndex()
+    index.upsert_many(catalog)
+    filters = dict(filters)
+    licensed_at = filters.pop("licensed_at", NOW)
+    expected = scan(catalog, licensed_at=licensed_at, **filters)
+    assert sorted(index.query(licensed_at=licensed_at, **filters)) == expected
+    assert index.count(licensed_at=licensed_at, **filters) == len(expected)
+
+
+def test_bulk_and_single_upserts_agree(catalog):
+    bulk, single = CatalogIndex(), CatalogIndex()
+    assert bulk.upsert_many(catalog) == len(catalog)
+    for content in catalog:
+        single.upsert(content)
+    for name in ("genre", "country", "language", "rating", "content_type"):
+        assert bulk.values(name) == single.values(name)
+    assert sorted(bulk.query(licensed_at=NOW)) == sorted(single.query(licensed_at=NOW))
+
+
+def test_upsert_only_applies_newer_versions():
+    index = CatalogIndex()
+    original = ContentMetadata(content_id="a", genres=["drama"], available_countries=["US"],
+                               license_start_date=NOW - timedelta(days=1), updated_at=NOW)
+    index.upsert(original)
+    stale = ContentMetadata(content_id="a", genres=["comedy"], available_countries=["US"],
+                            license_start_date=NOW - timedelta(days=1), updated_at=NOW)
+    assert index.upsert(stale) is False
+    assert index.query(genres=["drama"], licensed_at=NOW) == ["a"]
+    newer = ContentMetadata(content_id="a", genres=["comedy"], available_countries=["DE"],
+                            license_start_date=NOW - timedelta(days=1), license_end_date=NOW,
+                            updated_at=NOW + timedelta(seconds=1))
+    assert index.upsert(newer) is True
+    assert index.genre("drama") == 0 and index.country("US") == 0
+    # License window changed, so the cached bitmap for NOW must not be reused
+    assert index.query(licensed_at=NOW) == []
+    assert index.query(licensed_at=NOW - timedelta(hours=1)) == ["a"]
+
+
+def test_remove_frees_slot_for_reuse():
+    index = CatalogIndex()
+    for content_id in ("a", "b", "c"):
+        index.upsert(ContentMetadata(content_id=content_id, license_start_date=NOW, updated_at=NOW))
+    assert index.remove("b") and not index.remove("b")
+    assert "b" not in index and len(index) == 2
+    assert index.query(licensed_at=NOW) == ["a", "c"]
+    index.upsert(ContentMetadata(content_id="d", license_start_date=NOW, updated_at=NOW))
+    assert index.query(licensed_at=NOW) == ["a", "d", "c"]
+    assert index.values("content_type") == {ContentType.MOVIE.value: 3}
+
+
+def test_reused_slot_with_removed_titles_window_is_licensed():
+    index = CatalogIndex()
+    window = dict(license_start_date=NOW - timedelta(days=2), license_end_date=NOW + timedelta(days=2))
+    index.upsert(ContentMetadata(content_id="a", updated_at=NOW, **window))
+    index.upsert(ContentMetadata(content_id="b", license_start_date=NOW - timedelta(days=1), updated_at=NOW))
+    index.remove("a")
+    assert index.query(licensed_at=NOW) == ["b"]
+    # c takes a's slot; the cached intervals were built without a's boundaries
+    index.upsert(ContentMetadata(content_id="c", updated_at=NOW, **window))
+    assert sorted(index.query(licensed_at=NOW)) == ["b", "c"]
+    assert index.query(licensed_at=NOW + timedelta(days=3)) == ["b"]
+
+
+def test_snapshot_round_trip(catalog, tmp_path):
+    index = CatalogIndex()
+    index.upsert_many(catalog)
+    index.remove("title_7")
+    path = str(tmp_path / "catalog.cidx")
+    index.save(path)
+    loaded = CatalogIndex.load(path)
+    assert len(loaded) == len(index) and "title_7" not in loaded
+    for filters in QUERIES[:4]:
+        assert loaded.query(licensed_at=NOW, **filters) == index.query(licensed_at=NOW, **filters)
+    # The loaded index keeps accepting upserts
+    assert loaded.upsert(ContentMetadata(content_id="title_7", license_start_date=NOW, updated_at=NOW))
+    assert "title_7" in loaded.query(licensed_at=NOW)
@@ -0,0 +1,94 @@
+import os
+from collections import Counter
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+
+from builders import random_events
+from columnar_sink import PartitionedColumnarReader, PartitionedColumnarSink
+from core_data_domains import EventType, PlaybackEvent, UserInteractionEvent
+
+BASE = datetime(2024, 1, 1, 22)
+
+
+def playback_events(n=600):
+    events = []
+    for i in range(n):
+        ts = BASE + timedelta(seconds=i * 30)
+        events.append(PlaybackEvent(
+            event_type=list(EventType)[i % 5], event_timestamp=ts, user_id=f"user_{i % 37}",
+            content_id=f"movie_{i % 50:03d}", position_seconds=i, duration_seconds=7200,
+            bandwidth_mbps=None if i % 3 else i / 7, subtitle_language=None if i % 2 else "fr",
+            is_fullscreen=bool(i % 2), event_date=ts.strftime("%Y-%m-%d"), event_hour=ts.hour,
+        ))
+    return events
+
+
+def key(event):
+    return event.event_id
+
+
+@pytest.fixture
+def written(tmp_path):
+    events = playback_events()
+    with PartitionedColumnarSink(str(tmp_path), PlaybackEvent, row_group_size=40, row_groups_per_file=2,
+                                 max_open_files=2, max_buffered_rows=100) as sink:
+        sink.write_many(events)
+    return str(tmp_path), events, sink
+
+
+def test_all_rows_round_trip(written):
+    root, events, sink = written
+    assert sink.rows_written == len(events)
+    rows = list(PartitionedColumnarReader(root, PlaybackEvent).scan())
+    assert sorted(rows, key=key) == sorted(events, key=key)
+
+
+def test_hive_partition_layout(written):
+    root, events, _ = written
+    expected = {(e.event_date, e.event_hour) for e in events}
+    found = set()
+    for directory, _, files in os.walk(root):
+        if any(name.endswith(".evc") for name in files):
+            date_part, hour_part = directory.split(os.sep)[-2:]
+            found.add((date_part.split("=")[1], int(hour_part.split("=")[1])))
+        assert not any(name.endswith(".inprogress") for name in files)
+    assert found == expected
+
+
+def test_partition_and_stats_pruning(written):
+    root, events, _ = written
+    reader = PartitionedColumnarReader(root, PlaybackEvent)
+    rows = list(reader.scan(event_date="2024-01-02", event_hour=[0, 1], content_id={"movie_007", "movie_008"}))
+    expected = [e for e in events if e.event_date == "2024-01-02" and e.event_hour in (0, 1)
+                and e.content_id in ("movie_007", "movie_008")]
+    assert sorted(rows, key=key) == sorted(expected, key=key)
+    assert reader.row_groups_skipped > 0
+
+    in_range = list(PartitionedColumnarReader(root, PlaybackEvent).scan(date_range=("2024-01-01", "2024-01-01")))
+    assert Counter(e.event_hour for e in in_range) == Counter(e.event_hour for e in events
+                                                              if e.event_date == "2024-01-01")
+
+
+def test_projection_returns_only_requested_columns(written):
+    root, events, _ = written
+    rows = list(PartitionedColumnarReader(root, PlaybackEvent).scan(
+        content_id="movie_001", columns=["user_id", "bandwidth_mbps"]))
+    assert all(set(row) == {"user_id", "bandwidth_mbps"} for row in rows)
+    assert sorted((r["user_id"], r["bandwidth_mbps"] or -1) for r in rows) == \
+        sorted((e.user_id, e.bandwidth_mbps or -1) for e in events if e.content_id == "movie_001")
+
+
+def test_other_event_classes_round_trip(tmp_path):
+    events = [replace(e, event_id=f"e{i:03d}", event_date=f"2024-01-0{1 + i % 3}", event_hour=i % 24)
+              for i, e in enumerate(random_events(UserInteractionEvent, 300, seed=3))]
+    with PartitionedColumnarSink(str(tmp_path), UserInteractionEvent, row_group_size=64) as sink:
+        sink.write_many(events)
+    rows = list(PartitionedColumnarReader(str(tmp_path), UserInteractionEvent).scan())
+    assert sorted(rows, key=key) == sorted(events, key=key)
+
+
+def test_non_dataclass_rejected(tmp_path):
+    with pytest.raises(TypeError):
+        PartitionedColumnarSink(str(tmp_path), dict)
@@ -0,0 +1,71 @@
+import json
+import uuid
+from dataclasses import fields
+from datetime import datetime
+
+import pytest
+
+import fast_json
+from compact_events import (
+    CompactPlaybackEvent, CompactQoSTelemetry, CompactUserInteractionEvent, pack_uuid, render_uuid
+)
+from core_data_domains import EventType, PlaybackEvent, QoSTelemtry, UserInteractionEvent
+
+PAIRS = [(CompactPlaybackEvent, PlaybackEvent), (CompactUserInteractionEvent, UserInteractionEvent),
+         (CompactQoSTelemetry, QoSTelemtry)]
+
+
+@pytest.mark.parametrize("compact_cls, source", PAIRS)
+def test_round_trip_through_compact_form(compact_cls, source):
+    event = source(session_id=str(uuid.uuid4()))
+    compact = compact_cls.from_event(event)
+    assert compact.to_event() == event
+    assert compact == compact_cls.from_event(event)
+    assert not hasattr(compact, "__dict__")
+
+
+@pytest.mark.parametrize("compact_cls, source", PAIRS)
+def test_defaults_match_source(compact_cls, source):
+    compact, event = compact_cls(), source()
+    for f in fields(source):
+        value = getattr(compact, f.name)
+        if isinstance(value, datetime) or f.name.endswith("_id") or f.name == "event_date":
+            continue
+        assert value == getattr(event, f.name), f.name
+    uuid.UUID(compact.to_dict()[fields(source)[0].name])
+
+
+@pytest.mark.parametrize("compact_cls, source", PAIRS)
+def test_to_dict_matches_source(compact_cls, source):
+    event = source(session_id=str(uuid.uuid4()))
+    compact = compact_cls.from_event(event)
+    data = json.loads(compact.to_json())
+    # Same keys, order and values as the source's to_dict(), or every field when it has none
+    assert list(data.items()) == list(json.loads(fast_json.encode(event)).items())
+    if hasattr(source, "to_dict"):
+        assert compact.to_dict() == event.to_dict()
+
+
+def test_to_dict_leaves_out_what_the_source_leaves_out():
+    event = UserInteractionEvent(event_type=EventType.SEARCH, session_id="s", page_url="/x", element_text="t")
+    data = CompactUserInteractionEvent.from_event(event).to_dict()
+    assert not {"session_id", "page_url", "element_text"} & set(data)
+    assert data["event_type"] == "search"
+
+
+def test_uuid_packing_only_for_canonical_uuids():
+    value = str(uuid.uuid4())
+    assert pack_uuid(value) == uuid.UUID(value).bytes
+    assert render_uuid(pack_uuid(value)) == value
+    for other in ("session-1", value.upper(), "", None):
+        assert pack_uuid(other) == other
+    compact = CompactPlaybackEvent(session_id="session-1")
+    assert compact.session_id == "session-1"
+    compact.session_id = value
+    assert compact._session_id == uuid.UUID(value).bytes and compact.session_id == value
+
+
+def test_low_cardinality_strings_are_interned():
+    a = CompactPlaybackEvent(country="".join(["F", "R"]))
+    b = CompactPlaybackEvent(country="".join(["F", "R"]))
+    assert a.country is b.country
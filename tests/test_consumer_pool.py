@@ -0,0 +1,124 @@
+import functools
+import json
+import os
+import time
+
+import pytest
+
+from consumer_pool import ConsumerPool, ConsumerPoolConfig, WatchTimeProcessor, _merge, owner_for
+from local_broker import InMemoryBroker
+
+TOPIC = "playback"
+
+
+def produce(broker, n, start=0, partitions=6):
+    broker.create_topic(TOPIC, partitions)
+    expected = {}
+    for i in range(start, start + n):
+        user_id = f"user_{i % 40}"
+        broker.produce_batch(TOPIC, i % partitions, [(user_id.encode(), json.dumps(
+            {"user_id": user_id, "position_seconds": i}).encode())])
+        totals = expected.setdefault(user_id, [0, 0])
+        totals[0] += 1
+        totals[1] += i
+    return expected
+
+
+def committed(broker, group_id):
+    return [broker.committed(group_id, TOPIC, p) for p in range(broker.num_partitions(TOPIC))]
+
+
+def end_offsets(broker):
+    return [broker.end_offset(TOPIC, p) for p in range(broker.num_partitions(TOPIC))]
+
+
+def config(**overrides):
+    overrides.setdefault("num_workers", 2)
+    overrides.setdefault("max_batch_records", 50)
+    return ConsumerPoolConfig(**overrides)
+
+
+class CrashOnceProcessor(WatchTimeProcessor):
+    # Kills its worker process the first time it sees a batch on partition 0
+    def __init__(self, topic, partition, state=None, marker=None):
+        super().__init__(topic, partition, state)
+        self.marker = marker
+
+    def process(self, records, base_offset):
+        if self.partition == 0 and base_offset > 0 and not os.path.exists(self.marker):
+            open(self.marker, "w").close()
+            os._exit(1)
+        super().process(records, base_offset)
+
+
+def test_rendezvous_owner_only_moves_removed_workers_partitions():
+    partitions = [(TOPIC, p) for p in range(64)]
+    before = {tp: owner_for(*tp, [0, 1, 2, 3]) for tp in partitions}
+    after = {tp: owner_for(*tp, [0, 1, 3]) for tp in partitions}
+    assert set(before.values()) == {0, 1, 2, 3}
+    assert all(after[tp] == owner for tp, owner in before.items() if owner != 2)
+    assert before == {tp: owner_for(*tp, [3, 2, 1, 0]) for tp in partitions}
+
+
+@pytest.mark.parametrize("num_workers", [0, -1])
+def test_pool_needs_at_least_one_worker(num_workers):
+    broker = InMemoryBroker()
+    produce(broker, 10)
+    with pytest.raises(ValueError):
+        ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config(num_workers=num_workers))
+    pool = ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config(num_workers=1))
+    with pytest.raises(ValueError):
+        pool.scale(num_workers)
+    assert pool._target_workers == 1
+
+
+def test_pool_processes_every_record_once_and_commits():
+    broker = InMemoryBroker()
+    expected = produce(broker, 3000)
+    with ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config()) as pool:
+        assert pool.wait_until_caught_up(timeout=30)
+    snapshots = pool.stop()
+    assert set(snapshots) == {(TOPIC, p) for p in range(6)}
+    assert _merge(snapshots) == expected
+    assert committed(broker, "g") == end_offsets(broker)
+    assert pool.metrics.records_processed == pool.metrics.records_dispatched == 3000
+
+
+def test_restart_resumes_from_committed_offsets():
+    broker = InMemoryBroker()
+    produce(broker, 600)
+    with ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config()) as pool:
+        pool.wait_until_caught_up(timeout=30)
+    expected = produce(broker, 400, start=600)
+    with ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config()) as pool:
+        pool.wait_until_caught_up(timeout=30)
+    assert _merge(pool.stop()) == expected
+    assert pool.metrics.records_processed == 400
+
+
+def test_scaling_mid_stream_neither_loses_nor_double_counts():
+    broker = InMemoryBroker()
+    expected = produce(broker, 6000)
+    pool = ConsumerPool(broker, "g", [TOPIC], WatchTimeProcessor, config(num_workers=1, max_batch_records=20))
+    pool.start()
+    deadline = time.monotonic() + 30
+    while pool.metrics.records_processed < 1500 and time.monotonic() < deadline:
+        time.sleep(0.002)
+    pool.scale(3)
+    while pool.metrics.records_processed < 3500 and time.monotonic() < deadline:
+        time.sleep(0.002)
+    pool.scale(2)
+    assert pool.wait_until_caught_up(timeout=30)
+    assert _merge(pool.stop()) == expected
+    assert pool.metrics.partitions_moved > 0
+    assert committed(broker, "g") == end_offsets(broker)
+
+
+def test_crashed_worker_is_replaced_and_partition_replayed(tmp_path):
+    broker = InMemoryBroker()
+    expected = produce(broker, 1200)
+    factory = functools.partial(CrashOnceProcessor, marker=str(tmp_path / "crashed"))
+    with ConsumerPool(broker, "g", [TOPIC], factory, config(max_batch_records=10)) as pool:
+        assert pool.wait_until_caught_up(timeout=30)
+    assert pool.metrics.worker_restarts == 1
+    assert _merge(pool.stop()) == expected
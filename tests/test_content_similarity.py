@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from content_similarity import ContentSimilarityEngine, SimilarityConfig, jaccard
+from core_data_domains import ContentMetadata, UserRating, ViewingSession
+
+GENRES = ["drama", "comedy", "action", "thriller", "documentary", "animation", "horror", "romance"]
+
+
+def catalog(rng, titles):
+    return [ContentMetadata(content_id=f"content_{i}", genres=rng.sample(GENRES, rng.randint(1, 3)),
+                            cast=[f"actor_{rng.randrange(titles)}" for _ in range(3)])
+            for i in range(titles)]
+
+
+def sessions(rng, titles, users, n):
+    weights = [1.0 / (rank + 1) for rank in range(titles)]
+    return [ViewingSession(user_id=f"user_{rng.randrange(users)}", is_completed=True,
+                           content_id=f"content_{rng.choices(range(titles), weights)[0]}")
+            for _ in range(n)]
+
+
+def ratings(rng, titles, users, n):
+    return [UserRating(user_id=f"user_{rng.randrange(users)}", content_id=f"content_{rng.randrange(titles)}",
+                       rating_value=rng.choice([1.0, 3.0, 4.0, 5.0]))
+            for _ in range(n)]
+
+
+def snapshot(engine, titles):
+    return {f"content_{i}": [(row.content_id_b, row.similarity_score)
+                             for row in engine.neighbours(f"content_{i}")]
+            for i in range(titles)}
+
+
+def rebuilt(config, *inputs):
+    engine = ContentSimilarityEngine(config)
+    for upserts, interactions in inputs:
+        engine.upsert_catalog(upserts)
+        engine.add_interactions(interactions)
+    engine.rebuild()
+    return engine
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_refresh_matches_rebuild_after_new_ratings(seed):
+    rng = random.Random(seed)
+    titles, users = 400, 2000
+    config = SimilarityConfig(top_k=10)
+    items = catalog(rng, titles)
+    history = sessions(rng, titles, users, 8000)
+    new = ratings(rng, titles, users, 300)
+
+    engine = rebuilt(config, (items, history))
+    engine.add_interactions(new)
+    engine.refresh()
+    assert engine.pending == 0
+    assert snapshot(engine, titles) == snapshot(rebuilt(config, (items, history + new)), titles)
+
+
+def test_refresh_matches_rebuild_after_evictions_and_catalog_changes():
+    rng = random.Random(9)
+    titles, users = 200, 300
+    config = SimilarityConfig(top_k=8, max_user_items=12)
+    items = catalog(rng, titles)
+    history = sessions(rng, titles, users, 3000)
+    engine = rebuilt(config, (items, history))
+
+    changed = [ContentMetadata(content_id=f"content_{i}", genres=rng.sample(GENRES, 2),
+                               cast=[f"actor_{rng.randrange(titles)}"]) for i in rng.sample(range(titles), 15)]
+    added = [ContentMetadata(content_id=f"content_{titles + i}", genres=rng.sample(GENRES, 2)) for i in range(5)]
+    new = sessions(rng, titles, users, 600)
+    engine.upsert_catalog(changed + added)
+    engine.add_interactions(new)
+    engine.refresh()
+
+    expected = rebuilt(config, (items, history), (changed + added, new))
+    assert snapshot(engine, titles + 5) == snapshot(expected, titles + 5)
+
+
+def test_refresh_in_steps_reaches_the_same_result():
+    rng = random.Random(4)
+    titles, users = 150, 600
+    config = SimilarityConfig(top_k=5)
+    items = catalog(rng, titles)
+    history = sessions(rng, titles, users, 2000)
+    engine = rebuilt(config, (items, history))
+    new = ratings(rng, titles, users, 100)
+    engine.add_interactions(new)
+    while engine.pending:
+        engine.refresh(max_titles=20)
+    assert snapshot(engine, titles) == snapshot(rebuilt(config, (items, history + new)), titles)
+
+
+def test_scores_blend_cohort_and_metadata():
+    engine = ContentSimilarityEngine(SimilarityConfig(top_k=5, min_common_users=2))
+    engine.upsert_catalog([ContentMetadata(content_id="a", genres=["Drama"], cast=["x"]),
+                           ContentMetadata(content_id="b", genres=["drama"], cast=["y"]),
+                           ContentMetadata(content_id="c", genres=["comedy"])])
+    for user in ("u1", "u2"):
+        for content in ("a", "c"):
+            engine.add_session(ViewingSession(user_id=user, content_id=content, is_completed=True))
+    engine.rebuild()
+    rows = {row.content_id_b: row for row in engine.neighbours("a")}
+    assert rows["c"].user_cohor_similarity == pytest.approx(1.0)
+    assert rows["c"].similarity_type == "collaborative_filtering"
+    assert rows["b"].genre_similarity == pytest.approx(jaccard({"drama"}, {"drama"}))
+    assert rows["b"].similarity_type == "content_based"
+    assert rows["c"].similarity_score > rows["b"].similarity_score
@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+
+from core_data_domains import PlaybackEvent, QoSTelemtry, UserRating
+from deduplication import (
+    BlockedBloomFilter, DedupStage, ExactDedupFilter, TimeBucketedBloomFilter, blocked_bloom_geometry,
+    blocked_false_positive_rate
+)
+
+
+def ids(n):
+    return [str(uuid.uuid4()) for _ in range(n)]
+
+
+@pytest.mark.parametrize("capacity, fp_rate", [(0, 0.01), (10, 0), (10, 1)])
+def test_geometry_rejects_bad_arguments(capacity, fp_rate):
+    with pytest.raises(ValueError):
+        blocked_bloom_geometry(capacity, fp_rate)
+
+
+def test_bloom_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BlockedBloomFilter(20_000, 0.01)
+    members = ids(20_000)
+    for key in members:
+        bloom.add(key)
+    assert all(key in bloom for key in members)
+    false_positives = sum(key in bloom for key in ids(20_000))
+    assert false_positives / 20_000 <= 0.01
+
+
+@pytest.mark.parametrize("fp_rate", [0.001 / 6, 1e-4])
+def test_geometry_model_is_met_when_the_hash_cap_binds(fp_rate):
+    num_blocks, num_hashes = blocked_bloom_geometry(1_000_000, fp_rate)
+    assert num_hashes == 8
+    assert blocked_false_positive_rate(1_000_000 / num_blocks, num_hashes) <= fp_rate
+
+
+def test_full_buckets_keep_aggregate_false_positive_rate():
+    dedup = TimeBucketedBloomFilter(horizon_seconds=3600, num_buckets=6, ids_per_bucket=20_000, fp_rate=0.001)
+    for bucket in range(6):
+        dedup.seen_or_add_many(ids(20_000), bucket * dedup.bucket_seconds)
+    assert len(dedup.buckets) == 6
+    probes = 100_000
+    false_positives = sum(any(key in b for b in dedup.buckets.values()) for key in ids(probes))
+    assert false_positives / probes <= dedup.fp_rate
+
+
+def test_checkpoint_rejects_other_geometry(tmp_path):
+    path = str(tmp_path / "dedup.ckpt")
+    TimeBucketedBloomFilter(ids_per_bucket=1000).save(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data.replace(b'"num_hashes": ', b'"num_hashes": 1'))
+    with pytest.raises(ValueError):
+        TimeBucketedBloomFilter.load(path)
+
+
+def test_ids_are_remembered_for_the_horizon_then_forgotten():
+    dedup = TimeBucketedBloomFilter(horizon_seconds=3600, num_buckets=6, ids_per_bucket=1000, fp_rate=0.001)
+    assert dedup.seen_or_add("a", 0) is False
+    assert dedup.seen_or_add("a", 10) is True
+    assert dedup.seen_or_add("a", 3000) is True
+    # Bucket 0 leaves the horizon once bucket 6 opens
+    assert dedup.seen_or_add("b", 3600) is False
+    assert dedup.seen_or_add("a", 3601) is False
+    assert len(dedup.buckets) <= dedup.num_buckets
+
+
+def test_memory_stays_fixed_as_time_advances():
+    dedup = TimeBucketedBloomFilter(horizon_seconds=60, num_buckets=4, ids_per_bucket=500, fp_rate=0.01)
+    for second in range(0, 600, 5):
+        dedup.seen_or_add_many(ids(20), second)
+        assert sum(len(b.words) * 8 for b in dedup.buckets.values()) <= dedup.memory_bytes
+
+
+def test_batch_matches_single_key_calls():
+    keys = ids(300)
+    keys += keys[:100]
+    batch = TimeBucketedBloomFilter(ids_per_bucket=1000).seen_or_add_many(keys, 50)
+    single = TimeBucketedBloomFilter(ids_per_bucket=1000)
+    assert batch == [single.seen_or_add(k, 50) for k in keys]
+    assert batch == [False] * 300 + [True] * 100
+
+
+def test_late_ids_land_in_a_live_bucket():
+    dedup = TimeBucketedBloomFilter(horizon_seconds=600, num_buckets=6, ids_per_bucket=1000)
+    dedup.seen_or_add("now", 1000)
+    assert dedup.seen_or_add("late", 10) is False
+    assert dedup.seen_or_add("late", 1000) is True
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "dedup.ckpt")
+    dedup = TimeBucketedBloomFilter(horizon_seconds=600, num_buckets=3, ids_per_bucket=2000, fp_rate=0.01)
+    seen = ids(500)
+    dedup.seen_or_add_many(seen[:250], 0)
+    dedup.seen_or_add_many(seen[250:], 250)
+    dedup.save(path)
+    restored = TimeBucketedBloomFilter.load(path)
+    assert restored.current_index == dedup.current_index
+    assert {i: b.count for i, b in restored.buckets.items()} == {i: b.count for i, b in dedup.buckets.items()}
+    assert all(restored.seen_or_add_many(seen, 300))
+    assert list(tmp_path.iterdir()) == [tmp_path / "dedup.ckpt"]
+
+
+def test_dedup_stage_uses_first_field_and_survives_restart(tmp_path):
+    path = str(tmp_path / "stage.ckpt")
+    events = [PlaybackEvent(), QoSTelemtry(), UserRating()]
+    stage = DedupStage(checkpoint_path=path)
+    assert [stage.event_id(e) for e in events] == [events[0].event_id, events[1].telemetry_id, events[2].rating_id]
+    assert list(stage.filter_events(events + events[:2])) == events
+    assert (stage.metrics.events_in, stage.metrics.duplicates_dropped) == (5, 2)
+    stage.close()
+
+    restarted = DedupStage(checkpoint_path=path)
+    assert list(restarted.filter_events(events + [PlaybackEvent()]))[:-1] == []
+
+
+def test_exact_filter_respects_horizon():
+    dedup = ExactDedupFilter(horizon_seconds=100)
+    assert [dedup.seen_or_add("a", t) for t in (0, 100, 201, 250)] == [False, True, False, True]
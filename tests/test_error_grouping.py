@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from core_data_domains import ErrorEvent
+from error_grouping import ErrorGrouper, ErrorGroupingConfig, normalize_message, normalize_stack
+
+START = datetime(2024, 1, 1)
+
+
+def error(seconds=0.0, message="boom", stack=None, error_type="api", **kwargs):
+    return ErrorEvent(error_timestamp=START + timedelta(seconds=seconds), error_type=error_type,
+                      error_code="E1", error_message=message, stack_trace=stack, **kwargs)
+
+
+def test_normalize_message_replaces_variable_parts():
+    text = ("user 'alice' request 3f2a9c1e-4b5d-4e6f-8a7b-9c0d1e2f3a4b from 10.0.0.12 "
+            "at 0x7ffde4 retried 3 times")
+    assert normalize_message(text) == "user <str> request <uuid> from <ip> at <hex> retried <n> times"
+
+
+def test_normalize_stack_keeps_quoted_paths_and_masks_line_numbers():
+    stack = 'Traceback:\n  File "/srv/api/handlers.py", line 42, in handle\n\n  ...\n  at 0x7f3a2b1c in libmedia.so'
+    assert normalize_stack(stack) == (
+        "Traceback:",
+        'File "/srv/api/handlers.py", line <n>, in handle',
+        "at <hex> in libmedia.so",
+    )
+    assert normalize_stack("\n".join(f"frame {i}" for i in range(20)), max_frames=3) == \
+        ("frame <n>",) * 3
+
+
+def test_frames_in_different_files_get_different_fingerprints():
+    grouper = ErrorGrouper()
+    handlers = error(stack='File "/srv/api/handlers.py", line 42, in handle')
+    handlers_other_line = error(stack='File "/srv/api/handlers.py", line 97, in handle')
+    db = error(stack='File "/srv/api/db.py", line 42, in handle')
+    assert grouper.fingerprint(handlers) == grouper.fingerprint(handlers_other_line)
+    assert grouper.fingerprint(handlers) != grouper.fingerprint(db)
+
+
+def test_near_identical_errors_collapse_into_one_group():
+    grouper = ErrorGrouper()
+    grouper.add_many(error(i, message=f"timeout after {i} ms for 'user_{i}'") for i in range(100))
+    grouper.add(error(100, message="disk full", error_type="storage"))
+    top = grouper.top_groups(2)
+    assert [(g.message, g.window_count, g.total_count) for g in top] == [
+        ("timeout after <n> ms for <str>", 100, 100), ("disk full", 1, 1)]
+    assert len(top[0].exemplars) == ErrorGroupingConfig().exemplars_per_group
+
+
+def test_window_slides_and_late_events_are_dropped():
+    config = ErrorGroupingConfig(bucket_seconds=10, window_buckets=3)
+    grouper = ErrorGrouper(config)
+    grouper.add(error(0))
+    grouper.add(error(35))
+    assert grouper.top_groups(1)[0].window_count == 1
+    assert grouper.top_groups(1)[0].total_count == 2
+    grouper.add(error(1))
+    assert grouper.metrics.late_events_dropped == 1
+
+
+def test_full_table_evicts_smallest_group_and_inherits_its_count():
+    grouper = ErrorGrouper(ErrorGroupingConfig(max_groups=2))
+    grouper.add_many(error(0, error_type="a") for _ in range(5))
+    grouper.add_many(error(0, error_type="b") for _ in range(2))
+    grouper.add(error(0, error_type="c"))
+    groups = {g.error_type: g for g in grouper.top_groups(5)}
+    assert set(groups) == {"a", "c"}
+    assert (groups["c"].window_count, groups["c"].count_error) == (3, 2)
+    assert grouper.metrics.groups_evicted == 1
+
+
+def test_spike_flagged_against_baseline():
+    config = ErrorGroupingConfig(bucket_seconds=10, window_buckets=30, warmup_buckets=3, min_spike_count=20)
+    spikes = []
+    grouper = ErrorGrouper(config, on_spike=spikes.append)
+    for bucket in range(10):
+        grouper.add_many(error(bucket * 10 + i, cdn_server="cdn-1") for i in range(2))
+    grouper.add_many(error(100 + i * 0.1, cdn_server="cdn-1") for i in range(40))
+    assert [(s.dimension, s.value) for s in spikes] == [("cdn_server", "cdn-1")]
+    assert spikes[0].bucket_start == START + timedelta(seconds=100)
+    assert spikes[0].count == 20
@@ -0,0 +1,70 @@
+import pytest
+
+from core_data_domains import ErrorEvent, PlaybackEvent, UserInteractionEvent
+from event_producer import EVENT_TOPICS, EventProducer, event_key, partition_for_key
+from local_broker import InMemoryBroker
+from real_time_event_streaming import KafkaTopics, TopicConfig
+
+
+def test_for_topic_templates():
+    assert TopicConfig.for_topic(KafkaTopics.PLAYBACK_EVENTS) is TopicConfig.CRITICAL_CONFIG
+    assert TopicConfig.for_topic(KafkaTopics.EXPERIMENT_METRICS) is TopicConfig.ANALYTICS_CONFIG
+    assert TopicConfig.for_topic(KafkaTopics.ERROR_EVENTS) is TopicConfig.STANDARD_CONFIG
+    for topic in KafkaTopics:
+        assert TopicConfig.for_topic(topic)["num_partitions"] > 0
+
+
+def test_every_routed_topic_is_a_kafka_topic():
+    assert all(isinstance(topic, KafkaTopics) for topic in EVENT_TOPICS.values())
+
+
+def test_produce_routes_and_partitions_by_user():
+    broker = InMemoryBroker()
+    producer = EventProducer(broker, linger_ms=1)
+    events = [PlaybackEvent(user_id=f"user_{i % 7}", content_id="c", position_seconds=i, duration_seconds=10_000)
+              for i in range(200)]
+    events.append(UserInteractionEvent(user_id="user_1"))
+    for event in events:
+        producer.produce(event)
+    assert producer.flush(5.0) == 0
+    producer.close()
+
+    topic = KafkaTopics.PLAYBACK_EVENTS.value
+    partitions = broker.num_partitions(topic)
+    assert partitions == TopicConfig.for_topic(KafkaTopics.PLAYBACK_EVENTS)["num_partitions"]
+    seen = 0
+    for partition in range(partitions):
+        for record in broker.fetch(topic, partition, 0, 1000):
+            assert partition == partition_for_key(record.key.decode(), partitions)
+            seen += 1
+    assert seen == 200
+    assert broker.end_offset(KafkaTopics.USER_INTERACTIONS.value,
+                             partition_for_key("user_1", broker.num_partitions(KafkaTopics.USER_INTERACTIONS.value))) == 1
+    assert producer.metrics.records_delivered == 201
+
+
+def test_delivery_callbacks_report_offsets_in_order():
+    producer = EventProducer(InMemoryBroker(), linger_ms=1)
+    delivered = []
+    for i in range(5):
+        producer.produce(PlaybackEvent(user_id="u", position_seconds=i, duration_seconds=10),
+                         on_delivery=lambda err, meta: delivered.append((err, meta.offset)))
+    producer.close(5.0)
+    assert delivered == [(None, i) for i in range(5)]
+
+
+def test_event_key_falls_back_to_session_then_event_id():
+    assert event_key(PlaybackEvent(user_id="u", session_id="s")) == "u"
+    assert event_key(PlaybackEvent(user_id="", session_id="s")) == "s"
+    event = ErrorEvent(user_id="", session_id="")
+    assert event_key(event) == event.error_id
+
+
+def test_unmapped_event_type_and_full_queue():
+    producer = EventProducer(InMemoryBroker(), max_queue_records=1, max_block_ms=1, linger_ms=10_000)
+    with pytest.raises(ValueError):
+        producer.produce(object())
+    producer.produce(PlaybackEvent(user_id="u"))
+    with pytest.raises(BufferError):
+        producer.produce(PlaybackEvent(user_id="u"))
+    producer.close(5.0)
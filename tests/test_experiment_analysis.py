@@ -0,0 +1,146 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from core_data_domains import ErrorEvent, ExperimentExposure, ExperimentVariant, ViewingSession
+from experiment_analysis import (
+    ExperimentAnalyzer, ExperimentConfig, RatioStats, RunningStats, assign_variant, parse_window
+)
+
+START = datetime(2024, 1, 1)
+CONTROL, TREATMENT = ExperimentVariant.CONTROL, ExperimentVariant.TREATMENT_A
+
+
+def exposure(user_id, variant=CONTROL, seconds=0, experiment_id="exp"):
+    return ExperimentExposure(experiment_id=experiment_id, user_id=user_id, variant=variant,
+                              exposure_timestamp=START + timedelta(seconds=seconds))
+
+
+def watch(user_id, seconds, watched=100, completed=False):
+    at = START + timedelta(seconds=seconds)
+    return ViewingSession(user_id=user_id, session_start=at, session_end=at,
+                          total_watch_tie_seconds=watched, is_completed=completed)
+
+
+def rows_by(analyzer, experiment_id="exp"):
+    return {(row.variant, row.metric_name): row for row in analyzer.metrics_for(experiment_id, START)}
+
+
+def test_parse_window():
+    assert parse_window("7d") == timedelta(days=7)
+    assert parse_window("90m") == timedelta(minutes=90)
+    with pytest.raises(ValueError):
+        parse_window("7 days")
+
+
+def test_assign_variant_is_stable_and_allocation_only_adds_users():
+    users = [f"user_{i}" for i in range(2000)]
+    small = {u: assign_variant("exp", u, traffic_allocation=0.3) for u in users}
+    large = {u: assign_variant("exp", u, traffic_allocation=0.6) for u in users}
+    assert all(large[u] is v for u, v in small.items() if v is not None)
+    assert 0.25 < sum(v is not None for v in small.values()) / len(users) < 0.35
+
+
+def test_running_stats_replace_and_merge_match_direct():
+    rng = random.Random(2)
+    values = [rng.random() * 10 for _ in range(50)]
+    stats = RunningStats()
+    for v in values:
+        stats.add(0.0)
+    for v in values:
+        stats.replace(0.0, v)
+    left, right = RunningStats(), RunningStats()
+    for v in values[:20]:
+        left.add(v)
+    for v in values[20:]:
+        right.add(v)
+    left.merge(right)
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    for s in (stats, left):
+        assert s.mean == pytest.approx(mean)
+        assert s.variance == pytest.approx(variance)
+
+
+def test_ratio_stats_add_and_retract():
+    stats = RatioStats()
+    stats.add(1.0, 2.0)
+    stats.add(3.0, 2.0)
+    stats.add(3.0, 2.0, sign=-1)
+    stats.add(2.0, 4.0)
+    assert (stats.n, stats.mean) == (2, 0.5)
+
+
+def test_outcomes_join_within_window_only():
+    analyzer = ExperimentAnalyzer()
+    analyzer.register(ExperimentConfig("exp", aggregation_window="1h"))
+    analyzer.process_many([exposure("a"), exposure("a2"), exposure("b", TREATMENT), exposure("c", TREATMENT)])
+    analyzer.process_many([watch("a", 60, 100, completed=True), watch("a2", 90, 100, completed=True),
+                           watch("b", 120, 300), watch("b", 180, 100), watch("z", 200, 999)])
+    analyzer.process(watch("c", 3600 + 1, 500))
+    rows = rows_by(analyzer)
+    assert rows[CONTROL, "watch_time_seconds"].metric_value == 100
+    assert rows[TREATMENT, "watch_time_seconds"].metric_value == 200
+    assert rows[TREATMENT, "sessions_per_user"].metric_value == 1.0
+    assert rows[CONTROL, "completion_rate"].metric_value == 1.0
+    assert rows[TREATMENT, "watch_time_seconds"].lift_percentage == pytest.approx(100.0)
+
+
+def test_first_exposure_fixes_variant():
+    analyzer = ExperimentAnalyzer()
+    analyzer.process_many([exposure("a"), exposure("a", TREATMENT)])
+    analyzer.process(watch("a", 10))
+    rows = rows_by(analyzer)
+    assert (TREATMENT, "watch_time_seconds") not in rows
+    assert rows[CONTROL, "watch_time_seconds"].sample_size == 1
+    assert analyzer._experiments["exp"].conflicting_exposures == 1
+
+
+def test_ratio_metric_counts_errors_per_session():
+    analyzer = ExperimentAnalyzer()
+    analyzer.process_many([exposure("a"), exposure("b")])
+    analyzer.process_many([watch("a", 10), watch("a", 20), watch("b", 30),
+                           ErrorEvent(user_id="a", error_timestamp=START + timedelta(seconds=40))])
+    assert rows_by(analyzer)[CONTROL, "errors_per_session"].metric_value == pytest.approx(1 / 3)
+
+
+def test_out_of_order_outcome_within_lateness_is_joined():
+    analyzer = ExperimentAnalyzer(allowed_lateness_seconds=300)
+    analyzer.register(ExperimentConfig("exp", aggregation_window="1h"))
+    analyzer.process(exposure("a"))
+    # Another user's event pushes event time just past a's window end ...
+    analyzer.process(exposure("b", seconds=3600 + 60))
+    # ... before a's in-window outcome arrives
+    analyzer.process(watch("a", 3500, 250))
+    assert rows_by(analyzer)[CONTROL, "watch_time_seconds"].metric_value == pytest.approx(125.0)
+
+    analyzer.process(exposure("c", seconds=3600 + 400))
+    assert analyzer.tracked_users == 2
+    analyzer.process(watch("a", 3550, 1000))
+    assert rows_by(analyzer)[CONTROL, "watch_time_seconds"].metric_value == pytest.approx(250 / 3)
+
+
+def test_without_lateness_window_closes_at_highest_event_time():
+    analyzer = ExperimentAnalyzer(allowed_lateness_seconds=0)
+    analyzer.register(ExperimentConfig("exp", aggregation_window="1h"))
+    analyzer.process_many([exposure("a"), exposure("b", seconds=3600), watch("a", 3500, 250)])
+    assert rows_by(analyzer)[CONTROL, "watch_time_seconds"].metric_value == 0.0
+
+
+def test_caps_evict_oldest_users_but_keep_their_contribution():
+    analyzer = ExperimentAnalyzer(max_users_per_experiment=2)
+    for i in range(5):
+        analyzer.process(exposure(f"u{i}", seconds=i))
+        analyzer.process(watch(f"u{i}", i, 10))
+    assert analyzer.tracked_users == 2
+    row = rows_by(analyzer)[CONTROL, "watch_time_seconds"]
+    assert (row.sample_size, row.metric_value) == (5, 10.0)
+
+
+def test_finish_drops_state():
+    analyzer = ExperimentAnalyzer()
+    analyzer.process_many([exposure("a"), exposure("b", experiment_id="other")])
+    assert len(analyzer.finish("exp")) > 0
+    assert analyzer.tracked_users == 1
+    assert analyzer.metrics_for("exp") == []
@@ -0,0 +1,58 @@
+import json
+from dataclasses import fields, replace
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+
+import pytest
+
+import fast_json
+from builders import STREAMED_CLASSES, random_events
+from core_data_domains import ContentType, PlaybackEvent, UserInteractionEvent
+
+
+def reference(event) -> bytes:
+    # What the encoder promises: json.dumps(to_dict()), or the same
+    # conventions over every field for classes without to_dict
+    if hasattr(event, "to_dict"):
+        return json.dumps(event.to_dict()).encode()
+
+    def plain(value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+    return json.dumps({f.name: plain(getattr(event, f.name)) for f in fields(event)}).encode()
+
+
+@pytest.mark.parametrize("cls", STREAMED_CLASSES, ids=lambda cls: cls.__name__)
+def test_encode_is_byte_identical(cls):
+    events = random_events(cls, 300)
+    for event in events:
+        assert fast_json.encode(event) == reference(event)
+    assert fast_json.encode_many(events) == b"".join(reference(e) + b"\n" for e in events)
+
+
+@pytest.mark.parametrize("cls", [PlaybackEvent, UserInteractionEvent], ids=lambda cls: cls.__name__)
+def test_keys_and_order_follow_to_dict(cls):
+    event = cls()
+    assert fast_json.to_dict_fields(cls) == list(event.to_dict())
+    assert list(json.loads(fast_json.encode(event))) == list(event.to_dict())
+
+
+def test_user_interaction_event_omits_fields_to_dict_omits():
+    payload = json.loads(fast_json.encode(UserInteractionEvent(session_id="s", page_url="/x", element_text="t")))
+    assert not {"session_id", "page_url", "element_text"} & set(payload)
+
+
+def test_edge_values():
+    events = [
+        PlaybackEvent(content_title='quote " backslash \\ café ☃', bandwidth_mbps=None),
+        PlaybackEvent(bandwidth_mbps=float("nan"), error_code=None),
+        replace(UserInteractionEvent(), content_type=ContentType.MOVIE, content_id="m1", search_results_count=0),
+    ]
+    for event in events:
+        assert fast_json.encode(event) == reference(event)
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core_data_domains import (
+    ContentMetadata, EventType, PlaybackEvent, UserInteractionEvent, UserRating, ViewingSession
+)
+from feature_store import FeatureStore, FeatureStoreConfig
+
+START = datetime(2024, 1, 8)
+
+
+def at(seconds):
+    return START + timedelta(seconds=seconds)
+
+
+def play(seconds, event_type=EventType.PLAY_START, user_id="u", session_id="s", content_id="c1", **kwargs):
+    return PlaybackEvent(user_id=user_id, session_id=session_id, content_id=content_id, event_type=event_type,
+                         event_timestamp=at(seconds), **kwargs)
+
+
+def search(seconds, user_id="u"):
+    return UserInteractionEvent(user_id=user_id, event_type=EventType.SEARCH, event_timestamp=at(seconds))
+
+
+def rate(seconds, value, content_id="c1", user_id="u"):
+    return UserRating(user_id=user_id, content_id=content_id, rating_value=value, rating_timestamp=at(seconds))
+
+
+@pytest.fixture
+def store():
+    store = FeatureStore()
+    store.upsert_catalog([ContentMetadata(content_id="c1", genres=["drama", "comedy"]),
+                          ContentMetadata(content_id="c2", genres=["horror"])])
+    return store
+
+
+def test_watch_time_accrues_between_playing_events(store):
+    store.process_many([play(0), play(600, EventType.PLAY_PAUSE), play(900, EventType.PLAY_RESUME),
+                        play(1200, EventType.PLAY_STOP)])
+    features = store.get("u")
+    assert features.watch_minutes_24h == pytest.approx(15.0)
+    assert features.watch_minutes_7d == pytest.approx(15.0)
+    assert features.playback_events_24h == 4
+    assert features.recent_genres == ["comedy", "drama"]
+
+
+def test_windows_age_out(store):
+    store.process_many([play(0), play(600, EventType.PLAY_STOP), search(600)])
+    later = store.get("u", now=at(2 * 3600))
+    assert later.watch_minutes_1h == 0.0
+    assert later.search_count_1h == 0
+    assert (later.watch_minutes_24h, later.search_count_24h) == (pytest.approx(10.0), 1)
+    assert store.get("u", now=at(8 * 86400)).watch_minutes_7d == 0.0
+
+
+def test_ratings_and_positive_genres(store):
+    store.process_many([rate(0, 5.0, "c2"), rate(10, 2.0, "c1")])
+    features = store.get("u")
+    assert (features.rating_count_7d, features.avg_rating_7d) == (2, 3.5)
+    assert features.recent_genres == ["horror"]
+
+
+def test_events_processed_counts_only_applied_events(store):
+    store.process_many([
+        play(86400),
+        search(86400),
+        rate(86400, 4.0),
+        UserInteractionEvent(user_id="u", event_type=EventType.CLICK, event_timestamp=at(86400)),
+        ViewingSession(user_id="u"),
+        # Same hourly ring slot as the first event, one full day earlier
+        play(0, session_id="old"),
+    ])
+    metrics = store.metrics
+    assert (metrics.events_processed, metrics.events_skipped, metrics.late_events_dropped) == (3, 2, 1)
+
+
+def test_direct_add_calls_are_counted(store):
+    store.add_playback(play(0))
+    store.add_interaction(search(1))
+    store.add_rating(rate(2, 3.0))
+    assert store.metrics.events_processed == 3
+
+
+def test_lru_cap_and_ttl(store):
+    capped = FeatureStore(FeatureStoreConfig(max_users=2, ttl_seconds=3600))
+    capped.process_many([search(0, "a"), search(1, "b"), search(2, "c")])
+    assert "a" not in capped and len(capped) == 2
+    assert capped.metrics.users_evicted == 1
+    assert capped.expire(at(2 + 3601)) == 2
+    assert len(capped) == 0
+
+
+def test_snapshot_round_trip(store, tmp_path):
+    store.process_many([play(0), play(600, EventType.PLAY_STOP), search(30), rate(60, 5.0)])
+    path = str(tmp_path / "features.snap")
+    store.save(path)
+    restored = FeatureStore.load(path)
+    expected, actual = store.get("u"), restored.get("u")
+    expected.computed_at = actual.computed_at
+    assert actual == expected
+    restored.add_interaction(search(90, "v"))
+    assert restored.get("v").search_count_1h == 1
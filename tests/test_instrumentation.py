@@ -0,0 +1,196 @@
+import inspect
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import instrumentation
+from core_data_domains import DataValidator, PlaybackEvent
+from event_producer import EventProducer
+from instrumentation import (
+    Histogram, Registry, SamplingProfiler, _bucket_bounds, _bucket_index, disable, enable, instrument,
+    instrumented, uninstrument, watch_consumer_lag, watch_producer
+)
+from local_broker import InMemoryBroker
+
+
+class Target:
+    def method(self, x):
+        return x * 2
+
+    @staticmethod
+    def static(x):
+        return x + 1
+
+    @classmethod
+    def factory(cls, x):
+        return (cls, x)
+
+    def fails(self):
+        raise RuntimeError("boom")
+
+    def busy(self, seconds):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+
+@pytest.fixture(autouse=True)
+def restore_originals():
+    yield
+    disable()
+
+
+def test_bucket_bounds_contain_their_values():
+    for bits in (3, 6):
+        for value in list(range(300)) + [2 ** 20 + 12345, 2 ** 39 - 1]:
+            low, high = _bucket_bounds(_bucket_index(value, bits), bits)
+            assert low <= value < high
+            assert (high - low) <= max(1, low / 2 ** (bits - 1))
+
+
+def test_histogram_percentiles_within_relative_error():
+    histogram = Histogram(significant_bits=6, max_value_bits=30)
+    values = list(range(1, 100_001))
+    for value in values:
+        histogram.record(value)
+    histogram.record(2 ** 31)
+    counts, count, total = histogram.snapshot()
+    assert count == 100_001 and total == sum(values) + 2 ** 31
+    for percentile in (50, 90, 99):
+        assert histogram.percentile(percentile) == pytest.approx(percentile * 1000, rel=1 / 32)
+    assert histogram.percentile(100) == math.inf
+
+
+def test_counters_and_histograms_merge_thread_shards():
+    registry = Registry()
+    counter = registry.counter("c_total")
+    histogram = registry.histogram("h")
+
+    def work():
+        for i in range(1000):
+            counter.inc()
+            histogram.record(i)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value == 4000 and histogram.count == 4000
+    assert registry.counter("c_total") is counter
+
+
+
+def test_exited_threads_fold_their_shards():
+    histogram = Registry().histogram("h")
+    for _ in range(20):
+        thread = threading.Thread(target=histogram.record, args=(5,))
+        thread.start()
+        thread.join()
+    histogram.record(7)
+    assert len(histogram._shards) == 1
+    counts, count, total = histogram.snapshot()
+    assert count == 21 and total == 107
+
+def test_render_prometheus_text_format():
+    registry = Registry()
+    registry.counter("jobs_total", "Jobs run", queue='a"b').inc(3)
+    registry.gauge("depth", fn=lambda: 7)
+    registry.gauge("broken", fn=lambda: 1 / 0)
+    latency = registry.histogram("latency_seconds", "Latency", scale=1e-9, stage="x")
+    for ns in (500, 3_000, 40_000_000, 20_000_000_000):
+        latency.record(ns)
+    with pytest.raises(ValueError):
+        registry.gauge("jobs_total")
+    text = registry.render()
+    assert "# HELP jobs_total Jobs run\n# TYPE jobs_total counter\n" in text
+    assert 'jobs_total{queue="a\\"b"} 3\n' in text
+    assert "depth 7.0\n" in text and "broken NaN\n" in text
+    buckets = [line for line in text.splitlines() if line.startswith("latency_seconds_bucket")]
+    cumulative = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert cumulative == sorted(cumulative) and buckets[-1] == 'latency_seconds_bucket{stage="x",le="+Inf"} 4'
+    assert 'latency_seconds_bucket{stage="x",le="1e-06"} 1' in buckets
+    assert 'latency_seconds_count{stage="x"} 4' in text
+    total = float(next(line for line in text.splitlines() if line.startswith("latency_seconds_sum")).split()[1])
+    assert total == pytest.approx(20.040003500)
+
+
+def test_textfile_and_http_endpoint(tmp_path):
+    registry = Registry()
+    registry.counter("hits_total").inc()
+    path = str(tmp_path / "metrics.prom")
+    registry.write_textfile(path)
+    assert open(path).read() == registry.render() and len(list(tmp_path.iterdir())) == 1
+    server = registry.serve(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.read().decode() == registry.render()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+
+
+def test_instrument_times_calls_and_restores_originals():
+    registry = Registry()
+    originals = {attr: inspect.getattr_static(Target, attr) for attr in ("method", "static", "factory", "fails")}
+    stages = {attr: instrument(Target, attr, registry=registry) for attr in originals}
+    target = Target()
+    assert (target.method(2), Target.static(2), Target.factory(2)) == (4, 3, (Target, 2))
+    with pytest.raises(RuntimeError):
+        target.fails()
+    assert Target.method.__name__ == "method"
+    assert [stages[a].latency.count for a in ("method", "static", "factory", "fails")] == [1, 1, 1, 1]
+    assert stages["fails"].errors.value == 1 and stages["method"].errors.value == 0
+    # Instrumenting again wraps the original, not the previous wrapper
+    instrument(Target, "method", registry=registry)
+    assert inspect.getattr_static(Target, "method").__wrapped__ is originals["method"]
+    assert uninstrument(Target, "method") and not uninstrument(Target, "method")
+    disable()
+    assert all(inspect.getattr_static(Target, attr) is original for attr, original in originals.items())
+    assert instrumented() == []
+
+
+def test_enable_covers_pipeline_stages_and_disable_removes_them():
+    registry = Registry()
+    original = inspect.getattr_static(DataValidator, "validate_playback_event")
+    stages = enable(registry, groups=("validation", "serialization"))
+    assert {s.group for s in stages} == {"validation", "serialization"}
+    DataValidator.validate_playback_event(PlaybackEvent())
+    assert 'stage="DataValidator.validate_playback_event"} 1' in registry.render()
+    disable()
+    assert inspect.getattr_static(DataValidator, "validate_playback_event") is original
+
+
+def test_sampling_profiler_attributes_samples_to_stage():
+    registry = Registry()
+    profiler = SamplingProfiler(interval_ms=1)
+    profiler.attach(Target, "busy", stage="busy-stage", registry=registry)
+    with profiler:
+        Target().busy(0.2)
+    assert profiler.samples > 0
+    assert all(stack.startswith("busy-stage;") for stack in profiler.stacks)
+    assert any(stack.endswith(":busy") for stack in profiler.stacks)
+    profiler.detach(Target, "busy")
+    assert instrumentation._patched[(id(Target), "busy")].profiler is None
+
+
+def test_queue_depth_and_lag_gauges():
+    registry = Registry()
+    broker = InMemoryBroker()
+    producer = EventProducer(broker, linger_ms=10_000, batch_size=1000)
+    watch_producer(producer, registry=registry)
+    for _ in range(5):
+        producer.produce(PlaybackEvent(user_id="u1"))
+    assert "pipeline_queue_depth_records{queue=\"producer:default\"} 5.0" in registry.render()
+    producer.close()
+    topic = broker.topics()[0]
+    watch_consumer_lag(broker, "g", [topic, "missing.topic"], registry=registry)
+    text = registry.render()
+    assert f'pipeline_consumer_lag_records{{group_id="g",topic="{topic}"}} 5.0' in text
+    assert 'pipeline_consumer_lag_records{group_id="g",topic="missing.topic"} 0.0' in text
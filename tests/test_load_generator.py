@@ -0,0 +1,124 @@
+import json
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+from benchmarks import BENCHMARKS, compare, run_suite
+from core_data_domains import DataValidator, EventType, PlaybackEvent, QoSTelemtry
+from load_generator import EVENT_MIX, LoadGenerator, LoadProfile, ZipfSampler, batches, write_ndjson
+
+MODELS = list(EVENT_MIX)
+
+
+def small_profile(**overrides):
+    overrides.setdefault("num_users", 5_000)
+    overrides.setdefault("num_contents", 500)
+    overrides.setdefault("concurrent_sessions", 200)
+    return LoadProfile(**overrides)
+
+
+@pytest.mark.parametrize("cls", MODELS, ids=lambda cls: cls.__name__)
+def test_streams_are_reproducible_per_seed_and_shard(cls):
+    def take(seed, shard=0):
+        return list(LoadGenerator(small_profile(seed=seed), shard).stream_for(cls, 200))
+    first = take(1)
+    assert all(isinstance(e, cls) for e in first)
+    assert take(1) == first
+    assert take(2) != first
+    assert take(1, shard=1) != first
+
+
+def test_playback_sessions_are_well_formed():
+    events = list(LoadGenerator(small_profile()).playback_events(20_000))
+    assert all(DataValidator.validate_playback_event(e) == [] for e in events)
+    by_session = defaultdict(list)
+    for event in events:
+        by_session[event.session_id].append(event)
+    for session in by_session.values():
+        assert session[0].event_type is EventType.PLAY_START
+        ends = [i for i, e in enumerate(session) if e.event_type in (EventType.PLAY_STOP, EventType.PLAY_COMPLETE)]
+        assert ends in ([], [len(session) - 1])
+        assert len({(e.user_id, e.content_id, e.device_type, e.country) for e in session}) == 1
+
+
+def test_clock_follows_event_time_and_partitions():
+    events = list(LoadGenerator(small_profile(peak_events_per_second=5)).qos_telemetry(50_000))
+    timestamps = [e.timestamp for e in events]
+    assert timestamps == sorted(timestamps)
+    per_hour = Counter(t.hour for t in timestamps[1:-1])
+    # Diurnal: the busiest hour carries far more events than the quietest one
+    assert max(per_hour.values()) > 2 * min(per_hour.values())
+
+
+def test_event_date_and_hour_match_timestamp():
+    for event in LoadGenerator(small_profile(peak_events_per_second=1)).playback_events(5_000):
+        assert (event.event_date, event.event_hour) == \
+            (event.event_timestamp.strftime("%Y-%m-%d"), event.event_timestamp.hour)
+
+
+def test_zipf_sampler_is_head_heavy():
+    sample = ZipfSampler(1000, 1.1, random.Random(0))
+    counts = Counter(sample() for _ in range(50_000))
+    assert set(counts) <= set(range(1000))
+    assert counts[0] == max(counts.values())
+    assert counts[0] / counts[9] == pytest.approx(10 ** 1.1, rel=0.25)
+
+
+def test_mixed_stream_follows_mix():
+    counts = Counter(type(e) for e in LoadGenerator(small_profile()).mixed_stream(20_000))
+    total = sum(EVENT_MIX.values())
+    for cls, weight in EVENT_MIX.items():
+        assert counts[cls] / 20_000 == pytest.approx(weight / total, abs=0.02)
+
+
+def test_batches_preserve_order():
+    assert list(batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batches([], 3)) == []
+
+
+def test_write_ndjson_single_worker(tmp_path):
+    paths = write_ndjson(str(tmp_path), 1_000, kind="qos", workers=1, profile=small_profile())
+    lines = open(paths[0], "rb").read().splitlines()
+    assert len(lines) == 1_000
+    expected = list(LoadGenerator(small_profile()).stream_for(QoSTelemtry, 1_000))
+    assert [json.loads(line)["telemetry_id"] for line in lines] == [e.telemetry_id for e in expected]
+
+
+def test_suite_reports_machine_readable_results():
+    report = run_suite(n=200, repeats=1, only=["construction.PlaybackEvent", "validation."])
+    names = {r["name"] for r in report["results"]}
+    assert names == {"construction.PlaybackEvent"} | {n for n in BENCHMARKS if n.startswith("validation.")}
+    assert all(r["operations"] == 200 and r["ops_per_sec"] > 0 for r in report["results"])
+    assert json.loads(json.dumps(report)) == report
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    def report(rates):
+        return {"results": [{"name": name, "ops_per_sec": rate} for name, rate in rates.items()]}
+    rows = compare(report({"a": 85.0, "b": 95.0, "new": 1.0}), report({"a": 100.0, "b": 100.0}), 0.10)
+    assert {row["name"]: row["regression"] for row in rows} == {"a": True, "b": False}
+
+
+def test_failed_benchmark_stays_in_report(monkeypatch):
+    def broken(ctx):
+        raise RuntimeError("stage is broken")
+    monkeypatch.setitem(BENCHMARKS, "broken.stage", ("broken", broken))
+    report = run_suite(n=200, repeats=1, only=["broken.", "construction.PlaybackEvent"])
+    results = {r["name"]: r for r in report["results"]}
+    assert set(results) == {"broken.stage", "construction.PlaybackEvent"}
+    assert "stage is broken" in results["broken.stage"]["error"]
+    assert "error" not in results["construction.PlaybackEvent"]
+    assert json.loads(json.dumps(report)) == report
+
+
+def test_compare_flags_failed_and_missing_benchmarks():
+    baseline = {"results": [{"name": "a", "ops_per_sec": 100.0}, {"name": "b", "ops_per_sec": 100.0},
+                            {"name": "c", "ops_per_sec": 100.0}, {"name": "old", "error": "RuntimeError()"}]}
+    current = {"results": [{"name": "a", "ops_per_sec": 100.0}, {"name": "b", "error": "RuntimeError()"}]}
+    rows = {row["name"]: row for row in compare(current, baseline)}
+    assert {name: row["regression"] for name, row in rows.items()} == {"a": False, "b": True, "c": True}
+    assert rows["c"]["ops_per_sec"] is None and rows["c"]["change"] is None
+    # A run restricted with only= is compared on its own benchmarks
+    current["metadata"] = {"only": ["a", "b"]}
+    assert [row["name"] for row in compare(current, baseline)] == ["a", "b"]
@@ -0,0 +1,62 @@
+import random
+
+from core_data_domains import ContentType, DataValidator, DeviceType, EventType, PlaybackEvent, VideoQuality
+from playback_batch import PlaybackEventBatch, PlaybackValidationError as E
+
+
+def random_events(n, seed=1):
+    rng = random.Random(seed)
+    return [
+        PlaybackEvent(
+            user_id=rng.choice(["", f"user_{i}"]), content_id=rng.choice(["", "movie_1", "movie_2"]),
+            event_type=rng.choice(list(EventType)), content_type=rng.choice(list(ContentType)),
+            video_quality=rng.choice(list(VideoQuality)), device_type=rng.choice(list(DeviceType)),
+            position_seconds=rng.randint(-10, 120), duration_seconds=rng.randint(-1, 100),
+            volume_level=rng.randint(-5, 105), playback_rate=rng.choice([0.1, 0.25, 1.0, 3.0, 3.5]),
+            is_fullscreen=rng.random() < 0.5, subtitle_language=rng.choice([None, "fr"]),
+        )
+        for i in range(n)
+    ]
+
+
+def test_round_trip_is_lossless():
+    events = random_events(200)
+    batch = PlaybackEventBatch.from_events(events[:100])
+    for event in events[100:]:
+        batch.append(event)
+    assert len(batch) == 200
+    assert batch.to_events() == events
+    assert batch[150] == events[150]
+    assert batch.decoded_column("device_type") == [e.device_type for e in events]
+
+
+def test_select_keeps_rows_in_order():
+    events = random_events(50)
+    batch = PlaybackEventBatch.from_events(events)
+    assert batch.select([3, 1, 40]).to_events() == [events[3], events[1], events[40]]
+
+
+def test_validate_batch_agrees_with_data_validator():
+    events = random_events(2000, seed=7)
+    masks = PlaybackEventBatch.from_events(events).validate_batch()
+    for event, mask in zip(events, masks):
+        errors = DataValidator.validate_playback_event(event)
+        assert bool(mask) == bool(errors)
+        assert set(PlaybackEventBatch.describe_errors(mask)) <= set(errors)
+
+
+def test_validate_batch_sets_one_bit_per_rule():
+    events = [
+        PlaybackEvent(user_id="u", content_id="c", position_seconds=10, duration_seconds=100),
+        PlaybackEvent(user_id="", content_id="", position_seconds=-1, duration_seconds=100),
+        PlaybackEvent(user_id="u", content_id="c", position_seconds=5, duration_seconds=0, volume_level=101),
+        PlaybackEvent(user_id="u", content_id="c", position_seconds=1, duration_seconds=2, playback_rate=0.2),
+    ]
+    masks = PlaybackEventBatch.from_events(events).validate_batch()
+    assert list(masks) == [
+        0,
+        E.MISSING_USER_ID | E.MISSING_CONTENT_ID | E.NEGATIVE_POSITION,
+        E.NON_POSITIVE_DURATION | E.POSITION_EXCEEDS_DURATION | E.VOLUME_OUT_OF_RANGE,
+        E.PLAYBACK_RATE_OUT_OF_RANGE,
+    ]
+    assert PlaybackEventBatch.describe_errors(masks[3]) == ["playback_rate out of valid range (0.25-3.0)"]
@@ -0,0 +1,134 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from core_data_domains import QoSTelemtry
+from qos_metrics import DDSketch, QoSWindowAggregator
+
+START = datetime(2024, 1, 1)
+
+
+def sample(seconds, latency=50, cdn="cdn-0"):
+    return QoSTelemtry(timestamp=START + timedelta(seconds=seconds), cdn_server=cdn, latency_ms=latency)
+
+
+def windows(metrics, metric_name="latency_ms", value="cdn-0"):
+    return [(m.window_end, m.sample_count) for m in metrics
+            if m.metric_name == metric_name and m.dimension_value == value]
+
+
+def test_ddsketch_quantiles_within_relative_accuracy():
+    rng = random.Random(3)
+    values = sorted(rng.lognormvariate(4, 1) for _ in range(5000))
+    sketch = DDSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1e-9
+
+
+def test_ddsketch_dict_round_trip_through_json():
+    sketch = DDSketch()
+    for v in (-3.0, 0.0, 1.5, 200.0):
+        sketch.add(v)
+    restored = DDSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.count == 4
+    assert (restored.min, restored.max) == (-3.0, 200.0)
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+
+def test_tumbling_windows_emit_once_each():
+    emitted = []
+    agg = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=0, on_metric=emitted.append)
+    agg.add_many(sample(s) for s in (0, 30, 65, 130))
+    agg.flush()
+    assert windows(emitted) == [(START + timedelta(seconds=60), 2),
+                                (START + timedelta(seconds=120), 1),
+                                (START + timedelta(seconds=180), 1)]
+
+
+def test_late_samples_are_counted_not_reemitted():
+    emitted = []
+    agg = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=0, on_metric=emitted.append)
+    agg.add(sample(10))
+    agg.add(sample(70))
+    agg.add(sample(5))
+    assert agg.late_samples_dropped == 1
+    assert windows(emitted) == [(START + timedelta(seconds=60), 1)]
+
+
+
+def test_samples_for_flushed_windows_are_late():
+    emitted = []
+    agg = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=30, on_metric=emitted.append)
+    agg.add_many(sample(s) for s in (10, 70))
+    agg.flush()
+    agg.add(sample(20))
+    agg.merge_partial([(0, [(["cdn_server", "cdn-0", "latency_ms"], DDSketch().to_dict())])])
+    agg.flush()
+    assert agg.late_samples_dropped == 1
+    assert windows(emitted) == [(START + timedelta(seconds=60), 1), (START + timedelta(seconds=120), 1)]
+    # A later sample still opens a fresh window
+    agg.add(sample(200))
+    agg.flush()
+    assert windows(emitted)[-1] == (START + timedelta(seconds=240), 1)
+
+def test_partial_state_survives_json():
+    agg = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=600)
+    agg.add_many(sample(s, latency=s + 1) for s in range(0, 180, 7))
+    state = json.loads(json.dumps(agg.partial_state()))
+
+    emitted_a, emitted_b = [], []
+    direct = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=600, on_metric=emitted_a.append)
+    direct.merge(agg)
+    via_json = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=600, on_metric=emitted_b.append)
+    via_json.merge_partial(state)
+    direct.flush()
+    via_json.flush()
+    assert [(m.window_end, m.dimension_value, m.metric_name, m.sample_count, m.p99) for m in emitted_a] == \
+        [(m.window_end, m.dimension_value, m.metric_name, m.sample_count, m.p99) for m in emitted_b]
+    assert windows(emitted_b) == [(START + timedelta(seconds=60), 9),
+                                  (START + timedelta(seconds=120), 9),
+                                  (START + timedelta(seconds=180), 8)]
+
+
+def test_merge_partial_rejects_malformed_keys():
+    agg = QoSWindowAggregator()
+    with pytest.raises(ValueError):
+        agg.merge_partial([(0, [("cdn_server", DDSketch().to_dict())])])
+
+
+def test_merge_does_not_reemit_closed_windows():
+    emitted = []
+    agg = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=0, on_metric=emitted.append)
+    agg.add_many(sample(s) for s in (0, 65, 130))
+    assert windows(emitted) == [(START + timedelta(seconds=60), 1), (START + timedelta(seconds=120), 1)]
+
+    worker = QoSWindowAggregator(window_seconds=60, allowed_lateness_seconds=600)
+    worker.add_many(sample(s) for s in (10, 70, 140))
+    agg.merge(worker)
+    # Panes 0 and 1 belong to windows already published; pane 2 is still open
+    assert agg.late_samples_dropped == 2
+    agg.flush()
+    assert windows(emitted) == [(START + timedelta(seconds=60), 1),
+                                (START + timedelta(seconds=120), 1),
+                                (START + timedelta(seconds=180), 2)]
+
+
+def test_sliding_merge_keeps_panes_of_open_windows():
+    emitted = []
+    agg = QoSWindowAggregator(window_seconds=120, slide_seconds=60, allowed_lateness_seconds=0,
+                              on_metric=emitted.append)
+    agg.add_many(sample(s) for s in (0, 65, 130))
+    worker = QoSWindowAggregator(window_seconds=120, slide_seconds=60, allowed_lateness_seconds=0)
+    worker.add(sample(70))
+    agg.merge(worker)
+    assert agg.late_samples_dropped == 0
+    agg.flush()
+    assert windows(emitted) == [(START + timedelta(seconds=60), 1),
+                                (START + timedelta(seconds=120), 2),
+                                (START + timedelta(seconds=180), 3),
+                                (START + timedelta(seconds=240), 1)]
@@ -0,0 +1,85 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core_data_domains import EventType, UserInteractionEvent
+from search_analytics import (
+    PrefixIndex, SearchAnalytics, SearchAnalyticsConfig, SpaceSaving, normalize_prefix, normalize_query
+)
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def search(query, seconds=0.0, results=10, clicked=None, country="US"):
+    return UserInteractionEvent(event_type=EventType.SEARCH, search_query=query, search_results_count=results,
+                                search_result_clicked_position=clicked, country=country,
+                                event_timestamp=START + timedelta(seconds=seconds))
+
+
+def test_normalize_query_and_prefix():
+    assert normalize_query("  Sci   FI ") == "sci fi"
+    assert normalize_query(None) == ""
+    assert normalize_prefix("Sci ") == "sci "
+    assert normalize_prefix("sci\t") == "sci "
+    assert normalize_prefix("sci") == "sci"
+    assert normalize_prefix("   ") == ""
+    assert normalize_prefix("abcd ", max_length=4) == "abcd"
+
+
+def test_space_saving_overestimates_within_error():
+    rng = random.Random(4)
+    stream = [f"q{min(int(rng.paretovariate(1.1)), 500)}" for _ in range(20_000)]
+    summary = SpaceSaving(50)
+    for item in stream:
+        summary.add(item)
+    exact = {item: stream.count(item) for item in set(stream)}
+    for row in summary.top(10):
+        assert row.count - row.error <= exact[row.query] <= row.count
+    assert [row.query for row in summary.top(3)] == sorted(exact, key=exact.get, reverse=True)[:3]
+
+
+def test_prefix_index_ranks_by_score_on_both_paths():
+    index = PrefixIndex([("science", 5), ("sci fi", 9), ("scissors", 1), ("comedy", 7)],
+                        completions=2, short_prefix_length=2)
+    assert index.lookup("sc") == ["sci fi", "science"]
+    assert index.lookup("sci") == ["sci fi", "science"]
+    assert index.lookup("sci", n=5) == ["sci fi", "science", "scissors"]
+    assert index.lookup("x") == []
+
+
+def test_autocomplete_keeps_trailing_space():
+    analytics = SearchAnalytics()
+    analytics.process_many([search(q) for q in ["science", "science", "sci fi", "sci fi", "sci fi"]])
+    analytics.flush()
+    assert analytics.autocomplete("SCI") == ["sci fi", "science"]
+    assert analytics.autocomplete("sci ") == ["sci fi"]
+    assert analytics.autocomplete("science ") == []
+
+
+def test_index_leaves_out_rare_and_zero_result_queries():
+    analytics = SearchAnalytics()
+    analytics.process_many([search("drama"), search("drama"), search("dune"),
+                            search("dracula", results=0), search("dracula", results=0), search("dracula")])
+    analytics.flush()
+    assert analytics.autocomplete("d") == ["drama"]
+
+
+def test_windows_reports_and_late_events():
+    reports = []
+    analytics = SearchAnalytics(SearchAnalyticsConfig(window_seconds=60, max_countries=1),
+                                on_report=reports.extend)
+    analytics.process_many([search("a", 1, clicked=1), search("a", 2, clicked=2, country="FR"),
+                            search("b", 3, results=0), search("c", 61)])
+    analytics.process(search("late", -100))
+    assert analytics.metrics.late_events_dropped == 1
+    total = reports[0]
+    assert (total.country, total.searches, total.zero_results) == ("*", 3, 1)
+    assert total.click_through_rate == 1.0
+    assert total.mean_reciprocal_rank == pytest.approx(0.75)
+    assert total.click_positions[:2] == [1, 1]
+    # Only one country fits, the rest is counted under "other"
+    assert [r.country for r in reports[1:]] == ["US", "other"]
+    assert [q.query for q in total.top_zero_result_queries] == ["b"]
+    assert [q.query for q in analytics.top_queries(windows=2)][:1] == ["a"]
+    assert analytics.zero_result_rate(windows=2) == 0.25
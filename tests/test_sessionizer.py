@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from core_data_domains import ContentType, EventType, PlaybackEvent, VideoQuality
+from sessionizer import Sessionizer, SessionizerConfig, synthetic_playback_stream
+
+START = datetime(2024, 1, 1)
+
+
+def play(seconds, event_type, session_id="s1", user_id="u1", content_id="m1", position=0, **kwargs):
+    kwargs.setdefault("duration_seconds", 3600)
+    return PlaybackEvent(event_type=event_type, event_timestamp=START + timedelta(seconds=seconds),
+                         session_id=session_id, user_id=user_id, content_id=content_id,
+                         position_seconds=position, **kwargs)
+
+
+def sessionizer(**config):
+    sessions = []
+    return Sessionizer(SessionizerConfig(**config), on_session=sessions.append), sessions
+
+
+def test_session_built_from_events():
+    s, sessions = sessionizer(allowed_lateness_seconds=60)
+    uhd = VideoQuality.UHD_4K
+    s.process_many([
+        play(0, EventType.PLAY_START, bitrate_kbps=4000),
+        play(100, EventType.PLAY_PAUSE, position=100, bitrate_kbps=6000),
+        play(160, EventType.PLAY_RESUME, position=100, video_quality=uhd),
+        play(200, EventType.SEEK, position=50, buffering_count=1, buffering_duration_ms=300, video_quality=uhd),
+        play(260, EventType.SEEK, position=900, video_quality=uhd),
+        play(300, EventType.PLAY_STOP, position=960, error_code="E1", video_quality=uhd),
+    ])
+    assert sessions == []
+    s.process(play(360, EventType.PLAY_START, session_id="other"))
+    (session,) = sessions
+    assert (session.session_start, session.session_end) == (START, START + timedelta(seconds=300))
+    # Paused from 100s to 160s
+    assert session.total_watch_tie_seconds == 240
+    assert (session.pause_count, session.seel_count, session.rewind_count, session.fast_forward_count) == \
+        (1, 2, 1, 1)
+    assert session.average_bitrate_kbps == 5000
+    assert (session.buffering_events, session.total_buffering_duration_ms) == (1, 300)
+    assert session.quality_changes == 1 and session.video_quality is VideoQuality.UHD_4K
+    assert session.errors_encountered == 1
+    assert session.completion_percentage == 960 * 100 / 3600
+    assert not session.is_completed and not session.is_abandoned
+
+
+def test_inactivity_timeout_closes_session():
+    s, sessions = sessionizer(inactivity_gap_seconds=600, allowed_lateness_seconds=0)
+    s.process_many([play(0, EventType.PLAY_START), play(60, EventType.PLAY_RESUME, position=60)])
+    s.process(play(60 + 599, EventType.PLAY_START, session_id="other"))
+    assert sessions == []
+    s.process(play(60 + 600, EventType.PLAY_START, session_id="other"))
+    assert [x.session_id for x in sessions] == ["s1"]
+    assert s.metrics.sessions_timed_out == 1
+
+
+def test_late_events_within_lateness_are_applied_and_older_dropped():
+    s, sessions = sessionizer(allowed_lateness_seconds=60)
+    s.process_many([play(0, EventType.PLAY_START), play(100, EventType.PLAY_STOP, position=100)])
+    # Stop lies 40s behind the max event time: still open, so this late seek counts
+    s.process(play(140, EventType.PLAY_START, session_id="other"))
+    s.process(play(50, EventType.SEEK, position=20))
+    s.process(play(170, EventType.PLAY_RESUME, session_id="other"))
+    assert [x.seel_count for x in sessions] == [1]
+    s.process(play(10, EventType.PLAY_START, session_id="late"))
+    assert s.metrics.late_events_dropped == 1
+
+
+def test_complete_and_abandoned_flags():
+    s, sessions = sessionizer()
+    s.process_many([play(0, EventType.PLAY_START, session_id="a"),
+                    play(10, EventType.PLAY_COMPLETE, session_id="a", position=100),
+                    play(0, EventType.PLAY_START, session_id="b"),
+                    play(10, EventType.PLAY_STOP, session_id="b", position=60)])
+    s.flush()
+    flags = {x.session_id: (x.is_completed, x.is_abandoned) for x in sessions}
+    assert flags == {"a": (True, False), "b": (False, True)}
+
+
+def test_binge_detection_for_consecutive_episodes():
+    s, sessions = sessionizer(binge_gap_seconds=600, allowed_lateness_seconds=0)
+    episode = dict(content_type=ContentType.TV_EPISODE)
+    s.process_many([
+        play(0, EventType.PLAY_START, session_id="e1", content_id="ep1", **episode),
+        play(1000, EventType.PLAY_COMPLETE, session_id="e1", content_id="ep1", position=1000, **episode),
+        play(1300, EventType.PLAY_START, session_id="e2", content_id="ep2", **episode),
+        play(2000, EventType.PLAY_STOP, session_id="e2", content_id="ep2", position=700, **episode),
+        play(5000, EventType.PLAY_START, session_id="e3", content_id="ep3", **episode),
+    ])
+    s.flush()
+    assert {x.session_id: x.is_binge_watch for x in sessions} == {"e1": False, "e2": True, "e3": False}
+
+
+def test_synthetic_stream_emits_each_session_once():
+    s, sessions = sessionizer()
+    events = list(synthetic_playback_stream(20_000, concurrent_viewers=200))
+    s.process_many(events)
+    s.flush()
+    assert len(sessions) == len({(e.session_id, e.content_id) for e in events})
+    assert len(s) == 0
+    assert s.metrics.events_processed == len(events)
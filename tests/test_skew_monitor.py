@@ -0,0 +1,111 @@
+import math
+from collections import Counter
+
+from core_data_domains import PlaybackEvent
+from event_producer import partition_for_key
+from local_broker import BrokerRecord
+from real_time_event_streaming import KafkaTopics, TopicConfig
+from skew_monitor import PartitionPlannerConfig, SkewMonitor, SkewMonitorConfig, plan_partitions, salt_key
+
+PLAYBACK = KafkaTopics.PLAYBACK_EVENTS.value
+
+
+def skewed_keys(n=20_000, hot_every=10):
+    return ["user_bot" if i % hot_every == 0 else f"user_{i % 4000}" for i in range(n)]
+
+
+def monitor(**config):
+    reports = []
+    return SkewMonitor(SkewMonitorConfig(**config), num_partitions=lambda topic: 8,
+                       on_report=reports.append), reports
+
+
+def test_partition_counts_are_exact_and_match_the_producer():
+    skew, _ = monitor()
+    keys = skewed_keys()
+    for key in keys:
+        skew.observe(PLAYBACK, key, 100, now=0.0)
+    (report,) = skew.report(now=10.0)
+    expected = Counter(partition_for_key(key, 8) for key in keys)
+    assert report.partition_records == [expected[p] for p in range(8)]
+    assert (report.records, report.bytes, report.records_per_second) == (20_000, 2_000_000, 2_000.0)
+    assert report.max_partition == partition_for_key("user_bot", 8)
+    assert math.isclose(report.imbalance, max(expected.values()) / (20_000 / 8))
+
+
+def test_hot_key_reported_with_an_upper_bound_estimate():
+    skew, _ = monitor(sketch_width=256, heavy_hitters=16)
+    for key in skewed_keys():
+        skew.observe(PLAYBACK, key.encode("utf-8"), now=0.0)
+    (report,) = skew.report(now=1.0)
+    assert [hot.key for hot in report.hot_keys] == ["user_bot"]
+    hot = report.hot_keys[0]
+    assert hot.estimated_records >= 2_000 and hot.partition == partition_for_key("user_bot", 8)
+    assert hot.share >= 0.1 and 0 < hot.partition_share <= 1.0
+
+
+def test_even_load_reports_no_hot_keys():
+    skew, _ = monitor()
+    for i in range(20_000):
+        skew.observe(PLAYBACK, f"user_{i % 4000}", now=0.0)
+    (report,) = skew.report(now=1.0)
+    assert report.hot_keys == [] and report.imbalance < 1.2
+
+
+def test_windows_roll_and_reset():
+    skew, reports = monitor(window_seconds=60.0, history_windows=2)
+    for second in range(0, 240, 2):
+        skew.observe(PLAYBACK, f"user_{second}", now=float(second))
+        skew.observe("other.topic", "k", now=float(second))
+    assert [(r.window_start, r.records) for r in reports if r.topic == PLAYBACK] == [(0.0, 30), (60.0, 30), (120.0, 30)]
+    assert len(skew.history) == 2
+    assert sum(r.records for r in skew.report(now=240.0) if r.topic == PLAYBACK) == 30
+    assert skew.roll(now=240.0) and skew.report(now=241.0) == []
+
+
+def test_observe_records_and_events_use_their_partitions():
+    skew = SkewMonitor(num_partitions=lambda topic: 4)
+    skew.observe_records([BrokerRecord("t", 3, i, b"k", b"xyz", 0.0) for i in range(5)], now=0.0)
+    skew.observe_event(PlaybackEvent(user_id="u1"), KafkaTopics.PLAYBACK_EVENTS, now=0.0)
+    reports = {r.topic: r for r in skew.report(now=1.0)}
+    assert reports["t"].partition_records == [0, 0, 0, 5] and reports["t"].bytes == 15
+    assert reports[PLAYBACK].partition_records[partition_for_key("u1", 4)] == 1
+
+
+def test_default_partition_counts_come_from_topic_config():
+    skew = SkewMonitor()
+    skew.observe(PLAYBACK, "u1", now=0.0)
+    (report,) = skew.report(now=1.0)
+    assert report.num_partitions == TopicConfig.for_topic(KafkaTopics.PLAYBACK_EVENTS)["num_partitions"]
+
+
+def test_salt_key_is_stable_per_discriminator():
+    assert salt_key("user_bot", 1, "s1") == "user_bot"
+    buckets = {salt_key("user_bot", 8, f"session_{i}") for i in range(200)}
+    assert len(buckets) == 8 and all(b.startswith("user_bot#") for b in buckets)
+    assert salt_key("user_bot", 8, "session_1") == salt_key("user_bot", 8, "session_1")
+
+
+def test_planner_sizes_partitions_and_salts_hot_keys():
+    skew, _ = monitor()
+    for key in skewed_keys(hot_every=4):
+        skew.observe(PLAYBACK, key, 500, now=0.0)
+    reports = skew.report(now=2.0)
+    config = PartitionPlannerConfig(max_records_per_partition_per_second=1_000, headroom=2.0, salt_threshold=0.5)
+    (plan,) = plan_partitions(reports, current={PLAYBACK: 8}, config=config)
+    # The hot key runs at 2,500/sec, so 2.0 * 2,500 / 500 = 10 buckets
+    assert plan.salted_keys == {"user_bot": 10}
+    assert plan.residual_imbalance < reports[0].imbalance
+    assert plan.recommended_partitions >= math.ceil(10_000 * 2.0 / 1_000)
+    assert plan.topic_config()["num_partitions"] == plan.recommended_partitions
+    assert plan.topic_config()["config"] == TopicConfig.for_topic(KafkaTopics.PLAYBACK_EVENTS)["config"]
+    assert any("remaps keys" in note for note in plan.notes)
+
+
+def test_planner_keeps_over_provisioned_topics():
+    skew, _ = monitor()
+    for i in range(1_000):
+        skew.observe(PLAYBACK, f"user_{i}", now=0.0)
+    (plan,) = plan_partitions(skew.report(now=60.0), current={PLAYBACK: 50})
+    assert plan.recommended_partitions == PartitionPlannerConfig().min_partitions
+    assert plan.salted_keys == {} and any("cannot shrink" in note for note in plan.notes)
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from core_data_domains import EventType, PlaybackEvent, SubscriptionStatus, UserSubscription, VideoQuality
+from stream_admission import AdmissionConfig, AdmissionReason, StreamAdmissionService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def service(*subscriptions, **config):
+    clock = FakeClock()
+    admission = StreamAdmissionService(AdmissionConfig(**config), clock=clock)
+    admission.upsert_subscriptions(subscriptions)
+    return admission, clock
+
+
+def subscription(user_id="u1", streams=2, quality=VideoQuality.HD_1080P, status=SubscriptionStatus.ACTIVE):
+    return UserSubscription(user_id=user_id, max_concurrent_streams=streams, max_quality=quality, status=status)
+
+
+def test_stream_limit_and_quality_clamp():
+    admission, _ = service(subscription())
+    first = admission.admit("u1", "s1", VideoQuality.UHD_4K)
+    assert (first.allowed, first.reason, first.quality, first.active_streams, first.max_streams) == \
+        (True, AdmissionReason.ALLOWED, VideoQuality.HD_1080P, 1, 2)
+    assert admission.admit("u1", "s2", VideoQuality.SD_480P).quality is VideoQuality.SD_480P
+    denied = admission.admit("u1", "s3")
+    assert (denied.allowed, denied.reason, denied.quality) == (False, AdmissionReason.STREAM_LIMIT, None)
+    # A repeated start for a running session keeps its slot
+    assert admission.admit("u1", "s1").reason is AdmissionReason.ALREADY_ACTIVE
+    assert admission.release("u1", "s2") and not admission.release("u1", "s2")
+    assert admission.admit("u1", "s3").allowed
+    metrics = admission.metrics
+    assert (metrics.admitted, metrics.denied_limit, metrics.already_active, metrics.released) == (3, 1, 1, 1)
+    assert metrics.quality_clamped == 3
+
+
+@pytest.mark.parametrize("status, allowed", [(SubscriptionStatus.TRIAL, True), (SubscriptionStatus.PAUSED, False),
+                                             (SubscriptionStatus.PAST_DUE, False)])
+def test_subscription_status_gates_play_starts(status, allowed):
+    admission, _ = service(subscription(status=status))
+    decision = admission.admit("u1", "s1")
+    assert decision.allowed is allowed
+    assert allowed or decision.reason is AdmissionReason.INACTIVE_SUBSCRIPTION
+
+
+def test_unknown_and_removed_subscriptions_are_denied():
+    admission, _ = service(subscription())
+    assert admission.admit("nobody", "s1").reason is AdmissionReason.NO_SUBSCRIPTION
+    admission.admit("u1", "s1")
+    admission.remove_subscription("u1")
+    assert admission.active_streams("u1") == 1
+    assert admission.admit("u1", "s2").reason is AdmissionReason.NO_SUBSCRIPTION
+    admission.release("u1", "s1")
+    assert admission.active_streams("u1") == 0
+
+
+def test_streams_expire_without_heartbeats():
+    admission, clock = service(subscription(streams=1), heartbeat_timeout_seconds=90, tick_seconds=1)
+    admission.admit("u1", "s1")
+    clock.now += 60
+    assert admission.heartbeat("u1", "s1")
+    clock.now += 89
+    assert admission.active_streams("u1") == 1
+    assert not admission.admit("u1", "s2").allowed
+    clock.now += 2
+    assert admission.active_streams("u1") == 0
+    assert not admission.heartbeat("u1", "s1")
+    assert admission.admit("u1", "s2").allowed
+    assert (admission.metrics.expired, admission.metrics.heartbeats_unknown) == (1, 1)
+
+
+def test_long_idle_gap_expires_everything():
+    admission, clock = service(subscription(streams=3), heartbeat_timeout_seconds=10, tick_seconds=1)
+    for session in ("a", "b", "c"):
+        admission.admit("u1", session)
+    clock.now += 10_000
+    assert admission.active_streams("u1") == 0
+
+
+def test_handle_event_drives_admission():
+    admission, _ = service(subscription(streams=1))
+    start = PlaybackEvent(event_type=EventType.PLAY_START, user_id="u1", session_id="s1",
+                          video_quality=VideoQuality.UHD_8K)
+    assert admission.handle_event(start).quality is VideoQuality.HD_1080P
+    assert admission.handle_event(PlaybackEvent(event_type=EventType.PLAY_RESUME, user_id="u1",
+                                                session_id="s1")) is None
+    assert admission.metrics.heartbeats == 1
+    admission.handle_event(PlaybackEvent(event_type=EventType.PLAY_COMPLETE, user_id="u1", session_id="s1"))
+    assert admission.active_streams("u1") == 0
+
+
+def test_concurrent_starts_never_exceed_limit():
+    admission, _ = service(*(subscription(f"u{i}", streams=2) for i in range(8)), num_shards=4)
+    barrier = threading.Barrier(8)
+    decisions = []
+
+    def worker(thread):
+        barrier.wait()
+        for i in range(200):
+            decisions.append(admission.admit(f"u{i % 8}", f"t{thread}-{i}"))
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(d.allowed for d in decisions) == 16
+    assert all(admission.active_streams(f"u{i}") == 2 for i in range(8))
+
+
+def test_num_shards_must_be_power_of_two():
+    with pytest.raises(ValueError):
+        StreamAdmissionService(AdmissionConfig(num_shards=6))
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from core_data_domains import PlaybackEvent
+from unique_viewers import HyperLogLog, UniqueViewerCounter
+
+
+def event(content_id, user_id, event_date, hour):
+    return PlaybackEvent(content_id=content_id, user_id=user_id, event_date=event_date, event_hour=hour)
+
+
+def within(estimate, exact, tolerance=0.03):
+    return abs(estimate - exact) <= tolerance * exact + 2
+
+
+@pytest.mark.parametrize("n", [10, 1_000, 50_000])
+def test_hyperloglog_estimates_within_error_bound(n):
+    sketch = HyperLogLog()
+    for i in range(n):
+        sketch.add(f"user_{i}")
+        sketch.add(f"user_{i // 2}")
+    assert within(sketch.count(), n)
+
+
+@pytest.mark.parametrize("multiple", [1, 2, 2.5, 3, 4, 5])
+def test_hyperloglog_is_unbiased_across_the_mid_range(multiple):
+    # 2.5 * m is where the original estimator switched off linear counting
+    errors = []
+    for seed in range(6):
+        rng = random.Random(seed)
+        sketch = HyperLogLog()
+        n = int(multiple * sketch.m)
+        for _ in range(n):
+            sketch.add_hash(rng.getrandbits(64))
+        errors.append(sketch.count() / n - 1)
+    assert all(abs(error) <= 3 * sketch.relative_error for error in errors)
+    assert abs(sum(errors) / len(errors)) <= sketch.relative_error / 2
+
+
+def test_hyperloglog_bytes_round_trip_sparse_and_dense():
+    for n in (5, 20_000):
+        sketch = HyperLogLog(12)
+        for i in range(n):
+            sketch.add(f"user_{i}")
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        assert restored.count() == sketch.count()
+
+
+def test_rollups_only_merge_the_requested_content_and_dates():
+    rng = random.Random(5)
+    counter = UniqueViewerCounter()
+    exact = {}
+    for _ in range(20_000):
+        content_id = f"content_{rng.randrange(3)}"
+        day = f"2024-01-{rng.randrange(1, 10):02d}"
+        user_id = f"user_{rng.randrange(4000)}"
+        counter.add(event(content_id, user_id, day, rng.randrange(24)))
+        exact.setdefault((content_id, day), set()).add(user_id)
+
+    assert within(counter.daily("content_1", "2024-01-03"), len(exact[("content_1", "2024-01-03")]))
+    week = set().union(*(exact[("content_2", f"2024-01-{d:02d}")] for d in range(1, 8)))
+    assert within(counter.weekly("content_2", "2024-01-01"), len(week))
+    assert counter.daily("content_9", "2024-01-03") == 0
+    assert counter.weekly("content_0", "2023-12-01") == 0
+
+
+def test_daily_covers_every_hour_once():
+    counter = UniqueViewerCounter()
+    for hour in range(24):
+        counter.add(event("c", f"user_{hour}", "2024-01-01", hour))
+        counter.add(event("c", "user_0", "2024-01-01", hour))
+    counter.add(event("c", "user_late", "2024-01-02", 0))
+    assert counter.daily("c", "2024-01-01") == 24
+    assert counter.hourly("c", "2024-01-01", 5) == 2
+
+
+def test_merged_worker_sketches_match_single_counter():
+    events = [event("c", f"user_{i % 700}", "2024-01-01", i % 24) for i in range(3000)]
+    single = UniqueViewerCounter()
+    single.add_many(events)
+    left, right, combined = UniqueViewerCounter(), UniqueViewerCounter(), UniqueViewerCounter()
+    left.add_many(events[::2])
+    right.add_many(events[1::2])
+    for row in left.sketch_rows() + right.sketch_rows():
+        combined.merge_sketch(row)
+    assert combined.daily("c", "2024-01-01") == single.daily("c", "2024-01-01")
+
+
+def test_evict_before_drops_old_days():
+    counter = UniqueViewerCounter()
+    counter.add(event("c", "u", "2024-01-01", 1))
+    counter.add(event("c", "u", "2024-01-02", 1))
+    assert counter.evict_before("2024-01-02") == 1
+    assert counter.daily("c", "2024-01-01") == 0
+    assert counter.daily("c", "2024-01-02") == 1
@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from core_data_domains import EventType, UserInteractionEvent, UserList
+from user_lists import UserListStore
+
+T0 = datetime(2024, 1, 1)
+
+
+def list_event(event_type, user_id, content_id, minutes=0):
+    return UserInteractionEvent(event_type=event_type, user_id=user_id, element_id=content_id,
+                                event_timestamp=T0 + timedelta(minutes=minutes))
+
+
+def test_add_remove_keep_set_semantics_and_order():
+    store = UserListStore()
+    list_id = store.create_list("u1", created_at=T0)
+    assert [store.add(list_id, c) for c in ("a", "b", "a", "c")] == [True, True, False, True]
+    assert store.remove(list_id, "b") and not store.remove(list_id, "b")
+    store.add(list_id, "b")
+    assert store.items(list_id) == ["a", "c", "b"]
+    assert store.items(list_id, offset=1, limit=1) == ["c"]
+    assert store.contains(list_id, "c") and not store.contains(list_id, "z")
+    user_list = store.get(list_id)
+    assert user_list.content_ids == ["a", "c", "b"] and user_list.item_count == 3
+
+
+def test_updated_at_only_moves_forward_on_changes():
+    store = UserListStore()
+    list_id = store.create_list("u1", created_at=T0)
+    store.add(list_id, "a", T0 + timedelta(hours=2))
+    store.add(list_id, "b", T0 + timedelta(hours=1))
+    store.add(list_id, "a", T0 + timedelta(hours=3))
+    assert store.get(list_id).updated_at == T0 + timedelta(hours=2)
+
+
+def test_load_drops_duplicates_and_indexes_owners():
+    store = UserListStore()
+    list_id = store.load(UserList(user_id="u1", content_ids=["a", "b", "a"], item_count=7, updated_at=T0))
+    loaded = store.get(list_id)
+    assert (loaded.content_ids, loaded.item_count, loaded.updated_at) == (["a", "b"], 2, T0)
+    assert store.default_list_id("u1") == list_id
+    with pytest.raises(ValueError):
+        store.load(UserList(list_id=list_id, user_id="u2"))
+
+
+def test_reverse_index_counts_distinct_users():
+    store = UserListStore()
+    watchlist = store.default_list_id("u1")
+    favourites = store.create_list("u1", list_name="Favourites", list_type="custom")
+    other = store.default_list_id("u2")
+    store.add(watchlist, "a")
+    store.add(favourites, "a")
+    store.add(other, "a")
+    store.add(other, "b")
+    assert (store.saved_count("a"), store.owners("a")) == (2, {"u1", "u2"})
+    assert store.most_saved(2) == [(2, "a"), (1, "b")]
+    store.remove(watchlist, "a")
+    assert store.owners("a") == {"u1", "u2"}
+    assert store.delete_list(favourites) and not store.delete_list(favourites)
+    assert store.owners("a") == {"u2"}
+    store.delete_list(other)
+    assert store.saved_count("a") == store.saved_count("b") == 0 and store.most_saved() == []
+    assert store.lists_for_user("u2") == []
+
+
+def test_unknown_list_raises_key_error():
+    with pytest.raises(KeyError):
+        UserListStore().add("missing", "a")
+
+
+def test_apply_events_routes_to_default_list():
+    store = UserListStore()
+    result = store.apply_events([
+        list_event(EventType.ADD_TO_LIST, "u1", "a", 1),
+        list_event(EventType.ADD_TO_LIST, "u1", "a", 2),
+        list_event(EventType.REMOVE_FROM_LIST, "u1", "b", 3),
+        list_event(EventType.ADD_TO_LIST, "u1", "b", 4),
+        list_event(EventType.REMOVE_FROM_LIST, "u1", "a", 5),
+        list_event(EventType.CLICK, "u1", "c", 6),
+        list_event(EventType.ADD_TO_LIST, "", "c", 7),
+    ])
+    assert (result.added, result.removed, result.unchanged, result.skipped) == (2, 1, 2, 2)
+    user_list = store.get(store.default_list_id("u1"))
+    assert user_list.content_ids == ["b"] and user_list.updated_at == T0 + timedelta(minutes=5)
+
+
+def test_store_matches_reference_model():
+    rng = random.Random(5)
+    store = UserListStore()
+    reference = {}
+    events = [list_event(rng.choice([EventType.ADD_TO_LIST, EventType.REMOVE_FROM_LIST]),
+                         f"u{rng.randrange(20)}", f"c{rng.randrange(50)}", i) for i in range(5000)]
+    store.apply_events(events)
+    for event in events:
+        items = reference.setdefault(event.user_id, [])
+        if event.event_type is EventType.ADD_TO_LIST and event.element_id not in items:
+            items.append(event.element_id)
+        elif event.event_type is EventType.REMOVE_FROM_LIST and event.element_id in items:
+            items.remove(event.element_id)
+    for user_id, items in reference.items():
+        user_list = store.get(store.default_list_id(user_id))
+        assert user_list.content_ids == items and user_list.item_count == len(items)
+    for content_id in {e.element_id for e in events}:
+        assert store.owners(content_id) == {u for u, items in reference.items() if content_id in items}
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from watch_party import ConnectionClosed, SyncKind, WatchPartyConfig, WatchPartyCoordinator
+
+
+def drain(connection):
+    messages = list(connection._pending)
+    connection._pending.clear()
+    return messages
+
+
+def kinds(connection):
+    return [message.kind for message in drain(connection)]
+
+
+def test_newcomer_gets_state_and_members_get_join():
+    coordinator = WatchPartyCoordinator()
+    host = coordinator.create_party("h", "content_1", party_id="p")
+    assert kinds(host) == [SyncKind.STATE]
+    guest = coordinator.join("p", "a")
+    assert kinds(guest) == [SyncKind.STATE]
+    joined = drain(host)
+    assert [(m.kind, m.user_id) for m in joined] == [(SyncKind.JOIN, "a")]
+    assert coordinator.session("p").participant_user_ids == ["h", "a"]
+
+
+def test_join_cascade_that_empties_party_closes_newcomer():
+    coordinator = WatchPartyCoordinator(WatchPartyConfig(max_pending_messages=2))
+    host = coordinator.create_party("h", "content_1", party_id="p")
+    a = coordinator.join("p", "a")
+    b = coordinator.join("p", "b")
+    # Every mailbox overflowed while the JOIN and LEAVE/HOST notices fanned out
+    assert "p" not in coordinator
+    assert host.closed and a.closed and b.closed
+    with pytest.raises(KeyError):
+        coordinator.chat("p", "b", "hi")
+
+
+def test_join_drops_slow_member_but_keeps_party():
+    coordinator = WatchPartyCoordinator(WatchPartyConfig(max_pending_messages=3))
+    host = coordinator.create_party("h", "content_1", party_id="p")
+    a = coordinator.join("p", "a")
+    b = coordinator.join("p", "b")
+    drain(a)
+    drain(b)
+    # The host never reads, so its mailbox is full (STATE, JOIN a, JOIN b)
+    c = coordinator.join("p", "c")
+    assert host.closed and host.close_reason == "slow"
+    assert "p" in coordinator
+    assert not (a.closed or b.closed or c.closed)
+    assert coordinator.session("p").host_user_id == "a"
+    assert kinds(c) == [SyncKind.STATE, SyncKind.LEAVE, SyncKind.HOST]
+    drain(a)
+    drain(b)
+    coordinator.chat("p", "c", "hi")
+    assert [m.text for m in drain(a) + drain(b)] == ["hi", "hi"]
+
+
+def test_reconnect_replaces_connection_and_respects_capacity():
+    coordinator = WatchPartyCoordinator()
+    coordinator.create_party("h", "content_1", max_participants=2, party_id="p")
+    first = coordinator.join("p", "a")
+    second = coordinator.join("p", "a")
+    assert first.closed and first.close_reason == "replaced"
+    assert not second.closed
+    with pytest.raises(ValueError):
+        coordinator.join("p", "c")
+
+
+def test_leave_hands_over_host_and_last_leave_ends_party():
+    coordinator = WatchPartyCoordinator()
+    coordinator.create_party("h", "content_1", party_id="p")
+    a = coordinator.join("p", "a")
+    drain(a)
+    coordinator.leave("p", "h")
+    # The new host is not told about its own promotion
+    assert kinds(a) == [SyncKind.LEAVE]
+    assert coordinator.session("p").host_user_id == "a"
+    coordinator.leave("p", "a")
+    assert "p" not in coordinator
+
+
+def test_only_host_commands_playback():
+    coordinator = WatchPartyCoordinator()
+    coordinator.create_party("h", "content_1", party_id="p")
+    a = coordinator.join("p", "a")
+    drain(a)
+    with pytest.raises(PermissionError):
+        coordinator.play("p", "a")
+    coordinator.seek("p", "h", 120.0)
+    message = drain(a)[-1]
+    assert (message.kind, message.position_seconds) == (SyncKind.SEEK, 120.0)
+
+
+def test_recv_raises_after_close():
+    async def scenario():
+        coordinator = WatchPartyCoordinator()
+        host = coordinator.create_party("h", "content_1", party_id="p")
+        guest = coordinator.join("p", "a")
+        assert (await guest.recv()).kind == SyncKind.STATE
+        coordinator.end_party("p")
+        assert (await guest.recv()).kind == SyncKind.END
+        with pytest.raises(ConnectionClosed):
+            await guest.recv()
+        assert host.closed
+
+    asyncio.run(scenario())
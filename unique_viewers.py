@@ -0,0 +1,336 @@
+import base64
+import hashlib
+import logging
+import math
+import struct
+import sys
+import time
+import tracemalloc
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core_data_domains import PlaybackEvent
+from real_time_event_streaming import KafkaTopics
+
+logger = logging.getLogger(__name__)
+
+# Approximate unique viewers per content
+# HyperLogLog sketches keyed on (content_id, event_date, event_hour). Hourly
+# sketches merge into daily and weekly counts without rescanning events.
+#
+# Error bound: the relative standard error is 1.04 / sqrt(2 ** precision).
+# At the default precision of 14 (16384 registers) that is ~0.81%, so about
+# 95% of estimates fall within +/-1.6% of the exact count and 99.7% within
+# +/-2.4%. count() uses Ertl's improved estimator ("New cardinality
+# estimation algorithms for HyperLogLog sketches", 2017), which holds that
+# bound from small counts up without a switch-over from linear counting; the
+# original estimator's hard switch at 2.5 * m is biased by about +2% there.
+
+DEFAULT_PRECISION = 14
+
+_SKETCH_HEADER = struct.Struct(">BBB")  # version, precision, format
+_FORMAT_SPARSE = 0
+_FORMAT_DENSE = 1
+_VERSION = 1
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _sigma(x: float) -> float:
+    # Ertl's sigma: corrects for empty registers, so small counts need no linear counting
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    # Ertl's tau: corrects for saturated registers
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter with a sparse mode for low cardinalities.
+
+    Starts as a dict of register index -> rank and converts to a dense
+    bytearray of 2 ** precision registers once the dict would be larger, so
+    the long tail of rarely watched titles stays small.
+    """
+
+    __slots__ = ("precision", "m", "_sparse", "_dense", "_shift", "_mask", "_sparse_limit")
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._dense: Optional[bytearray] = None
+        # A dict entry costs far more than a register byte
+        self._sparse_limit = self.m // 16
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h: int):
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        dense = self._dense
+        if dense is not None:
+            if rank > dense[index]:
+                dense[index] = rank
+            return
+        sparse = self._sparse
+        if rank > sparse.get(index, 0):
+            sparse[index] = rank
+            if len(sparse) > self._sparse_limit:
+                self._to_dense()
+
+    def _to_dense(self):
+        dense = bytearray(self.m)
+        for index, rank in self._sparse.items():
+            dense[index] = rank
+        self._dense = dense
+        self._sparse = None
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        if other._dense is not None:
+            if self._dense is None:
+                self._to_dense()
+            self._dense = bytearray(map(max, self._dense, other._dense))
+            return
+        for index, rank in other._sparse.items():
+            if self._dense is not None:
+                if rank > self._dense[index]:
+                    self._dense[index] = rank
+            elif rank > self._sparse.get(index, 0):
+                self._sparse[index] = rank
+        if self._sparse is not None and len(self._sparse) > self._sparse_limit:
+            self._to_dense()
+
+    def copy(self) -> "HyperLogLog":
+        sketch = HyperLogLog(self.precision)
+        if self._dense is not None:
+            sketch._dense = bytearray(self._dense)
+            sketch._sparse = None
+        else:
+            sketch._sparse = dict(self._sparse)
+        return sketch
+
+    def count(self) -> int:
+        m = self.m
+        q = self._shift
+        # Histogram of register values 0..q+1
+        histogram = [0] * (q + 2)
+        if self._dense is not None:
+            registers = self._dense
+            for rank in set(registers):
+                histogram[rank] = registers.count(rank)
+        else:
+            histogram[0] = m - len(self._sparse)
+            for rank in self._sparse.values():
+                histogram[rank] += 1
+        if histogram[0] == m:
+            return 0
+        z = m * _tau(1.0 - histogram[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _sigma(histogram[0] / m)
+        return int(round(m * m / (2 * math.log(2)) / z))
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def to_bytes(self) -> bytes:
+        if self._dense is not None:
+            body = zlib.compress(bytes(self._dense))
+            fmt = _FORMAT_DENSE
+        else:
+            packed = bytearray()
+            for index in sorted(self._sparse):
+                packed += struct.pack(">IB", index, self._sparse[index])
+            body = zlib.compress(bytes(packed))
+            fmt = _FORMAT_SPARSE
+        return _SKETCH_HEADER.pack(_VERSION, self.precision, fmt) + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        version, precision, fmt = _SKETCH_HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported sketch version {version}")
+        sketch = cls(precision)
+        body = zlib.decompress(data[_SKETCH_HEADER.size:])
+        if fmt == _FORMAT_DENSE:
+            sketch._dense = bytearray(body)
+            sketch._sparse = None
+        else:
+            sketch._sparse = {index: rank for index, rank in struct.iter_unpack(">IB", body)}
+        return sketch
+
+
+@dataclass
+class UniqueViewerSketch:
+    # Published hourly sketch row for KafkaTopics.CONTENT_METRICS
+    sketch_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    content_id: str = ""
+    event_date: str = ""
+    event_hour: int = 0
+    estimated_unique_viewers: int = 0
+    relative_error: float = 0.0
+    precision: int = DEFAULT_PRECISION
+    sketch: str = ""  # base64 of HyperLogLog.to_bytes()
+
+    def to_hyperloglog(self) -> HyperLogLog:
+        return HyperLogLog.from_bytes(base64.b64decode(self.sketch))
+
+
+HourKey = Tuple[str, str, int]  # (content_id, event_date, event_hour)
+
+
+class UniqueViewerCounter:
+    """
+    Distinct user_ids per content per hour, with daily and weekly rollups
+    computed by merging hourly sketches.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self._hourly: Dict[HourKey, HyperLogLog] = {}
+
+    def add(self, event: PlaybackEvent):
+        if not event.user_id:
+            return
+        key = (event.content_id, event.event_date, event.event_hour)
+        sketch = self._hourly.get(key)
+        if sketch is None:
+            sketch = self._hourly[key] = HyperLogLog(self.precision)
+        sketch.add_hash(hash64(event.user_id))
+
+    def add_many(self, events: Iterable[PlaybackEvent]):
+        for event in events:
+            self.add(event)
+
+    def hourly(self, content_id: str, event_date: str, event_hour: int) -> int:
+        sketch = self._hourly.get((content_id, event_date, event_hour))
+        return sketch.count() if sketch else 0
+
+    def _rollup(self, content_id: str, dates: List[str]) -> HyperLogLog:
+        # Look the hourly keys up directly; the cost does not grow with the catalog
+        merged = HyperLogLog(self.precision)
+        hourly = self._hourly
+        for event_date in dict.fromkeys(dates):
+            for hour in range(24):
+                sketch = hourly.get((content_id, event_date, hour))
+                if sketch is not None:
+                    merged.merge(sketch)
+        return merged
+
+    def daily(self, content_id: str, event_date: str) -> int:
+        return self._rollup(content_id, [event_date]).count()
+
+    def weekly(self, content_id: str, week_start: str) -> int:
+        start = date.fromisoformat(week_start)
+        dates = [(start + timedelta(days=i)).isoformat() for i in range(7)]
+        return self._rollup(content_id, dates).count()
+
+    def merge_sketch(self, row: UniqueViewerSketch):
+        # Fold in a sketch shipped from another worker
+        key = (row.content_id, row.event_date, row.event_hour)
+        incoming = row.to_hyperloglog()
+        existing = self._hourly.get(key)
+        if existing is None:
+            self._hourly[key] = incoming
+        else:
+            existing.merge(incoming)
+
+    def sketch_rows(self, event_date: Optional[str] = None) -> List[UniqueViewerSketch]:
+        rows = []
+        for (content_id, day, hour), sketch in self._hourly.items():
+            if event_date is not None and day != event_date:
+                continue
+            rows.append(UniqueViewerSketch(
+                content_id=content_id, event_date=day, event_hour=hour,
+                estimated_unique_viewers=sketch.count(), relative_error=sketch.relative_error,
+                precision=self.precision, sketch=base64.b64encode(sketch.to_bytes()).decode("ascii"),
+            ))
+        return rows
+
+    def publish(self, producer, event_date: Optional[str] = None) -> int:
+        rows = self.sketch_rows(event_date)
+        for row in rows:
+            producer.produce(row, topic=KafkaTopics.CONTENT_METRICS)
+        return len(rows)
+
+    def evict_before(self, event_date: str) -> int:
+        """Drop hourly sketches older than event_date (after they were published)"""
+        stale = [key for key in self._hourly if key[1] < event_date]
+        for key in stale:
+            del self._hourly[key]
+        return len(stale)
+
+
+if __name__ == "__main__":
+    # Benchmark against exact counting with Python sets
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    distinct_users = n // 2
+    base = datetime(2024, 1, 1)
+    events = [
+        PlaybackEvent(user_id=f"user_{(i * 7919) % distinct_users}", content_id="movie_popular",
+                      event_date=(base + timedelta(days=(i * 7) // n)).strftime("%Y-%m-%d"),
+                      event_hour=(i * 24 * 7 // n) % 24)
+        for i in range(n)
+    ]
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    exact: Dict[HourKey, set] = {}
+    for e in events:
+        exact.setdefault((e.content_id, e.event_date, e.event_hour), set()).add(e.user_id)
+    weekly_exact = len(set().union(*exact.values()))
+    exact_secs = time.perf_counter() - t0
+    exact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del exact
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    counter = UniqueViewerCounter()
+    counter.add_many(events)
+    weekly_estimate = counter.weekly("movie_popular", "2024-01-01")
+    hll_secs = time.perf_counter() - t0
+    hll_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    shipped = sum(len(r.sketch) for r in counter.sketch_rows())
+    print(f"exact: {weekly_exact:,} users, {n / exact_secs:,.0f} events/sec, {exact_bytes / 1e6:.1f} MB")
+    print(f"hll:   {weekly_estimate:,} users ({(weekly_estimate - weekly_exact) / weekly_exact:+.2%}), "
+          f"{n / hll_secs:,.0f} events/sec, {hll_bytes / 1e6:.1f} MB, {shipped / 1e3:.0f} KB serialized")
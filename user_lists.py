@@ -0,0 +1,299 @@
+import heapq
+import itertools
+import logging
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core_data_domains import UserList, UserInteractionEvent, EventType
+
+logger = logging.getLogger(__name__)
+
+# Indexed UserList store
+# Each list is an insertion-ordered set (a dict with None values), so
+# membership, add and remove are O(1) and duplicates cannot occur. A reverse
+# index content_id -> owners is maintained on every change, so "how many
+# users saved X" is a dict lookup instead of a scan over every list.
+
+DEFAULT_LIST_NAME = "My List"
+DEFAULT_LIST_TYPE = "watchlist"
+
+LIST_EVENTS = {EventType.ADD_TO_LIST, EventType.REMOVE_FROM_LIST}
+
+
+class _ListState:
+    __slots__ = ("list_id", "user_id", "list_name", "list_type", "is_public",
+                 "items", "created_at", "updated_at")
+
+    def __init__(self, list_id: str, user_id: str, list_name: str, list_type: str,
+                 is_public: bool, created_at: datetime):
+        self.list_id = list_id
+        self.user_id = user_id
+        self.list_name = list_name
+        self.list_type = list_type
+        self.is_public = is_public
+        self.items: Dict[str, None] = {}
+        self.created_at = created_at
+        self.updated_at = created_at
+
+
+@dataclass
+class ListApplyResult:
+    added: int = 0
+    removed: int = 0
+    # Adds of titles already present and removes of absent ones
+    unchanged: int = 0
+    # Not a list event, or no user/content id
+    skipped: int = 0
+
+
+class UserListStore:
+    """
+    In-memory UserList store with O(1) membership and a reverse index.
+
+    Lists are addressed by list_id; each user's default watchlist is created
+    on first use and is where ADD_TO_LIST / REMOVE_FROM_LIST events land.
+    UserList objects are built on demand by get(), with content_ids in
+    insertion order and item_count always equal to len(content_ids).
+    """
+
+    def __init__(self):
+        self._lists: Dict[str, _ListState] = {}
+        self._user_lists: Dict[str, Dict[str, None]] = {}
+        self._default_list: Dict[str, str] = {}
+        # content_id -> {user_id: number of that user's lists holding it}
+        self._saved_by: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._lists)
+
+    def __contains__(self, list_id: str) -> bool:
+        return list_id in self._lists
+
+    # Lists
+
+    def create_list(self, user_id: str, list_name: str = DEFAULT_LIST_NAME,
+                    list_type: str = DEFAULT_LIST_TYPE, is_public: bool = False,
+                    list_id: Optional[str] = None, created_at: Optional[datetime] = None) -> str:
+        list_id = list_id or str(uuid.uuid4())
+        if list_id in self._lists:
+            raise ValueError(f"List {list_id} already exists")
+        self._lists[list_id] = _ListState(list_id, user_id, list_name, list_type, is_public,
+                                          created_at or datetime.utcnow())
+        self._user_lists.setdefault(user_id, {})[list_id] = None
+        if list_type == DEFAULT_LIST_TYPE and user_id not in self._default_list:
+            self._default_list[user_id] = list_id
+        return list_id
+
+    def load(self, user_list: UserList) -> str:
+        """Import an existing UserList, dropping duplicate content_ids"""
+        list_id = self.create_list(user_list.user_id, user_list.list_name, user_list.list_type,
+                                   user_list.is_public, user_list.list_id, user_list.created_at)
+        state = self._lists[list_id]
+        for content_id in user_list.content_ids:
+            if content_id not in state.items:
+                state.items[content_id] = None
+                self._index_add(state.user_id, content_id)
+        state.updated_at = user_list.updated_at
+        return list_id
+
+    def load_many(self, user_lists: Iterable[UserList]) -> int:
+        count = 0
+        for user_list in user_lists:
+            self.load(user_list)
+            count += 1
+        return count
+
+    def delete_list(self, list_id: str) -> bool:
+        state = self._lists.pop(list_id, None)
+        if state is None:
+            return False
+        for content_id in state.items:
+            self._index_remove(state.user_id, content_id)
+        owned = self._user_lists.get(state.user_id)
+        if owned is not None:
+            owned.pop(list_id, None)
+            if not owned:
+                del self._user_lists[state.user_id]
+        if self._default_list.get(state.user_id) == list_id:
+            del self._default_list[state.user_id]
+        return True
+
+    def default_list_id(self, user_id: str, created_at: Optional[datetime] = None) -> str:
+        list_id = self._default_list.get(user_id)
+        if list_id is None:
+            list_id = self.create_list(user_id, created_at=created_at)
+        return list_id
+
+    def lists_for_user(self, user_id: str) -> List[str]:
+        return list(self._user_lists.get(user_id, ()))
+
+    def get(self, list_id: str) -> UserList:
+        state = self._state(list_id)
+        content_ids = list(state.items)
+        return UserList(
+            list_id=state.list_id, user_id=state.user_id, list_name=state.list_name,
+            list_type=state.list_type, is_public=state.is_public, content_ids=content_ids,
+            created_at=state.created_at, updated_at=state.updated_at, item_count=len(content_ids),
+        )
+
+    def _state(self, list_id: str) -> _ListState:
+        state = self._lists.get(list_id)
+        if state is None:
+            raise KeyError(f"Unknown list {list_id}")
+        return state
+
+    # Items
+
+    def contains(self, list_id: str, content_id: str) -> bool:
+        return content_id in self._state(list_id).items
+
+    def item_count(self, list_id: str) -> int:
+        return len(self._state(list_id).items)
+
+    def items(self, list_id: str, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        items = self._state(list_id).items
+        if offset == 0 and limit is None:
+            return list(items)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(items, offset, stop))
+
+    def add(self, list_id: str, content_id: str, timestamp: Optional[datetime] = None) -> bool:
+        """Add content_id; False if it was already in the list"""
+        state = self._state(list_id)
+        if content_id in state.items:
+            return False
+        state.items[content_id] = None
+        self._touch(state, timestamp)
+        self._index_add(state.user_id, content_id)
+        return True
+
+    def remove(self, list_id: str, content_id: str, timestamp: Optional[datetime] = None) -> bool:
+        """Remove content_id; False if it was not in the list"""
+        state = self._state(list_id)
+        if content_id not in state.items:
+            return False
+        del state.items[content_id]
+        self._touch(state, timestamp)
+        self._index_remove(state.user_id, content_id)
+        return True
+
+    @staticmethod
+    def _touch(state: _ListState, timestamp: Optional[datetime]):
+        # updated_at never moves backwards when events arrive out of order
+        timestamp = timestamp or datetime.utcnow()
+        if timestamp > state.updated_at:
+            state.updated_at = timestamp
+
+    def _index_add(self, user_id: str, content_id: str):
+        owners = self._saved_by.get(content_id)
+        if owners is None:
+            owners = self._saved_by[content_id] = {}
+        owners[user_id] = owners.get(user_id, 0) + 1
+
+    def _index_remove(self, user_id: str, content_id: str):
+        owners = self._saved_by[content_id]
+        count = owners[user_id] - 1
+        if count:
+            owners[user_id] = count
+        else:
+            del owners[user_id]
+            if not owners:
+                del self._saved_by[content_id]
+
+    # Reverse index
+
+    def saved_count(self, content_id: str) -> int:
+        """Number of distinct users with content_id in any of their lists"""
+        return len(self._saved_by.get(content_id, ()))
+
+    def owners(self, content_id: str) -> Set[str]:
+        return set(self._saved_by.get(content_id, ()))
+
+    def most_saved(self, n: int = 10) -> List[Tuple[int, str]]:
+        return heapq.nlargest(n, ((len(owners), content_id) for content_id, owners in self._saved_by.items()))
+
+    # Interaction events
+
+    @staticmethod
+    def event_content_id(event: UserInteractionEvent) -> Optional[str]:
+        # List buttons carry the title in element_id
+        return event.content_id or event.element_id
+
+    def apply_event(self, event: UserInteractionEvent, result: Optional[ListApplyResult] = None) -> ListApplyResult:
+        result = result if result is not None else ListApplyResult()
+        content_id = self.event_content_id(event)
+        if event.event_type not in LIST_EVENTS or not event.user_id or not content_id:
+            result.skipped += 1
+            return result
+        # A list created by an event starts at event time, so replays keep updated_at in event time
+        list_id = self.default_list_id(event.user_id, event.event_timestamp)
+        if event.event_type is EventType.ADD_TO_LIST:
+            if self.add(list_id, content_id, event.event_timestamp):
+                result.added += 1
+            else:
+                result.unchanged += 1
+        elif self.remove(list_id, content_id, event.event_timestamp):
+            result.removed += 1
+        else:
+            result.unchanged += 1
+        return result
+
+    def apply_events(self, events: Iterable[UserInteractionEvent]) -> ListApplyResult:
+        """Bulk apply; non-list events are counted as skipped"""
+        result = ListApplyResult()
+        for event in events:
+            self.apply_event(event, result)
+        return result
+
+
+if __name__ == "__main__":
+    # Heavy users with thousands of saved titles: plain-list UserList vs store
+    rng = random.Random(3)
+    num_users = 200
+    items_per_user = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    catalog = [f"content_{i}" for i in range(items_per_user * 4)]
+    events = []
+    clock = datetime(2024, 1, 1)
+    for _ in range(num_users * items_per_user):
+        event_type = EventType.ADD_TO_LIST if rng.random() < 0.8 else EventType.REMOVE_FROM_LIST
+        events.append(UserInteractionEvent(
+            event_type=event_type, event_timestamp=clock, user_id=f"user_{rng.randrange(num_users)}",
+            element_id=rng.choice(catalog),
+        ))
+
+    naive: Dict[str, UserList] = {}
+    start = time.perf_counter()
+    for event in events:
+        user_list = naive.get(event.user_id)
+        if user_list is None:
+            user_list = naive[event.user_id] = UserList(user_id=event.user_id)
+        if event.event_type is EventType.ADD_TO_LIST:
+            if event.element_id not in user_list.content_ids:
+                user_list.content_ids.append(event.element_id)
+        elif event.element_id in user_list.content_ids:
+            user_list.content_ids.remove(event.element_id)
+        user_list.item_count = len(user_list.content_ids)
+    naive_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    naive_saved = sum(1 for user_list in naive.values() if catalog[0] in user_list.content_ids)
+    naive_lookup_secs = time.perf_counter() - start
+
+    store = UserListStore()
+    start = time.perf_counter()
+    result = store.apply_events(events)
+    store_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    store_saved = store.saved_count(catalog[0])
+    store_lookup_secs = time.perf_counter() - start
+
+    assert naive_saved == store_saved
+    sizes = [store.item_count(store.default_list_id(u)) for u in naive]
+    print(f"{len(events):,} events, {num_users} users, avg {sum(sizes) / len(sizes):,.0f} items per list")
+    print(f"plain list: {len(events) / naive_secs:,.0f} events/sec, saved_count {naive_lookup_secs * 1e3:.2f} ms")
+    print(f"store:      {len(events) / store_secs:,.0f} events/sec, saved_count {store_lookup_secs * 1e3:.3f} ms "
+          f"(+{result.added:,} -{result.removed:,} ={result.unchanged:,})")